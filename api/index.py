@@ -22,7 +22,7 @@ logger = logging.getLogger(__name__)
 database_manager = None
 
 try:
-    from app.routers import costing, health
+    from app.routers import costing, health, jobs
     from app.config import settings
     from app.database_psycopg2 import database_manager as db_manager
     database_manager = db_manager
@@ -47,10 +47,34 @@ async def lifespan(app: FastAPI):
             logger.error(f"Database connection failed: {e}")
             logger.warning("API starting without database connection")
     
+    # Start calculation worker processes up front (no-op when CALC_PROCESS_WORKERS=0)
+    try:
+        from process_executor import get_calculation_executor
+        await asyncio.to_thread(get_calculation_executor().warm_up)
+    except Exception as e:
+        logger.warning(f"Calculation workers not warmed up: {e}")
+    
+    # Resume queued / stale jobs left by the previous process (no-op when JOB_WORKERS=0)
+    try:
+        from job_queue import get_job_queue
+        await asyncio.to_thread(get_job_queue().start)
+    except Exception as e:
+        logger.warning(f"Job queue workers not started: {e}")
+    
     yield
     
     # Shutdown
     logger.info("Shutting down Costing API...")
+    try:
+        from job_queue import get_job_queue
+        await asyncio.to_thread(get_job_queue().stop, 5)
+    except Exception as e:
+        logger.error(f"Error stopping job queue workers: {e}")
+    try:
+        from process_executor import get_calculation_executor
+        get_calculation_executor().shutdown(wait=False)
+    except Exception as e:
+        logger.error(f"Error shutting down calculation workers: {e}")
     if database_manager:
         try:
             await database_manager.disconnect()
@@ -93,6 +117,7 @@ async def ensure_database_connection(request: Request, call_next):
 try:
     app.include_router(health.router, prefix="/api/health", tags=["health"])
     app.include_router(costing.router, prefix="/api/costing", tags=["costing"])
+    app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
 except Exception as e:
     logger.warning(f"Could not include routers: {e}")
 
@@ -114,6 +139,7 @@ async def api_root():
         "endpoints": {
             "health": "/api/health",
             "costing": "/api/costing",
+            "jobs": "/api/jobs",
             "docs": "/docs"
         }
     }
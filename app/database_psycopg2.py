@@ -5,55 +5,185 @@ Based on the working Python script provided
 
 import psycopg2
 import psycopg2.pool
+import psycopg2.extensions
 import logging
+import os
+from contextlib import contextmanager
 from typing import Optional, Dict, Any, List
 from app.config import settings
+from supabaseconfig import SUPABASE_CONFIG
+from data_source import DataSource, get_data_source
 import threading
 import time
 
 logger = logging.getLogger(__name__)
 
+# Same credentials (and sslmode=require) as the fetchers and tracker scripts used directly
+DB_PARAMS = dict(SUPABASE_CONFIG)
+
+# Pool tuning (shared by the API services and the legacy fetchers/tracker scripts)
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "2"))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "60"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class ManagedConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool with the bits a long-running service needs:
+
+    - statement_timeout is set once when a connection is opened
+    - idle connections are health-checked (SELECT 1) before being handed out
+    - connections older than max_lifetime are recycled
+    - up to maxconn idle connections are kept (the base pool closes anything above minconn)
+    - getconn() waits for a free slot instead of raising "pool exhausted"
+    """
+
+    def __init__(self, minconn, maxconn, max_lifetime=DB_POOL_MAX_LIFETIME,
+                 healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE, statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+                 acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT, *args, **kwargs):
+        self.max_lifetime = max_lifetime
+        self.healthcheck_idle = healthcheck_idle
+        self.statement_timeout_ms = statement_timeout_ms
+        self.acquire_timeout = acquire_timeout
+        self._created_at = {}
+        self._last_used = {}
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        cur = conn.cursor()
+        cur.execute("SET statement_timeout = %s", [self.statement_timeout_ms])
+        cur.close()
+        conn.commit()
+        self._created_at[id(conn)] = time.time()
+        self._last_used[id(conn)] = time.time()
+        return conn
+
+    def _forget(self, conn):
+        self._created_at.pop(id(conn), None)
+        self._last_used.pop(id(conn), None)
+
+    def _expired(self, conn):
+        created_at = self._created_at.get(id(conn))
+        return created_at is not None and time.time() - created_at > self.max_lifetime
+
+    def _healthy(self, conn):
+        if conn.closed or self._expired(conn):
+            return False
+        if time.time() - self._last_used.get(id(conn), 0) < self.healthcheck_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    def _getconn(self, key=None):
+        while True:
+            conn = super()._getconn(key)
+            if self._healthy(conn):
+                return conn
+            # Stale or broken: close it and try the next idle one (or open a fresh one)
+            self._putconn(conn, self._rused[id(conn)], close=True)
+
+    def _putconn(self, conn, key=None, close=False):
+        if self.closed:
+            raise psycopg2.pool.PoolError("connection pool is closed")
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise psycopg2.pool.PoolError("trying to put unkeyed connection")
+
+        if not close and not conn.closed:
+            if self._expired(conn):
+                close = True
+            else:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+
+        if close or conn.closed:
+            if not conn.closed:
+                conn.close()
+            self._forget(conn)
+        else:
+            self._last_used[id(conn)] = time.time()
+            self._pool.append(conn)
+
+        del self._used[key]
+        del self._rused[id(conn)]
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise psycopg2.pool.PoolError(
+                f"timed out after {self.acquire_timeout}s waiting for a database connection"
+            )
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+# One pool per process, shared by every DatabaseManager instance
+_shared_pool: Optional[ManagedConnectionPool] = None
+_shared_pool_lock = threading.Lock()
+
+
 class DatabaseManager:
-    def __init__(self):
-        self.pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
-        self._lock = threading.Lock()
-    
+    def __init__(self, owns_pool: bool = False):
+        # Only the owner (the global database_manager) closes the shared pool on disconnect
+        self.owns_pool = owns_pool
+
+    @property
+    def pool(self) -> Optional[ManagedConnectionPool]:
+        return _shared_pool
+
+    def ensure_pool(self) -> ManagedConnectionPool:
+        """Create the shared pool on first use (legacy scripts never call connect())"""
+        global _shared_pool
+        if _shared_pool is not None and not _shared_pool.closed:
+            return _shared_pool
+
+        with _shared_pool_lock:
+            if _shared_pool is None or _shared_pool.closed:
+                logger.info(f"Connecting to database at {DB_PARAMS['host']}:{DB_PARAMS['port']}")
+                _shared_pool = ManagedConnectionPool(
+                    minconn=DB_POOL_MIN_CONN,
+                    maxconn=DB_POOL_MAX_CONN,
+                    **DB_PARAMS
+                )
+                logger.info("Database pool created successfully")
+            return _shared_pool
+
     async def connect(self):
         """Create database connection pool using psycopg2"""
         try:
-            # Use the exact same connection parameters from the working Python script
-            db_params = {
-                "dbname": "postgres",
-                "user": "postgres.ozgkgkenzpngnptdqbqf",
-                "password": "PwbcCdD?Yq4Jn.v",
-                "host": "aws-0-ap-south-1.pooler.supabase.com",
-                "port": 5432
-            }
-            
-            logger.info(f"Connecting to database at {db_params['host']}:{db_params['port']}")
-            
-            # Create connection pool
-            self.pool = psycopg2.pool.ThreadedConnectionPool(
-                minconn=2,
-                maxconn=10,
-                **db_params
-            )
+            if not get_data_source().needs_database:
+                logger.info("Replay data source: skipping database pool")
+                return
+            self.ensure_pool()
             
             # Test the connection
-            conn = self.pool.getconn()
-            try:
-                cur = conn.cursor()
-                cur.execute("SELECT 1")
-                result = cur.fetchone()
-                if result[0] == 1:
-                    logger.info("Database connection test successful")
-                else:
-                    raise Exception("Database connection test failed")
-                cur.close()
-            finally:
-                self.pool.putconn(conn)
-            
-            logger.info("Database pool created successfully")
+            if not await self.health_check():
+                raise Exception("Database connection test failed")
+            logger.info("Database connection test successful")
             
         except Exception as e:
             logger.error(f"Failed to create database pool: {e}")
@@ -61,9 +191,50 @@ class DatabaseManager:
     
     async def disconnect(self):
         """Close database connection pool"""
-        if self.pool:
-            self.pool.closeall()
-            logger.info("Database pool closed")
+        global _shared_pool
+        if not self.owns_pool:
+            # Other managers share the process pool; connections were already returned
+            return
+        with _shared_pool_lock:
+            if _shared_pool:
+                _shared_pool.closeall()
+                _shared_pool = None
+                logger.info("Database pool closed")
+
+    def getconn(self):
+        """Borrow a connection from the shared pool; return it with putconn()"""
+        source = get_data_source()
+        if not source.needs_database:
+            return source.replay_connection()
+        return source.wrap(self.ensure_pool().getconn())
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection borrowed with getconn()"""
+        conn = DataSource.unwrap(conn)
+        if conn is None:
+            return
+        pool = self.pool
+        if pool is None or pool.closed:
+            conn.close()
+            return
+        pool.putconn(conn, close=close)
+
+    @contextmanager
+    def connection(self):
+        """
+        Pooled replacement for `with psycopg2.connect(...) as conn:`.
+        Commits on success, rolls back on error and returns the connection to the pool.
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
     
     def execute_function(
         self, 
@@ -71,18 +242,11 @@ class DatabaseManager:
         params: List[Any]
     ) -> List[Dict[str, Any]]:
         """Execute a PostgreSQL function with parameters (synchronous)"""
-        if not self.pool:
-            raise RuntimeError("Database pool not initialized")
-        
         conn = None
         try:
-            conn = self.pool.getconn()
+            conn = self.getconn()
             cur = conn.cursor()
             
-            # Set no timeout for this connection
-            cur.execute("SET statement_timeout = 0")
-            conn.commit()
-            
             # Build the function call
             param_placeholders = ", ".join(["%s" for _ in params])
             query = f"SELECT * FROM {function_name}({param_placeholders})"
@@ -111,21 +275,15 @@ class DatabaseManager:
             raise
         finally:
             if conn:
-                self.pool.putconn(conn)
+                self.putconn(conn)
     
     def execute_query(self, query: str, params: Optional[List] = None) -> List[Dict[str, Any]]:
         """Execute a raw SQL query (synchronous)"""
-        if not self.pool:
-            raise RuntimeError("Database pool not initialized")
-        
         conn = None
         try:
-            conn = self.pool.getconn()
+            conn = self.getconn()
             cur = conn.cursor()
             
-            cur.execute("SET statement_timeout = 0")
-            conn.commit()
-            
             if params:
                 cur.execute(query, params)
             else:
@@ -144,11 +302,13 @@ class DatabaseManager:
             raise
         finally:
             if conn:
-                self.pool.putconn(conn)
+                self.putconn(conn)
     
     async def health_check(self) -> bool:
         """Check database connection health"""
         try:
+            if not get_data_source().needs_database:
+                return True
             if not self.pool:
                 return False
             
@@ -166,5 +326,5 @@ class DatabaseManager:
             logger.error(f"Database health check failed: {e}")
             return False
 
-# Global database manager instance
-database_manager = DatabaseManager()
\ No newline at end of file
+# Global database manager instance (owns the shared pool)
+database_manager = DatabaseManager(owns_pool=True)
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""
+Pydantic models for the asynchronous job API
+"""
+
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional
+
+class JobSubmitRequest(BaseModel):
+    job_type: str = Field(..., description="Job type (costing, scheme_processor, tracker)")
+    scheme_id: str = Field(..., description="The scheme ID to run the job for")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Optional job parameters")
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    job_type: str
+    scheme_id: str
+    status: str = Field(..., description="queued, running, completed or failed")
+    attempts: int = 0
+    params: Optional[Dict[str, Any]] = None
+    worker_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    heartbeat_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class JobResultResponse(JobStatusResponse):
+    result: Optional[Any] = None
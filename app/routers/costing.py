@@ -16,6 +16,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from costing_sheet import CostingSheetCalculator
+from process_executor import get_calculation_executor, run_costing_sheet
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -47,12 +48,11 @@ async def calculate_costing_sheet(request: CostingRequest, background_tasks: Bac
     try:
         logger.info(f"Starting costing sheet calculation for scheme_id: {request.scheme_id}")
 
-        # Initialize the calculator
-        calculator = CostingSheetCalculator()
-
-        # Validate scheme first
-        logger.info("Validating scheme requirements...")
-        validation = calculator.validate_scheme_requirements(request.scheme_id)
+        # Validate and calculate in a worker process (thread when CALC_PROCESS_WORKERS=0);
+        # use POST /jobs for runs that outlive the request
+        logger.info("Validating scheme requirements and calculating costing sheet...")
+        outcome = await get_calculation_executor().run(run_costing_sheet, request.scheme_id)
+        validation = outcome['validation']
 
         if not validation['is_valid']:
             error_msg = f"Scheme validation failed: {', '.join(validation['errors'])}"
@@ -64,15 +64,7 @@ async def calculate_costing_sheet(request: CostingRequest, background_tasks: Bac
                 data=validation
             )
 
-        # Perform costing calculation
-        logger.info("Starting costing sheet calculation...")
-
-        # Run calculation in background for better performance
-        def run_calculation():
-            return calculator.calculate_costing_sheet(request.scheme_id)
-
-        # For now, run synchronously (can be made async later)
-        result = run_calculation()
+        result = outcome['result']
 
         if result['status'] == 'success':
             logger.info(f"Costing sheet calculation completed successfully for scheme_id: {request.scheme_id}")
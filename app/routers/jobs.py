@@ -0,0 +1,57 @@
+"""
+Asynchronous job API: submit costing/tracker runs and poll for results
+"""
+
+from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+import sys
+import os
+
+# Add current directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.job_models import JobSubmitRequest, JobStatusResponse, JobResultResponse
+from job_queue import get_job_queue
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.post("", response_model=JobStatusResponse, status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """
+    Queue a job and return its id immediately; poll GET /jobs/{job_id}
+    """
+    try:
+        job = await asyncio.to_thread(get_job_queue().submit, request.job_type, request.scheme_id, request.params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error submitting job: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error submitting job: {str(e)}")
+    return JobStatusResponse(**job)
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """
+    Current state of a job (without the result payload)
+    """
+    job = await asyncio.to_thread(get_job_queue().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JobStatusResponse(**job)
+
+
+@router.get("/{job_id}/result", response_model=JobResultResponse)
+async def get_job_result(job_id: str):
+    """
+    Job state plus stored result; 409 while the job has not finished
+    """
+    job = await asyncio.to_thread(get_job_queue().get_job, job_id, True)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job['status'] in ('queued', 'running'):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {job['status']}")
+    return JobResultResponse(**job)
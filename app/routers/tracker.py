@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
+from typing import List, Optional
 from ..models.tracker_models import TrackerRunRequest, TrackerRunResponse, TrackerStatusResponse
 from ..services.tracker_service import TrackerService
 import asyncio
@@ -45,6 +46,29 @@ async def get_tracker_status(scheme_id: str):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@router.get("/rows/{scheme_id}")
+async def get_tracker_rows(
+    scheme_id: str,
+    limit: int = Query(1000, ge=1, le=10000),
+    after_row: int = Query(-1, ge=-1),
+    credit_account: Optional[List[str]] = Query(None)
+):
+    """
+    Paginated tracker rows (row-store mode). Pass next_after_row back as
+    after_row to fetch the next page; repeat credit_account to filter accounts.
+    """
+    try:
+        if not scheme_id or not scheme_id.strip():
+            raise HTTPException(status_code=400, detail="scheme_id is required and cannot be empty")
+        
+        return await tracker_service.get_tracker_rows(
+            scheme_id.strip(), limit=limit, after_row=after_row, credit_accounts=credit_account
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
 @router.get("/debug/scheme-config/{scheme_id}")
 async def debug_scheme_config(scheme_id: str):
     """
@@ -89,14 +113,23 @@ async def run_tracker_background(request: TrackerRunRequest, background_tasks: B
         # Mark as processing immediately
         await tracker_service._mark_tracker_as_processing(request.scheme_id.strip())
         
-        # Add to background tasks
-        background_tasks.add_task(run_tracker_background_task, request.scheme_id.strip())
+        # Persist the run in the job queue so it survives restarts; fall back to
+        # in-process background tasks if the queue is unavailable
+        job_id = None
+        try:
+            from job_queue import get_job_queue
+            job = await asyncio.to_thread(get_job_queue().submit, 'tracker', request.scheme_id.strip())
+            job_id = job['job_id']
+        except Exception as e:
+            print(f"⚠️ Job queue unavailable, using background task: {e}")
+            background_tasks.add_task(run_tracker_background_task, request.scheme_id.strip())
         
         return {
             "success": True,
             "message": f"Tracker for scheme {request.scheme_id} has been queued for background processing.",
             "status": "running",
-            "scheme_id": request.scheme_id.strip()
+            "scheme_id": request.scheme_id.strip(),
+            "job_id": job_id
         }
         
     except Exception as e:
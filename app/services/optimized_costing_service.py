@@ -18,6 +18,9 @@ import hashlib
 import threading
 
 from app.database_psycopg2 import database_manager
+from sales_query_builder import applicable_filter_clauses, date_between_clause, sale_date_expr, in_filter_clause
+from material_cache import get_material_master_cache
+from calculations.slab_engine import SlabTable, FALLBACK_UNMATCHED
 from app.models.costing_models import CostingRequest, SchemeComplexityAnalysis
 
 logger = logging.getLogger(__name__)
@@ -319,31 +322,38 @@ class OptimizedCostingService:
             filter_conditions = []
             params = []
             
-            # Date filter
-            filter_conditions.append("TO_DATE(sd.year || '-' || sd.month || '-' || sd.day, 'YYYY-Mon-DD') BETWEEN %s AND %s")
+            # Date filter (indexed sale_date column once migrated)
+            filter_conditions.append(date_between_clause('sd', execute=database_manager.execute_query))
             params.extend([min_date, max_date])
             
             # Applicable filters
-            if scheme_config.applicable_filters['states']:
-                placeholders = ','.join(['%s'] * len(scheme_config.applicable_filters['states']))
-                filter_conditions.append(f"sd.state_name IN ({placeholders})")
-                params.extend(scheme_config.applicable_filters['states'])
-            
-            if scheme_config.applicable_filters['regions']:
-                placeholders = ','.join(['%s'] * len(scheme_config.applicable_filters['regions']))
-                filter_conditions.append(f"sd.region_name IN ({placeholders})")
-                params.extend(scheme_config.applicable_filters['regions'])
-            
-            if scheme_config.applicable_filters['divisions']:
-                placeholders = ','.join(['%s'] * len(scheme_config.applicable_filters['divisions']))
-                filter_conditions.append(f"sd.division::text IN ({placeholders})")
-                params.extend(scheme_config.applicable_filters['divisions'])
+            applicable_clauses, applicable_params = applicable_filter_clauses(
+                scheme_config.applicable_filters, alias='sd',
+                fields=('states', 'regions', 'divisions'), text_columns=('division',)
+            )
+            filter_conditions.extend(applicable_clauses)
+            params.extend(applicable_params)
             
             # Product filters
-            if scheme_config.product_filters['materials']:
-                placeholders = ','.join(['%s'] * len(scheme_config.product_filters['materials']))
-                filter_conditions.append(f"sd.material::text IN ({placeholders})")
-                params.extend(scheme_config.product_filters['materials'])
+            material_clause, material_params = in_filter_clause(
+                'material', scheme_config.product_filters['materials'], alias='sd', cast_text=True
+            )
+            if material_clause:
+                filter_conditions.append(material_clause)
+                params.extend(material_params)
+            
+            # Material attributes come from the in-memory material_master cache when enabled
+            material_cache = get_material_master_cache()
+            if material_cache is not None:
+                material_select = ""
+                material_join = ""
+            else:
+                material_select = """,
+                mm.category,
+                mm.grp,
+                mm.wanda_group,
+                mm.thinner_group"""
+                material_join = "JOIN material_master mm ON sd.material = mm.material"
             
             # Fetch sales data with optimized query (add indexes hint and limit if needed)
             sales_query = f"""
@@ -355,13 +365,9 @@ class OptimizedCostingService:
                 sd.material,
                 CAST(sd.volume AS NUMERIC) as volume,
                 CAST(sd.value AS NUMERIC) as value,
-                TO_DATE(sd.year || '-' || sd.month || '-' || sd.day, 'YYYY-Mon-DD')::timestamp as sale_date,
-                mm.category,
-                mm.grp,
-                mm.wanda_group,
-                mm.thinner_group
+                {sale_date_expr('sd', execute=database_manager.execute_query)}::timestamp as sale_date{material_select}
             FROM sales_data sd
-            JOIN material_master mm ON sd.material = mm.material
+            {material_join}
             WHERE {' AND '.join(filter_conditions)}
             ORDER BY sd.credit_account, sale_date
             """
@@ -370,6 +376,15 @@ class OptimizedCostingService:
             sales_result = database_manager.execute_query(sales_query, params)
             sales_df = pd.DataFrame(sales_result)
             
+            material_df = pd.DataFrame()
+            if material_cache is not None:
+                material_df = material_cache.get_frame()
+                if sales_df.empty:
+                    sales_df = pd.DataFrame(columns=['credit_account', 'customer_name', 'so_name', 'state_name',
+                                                     'material', 'volume', 'value', 'sale_date'])
+                # Inner-join semantics: sales rows without a material_master entry are dropped
+                sales_df = material_cache.attach_attributes(sales_df, drop_unmatched=True)
+            
             # Ensure sale_date is properly converted to datetime and numeric columns to float
             if not sales_df.empty:
                 if 'sale_date' in sales_df.columns:
@@ -387,10 +402,7 @@ class OptimizedCostingService:
                     if col in sales_df.columns:
                         sales_df[col] = sales_df[col].astype('category')
             
-            logger.info(f"Fetched {len(sales_df)} sales records (material data already included via JOIN)")
-            
-            # Create empty material_df since data is already in sales_df from JOIN
-            material_df = pd.DataFrame()
+            logger.info(f"Fetched {len(sales_df)} sales records (material attributes attached)")
             
             # Create BaseData object
             base_data = BaseData(
@@ -538,99 +550,81 @@ class OptimizedCostingService:
         """Apply slab-based calculations matching original SQL exactly"""
         try:
             result_df = base_df.copy()
-            
-            # Get first slab as fallback (matching original SQL first_slab CTE)
-            first_slab = scheme_config.slabs[0] if scheme_config.slabs else None
-            
-            # Apply slab logic for each account (matching original SQL slab_applied CTE)
-            for idx, row in result_df.iterrows():
-                total_value = row['final_base_value']
-                total_volume = row['final_base_volume']
+            slabs = scheme_config.slabs
+            if not slabs or result_df.empty:
+                return result_df
+            
+            # Slab lookup on total_value: first matching slab in scheme order, else the
+            # first slab (matching original SQL slab_applied / first_slab CTEs)
+            slab_table = SlabTable(
+                [slab['slab_start'] for slab in slabs],
+                [slab['slab_end'] for slab in slabs],
+                {name: [slab[name] for slab in slabs] for name in (
+                    'slab_start', 'growth_rate', 'qualification_rate', 'rebate_per_litre',
+                    'additional_rebate_on_growth', 'rebate_percent'
+                )},
+                priority='first', sort=False
+            )
+            total_value = result_df['final_base_value'].to_numpy(dtype=float)
+            total_volume = result_df['final_base_volume'].to_numpy(dtype=float)
+            slab = slab_table.resolve(total_value, fallback=FALLBACK_UNMATCHED)
+            first_start = slab_table.first_value('slab_start')
+            first_qualification = slab_table.first_value('qualification_rate')
+            
+            growth_rate = slab['growth_rate']
+            qualification_rate = slab['qualification_rate']
+            rebate_per_litre = slab['rebate_per_litre']
+            rebate_percent = slab['rebate_percent']
+            no_value = total_value == 0
+            
+            result_df['growth_rate'] = growth_rate
+            result_df['qualification_rate'] = qualification_rate
+            result_df['rebate_per_litre'] = rebate_per_litre
+            result_df['additional_rebate_on_growth'] = slab['additional_rebate_on_growth']
+            result_df['rebate_percent'] = rebate_percent
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # Target / estimated qualifiers / estimated value (original SQL lines 365-382)
+                target_value = np.where(
+                    no_value, first_start, np.maximum((1 + growth_rate) * total_value, slab['slab_start'])
+                )
+                estimated_qualifiers = np.where(no_value, first_qualification, qualification_rate)
+                estimated_value = np.where(
+                    no_value, first_qualification * first_start, qualification_rate * target_value
+                )
                 
-                # Find matching slab based on total_value (like original SQL)
-                matching_slab = None
-                for slab in scheme_config.slabs:
-                    if slab['slab_start'] <= total_value <= slab['slab_end']:
-                        matching_slab = slab
-                        break
+                # Estimated volume (original SQL lines 383-392)
+                price_per_unit = np.where((total_volume == 0) | no_value, 0.0, total_value / total_volume)
+                estimated_volume = np.where(price_per_unit > 0, estimated_value / price_per_unit, 0.0)
                 
-                # Use slab values or fallback to first slab
-                slab_to_use = matching_slab if matching_slab else first_slab
+                # Basic and estimated basic payout (original SQL lines 393-423)
+                per_litre = rebate_per_litre > 0
+                basic_payout = np.where(per_litre, rebate_per_litre * total_volume, rebate_percent * total_value)
+                estimated_volume_for_payout = np.where(
+                    total_volume == 0,
+                    first_qualification * first_start,
+                    qualification_rate * np.maximum((1 + growth_rate) * total_volume, slab['slab_start'])
+                )
+                estimated_basic_payout = np.where(
+                    per_litre,
+                    (slab['additional_rebate_on_growth'] + rebate_per_litre) * estimated_volume_for_payout,
+                    rebate_percent * estimated_value
+                )
                 
-                if slab_to_use:
-                    # Apply slab values (matching original SQL COALESCE logic)
-                    result_df.at[idx, 'growth_rate'] = slab_to_use['growth_rate']
-                    result_df.at[idx, 'qualification_rate'] = slab_to_use['qualification_rate']
-                    result_df.at[idx, 'rebate_per_litre'] = slab_to_use['rebate_per_litre']
-                    result_df.at[idx, 'additional_rebate_on_growth'] = slab_to_use['additional_rebate_on_growth']
-                    result_df.at[idx, 'rebate_percent'] = slab_to_use['rebate_percent']
-                    
-                    # Calculate target value (matching original SQL lines 365-369)
-                    if total_value == 0:
-                        target_value = first_slab['slab_start'] if first_slab else 0
-                    else:
-                        target_value = max(
-                            (1 + slab_to_use['growth_rate']) * total_value,
-                            slab_to_use['slab_start']
-                        )
-                    
-                    # Calculate estimated qualifiers (matching original SQL lines 370-376)
-                    if total_value == 0:
-                        estimated_qualifiers = first_slab['qualification_rate'] if first_slab else 0
-                    else:
-                        estimated_qualifiers = slab_to_use['qualification_rate']
-                    
-                    # Calculate estimated value (matching original SQL lines 377-382)
-                    if total_value == 0:
-                        estimated_value = first_slab['qualification_rate'] * first_slab['slab_start'] if first_slab else 0
-                    else:
-                        estimated_value = slab_to_use['qualification_rate'] * target_value
-                    
-                    # Calculate estimated volume (matching original SQL lines 383-392)
-                    if total_volume == 0 or total_value == 0:
-                        estimated_volume = 0
-                    else:
-                        price_per_unit = total_value / total_volume
-                        if price_per_unit > 0:
-                            estimated_volume = estimated_value / price_per_unit
-                        else:
-                            estimated_volume = 0
-                    
-                    # Calculate basic payout (matching original SQL lines 393-399)
-                    if slab_to_use['rebate_per_litre'] > 0:
-                        basic_payout = slab_to_use['rebate_per_litre'] * total_volume
-                    else:
-                        basic_payout = slab_to_use['rebate_percent'] * total_value
-                    
-                    # Calculate estimated basic payout (matching original SQL lines 400-423)
-                    if slab_to_use['rebate_per_litre'] > 0:
-                        # Per litre calculation
-                        rebate_total = slab_to_use['additional_rebate_on_growth'] + slab_to_use['rebate_per_litre']
-                        if total_volume == 0:
-                            estimated_volume_for_payout = first_slab['qualification_rate'] * first_slab['slab_start'] if first_slab else 0
-                        else:
-                            estimated_volume_for_payout = slab_to_use['qualification_rate'] * max(
-                                (1 + slab_to_use['growth_rate']) * total_volume,
-                                slab_to_use['slab_start']
-                            )
-                        estimated_basic_payout = rebate_total * estimated_volume_for_payout
-                    else:
-                        # Percentage calculation
-                        estimated_basic_payout = slab_to_use['rebate_percent'] * estimated_value
-                    
-                    # Set calculated values
-                    result_df.at[idx, 'target_value'] = target_value
-                    result_df.at[idx, 'estimated_value'] = estimated_value
-                    result_df.at[idx, 'estimated_volume'] = estimated_volume
-                    result_df.at[idx, 'estimated_qualifiers'] = estimated_qualifiers
-                    result_df.at[idx, 'basic_payout'] = basic_payout
-                    result_df.at[idx, 'estimated_base_payout'] = estimated_basic_payout
-                    
-                    # Calculate derived fields (matching original SQL lines 461-467)
-                    result_df.at[idx, 'spent_per_value'] = estimated_basic_payout / estimated_value if estimated_value > 0 else 0
-                    result_df.at[idx, 'estimated_value_final'] = estimated_value if total_value > 0 else 0
-                    result_df.at[idx, 'percent_growth_planned'] = (estimated_value / total_value - 1) if total_value > 0 else 0
-                    result_df.at[idx, 'percent_spent'] = estimated_basic_payout / estimated_value if estimated_value > 0 else 0
+                # Derived fields (original SQL lines 461-467)
+                spent = np.where(estimated_value > 0, estimated_basic_payout / estimated_value, 0.0)
+                result_df['target_value'] = target_value
+                result_df['estimated_value'] = estimated_value
+                result_df['estimated_volume'] = estimated_volume
+                result_df['estimated_qualifiers'] = estimated_qualifiers
+                result_df['basic_payout'] = basic_payout
+                result_df['estimated_base_payout'] = estimated_basic_payout
+                result_df['spent_per_value'] = spent
+                result_df['estimated_value_final'] = np.where(total_value > 0, estimated_value, 0.0)
+                result_df['percent_growth_planned'] = np.where(
+                    total_value > 0, estimated_value / total_value - 1, 0.0
+                )
+                result_df['percent_spent'] = spent
             
             return result_df
             
@@ -7,7 +7,6 @@ import sys
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional
-import collections
 from ..database_psycopg2 import DatabaseManager
 
 # Import the queries from the separate file
@@ -25,6 +24,16 @@ except ImportError:
     TRACKER_ADDITIONAL_SCHEME_VALUE = ""
     TRACKER_ADDITIONAL_SCHEME_VOLUME = ""
 
+from tracker_json import tracker_to_json
+from tracker_store import fetch_tracker_rows, save_tracker_run, store_blob
+
+try:
+    from sales_query_builder import apply_sale_date_column
+except ImportError:
+    # Fallback: keep the templates' TO_DATE predicates as-is
+    def apply_sale_date_column(sql, execute=None):
+        return sql
+
 # Define all columns returned by get_scheme_configuration function
 SCHEME_CONFIG_COLUMNS = [
     'additional_scheme_index', 'scheme_number', 'volume_value_based', 'scheme_type',
@@ -233,22 +242,20 @@ class TrackerService:
                 from tracker_runner import (
                     fetch_scheme_config, 
                     build_queries_from_templates, 
-                    run_multiple_queries_and_combine,
-                    db_params
+                    run_multiple_queries_and_combine
                 )
                 
                 print(f"🔍 Starting tracker execution for scheme_id: {scheme_id}")
                 
-                # Execute tracker logic using the original functions with proper connection
-                conn = psycopg2.connect(**db_params)
-                print(f"✅ Database connected successfully")
-                
-                # Fetch scheme configuration
-                scheme_config_df = fetch_scheme_config(conn, scheme_id)
+                # Execute tracker logic using the original functions with a pooled connection
+                with self.db_manager.connection() as conn:
+                    print(f"✅ Database connected successfully")
+                    
+                    # Fetch scheme configuration
+                    scheme_config_df = fetch_scheme_config(conn, scheme_id)
                 print(f"📊 Scheme config fetched: {len(scheme_config_df)} rows")
                 
                 if scheme_config_df.empty:
-                    conn.close()
                     return {
                         "success": False,
                         "message": f"No scheme configuration found for scheme_id: {scheme_id}. Please check if the scheme exists and has valid configuration.",
@@ -279,7 +286,6 @@ class TrackerService:
                     elif hasattr(tracker_runner, 'scheme_id'):
                         delattr(tracker_runner, 'scheme_id')
                 
-                conn.close()
                 print(f"✅ Tracker execution completed successfully for scheme_id: {scheme_id}")
                 
                 return {
@@ -394,7 +400,8 @@ class TrackerService:
                     template = TRACKER_ADDITIONAL_SCHEME_VOLUME
                 query = template.replace('{scheme_id}', scheme_id).replace('{additional_scheme_index}', str(scheme_index))
             
-            queries.append(query)
+            # Use the indexed sale_date column instead of TO_DATE(...) once migrated
+            queries.append(apply_sale_date_column(query))
             scheme_names.append(scheme_number)
         
         return queries, scheme_names
@@ -419,8 +426,8 @@ class TrackerService:
             # Process the dataframe (column removal, calculations, etc.)
             merged_df = self._process_dataframe(merged_df, scheme_config_df, scheme_id)
             
-            # Convert to JSON and save to database
-            json_data = self._convert_to_json(merged_df)
+            # Convert to JSON and save to database (skipped when only the row store is kept)
+            json_data = self._convert_to_json(merged_df) if store_blob() else None
             
             # Get scheme period dates
             main_scheme_row = scheme_config_df[scheme_config_df['additional_scheme_index'] == 'MAINSCHEME']
@@ -428,7 +435,8 @@ class TrackerService:
             scheme_period_to = main_scheme_row['scheme_period_to'].values[0] if not main_scheme_row.empty else None
             
             # Save to database
-            await self._insert_tracker_data_to_db(scheme_id, json_data, scheme_period_from, scheme_period_to)
+            await self._insert_tracker_data_to_db(scheme_id, json_data, scheme_period_from, scheme_period_to,
+                                                  tracker_df=merged_df)
             
             return {
                 "success": True,
@@ -485,38 +493,25 @@ class TrackerService:
         
         return merged_df
 
-    def _convert_to_json(self, merged_df: pd.DataFrame) -> str:
-        """Convert dataframe to JSON string"""
-        column_order = list(merged_df.columns)
-        ordered_records = []
-        
-        for _, row in merged_df.iterrows():
-            ordered_record = collections.OrderedDict()
-            for col in column_order:
-                value = row[col]
-                if pd.isna(value):
-                    ordered_record[col] = None
-                elif value == float('inf'):
-                    ordered_record[col] = "Infinity"
-                elif value == float('-inf'):
-                    ordered_record[col] = "-Infinity"
-                else:
-                    ordered_record[col] = value
-            ordered_records.append(ordered_record)
-        
-        return json.dumps(ordered_records, indent=4, ensure_ascii=False)
+    def _convert_to_json(self, merged_df: pd.DataFrame, indent: Optional[int] = None) -> str:
+        """Convert dataframe to JSON string (compact unless indent is given)"""
+        return tracker_to_json(merged_df, indent=indent)
 
-    async def _insert_tracker_data_to_db(self, scheme_id: str, json_data: str, from_date, to_date):
-        """Insert tracker data to database"""
+    async def _insert_tracker_data_to_db(self, scheme_id: str, json_data: Optional[str], from_date, to_date,
+                                         tracker_df: Optional[pd.DataFrame] = None):
+        """Insert tracker data (scheme_tracker_rows + today's run row, one transaction) to database"""
         try:
             # Convert scheme_id to integer as the table expects integer type
             scheme_id_int = int(scheme_id)
-            
+        except ValueError:
+            raise Exception(f"Invalid scheme_id format: {scheme_id}. Expected integer.")
+        
+        def write_run(cur, json_data):
             # Check if record exists for today's date (since table has composite primary key)
             check_query = "SELECT scheme_id FROM scheme_tracker_runs WHERE scheme_id = %s AND run_date = CURRENT_DATE"
-            existing = self.db_manager.execute_query(check_query, [scheme_id_int])
+            cur.execute(check_query, [scheme_id_int])
             
-            if existing:
+            if cur.fetchone():
                 # Update existing record for today
                 update_query = """
                 UPDATE scheme_tracker_runs 
@@ -528,17 +523,18 @@ class TrackerService:
                     updated_at = now()
                 WHERE scheme_id = %s AND run_date = CURRENT_DATE
                 """
-                self.db_manager.execute_query(update_query, [json_data, from_date, to_date, scheme_id_int])
+                cur.execute(update_query, [json_data, from_date, to_date, scheme_id_int])
             else:
                 # Insert new record for today
                 insert_query = """
                 INSERT INTO scheme_tracker_runs (scheme_id, tracker_data, from_date, to_date, run_status)
                 VALUES (%s, %s::jsonb, %s, %s, 'completed')
                 """
-                self.db_manager.execute_query(insert_query, [scheme_id_int, json_data, from_date, to_date])
-                
-        except ValueError:
-            raise Exception(f"Invalid scheme_id format: {scheme_id}. Expected integer.")
+                cur.execute(insert_query, [scheme_id_int, json_data, from_date, to_date])
+        
+        try:
+            with self.db_manager.connection() as conn:
+                save_tracker_run(scheme_id_int, json_data, tracker_df, conn, write_run)
         except Exception as e:
             raise Exception(f"Error saving tracker data to database: {str(e)}")
 
@@ -617,6 +613,34 @@ class TrackerService:
         finally:
             await self.db_manager.disconnect()
 
+    async def get_tracker_rows(self, scheme_id: str, limit: int = 1000, after_row: int = -1,
+                               credit_accounts: Optional[list] = None) -> Dict[str, Any]:
+        """Page through tracker rows stored in scheme_tracker_rows"""
+        try:
+            with self.db_manager.connection() as conn:
+                rows, next_after_row = fetch_tracker_rows(
+                    int(scheme_id), conn, limit=limit, after_row=after_row, credit_accounts=credit_accounts
+                )
+            return {
+                "success": True,
+                "scheme_id": scheme_id,
+                "rows": rows,
+                "count": len(rows),
+                "next_after_row": next_after_row
+            }
+        except ValueError:
+            return {
+                "success": False,
+                "message": f"Invalid scheme_id format: {scheme_id}. Expected integer.",
+                "scheme_id": scheme_id
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error reading tracker rows: {str(e)}",
+                "scheme_id": scheme_id
+            }
+
     async def get_tracker_status(self, scheme_id: str) -> Dict[str, Any]:
         """Get tracker status for a scheme"""
         try:
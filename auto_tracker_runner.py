@@ -5,7 +5,6 @@ This script automatically generates tracker data for all finance-approved scheme
 that don't have tracker data yet.
 """
 
-import psycopg2
 import pandas as pd
 import sys
 import time
@@ -13,35 +12,45 @@ from datetime import datetime
 from tracker_runner import (
     fetch_scheme_config, 
     build_queries_from_templates, 
-    run_multiple_queries_and_combine,
-    db_params
+    run_multiple_queries_and_combine
 )
+from app.database_psycopg2 import database_manager
+from tracker_store import TRACKER_ROWS_TABLE, ensure_tracker_rows_table, store_rows
 
 def get_finance_approved_schemes_without_tracker_data():
     """Get all finance-approved schemes that don't have tracker data yet."""
     try:
-        conn = psycopg2.connect(**db_params)
-        cursor = conn.cursor()
+        with database_manager.connection() as conn:
+            cursor = conn.cursor()
         
-        query = """
-        SELECT sd.scheme_id, 
-               sd.scheme_json->'basicInfo'->>'schemeTitle' as scheme_title
-        FROM schemes_data sd
-        WHERE sd.status = 'finance_approved'
-          AND NOT EXISTS (
-            SELECT 1 FROM scheme_tracker_runs str 
-            WHERE str.scheme_id = sd.scheme_id 
-            AND str.run_status = 'completed'
-            AND str.tracker_data IS NOT NULL
-          )
-        ORDER BY sd.fad_reviewed_at DESC;
-        """
+            query = """
+            SELECT sd.scheme_id, 
+                   sd.scheme_json->'basicInfo'->>'schemeTitle' as scheme_title
+            FROM schemes_data sd
+            WHERE sd.status = 'finance_approved'
+              AND NOT EXISTS (
+                SELECT 1 FROM scheme_tracker_runs str 
+                WHERE str.scheme_id = sd.scheme_id 
+                AND str.run_status = 'completed'
+                AND {tracker_data_present}
+              )
+            ORDER BY sd.fad_reviewed_at DESC;
+            """
+            
+            # Row-store mode leaves tracker_data NULL, so also accept stored tracker rows
+            if store_rows():
+                ensure_tracker_rows_table(conn)
+                tracker_data_present = f"""(str.tracker_data IS NOT NULL OR EXISTS (
+                    SELECT 1 FROM {TRACKER_ROWS_TABLE} r WHERE r.scheme_id = str.scheme_id
+                  ))"""
+            else:
+                tracker_data_present = "str.tracker_data IS NOT NULL"
+            query = query.format(tracker_data_present=tracker_data_present)
         
-        cursor.execute(query)
-        results = cursor.fetchall()
+            cursor.execute(query)
+            results = cursor.fetchall()
         
-        cursor.close()
-        conn.close()
+            cursor.close()
         
         return results
     except Exception as e:
@@ -53,9 +62,8 @@ def process_scheme_tracker(scheme_id, scheme_title):
     print(f"\n🔄 Processing tracker for Scheme {scheme_id}: {scheme_title}")
     
     try:
-        conn = psycopg2.connect(**db_params)
-        scheme_config_df = fetch_scheme_config(conn, scheme_id)
-        conn.close()
+        with database_manager.connection() as conn:
+            scheme_config_df = fetch_scheme_config(conn, scheme_id)
         
         if scheme_config_df.empty:
             print(f"⚠️  No scheme configuration found for scheme {scheme_id}")
@@ -0,0 +1,16 @@
+"""
+Offline benchmark suite for the calculation pipeline
+
+Generates synthetic scheme_json / sales_data / material_master in the shape
+of examplestructure.json and runs the full SchemeProcessor pipeline without
+a database, reporting per-stage time, throughput and memory against stored
+baselines.
+
+    python -m benchmarks --sizes 10k,100k --repeat 3
+    python -m benchmarks --sizes 1m --scenarios typical --update-baseline
+"""
+
+from benchmarks.generators import (
+    SCENARIOS, SALES_SIZES, generate_case, generate_material_master,
+    generate_sales_data, generate_scheme_json
+)
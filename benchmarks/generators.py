@@ -0,0 +1,387 @@
+"""
+Synthetic scheme_json, material_master and sales_data generators
+
+Documents follow examplestructure.json (mainScheme, additionalSchemes,
+configuration, basicInfo) so they go through the same store.py extraction
+and calculation branches as real schemes. All generators are seeded and
+vectorized, so 1M-row sales frames build in seconds.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ['1K TopCoat', 'PU Topcoat', '2K Primer', 'Clear Coat', 'Basecoat',
+              'Putty', 'Thinner', 'Hardener', 'Enamel', 'Wood Finish']
+STATES = ['Maharashtra', 'Gujarat', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Punjab',
+          'Haryana', 'Rajasthan', 'Uttar Pradesh', 'West Bengal', 'Odisha', 'Telangana']
+REGIONS = ['North', 'South', 'East', 'West', 'Central']
+DEALER_TYPES = ['Small', 'Medium', 'Large']
+REWARD_NAMES = ['Rs. 1000 Credit Note', 'Rs. 2500 Credit Note', 'Gold Coin', 'Smart Phone',
+                'Rs. 5000 Credit Note', 'LED TV', 'Foreign Trip', 'Two Wheeler']
+
+# Scenario shapes; sizes are applied separately via SALES_SIZES
+SCENARIOS = {
+    'minimal': dict(mode='volume', base_periods=1, slab_count=2, phasing_periods=0, bonus_schemes=0,
+                    additional_schemes=0, mandatory_products=0, payout_products=False, reward_slabs=0),
+    'typical': dict(mode='value', base_periods=2, slab_count=3, phasing_periods=3, bonus_schemes=3,
+                    additional_schemes=3, mandatory_products=200, payout_products=True, reward_slabs=3),
+    'heavy': dict(mode='value', base_periods=2, slab_count=8, phasing_periods=6, bonus_schemes=4,
+                  additional_schemes=8, mandatory_products=600, payout_products=True, reward_slabs=8,
+                  additional_phasing=True),
+}
+
+SALES_SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def _iso(day):
+    return f"{day.isoformat()}T00:00:00.000Z"
+
+
+def _month_range(year, month):
+    start = date(year, month, 1)
+    end = (date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1))
+    return start, end
+
+
+def generate_material_master(n_materials=2000, seed=0):
+    """material_master-shaped frame with realistic attribute cardinalities"""
+    rng = np.random.default_rng(seed)
+    materials = np.array([str(10300000 + i * 7) for i in range(n_materials)])
+    category = rng.choice(CATEGORIES, n_materials)
+    grp = np.array([f"G{n:02d}" for n in rng.integers(0, 70, n_materials)])
+    wanda_group = np.array([f"WAN GROUP {n}" for n in rng.integers(0, 15, n_materials)])
+    thinner_group = np.array([f"Thinner {n}" for n in rng.integers(0, 8, n_materials)])
+    product_name = np.array([f"{n:02d} Product Line" for n in rng.integers(0, 30, n_materials)])
+    return pd.DataFrame({
+        'material': materials,
+        'material_description': [f"Material {m}" for m in materials],
+        'category': category,
+        'grp': grp,
+        'wanda_group': wanda_group,
+        'thinner_group': thinner_group,
+        'product_name': product_name,
+        'group_description': [f"{g} GROUP" for g in grp],
+        'sku': np.where(rng.random(n_materials) < 0.5, 'YES', 'NO'),
+    })
+
+
+def _product_section(materials_df):
+    """productData-style dict (materials plus the attribute lists the UI stores)"""
+    return {
+        'grps': sorted(materials_df['grp'].unique().tolist()),
+        'skus': ['NO', 'YES'],
+        'materials': materials_df['material'].tolist(),
+        'categories': sorted(materials_df['category'].unique().tolist()),
+        'otherGroups': [],
+        'wandaGroups': sorted(materials_df['wanda_group'].unique().tolist()),
+        'productNames': sorted(materials_df['product_name'].unique().tolist()),
+        'thinnerGroups': sorted(materials_df['thinner_group'].unique().tolist()),
+        'groupDescriptions': sorted(materials_df['group_description'].unique().tolist()),
+        'filteredRecordCount': len(materials_df),
+        'materialDescriptions': materials_df['material_description'].tolist(),
+    }
+
+
+def _slabs(rng, count, mode, with_mandatory, start):
+    """Contiguous slabs; value schemes use rebatePercent, volume schemes rebatePerLitre"""
+    slabs = []
+    step = start
+    for i in range(count):
+        slab_end = start + step * (i + 1) * 2
+        slabs.append({
+            'id': i + 1,
+            'slabEnd': str(slab_end if i < count - 1 else slab_end * 100),
+            'slabStart': str(start),
+            'fixedRebate': '',
+            'growthPercent': str(5 + i),
+            'rebatePercent': str(1 + 0.5 * i) if mode == 'value' else '',
+            'rebatePerLitre': '' if mode == 'value' else str(30 + 5 * i),
+            'mandatoryMinShadesPPI': '',
+            'mandatoryProductRebate': '',
+            'mandatoryProductTarget': '',
+            'dealerMayQualifyPercent': str(min(95, 70 + 5 * i)),
+            'additionalRebateOnGrowth': '' if mode == 'value' else str(int(rng.integers(0, 30))),
+            'mandatoryProductGrowthPercent': str(10 + 2 * i) if with_mandatory else '',
+            'mandatoryProductRebatePercent': str(1 + 0.5 * i) if with_mandatory else '',
+            'mandatoryProductTargetToActual': '',
+        })
+        start = slab_end + 1
+    return slabs
+
+
+def _phasing(count, scheme_from, scheme_to, with_bonus):
+    days = (scheme_to - scheme_from).days + 1
+    periods = []
+    for i in range(count):
+        from_day = scheme_from + timedelta(days=days * i // max(count, 1))
+        to_day = scheme_from + timedelta(days=days * (i + 1) // max(count, 1) - 1)
+        periods.append({
+            'id': i + 1,
+            'isBonus': with_bonus,
+            'rebateValue': '',
+            'payoutToDate': _iso(to_day),
+            'phasingToDate': _iso(to_day),
+            'payoutFromDate': _iso(from_day),
+            'phasingFromDate': _iso(scheme_from),
+            'bonusRebateValue': '',
+            'rebatePercentage': str(1 + i),
+            'bonusPayoutToDate': _iso(scheme_to),
+            'bonusPhasingToDate': _iso(to_day),
+            'bonusPayoutFromDate': _iso(scheme_from),
+            'bonusPhasingFromDate': _iso(scheme_from),
+            'phasingTargetPercent': str(min(100, 30 * (i + 1))),
+            'bonusRebatePercentage': str(1.5 + i),
+            'bonusPhasingTargetPercent': str(min(100, 35 * (i + 1))),
+        })
+    return periods
+
+
+def _bonus_schemes(count, scheme_from, scheme_to):
+    days = (scheme_to - scheme_from).days + 1
+    schemes = []
+    for i in range(count):
+        to_day = scheme_from + timedelta(days=days * (i + 1) // max(count, 1) - 1)
+        schemes.append({
+            'id': i + 1,
+            'name': f"Bonus Scheme {i + 1}",
+            'type': f"scheme{i + 1}",
+            'bonusPayoutTo': _iso(to_day),
+            'bonusPeriodTo': _iso(to_day),
+            'minimumTarget': str(12000 * (i + 1)),
+            'bonusPayoutFrom': _iso(scheme_from),
+            'bonusPeriodFrom': _iso(scheme_from),
+            'rewardOnTotalPercent': str(5 + i),
+            'mainSchemeTargetPercent': str(25 * (i + 1)),
+            'mandatoryProductTargetPercent': str(15 + 5 * i),
+            'minimumMandatoryProductTarget': str(8000 * (i + 1)),
+            'rewardOnMandatoryProductPercent': str(5 + i),
+        })
+    return schemes
+
+
+def _reward_slabs(count, start):
+    slabs = []
+    for i in range(count):
+        slab_to = start * (i + 2)
+        slabs.append({'slabId': i + 1, 'slabTo': str(slab_to), 'slabFrom': str(start),
+                      'schemeReward': REWARD_NAMES[i % len(REWARD_NAMES)]})
+        start = slab_to + 1
+    return slabs
+
+
+def generate_scheme_json(material_master, n_accounts=500, mode='value', base_periods=2, slab_count=3,
+                         phasing_periods=3, bonus_schemes=3, additional_schemes=3, mandatory_products=200,
+                         payout_products=True, reward_slabs=3, additional_phasing=False,
+                         scheme_year=2025, scheme_month=7, seed=0):
+    """
+    scheme_json document shaped like examplestructure.json.
+
+    Accounts in schemeApplicable are '0000100000'-style strings; pass the
+    same n_accounts to generate_sales_data so the sales rows match.
+    """
+    rng = np.random.default_rng(seed)
+    scheme_from, scheme_to = _month_range(scheme_year, scheme_month)
+    slab_start = 50000 if mode == 'value' else 20
+
+    n_scheme_materials = max(1, int(len(material_master) * 0.6))
+    scheme_materials = material_master.sample(n=n_scheme_materials, random_state=seed)
+    product_data = _product_section(scheme_materials)
+    if mandatory_products:
+        product_data['mandatoryProducts'] = _product_section(
+            scheme_materials.head(min(mandatory_products, len(scheme_materials))))
+    else:
+        product_data['mandatoryProducts'] = {}
+    product_data['payoutProducts'] = (
+        _product_section(scheme_materials.sample(frac=0.9, random_state=seed + 1)) if payout_products else {})
+
+    base_sections = []
+    for i in range(base_periods):
+        base_sections.append({
+            'id': i + 1,
+            'sumAvg': 'average' if i == 0 else 'sum',
+            'toDate': _iso(date(scheme_year - 1 - i, 12, 31)),
+            'fromDate': _iso(date(scheme_year - 1 - i, 1, 1)),
+        })
+
+    accounts = [f"{100000 + i:010d}" for i in range(n_accounts)]
+    main_scheme = {
+        'slabData': {'slabs': _slabs(rng, slab_count, mode, bool(mandatory_products), slab_start),
+                     'enableStrataGrowth': False},
+        'schemeBase': 'target-based',
+        'productData': product_data,
+        'schemePeriod': {'toDate': _iso(scheme_to), 'fromDate': _iso(scheme_from)},
+        'phasingPeriods': _phasing(phasing_periods, scheme_from, scheme_to, bonus_schemes > 0),
+        'rewardSlabData': _reward_slabs(reward_slabs, slab_start),
+        'baseVolSections': base_sections,
+        'bonusSchemeData': {'bonusSchemes': _bonus_schemes(bonus_schemes, scheme_from, scheme_to)},
+        'mandatoryQualify': 'yes' if mandatory_products else 'no',
+        'schemeApplicable': {
+            'enabled': True,
+            'selectedSlocs': ['RS72', 'RS73'],
+            'selectedStates': STATES,
+            'selectedRegions': REGIONS,
+            'selectedAreaHeads': [f"Area Head {i}" for i in range(18)],
+            'selectedDivisions': ['72'],
+            'filteredRecordCount': n_accounts,
+            'selectedDealerTypes': DEALER_TYPES,
+            'selectedRackDealers': ['Non Rack', 'Rack'],
+            'selectedDistributors': ['NO', 'YES'],
+            'selectedFixedDealers': ['Other', 'Fixed'],
+            'selectedCustomerNames': [f"Customer {a}" for a in accounts],
+            'selectedCreditAccounts': accounts,
+        },
+        'volumeValueBased': mode,
+    }
+
+    additional = []
+    features = {}
+    for i in range(additional_schemes):
+        scheme_id = 1755407811380 + i * 1000
+        add_mode = 'volume' if i % 2 == 0 else 'value'
+        add_materials = scheme_materials.sample(n=max(1, min(40, len(scheme_materials))), random_state=seed + 10 + i)
+        has_payout = i % 3 == 2
+        has_phasing = additional_phasing and i % 2 == 0
+        add_products = _product_section(add_materials)
+        add_products['payoutProducts'] = _product_section(add_materials.head(20)) if has_payout else {}
+        add_products['mandatoryProducts'] = {}
+        additional.append({
+            'id': scheme_id,
+            'slabData': {'mainScheme': {'slabs': _slabs(rng, max(2, slab_count // 2), add_mode, False,
+                                                        50000 if add_mode == 'value' else 20),
+                                        'enableStrataGrowth': False},
+                         'additionalSchemes': {}},
+            'schemeBase': 'target-based',
+            'productData': {'mainScheme': add_products, 'additionalSchemes': {}},
+            'schemeNumber': f"Synthetic Additional Scheme {i + 1}",
+            'configuration': {
+                'enabledSections': {'rewardSlabs': False, 'bonusSchemes': False, 'payoutProducts': has_payout,
+                                    'schemeApplicable': False, 'mandatoryProducts': False},
+                'enableStrataGrowth': False,
+                'showMandatoryProduct': False,
+            },
+            'phasingPeriods': _phasing(2, scheme_from, scheme_to, False) if has_phasing else [],
+            'rewardSlabData': [],
+            'baseVolSections': [],
+            'bonusSchemeData': {},
+            'mandatoryQualify': 'no',
+            'schemeApplicable': {},
+            'volumeValueBased': add_mode,
+        })
+        features[str(scheme_id)] = {'schemeType': 'ho-scheme', 'hasRewardSlabs': False, 'hasBonusSchemes': False}
+
+    return {
+        'basicInfo': {
+            'createdBy': 'benchmark',
+            'schemeType': 'ho-scheme',
+            'schemeTitle': f"Synthetic Scheme {scheme_month:02d}/{scheme_year}",
+            'schemeNumber': f"Synthetic {mode} scheme ({slab_count} slabs, {additional_schemes} additional)",
+            'schemeDescription': 'Generated by benchmarks.generators',
+        },
+        'createdAt': f"{scheme_from.isoformat()}T00:00:00.000Z",
+        'updatedAt': f"{scheme_from.isoformat()}T00:00:00.000Z",
+        'mainScheme': main_scheme,
+        'configuration': {
+            'schemeType': 'ho-scheme',
+            'enabledSections': {
+                'rewardSlabs': reward_slabs > 0,
+                'bonusSchemes': bonus_schemes > 0,
+                'payoutProducts': bool(payout_products),
+                'schemeApplicable': True,
+                'mandatoryProducts': bool(mandatory_products),
+            },
+            'enableStrataGrowth': False,
+            'showMandatoryProduct': bool(mandatory_products),
+            'additionalSchemeFeatures': features,
+        },
+        'additionalSchemes': additional,
+    }
+
+
+def scheme_periods(scheme_json):
+    """(from_date, to_date) pairs for every base period and the scheme period"""
+    main_scheme = scheme_json['mainScheme']
+    periods = [(pd.Timestamp(s['fromDate'][:10]), pd.Timestamp(s['toDate'][:10]))
+               for s in main_scheme.get('baseVolSections', [])]
+    scheme_period = main_scheme['schemePeriod']
+    periods.append((pd.Timestamp(scheme_period['fromDate'][:10]), pd.Timestamp(scheme_period['toDate'][:10])))
+    return periods
+
+
+def generate_sales_data(scheme_json, material_master, rows=10_000, n_accounts=None, scheme_share=0.85, seed=0):
+    """
+    sales_data frame in the shape of SalesFetcher's aggregated query.
+
+    Rows are split evenly across base periods and the scheme period; accounts
+    come from schemeApplicable and scheme_share of rows use scheme materials.
+    """
+    rng = np.random.default_rng(seed)
+    applicable = scheme_json['mainScheme']['schemeApplicable']
+    accounts = np.array(applicable['selectedCreditAccounts'][:n_accounts] if n_accounts
+                        else applicable['selectedCreditAccounts'])
+    scheme_materials = np.array(scheme_json['mainScheme']['productData']['materials'])
+    all_materials = material_master['material'].to_numpy()
+
+    # Account attributes are fixed per account, as in the real table
+    n_acc = len(accounts)
+    account_idx = np.minimum(rng.zipf(1.3, rows) - 1, n_acc - 1)
+    account_idx = rng.permutation(n_acc)[account_idx]
+    acc_state = rng.integers(0, len(STATES), n_acc)
+    acc_region = rng.integers(0, len(REGIONS), n_acc)
+    acc_dealer = rng.integers(0, len(DEALER_TYPES), n_acc)
+    acc_area = rng.integers(0, 18, n_acc)
+
+    materials = np.where(rng.random(rows) < scheme_share,
+                         rng.choice(scheme_materials, rows),
+                         rng.choice(all_materials, rows))
+
+    periods = scheme_periods(scheme_json)
+    period_idx = rng.integers(0, len(periods), rows)
+    starts = np.array([p[0].value for p in periods])
+    spans = np.array([(p[1] - p[0]).days + 1 for p in periods])
+    day_offsets = (rng.random(rows) * spans[period_idx]).astype(np.int64)
+    sale_dates = pd.to_datetime(starts[period_idx]) + pd.to_timedelta(day_offsets, unit='D')
+
+    volume = np.round(rng.gamma(2.0, 20.0, rows), 2)
+    # ~2% returns, which the calculations keep as negative rows
+    volume = np.where(rng.random(rows) < 0.02, -volume, volume)
+    value = np.round(volume * rng.uniform(150, 900, rows), 2)
+
+    customer = np.array([f"Customer {a}" for a in accounts])
+    return pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'division': '72',
+        'distributor': np.where(rng.random(rows) < 0.9, 'NO', 'YES'),
+        'location': 'RS72',
+        'year': sale_dates.year.astype(str),
+        'month': sale_dates.strftime('%b'),
+        'day': sale_dates.day.astype(str),
+        'credit_account': accounts[account_idx],
+        'customer_name': customer[account_idx],
+        'region_name': np.array(REGIONS)[acc_region[account_idx]],
+        'state_name': np.array(STATES)[acc_state[account_idx]],
+        'area_head_name': np.array([f"Area Head {i}" for i in range(18)])[acc_area[account_idx]],
+        'so_name': np.array([f"SO {i}" for i in range(40)])[account_idx % 40],
+        'dealer_type': np.array(DEALER_TYPES)[acc_dealer[account_idx]],
+        'fixed_dealers': 'Other',
+        'rack_dealers': 'Non Rack',
+        'material': materials,
+        'volume': volume,
+        'value': value,
+        'created_at': pd.Timestamp('2025-01-01'),
+        'area_head_code': np.array([f"AH{i:03d}" for i in range(18)])[acc_area[account_idx]],
+        'sale_date': sale_dates.date,
+        'record_count': 1,
+    })
+
+
+def generate_case(scenario='typical', rows=10_000, seed=0, n_materials=None, n_accounts=None):
+    """(scheme_json, sales_df, material_master_df) for one scenario and sales size"""
+    params = dict(SCENARIOS[scenario])
+    n_materials = n_materials or min(5000, max(500, rows // 50))
+    n_accounts = n_accounts or min(20000, max(100, rows // 25))
+    material_master = generate_material_master(n_materials, seed=seed)
+    scheme_json = generate_scheme_json(material_master, n_accounts=n_accounts, seed=seed, **params)
+    sales_df = generate_sales_data(scheme_json, material_master, rows=rows, seed=seed)
+    return scheme_json, sales_df, material_master
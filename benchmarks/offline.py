@@ -0,0 +1,82 @@
+"""
+Network-free SchemeProcessor for benchmarks
+
+The offline fetchers subclass the real ones and replace only the database
+round trips, so period splitting, dtype normalisation, structured-data
+extraction and every calculation stage run exactly as in production.
+"""
+
+import copy
+import json
+import hashlib
+
+import pandas as pd
+
+from json_fetcher import JSONFetcher
+from sales_fetcher import SalesFetcher
+from materialfetcher import MaterialFetcher
+from sales_cache import normalize_frame
+from main import SchemeProcessor
+
+
+class OfflineJSONFetcher(JSONFetcher):
+    """Serves one in-memory scheme_json document"""
+
+    def __init__(self, scheme_json, use_scheme_cache=False):
+        super().__init__()
+        self.document = scheme_json
+        self.document_hash = hashlib.md5(json.dumps(scheme_json, sort_keys=True).encode()).hexdigest()
+        if not use_scheme_cache:
+            self.scheme_cache = None
+
+    def fetch_and_store_json(self, scheme_id):
+        # Fresh copy, as a database fetch would return
+        return self.store_json(scheme_id, copy.deepcopy(self.document), self.document_hash)
+
+
+class OfflineSalesFetcher(SalesFetcher):
+    """Answers the aggregated sales query from an in-memory frame (date ranges only)"""
+
+    def __init__(self, sales_df):
+        super().__init__()
+        self.source_df = sales_df
+        self.source_dates = pd.to_datetime(sales_df['sale_date'])
+        self.snapshot_cache = None
+        self.sales_rollup = None
+
+    def _range_mask(self, ranges):
+        mask = pd.Series(False, index=self.source_df.index)
+        for from_date, to_date in ranges:
+            mask |= (self.source_dates >= pd.Timestamp(from_date)) & (self.source_dates <= pd.Timestamp(to_date))
+        return mask.to_numpy()
+
+    def _fetch_ranges_frame(self, ranges, where_clauses, params):
+        # Synthetic rows are generated inside the scheme's applicable filters
+        return self.source_df[self._range_mask(ranges)].reset_index(drop=True)
+
+    def _fetch_sales_for_period_live(self, start_date, end_date, filters, calc_mode, period_name, where_clauses, params):
+        return self._fetch_ranges_frame([(start_date, end_date)], where_clauses, params).to_dict('records')
+
+
+class OfflineMaterialFetcher(MaterialFetcher):
+    """material_master from an in-memory frame"""
+
+    def __init__(self, material_df):
+        super().__init__()
+        self.material_cache = None
+        self.source_df = material_df
+
+    def fetch_all_material_master(self):
+        self.materials_df = self.source_df
+        self.materials_data = self.source_df.to_dict('records')
+        return self.materials_data
+
+
+class OfflineSchemeProcessor(SchemeProcessor):
+    """SchemeProcessor wired to in-memory scheme, sales and material data"""
+
+    def __init__(self, scheme_json, sales_df, material_df, use_scheme_cache=False):
+        super().__init__()
+        self.json_fetcher = OfflineJSONFetcher(scheme_json, use_scheme_cache=use_scheme_cache)
+        self.sales_fetcher = OfflineSalesFetcher(normalize_frame(sales_df))
+        self.material_fetcher = OfflineMaterialFetcher(material_df)
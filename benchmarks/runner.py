@@ -0,0 +1,243 @@
+"""
+Benchmark runner: synthetic cases through the full offline pipeline
+
+Each case (scenario x sales size) runs in a fresh worker process so peak
+RSS is per case, repeats are reduced to the median, and results are compared
+against the stored baselines file (per-stage wall time, throughput, memory).
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import warnings
+import contextlib
+import multiprocessing
+from statistics import median
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.generators import SCENARIOS, SALES_SIZES, generate_case
+
+BENCHMARK_BASELINE_FILE = os.getenv("BENCHMARK_BASELINE_FILE",
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json"))
+BENCHMARK_REGRESSION_PCT = float(os.getenv("BENCHMARK_REGRESSION_PCT", "20"))
+
+
+def case_key(scenario, size):
+    return f"{scenario}/{size}"
+
+
+def _run_once(scheme_json, sales_df, material_df, verbose):
+    import pipeline_metrics
+    from benchmarks.offline import OfflineSchemeProcessor
+
+    pipeline_metrics.PIPELINE_METRICS_SINK = "none"
+    processor = OfflineSchemeProcessor(scheme_json, sales_df, material_df)
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with sink, warnings.catch_warnings():
+        if not verbose:
+            warnings.simplefilter("ignore")
+        start = time.perf_counter()
+        success = processor.process_scheme('BENCHMARK')
+        output_start = time.perf_counter()
+        result = processor.get_calculation_results_json('BENCHMARK') if success else None
+        output_seconds = time.perf_counter() - output_start
+        total_seconds = time.perf_counter() - start
+
+    profile = processor.get_pipeline_metrics() or {'stages': []}
+    stages = {entry['stage']: entry['wall_seconds'] for entry in profile['stages']}
+    stages['output_json'] = round(output_seconds, 4)
+    errors = {entry['stage']: entry['error'] for entry in profile['stages'] if entry['error']}
+    return {
+        'success': bool(success and result),
+        'total_seconds': total_seconds,
+        'stages': stages,
+        'errors': errors,
+        'output_records': result['summary']['total_records'] if result else 0,
+        'output_columns': result['summary']['total_columns'] if result else 0,
+    }
+
+
+def run_case(scenario, size, repeat=3, seed=0, verbose=False):
+    """Generate one case and run the pipeline `repeat` times; returns the median result"""
+    from pipeline_metrics import peak_rss_mb
+
+    rows = SALES_SIZES[size]
+    generate_start = time.perf_counter()
+    scheme_json, sales_df, material_df = generate_case(scenario, rows, seed=seed)
+    generate_seconds = time.perf_counter() - generate_start
+
+    runs = [_run_once(scheme_json, sales_df, material_df, verbose) for _ in range(repeat)]
+    total = median(run['total_seconds'] for run in runs)
+    stage_names = list(runs[0]['stages'])
+    return {
+        'case': case_key(scenario, size),
+        'scenario': scenario,
+        'size': size,
+        'sales_rows': rows,
+        'accounts': int(sales_df['credit_account'].nunique()),
+        'additional_schemes': len(scheme_json.get('additionalSchemes', [])),
+        'repeat': repeat,
+        'success': all(run['success'] for run in runs),
+        'errors': runs[-1]['errors'],
+        'generate_seconds': round(generate_seconds, 4),
+        'total_seconds': round(total, 4),
+        'rows_per_second': round(rows / total, 1) if total else None,
+        'peak_rss_mb': round(peak_rss_mb() or 0, 1),
+        'output_records': runs[-1]['output_records'],
+        'output_columns': runs[-1]['output_columns'],
+        'stages': {name: round(median(run['stages'].get(name) or 0 for run in runs), 4) for name in stage_names},
+    }
+
+
+def _run_case_isolated(args):
+    return run_case(*args)
+
+
+def run_suite(scenarios=None, sizes=None, repeat=3, seed=0, isolate=True, verbose=False):
+    """Run every scenario x size; each case in its own process when isolate"""
+    scenarios = scenarios or list(SCENARIOS)
+    sizes = sizes or ['10k', '100k']
+    cases = [(scenario, size, repeat, seed, verbose) for size in sizes for scenario in scenarios]
+
+    results = []
+    if isolate:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as pool:
+            for case in cases:
+                print(f"🏁 Running {case_key(case[0], case[1])} (x{repeat})...")
+                results.append(pool.submit(_run_case_isolated, case).result())
+    else:
+        for case in cases:
+            print(f"🏁 Running {case_key(case[0], case[1])} (x{repeat})...")
+            results.append(run_case(*case))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------------------------
+
+def load_baselines(path=None):
+    path = path or BENCHMARK_BASELINE_FILE
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get('cases', {})
+
+
+def save_baselines(results, path=None):
+    """Merge results into the baselines file (one entry per case)"""
+    path = path or BENCHMARK_BASELINE_FILE
+    cases = load_baselines(path)
+    for result in results:
+        cases[result['case']] = result
+    payload = {
+        'updated_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+        'cases': cases,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    print(f"💾 Baselines written to {path}")
+
+
+def _pct(current, baseline):
+    if not baseline:
+        return None
+    return round((current - baseline) / baseline * 100, 1)
+
+
+def compare_to_baselines(results, baselines, threshold_pct=None):
+    """Attach per-case/per-stage % change vs baseline; returns the list of regressions"""
+    threshold = BENCHMARK_REGRESSION_PCT if threshold_pct is None else threshold_pct
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result['case'])
+        if not baseline:
+            result['baseline'] = None
+            continue
+        stage_changes = {
+            name: _pct(seconds, baseline['stages'].get(name))
+            for name, seconds in result['stages'].items()
+            # Sub-10ms stages are noise at this resolution
+            if baseline['stages'].get(name, 0) >= 0.01
+        }
+        result['baseline'] = {
+            'total_seconds_pct': _pct(result['total_seconds'], baseline['total_seconds']),
+            'peak_rss_mb_pct': _pct(result['peak_rss_mb'], baseline['peak_rss_mb']),
+            'stages_pct': stage_changes,
+        }
+        if (result['baseline']['total_seconds_pct'] or 0) > threshold:
+            regressions.append(f"{result['case']}: total {result['baseline']['total_seconds_pct']:+.1f}%")
+        if (result['baseline']['peak_rss_mb_pct'] or 0) > threshold:
+            regressions.append(f"{result['case']}: peak RSS {result['baseline']['peak_rss_mb_pct']:+.1f}%")
+        for name, pct in stage_changes.items():
+            if pct is not None and pct > threshold:
+                regressions.append(f"{result['case']}: stage {name} {pct:+.1f}%")
+    return regressions
+
+
+def print_report(results, top_stages=5):
+    for result in results:
+        status = "✅" if result['success'] else "❌"
+        baseline = result.get('baseline') or {}
+        vs = f" ({baseline['total_seconds_pct']:+.1f}% vs baseline)" if baseline.get('total_seconds_pct') is not None else ""
+        print(f"\n{status} {result['case']}: {result['total_seconds']:.3f}s{vs}, "
+              f"{result['rows_per_second']:,.0f} rows/s, peak RSS {result['peak_rss_mb']} MB, "
+              f"{result['output_records']} accounts x {result['output_columns']} columns")
+        for name, error in result['errors'].items():
+            print(f"   ❌ {name}: {error}")
+        slowest = sorted(result['stages'].items(), key=lambda item: item[1], reverse=True)[:top_stages]
+        for name, seconds in slowest:
+            pct = (baseline.get('stages_pct') or {}).get(name)
+            change = f"  {pct:+.1f}%" if pct is not None else ""
+            print(f"   {name:<32} {seconds:>9.3f}s{change}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline calculation pipeline benchmarks")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--sizes", default="10k,100k", help="comma separated: " + ", ".join(SALES_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=None, help="baselines file (default BENCHMARK_BASELINE_FILE)")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baselines")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a case regresses")
+    parser.add_argument("--threshold", type=float, default=None, help="regression threshold in percent")
+    parser.add_argument("--output", default=None, help="write the full results as JSON")
+    parser.add_argument("--in-process", action="store_true", help="do not isolate cases in worker processes")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        scenarios=[s.strip() for s in args.scenarios.split(",") if s.strip()],
+        sizes=[s.strip().lower() for s in args.sizes.split(",") if s.strip()],
+        repeat=args.repeat, seed=args.seed, isolate=not args.in_process, verbose=args.verbose,
+    )
+    regressions = compare_to_baselines(results, load_baselines(args.baseline), args.threshold)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    if args.update_baseline:
+        save_baselines(results, args.baseline)
+
+    if regressions:
+        print(f"\n⚠️ {len(regressions)} regressions above threshold:")
+        for line in regressions:
+            print(f"   • {line}")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,9 +6,12 @@ Handles both single and double base period scenarios with proper aggregation.
 """
 
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from .vectorized_calculations import calculate_base_and_scheme_metrics_vectorized
+from sales_frame import typed_sales_frame
+from .product_resolver import product_selection, product_mask
 
 def calculate_base_and_scheme_metrics(sales_df: pd.DataFrame, scheme_config: Dict[str, Any], 
                                      json_data: Dict[str, Any] = None) -> pd.DataFrame:
@@ -65,6 +68,9 @@ def calculate_base_and_scheme_metrics(sales_df: pd.DataFrame, scheme_config: Dic
 def _prepare_sales_data(sales_df: pd.DataFrame) -> pd.DataFrame:
     """Prepare and clean sales data for calculations"""
     
+    # Frames from SalesFrame already have str accounts and datetime64 dates
+    typed = typed_sales_frame(sales_df) is not None
+    
     # Create a copy to avoid modifying original data
     sales_clean = sales_df.copy()
     
@@ -94,7 +100,7 @@ def _prepare_sales_data(sales_df: pd.DataFrame) -> pd.DataFrame:
                 sales_clean[col] = 'Unknown'
     
     # Convert sale_date to datetime
-    if 'sale_date' in sales_clean.columns:
+    if 'sale_date' in sales_clean.columns and not typed:
         sales_clean['sale_date'] = pd.to_datetime(sales_clean['sale_date'])
     
     # Fill NaN values
@@ -109,7 +115,7 @@ def _prepare_sales_data(sales_df: pd.DataFrame) -> pd.DataFrame:
             sales_clean[col] = sales_clean[col].fillna('Unknown')
     
     # Convert credit_account to string for consistent grouping
-    if 'credit_account' in sales_clean.columns:
+    if 'credit_account' in sales_clean.columns and (not typed or sales_clean['credit_account'].isna().any()):
         sales_clean['credit_account'] = sales_clean['credit_account'].astype(str)
     
     print(f"📋 Data prepared: {len(sales_clean)} records with {len(sales_clean.columns)} columns")
@@ -564,17 +570,11 @@ def _get_product_filtered_accounts(sales_df: pd.DataFrame, json_data: Dict = Non
     main_scheme = json_data.get('mainScheme', {})
     product_data = main_scheme.get('productData', {})
     
-    # Collect all materials from product data
-    product_materials = set()
-    
-    # Check all product types
-    for product_type in ['grps', 'skus', 'materials', 'categories', 'otherGroups', 
-                        'wandaGroups', 'productNames', 'thinnerGroups']:
-        if product_type in product_data:
-            product_materials.update(product_data[product_type])
+    # Collect all materials from product data (resolved once per selection)
+    product_materials = product_selection(product_data)
     
     # Filter sales data by these materials
-    filtered_sales = sales_df[sales_df['material'].isin(product_materials)]
+    filtered_sales = sales_df[product_mask(sales_df, product_materials)]
     
     # Get unique credit accounts - ensure consistent string conversion
     filtered_accounts = sorted([str(acc) for acc in filtered_sales['credit_account'].unique().tolist()])
@@ -724,13 +724,8 @@ def _add_additional_scheme_columns(result_df: pd.DataFrame, json_data: Dict = No
         
         # Get product data for this additional scheme
         add_product_data = add_scheme.get('productData', {}).get('mainScheme', {})
-        add_product_materials = set()
-        
         # Collect all materials from additional scheme product data
-        for product_type in ['grps', 'skus', 'materials', 'categories', 'otherGroups', 
-                            'wandaGroups', 'productNames', 'thinnerGroups']:
-            if product_type in add_product_data:
-                add_product_materials.update(add_product_data[product_type])
+        add_product_materials = product_selection(add_product_data)
         
         print(f"   📋 Additional Scheme {i}: {len(add_product_materials)} product materials")
         
@@ -759,7 +754,7 @@ def _calculate_additional_scheme_metrics_both(result_df: pd.DataFrame, sales_df:
     """🔧 FIXED: Calculate BOTH volume and value metrics for additional scheme based on its specific products"""
     
     # Filter sales data by additional scheme products
-    filtered_sales = sales_df[sales_df['material'].isin(product_materials)]
+    filtered_sales = sales_df[product_mask(sales_df, product_materials)]
     
     if filtered_sales.empty:
         # No sales for these products, set all to 0 - BOTH volume and value
@@ -771,48 +766,16 @@ def _calculate_additional_scheme_metrics_both(result_df: pd.DataFrame, sales_df:
         result_df[f'total_value{prefix}'] = 0
         return result_df
     
-    # Calculate for each account in result_df
-    for idx, row in result_df.iterrows():
-        credit_account = str(row['credit_account'])
-        account_sales = filtered_sales[filtered_sales['credit_account'].astype(str) == credit_account]
-        
-        if account_sales.empty:
-            # No sales for this account with additional scheme products - BOTH volume and value
-            result_df.at[idx, f'Base 1 Volume Final{prefix}'] = 0
-            result_df.at[idx, f'Base 2 Volume Final{prefix}'] = 0
-            result_df.at[idx, f'total_volume{prefix}'] = 0
-            result_df.at[idx, f'Base 1 Value Final{prefix}'] = 0
-            result_df.at[idx, f'Base 2 Value Final{prefix}'] = 0
-            result_df.at[idx, f'total_value{prefix}'] = 0
-            continue
-        
-        # Calculate Base Period 1 - BOTH volume and value
-        base1_volume = _calculate_single_period_for_account(
-            account_sales, base_periods[0] if base_periods else None, 'volume'
-        )
-        base1_value = _calculate_single_period_for_account(
-            account_sales, base_periods[0] if base_periods else None, 'value'
-        )
-        
-        # Calculate Base Period 2 (or copy Base 1) - BOTH volume and value
-        if len(base_periods) >= 2:
-            base2_volume = _calculate_single_period_for_account(
-                account_sales, base_periods[1], 'volume'
-            )
-            base2_value = _calculate_single_period_for_account(
-                account_sales, base_periods[1], 'value'
-            )
-        else:
-            base2_volume = base1_volume
-            base2_value = base1_value
-        
-        # Set ALL values with proper float conversion
-        result_df.at[idx, f'Base 1 Volume Final{prefix}'] = float(base1_volume)
-        result_df.at[idx, f'Base 2 Volume Final{prefix}'] = float(base2_volume)
-        result_df.at[idx, f'total_volume{prefix}'] = float(max(base1_volume, base2_volume))
-        result_df.at[idx, f'Base 1 Value Final{prefix}'] = float(base1_value)
-        result_df.at[idx, f'Base 2 Value Final{prefix}'] = float(base2_value)
-        result_df.at[idx, f'total_value{prefix}'] = float(max(base1_value, base2_value))
+    # One groupby over (credit_account, base period) for every account at once
+    period_totals = _calculate_additional_period_totals(filtered_sales, base_periods, ['volume', 'value'])
+    accounts = result_df['credit_account'].astype(str)
+    
+    for metric_col, metric_name in [('volume', 'Volume'), ('value', 'Value')]:
+        base1 = accounts.map(period_totals[(metric_col, 1)]).fillna(0.0).astype(float)
+        base2 = accounts.map(period_totals[(metric_col, 2)]).fillna(0.0).astype(float)
+        result_df[f'Base 1 {metric_name} Final{prefix}'] = base1.to_numpy()
+        result_df[f'Base 2 {metric_name} Final{prefix}'] = base2.to_numpy()
+        result_df[f'total_{metric_col}{prefix}'] = np.maximum(base1.to_numpy(), base2.to_numpy())
     
     return result_df
 
@@ -822,7 +785,7 @@ def _calculate_additional_scheme_metrics(result_df: pd.DataFrame, sales_df: pd.D
     """Calculate metrics for additional scheme based on its specific products"""
     
     # Filter sales data by additional scheme products
-    filtered_sales = sales_df[sales_df['material'].isin(product_materials)]
+    filtered_sales = sales_df[product_mask(sales_df, product_materials)]
     
     if filtered_sales.empty:
         # No sales for these products, set all to 0
@@ -833,69 +796,67 @@ def _calculate_additional_scheme_metrics(result_df: pd.DataFrame, sales_df: pd.D
     
     metric_col = 'volume' if is_volume_based else 'value'
     
-    # Calculate for each account in result_df
-    for idx, row in result_df.iterrows():
-        credit_account = str(row['credit_account'])
-        account_sales = filtered_sales[filtered_sales['credit_account'].astype(str) == credit_account]
-        
-        if account_sales.empty:
-            # No sales for this account with additional scheme products
-            result_df.at[idx, f'Base 1 {metric_name} Final{prefix}'] = 0
-            result_df.at[idx, f'Base 2 {metric_name} Final{prefix}'] = 0
-            result_df.at[idx, f'total_{metric_name.lower()}{prefix}'] = 0
-            continue
-        
-        # Calculate Base Period 1
-        base1_value = _calculate_single_period_for_account(
-            account_sales, base_periods[0] if base_periods else None, metric_col
-        )
-        
-        # Calculate Base Period 2 (or copy Base 1)
-        if len(base_periods) >= 2:
-            base2_value = _calculate_single_period_for_account(
-                account_sales, base_periods[1], metric_col
-            )
-        else:
-            base2_value = base1_value
-        
-        # Set values with proper float conversion
-        result_df.at[idx, f'Base 1 {metric_name} Final{prefix}'] = float(base1_value)
-        result_df.at[idx, f'Base 2 {metric_name} Final{prefix}'] = float(base2_value)
-        result_df.at[idx, f'total_{metric_name.lower()}{prefix}'] = float(max(base1_value, base2_value))
+    # One groupby over (credit_account, base period) for every account at once
+    period_totals = _calculate_additional_period_totals(filtered_sales, base_periods, [metric_col])
+    accounts = result_df['credit_account'].astype(str)
+    base1 = accounts.map(period_totals[(metric_col, 1)]).fillna(0.0).astype(float)
+    base2 = accounts.map(period_totals[(metric_col, 2)]).fillna(0.0).astype(float)
+    
+    result_df[f'Base 1 {metric_name} Final{prefix}'] = base1.to_numpy()
+    result_df[f'Base 2 {metric_name} Final{prefix}'] = base2.to_numpy()
+    result_df[f'total_{metric_name.lower()}{prefix}'] = np.maximum(base1.to_numpy(), base2.to_numpy())
     
     return result_df
 
-def _calculate_single_period_for_account(account_sales: pd.DataFrame, base_period: Dict, 
-                                       metric_col: str) -> float:
-    """Calculate single period metric for an account"""
-    
-    if base_period is None or account_sales.empty:
-        return 0.0
-    
+def _period_month_count(base_period: Dict) -> int:
+    """Number of calendar months spanned by a base period (inclusive)"""
     from_date = pd.to_datetime(base_period['from_date'])
     to_date = pd.to_datetime(base_period['to_date'])
-    sum_avg_method = base_period.get('sum_avg_method', 'sum')
-    
-    # Filter data for this period
-    period_data = account_sales[
-        (account_sales['sale_date'] >= from_date) & 
-        (account_sales['sale_date'] <= to_date)
-    ]
-    
-    if period_data.empty:
-        return 0.0
-    
-    # Calculate base metric
-    base_metric = period_data[metric_col].sum()
+    return ((to_date.year - from_date.year) * 12 + to_date.month - from_date.month) + 1
+
+def _calculate_additional_period_totals(filtered_sales: pd.DataFrame, base_periods: List[Dict],
+                                        metric_cols: List[str]) -> Dict[tuple, pd.Series]:
+    """
+    Base period totals per credit_account for every metric in one groupby.
     
-    # Apply SUM/AVG logic
-    if sum_avg_method.lower() == 'average':
-        # Calculate number of months
-        num_months = ((to_date.year - from_date.year) * 12 + to_date.month - from_date.month) + 1
-        return base_metric / num_months if num_months > 0 else base_metric
-    else:
-        # SUM method - divide by 1
-        return base_metric
+    Returns:
+        {(metric_col, 1|2): Series indexed by credit_account (str)}; Base 2 mirrors
+        Base 1 when only one base period is configured. 'average' periods are
+        divided by their month count, 'sum' periods are left as is.
+    """
+    period_frames = []
+    period_divisors = {}
+    for period_number, base_period in enumerate((base_periods or [])[:2], 1):
+        from_date = pd.to_datetime(base_period['from_date'])
+        to_date = pd.to_datetime(base_period['to_date'])
+        in_period = (filtered_sales['sale_date'] >= from_date) & (filtered_sales['sale_date'] <= to_date)
+        period_frames.append(
+            filtered_sales.loc[in_period, metric_cols].assign(
+                credit_account=filtered_sales.loc[in_period, 'credit_account'].astype(str),
+                base_period=period_number
+            )
+        )
+        num_months = _period_month_count(base_period)
+        if base_period.get('sum_avg_method', 'sum').lower() == 'average' and num_months > 0:
+            period_divisors[period_number] = num_months
+        else:
+            period_divisors[period_number] = 1
+    
+    empty = pd.Series(dtype=float)
+    totals = {(metric_col, period_number): empty for metric_col in metric_cols for period_number in (1, 2)}
+    if not period_frames:
+        return totals
+    
+    grouped = pd.concat(period_frames, ignore_index=True).groupby(['credit_account', 'base_period'])[metric_cols].sum()
+    for metric_col in metric_cols:
+        by_period = grouped[metric_col].astype(float).unstack('base_period')
+        for period_number, divisor in period_divisors.items():
+            if period_number in by_period.columns:
+                totals[(metric_col, period_number)] = by_period[period_number].dropna() / divisor
+        if len(period_divisors) < 2:
+            totals[(metric_col, 2)] = totals[(metric_col, 1)]
+    
+    return totals
 
 def _create_empty_result_df_new() -> pd.DataFrame:
     """Create empty result DataFrame with new structure"""
@@ -7,6 +7,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Any
 from datetime import datetime
+from calculations.sales_matrix import get_sales_matrix, frame_windows
+from calculations.product_resolver import scheme_products
 
 
 def calculate_bonus_scheme_columns(tracker_df: pd.DataFrame, structured_data: Dict, 
@@ -67,6 +69,11 @@ def _add_main_scheme_bonus_columns(tracker_df: pd.DataFrame, structured_data: Di
     # Sort bonus schemes by bonus_id
     main_bonus = main_bonus.sort_values('bonus_id')
     
+    # Bucket every bonus period / payout window in one pass over the sales rows
+    get_sales_matrix(sales_df).prepare_periods(frame_windows(
+        main_bonus, [('bonus_period_from', 'bonus_period_to'), ('bonus_payout_from', 'bonus_payout_to')]
+    ))
+    
     # Apply bonus scheme calculations for each bonus scheme
     for _, bonus_row in main_bonus.iterrows():
         bonus_id = int(bonus_row['bonus_id'])
@@ -240,30 +247,16 @@ def _calculate_bonus_period_sales(sales_df: pd.DataFrame, date_from: datetime, d
     # Get eligible materials
     eligible_materials = set(main_products['material_code'].tolist())
     
-    # Filter sales data for the period and eligible products
-    sales_temp = sales_df.copy()
-    sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date']).dt.tz_localize(None)
-    
-    period_sales = sales_temp[
-        (sales_temp['sale_date'] >= date_from) &
-        (sales_temp['sale_date'] <= date_to) &
-        (sales_temp['material'].isin(eligible_materials))
-    ].copy()
+    # Per-account sums for the period and eligible products from the shared account x material matrix
+    period_actuals = get_sales_matrix(sales_df).product_actuals(eligible_materials, date_from, date_to).drop(columns=['material_count'])
     
-    if period_sales.empty:
+    if period_actuals.empty:
         # Return zeros for all accounts
         return {
             'volume': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index),
             'value': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index)
         }
     
-    # Aggregate by credit_account
-    period_actuals = period_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
-    period_actuals['credit_account'] = period_actuals['credit_account'].astype(str)
     credit_accounts_str = credit_accounts.astype(str)
     
     # Create a DataFrame to merge
@@ -283,46 +276,25 @@ def _calculate_bonus_mp_period_sales(sales_df: pd.DataFrame, date_from: datetime
     """Calculate mandatory product sales for bonus period"""
     
     # Get mandatory products for main scheme
-    products_df = structured_data['products']
-    mandatory_products = products_df[
-        (products_df['scheme_type'] == 'main_scheme') & 
-        (products_df['is_mandatory_product'] == True)
-    ]
+    mandatory_materials = scheme_products(structured_data['products'], 'is_mandatory_product', 'main_scheme')
     
-    if mandatory_products.empty:
+    if not mandatory_materials:
         # Return zeros for all accounts
         return {
             'volume': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index),
             'value': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index)
         }
     
-    # Get mandatory product materials
-    mandatory_materials = set(mandatory_products['material_code'].tolist())
-    
-    # Filter sales data for the period and mandatory products
-    sales_temp = sales_df.copy()
-    sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date']).dt.tz_localize(None)
+    # Per-account sums for the period and mandatory products from the shared account x material matrix
+    mp_actuals = get_sales_matrix(sales_df).product_actuals(mandatory_materials, date_from, date_to).drop(columns=['material_count'])
     
-    period_mp_sales = sales_temp[
-        (sales_temp['sale_date'] >= date_from) &
-        (sales_temp['sale_date'] <= date_to) &
-        (sales_temp['material'].isin(mandatory_materials))
-    ].copy()
-    
-    if period_mp_sales.empty:
+    if mp_actuals.empty:
         # Return zeros for all accounts
         return {
             'volume': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index),
             'value': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index)
         }
     
-    # Aggregate by credit_account
-    mp_actuals = period_mp_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
-    mp_actuals['credit_account'] = mp_actuals['credit_account'].astype(str)
     credit_accounts_str = credit_accounts.astype(str)
     
     # Create a DataFrame to merge
@@ -23,6 +23,8 @@ Note: percentage_achieved is stored as decimal (1.0 = 100%, 0.5 = 50%, etc.)
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Any
+from calculations.slab_engine import SlabTable, FALLBACK_BELOW_FIRST
+from calculations.sales_matrix import get_sales_matrix
 
 
 def calculate_conditional_payout_columns(tracker_df: pd.DataFrame, structured_data: Dict, 
@@ -237,54 +239,34 @@ def _calculate_scheme_slab_values(tracker_df: pd.DataFrame, structured_data: Dic
     
     # Get base values for slab lookup
     if base_column in tracker_df.columns:
-        base_values = tracker_df[base_column].values
-        
-        # Initialize all rebate columns to 0
-        tracker_df[rebate_per_litre_col] = 0.0
-        tracker_df[rebate_percent_col] = 0.0
-        tracker_df[additional_rebate_col] = 0.0
-        
-        # Get first and last slab info for fallback logic
-        first_slab = slabs_sorted.iloc[0]
-        last_slab = slabs_sorted.iloc[-1]
-        first_slab_start = float(first_slab['slab_start'])
-        last_slab_end = float(last_slab['slab_end'])
-        
-        # Track which accounts have been matched to slabs
-        matched_accounts = pd.Series([False] * len(tracker_df), index=tracker_df.index)
+        # Resolve all rebate columns in one pass; accounts below the first slab
+        # (including negative/zero) fall back to the first slab, others stay 0
+        slab_table = SlabTable.from_frame(
+            slabs_sorted, ['rebate_per_litre', 'rebate_percent', 'additional_rebate_on_growth']
+        )
+        base_values = pd.to_numeric(tracker_df[base_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        slab_index = slab_table.slab_index(base_values)
+        resolved = slab_table.resolve(base_values, fallback=FALLBACK_BELOW_FIRST)
+        tracker_df[rebate_per_litre_col] = resolved['rebate_per_litre']
+        tracker_df[rebate_percent_col] = resolved['rebate_percent']
+        tracker_df[additional_rebate_col] = resolved['additional_rebate_on_growth']
         
-        # Apply slab lookup for accounts within slab ranges
-        for _, slab_row in slabs_sorted.iterrows():
-            slab_start = float(slab_row['slab_start'])
-            slab_end = float(slab_row['slab_end'])
-            
-            # Create mask for values in this slab range
-            mask = (base_values >= slab_start) & (base_values <= slab_end)
-            
-            if mask.sum() > 0:
-                # Apply slab values to matching accounts
-                tracker_df.loc[mask, rebate_per_litre_col] = float(slab_row['rebate_per_litre'])
-                tracker_df.loc[mask, rebate_percent_col] = float(slab_row['rebate_percent'])
-                tracker_df.loc[mask, additional_rebate_col] = float(slab_row['additional_rebate_on_growth'])
-                
-                # Mark these accounts as matched
-                matched_accounts[mask] = True
-                
-                print(f"     ✅ Slab {slab_start}-{slab_end}: Applied rebate_per_litre={slab_row['rebate_per_litre']} to {mask.sum()} accounts")
+        matched_counts = np.bincount(slab_index[slab_index >= 0], minlength=len(slab_table))
+        for i in np.flatnonzero(matched_counts):
+            print(f"     ✅ Slab {slab_table.slab_start[i]}-{slab_table.slab_end[i]}: Applied rebate_per_litre="
+                  f"{slab_table.attributes['rebate_per_litre'][i]} to {matched_counts[i]} accounts")
         
-        # Apply first slab fallback for accounts below minimum slab range (including negative/zero)
-        below_first_slab_mask = (base_values < first_slab_start) & (~matched_accounts)
-        if below_first_slab_mask.sum() > 0:
-            tracker_df.loc[below_first_slab_mask, rebate_per_litre_col] = float(first_slab['rebate_per_litre'])
-            tracker_df.loc[below_first_slab_mask, rebate_percent_col] = float(first_slab['rebate_percent'])
-            tracker_df.loc[below_first_slab_mask, additional_rebate_col] = float(first_slab['additional_rebate_on_growth'])
-            matched_accounts[below_first_slab_mask] = True
-            print(f"     ✅ First slab fallback: Applied rebate_per_litre={first_slab['rebate_per_litre']} to {below_first_slab_mask.sum()} accounts below {first_slab_start} (including negative/zero)")
+        first_slab_start = slab_table.first_slab_start
+        below_first_slab_count = int(((slab_index < 0) & (base_values < first_slab_start)).sum())
+        if below_first_slab_count > 0:
+            print(f"     ✅ First slab fallback: Applied rebate_per_litre={slab_table.first_value('rebate_per_litre')} "
+                  f"to {below_first_slab_count} accounts below {first_slab_start} (including negative/zero)")
         
         # Report accounts above last slab (these will keep rebate values as 0)
-        above_last_slab_mask = (base_values > last_slab_end) & (~matched_accounts)
-        if above_last_slab_mask.sum() > 0:
-            print(f"     📊 {above_last_slab_mask.sum()} accounts above last slab ({last_slab_end}) - rebate values set to 0")
+        last_slab_end = slab_table.slab_end[-1]
+        above_last_slab_count = int(((slab_index < 0) & (base_values > last_slab_end)).sum())
+        if above_last_slab_count > 0:
+            print(f"     📊 {above_last_slab_count} accounts above last slab ({last_slab_end}) - rebate values set to 0")
     
     return tracker_df
 
@@ -331,17 +313,13 @@ def _calculate_scheme_payout_actuals(tracker_df: pd.DataFrame, structured_data:
     scheme_to = pd.to_datetime(scheme_config['scheme_to'])
     
     if 'sale_date' in sales_df.columns:
-        sales_temp = sales_df.copy()
-        sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date'])
-        scheme_sales = sales_temp[
-            (sales_temp['sale_date'] >= scheme_from) &
-            (sales_temp['sale_date'] <= scheme_to) &
-            (sales_temp['material'].isin(payout_materials))
-        ].copy()
+        # Payout product sums from the shared account x material matrix
+        payout_actuals = get_sales_matrix(sales_df).product_actuals(
+            payout_materials, scheme_from, scheme_to).drop(columns=['material_count'])
     else:
-        scheme_sales = pd.DataFrame()
+        payout_actuals = pd.DataFrame()
     
-    if scheme_sales.empty:
+    if payout_actuals.empty:
         # No sales for payout products
         tracker_df[f'Payout_Products_Volume{suffix}'] = 0.0
         tracker_df[f'Payout_Products_Value{suffix}'] = 0.0
@@ -349,12 +327,6 @@ def _calculate_scheme_payout_actuals(tracker_df: pd.DataFrame, structured_data:
         tracker_df[f'payoutproductactualvalue{suffix}'] = 0.0
         return tracker_df
     
-    # Aggregate by credit_account for payout products
-    payout_actuals = scheme_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
     payout_actuals.columns = ['credit_account', 'payout_volume_temp', 'payout_value_temp']
     payout_actuals['credit_account'] = payout_actuals['credit_account'].astype(str)
     
@@ -15,6 +15,9 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from calculations.slab_engine import SlabTable, FALLBACK_ZERO
+from calculations.sales_matrix import get_sales_matrix
+from calculations.product_resolver import scheme_products
 
 
 def calculate_enhanced_costing_tracker_fields(tracker_df: pd.DataFrame, structured_data: Dict, 
@@ -139,22 +142,15 @@ def _calculate_mandatory_product_actuals(tracker_df: pd.DataFrame, structured_da
     
     print(f"     📦 Found {len(mandatory_materials)} mandatory materials")
     
-    # Filter sales data for scheme period and mandatory products
-    scheme_sales = _filter_scheme_period_sales(sales_df, scheme_config, mandatory_materials)
+    # Per-account sums for the scheme period and mandatory products
+    mandatory_actuals = _scheme_period_actuals(sales_df, scheme_config, mandatory_materials)
     
-    if scheme_sales.empty:
+    if mandatory_actuals.empty:
         print(f"     ℹ️ No mandatory product sales in scheme period")
         tracker_df[volume_col] = 0.0
         tracker_df[value_col] = 0.0
         return tracker_df
     
-    # Aggregate by credit_account using vectorized operations
-    mandatory_actuals = scheme_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
-    mandatory_actuals['credit_account'] = mandatory_actuals['credit_account'].astype(str)
     tracker_df['credit_account'] = tracker_df['credit_account'].astype(str)
     
     # Create mapping for efficient vectorized assignment
@@ -304,22 +300,15 @@ def _calculate_payout_products_actuals(tracker_df: pd.DataFrame, structured_data
     
     print(f"     📦 Found {len(payout_materials)} payout materials")
     
-    # Filter sales data for scheme period and payout products
-    scheme_sales = _filter_scheme_period_sales(sales_df, scheme_config, payout_materials)
+    # Per-account sums for the scheme period and payout products
+    payout_actuals = _scheme_period_actuals(sales_df, scheme_config, payout_materials)
     
-    if scheme_sales.empty:
+    if payout_actuals.empty:
         print(f"     ℹ️ No payout product sales in scheme period")
         tracker_df[volume_col] = 0.0
         tracker_df[value_col] = 0.0
         return tracker_df
     
-    # Aggregate by credit_account using vectorized operations
-    payout_actuals = scheme_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
-    payout_actuals['credit_account'] = payout_actuals['credit_account'].astype(str)
     tracker_df['credit_account'] = tracker_df['credit_account'].astype(str)
     
     # Create mapping for efficient vectorized assignment
@@ -382,45 +371,18 @@ def _fix_mandatory_product_growth(tracker_df: pd.DataFrame, structured_data: Dic
         tracker_df[growth_col] = 0.0
         return tracker_df
     
-    # Initialize growth column
-    tracker_df[growth_col] = 0.0
-    
-    # Get first slab's mandatory product growth as fallback
-    first_slab_growth = 0.0
-    if not scheme_slabs.empty and 'mandatory_product_growth_percent' in scheme_slabs.columns:
-        # Get first slab's growth value (raw from DB)
-        first_slab_growth = float(scheme_slabs.iloc[0]['mandatory_product_growth_percent'])
-        print(f"     📋 First slab mandatory growth (fallback): {first_slab_growth}%")
-    
-    # Apply vectorized slab lookup for mandatory product growth
-    base_values = tracker_df[base_column].values
+    # Raw DB values convert to percentages (e.g. 5000 in DB becomes 50%); the
+    # first slab covers unmatched and zero-growth accounts when it is > 0
+    slab_table = SlabTable.from_frame(scheme_slabs, ['mandatory_product_growth_percent'])
+    first_slab_growth = slab_table.first_value('mandatory_product_growth_percent')
+    print(f"     📋 First slab mandatory growth (fallback): {first_slab_growth}%")
     
-    for _, slab_row in scheme_slabs.iterrows():
-        slab_start = float(slab_row['slab_start'])
-        slab_end = float(slab_row['slab_end']) if pd.notna(slab_row['slab_end']) else float('inf')
-        
-        # Get mandatory product growth from slab - convert from raw DB value to percentage
-        # e.g., 5000 in DB becomes 50%
-        mp_growth_raw = float(slab_row.get('mandatory_product_growth_percent', 0.0))
-        mp_growth = mp_growth_raw / 100.0  # Convert from raw DB value to percentage
-        
-        # Create mask for values in this slab range
-        mask = (base_values >= slab_start) & (base_values <= slab_end)
-        
-        if mask.sum() > 0:
-            # Store as proper percentage value (e.g., 50.0 for 50%)
-            tracker_df.loc[mask, growth_col] = mp_growth
-            print(f"       📍 Slab {slab_start}-{slab_end}: {mask.sum()} accounts, growth: {mp_growth}% (from raw DB: {mp_growth_raw})")
+    base_values = pd.to_numeric(tracker_df[base_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    mp_growth_raw = slab_table.resolve(base_values, fallback=FALLBACK_ZERO)['mandatory_product_growth_percent']
+    tracker_df[growth_col] = mp_growth_raw / 100.0
     
-    # Apply fallback for accounts without slab match
-    unmatched_mask = (tracker_df[growth_col] == 0.0)
-    unmatched_count = unmatched_mask.sum()
-    
-    if unmatched_count > 0 and first_slab_growth > 0:
-        # Convert first slab growth from raw DB value to percentage
-        first_slab_growth_pct = first_slab_growth / 100.0
-        tracker_df.loc[unmatched_mask, growth_col] = first_slab_growth_pct
-        print(f"     🔧 Applied fallback growth ({first_slab_growth_pct}%) to {unmatched_count} unmatched accounts (from raw DB: {first_slab_growth})")
+    print(f"     ✅ {growth_col}: {(tracker_df[growth_col] > 0).sum()} accounts with growth "
+          f"(first slab fallback: {first_slab_growth / 100.0}%)")
     
     return tracker_df
 
@@ -630,51 +592,26 @@ def _get_additional_schemes_info(structured_data: Dict) -> Dict[int, Dict]:
 def _get_mandatory_products_materials(structured_data: Dict, scheme_type: str, 
                                      scheme_index: Optional[int]) -> set:
     """Get mandatory product materials for a specific scheme"""
-    products_df = structured_data.get('products', pd.DataFrame())
-    
-    if products_df.empty:
-        return set()
-    
-    if scheme_type == 'main_scheme':
-        mandatory_products = products_df[
-            (products_df['scheme_type'] == 'main_scheme') &
-            (products_df['is_mandatory_product'] == True)
-        ]
-    else:
-        mandatory_products = products_df[
-            (products_df['scheme_type'] == 'additional_scheme') &
-            (products_df['scheme_name'] == f'Additional Scheme {scheme_index}') &
-            (products_df['is_mandatory_product'] == True)
-        ]
-    
-    return set(mandatory_products['material_code'].tolist())
+    return _scheme_products_materials(structured_data, scheme_type, scheme_index, 'is_mandatory_product')
 
 
 def _get_payout_products_materials(structured_data: Dict, scheme_type: str, 
                                   scheme_index: Optional[int]) -> set:
     """Get payout product materials for a specific scheme"""
+    return _scheme_products_materials(structured_data, scheme_type, scheme_index, 'is_payout_product')
+
+
+def _scheme_products_materials(structured_data: Dict, scheme_type: str,
+                               scheme_index: Optional[int], flag: str) -> set:
+    """Flagged product materials of a scheme, from the resolver's per-scheme sets"""
     products_df = structured_data.get('products', pd.DataFrame())
-    
-    if products_df.empty:
-        return set()
-    
     if scheme_type == 'main_scheme':
-        payout_products = products_df[
-            (products_df['scheme_type'] == 'main_scheme') &
-            (products_df['is_payout_product'] == True)
-        ]
-    else:
-        payout_products = products_df[
-            (products_df['scheme_type'] == 'additional_scheme') &
-            (products_df['scheme_name'] == f'Additional Scheme {scheme_index}') &
-            (products_df['is_payout_product'] == True)
-        ]
-    
-    return set(payout_products['material_code'].tolist())
+        return scheme_products(products_df, flag, 'main_scheme')
+    return scheme_products(products_df, flag, 'additional_scheme', f'Additional Scheme {scheme_index}')
 
 
-def _filter_scheme_period_sales(sales_df: pd.DataFrame, scheme_config: Dict, materials: set) -> pd.DataFrame:
-    """Filter sales data for scheme period and specific materials"""
+def _scheme_period_actuals(sales_df: pd.DataFrame, scheme_config: Dict, materials: set) -> pd.DataFrame:
+    """Per-account volume/value of specific materials in the scheme period (nulls as 0, negatives kept)"""
     if sales_df.empty or not materials:
         return pd.DataFrame()
     
@@ -682,30 +619,11 @@ def _filter_scheme_period_sales(sales_df: pd.DataFrame, scheme_config: Dict, mat
     scheme_from = pd.to_datetime(scheme_config.get('scheme_from'))
     scheme_to = pd.to_datetime(scheme_config.get('scheme_to'))
     
-    if pd.isna(scheme_from) or pd.isna(scheme_to):
+    if pd.isna(scheme_from) or pd.isna(scheme_to) or 'sale_date' not in sales_df.columns:
         return pd.DataFrame()
     
-    # Filter sales data
-    sales_temp = sales_df.copy()
-    
-    # Ensure sale_date is datetime
-    if 'sale_date' in sales_temp.columns:
-        sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date'])
-        
-        # Filter by period and materials
-        filtered_sales = sales_temp[
-            (sales_temp['sale_date'] >= scheme_from) &
-            (sales_temp['sale_date'] <= scheme_to) &
-            (sales_temp['material'].isin(materials))
-        ].copy()
-        
-        # Handle nulls as 0, keep negative values
-        filtered_sales['volume'] = pd.to_numeric(filtered_sales['volume'], errors='coerce').fillna(0.0)
-        filtered_sales['value'] = pd.to_numeric(filtered_sales['value'], errors='coerce').fillna(0.0)
-        
-        return filtered_sales
-    
-    return pd.DataFrame()
+    # Product set as an indicator over the shared account x material matrix
+    return get_sales_matrix(sales_df).product_actuals(materials, scheme_from, scheme_to)
 
 
 def _calculate_mp_final_payout(tracker_df: pd.DataFrame, structured_data: Dict, scheme_type: str, suffix: str, scheme_index: Optional[int]) -> pd.DataFrame:
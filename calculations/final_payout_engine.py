@@ -0,0 +1,115 @@
+"""
+Final Payout Engine
+
+Column-wise Scheme Final Payout used by both the calculation pipeline
+(scheme_final_payout_calculations) and the SQL tracker path (tracker_runner).
+
+The payout, mandatory-qualify and achievement columns are resolved once per
+frame, then the total is computed with masked array sums for all accounts:
+
+- IF scheme_type == 'inbuilt': 0
+- ELSE IF any "Mandatory Qualify[_pN]" == "Yes" with achievement missing or < 1.0: 0
+- ELSE: main + additional (_pN) payouts, plus bonus payouts for ho-scheme
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional
+
+# Column naming used by the calculation pipeline
+CALCULATION_PAYOUT_COLUMNS = {
+    'achieved': 'percentage_achieved',
+    'payouts': ['Total_Payout', 'MP_Final_Payout', 'FINAL_PHASING_PAYOUT'],
+}
+
+# Column naming used by the SQL tracker templates
+TRACKER_PAYOUT_COLUMNS = {
+    'achieved': '% Achieved',
+    'payouts': ['Total Payout', 'MP Final Payout', 'FINAL PHASING PAYOUT'],
+}
+
+BONUS_PAYOUT_COLUMNS = ['Bonus Scheme {i} Bonus Payout', 'Bonus Scheme {i} MP Payout']
+
+
+def _mandatory_failures(df: pd.DataFrame, qualify_col: str, achieved_col: str) -> np.ndarray:
+    """Accounts that require mandatory qualification and did not reach 100%"""
+    if qualify_col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+
+    required = (df[qualify_col] == "Yes").to_numpy(dtype=bool)
+    if not required.any():
+        return required
+    if achieved_col not in df.columns:
+        # A missing achievement column reads as None, which fails the check
+        return required
+
+    achieved = df[achieved_col]
+    if pd.api.types.is_numeric_dtype(achieved.dtype):
+        # NaN compares False, matching the row-wise `achieved < 1.0` check
+        below = achieved.to_numpy(dtype=float, na_value=np.nan) < 1.0
+    else:
+        values = achieved.to_numpy(dtype=object)
+        below = np.equal(values, None) | (pd.to_numeric(achieved, errors='coerce').to_numpy() < 1.0)
+    return required & below
+
+
+def _sum_columns(df: pd.DataFrame, columns: List[str], skipna: bool) -> np.ndarray:
+    present = [col for col in columns if col in df.columns]
+    if not present:
+        return np.zeros(len(df), dtype=float)
+
+    block = df[present]
+    try:
+        values = block.to_numpy(dtype=float, na_value=np.nan)
+    except (TypeError, ValueError):
+        values = block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return np.nansum(values, axis=1) if skipna else values.sum(axis=1)
+
+
+def resolve_payout_columns(additional_suffixes: List[str], bonus_schemes_count: int,
+                           include_bonus: bool, naming: Dict) -> Dict[str, List]:
+    """Column names taking part in the final payout, resolved once per frame"""
+    payout_columns = list(naming['payouts'])
+    mandatory_checks = [("Mandatory Qualify", naming['achieved'])]
+
+    for suffix in additional_suffixes:
+        payout_columns.extend(f"{col}{suffix}" for col in naming['payouts'])
+        mandatory_checks.append((f"Mandatory Qualify{suffix}", f"{naming['achieved']}{suffix}"))
+
+    if include_bonus:
+        for i in range(1, bonus_schemes_count + 1):
+            payout_columns.extend(col.format(i=i) for col in BONUS_PAYOUT_COLUMNS)
+
+    return {'payouts': payout_columns, 'mandatory_checks': mandatory_checks}
+
+
+def compute_final_payout(df: pd.DataFrame, scheme_type: str, additional_suffixes: List[str],
+                         bonus_schemes_count: int, naming: Optional[Dict] = None,
+                         skipna: bool = True) -> np.ndarray:
+    """
+    Scheme Final Payout for every row of df.
+
+    Args:
+        df: Tracker DataFrame
+        scheme_type: Main scheme type ('inbuilt', 'ho-scheme', ...)
+        additional_suffixes: Column suffixes of the additional schemes, e.g. ['_p1', '_p2']
+        bonus_schemes_count: Number of bonus schemes (only summed for ho-scheme)
+        naming: CALCULATION_PAYOUT_COLUMNS (default) or TRACKER_PAYOUT_COLUMNS
+        skipna: Treat missing payout values as 0; False lets NaN propagate into the total
+
+    Returns:
+        float array aligned with df rows
+    """
+    naming = naming or CALCULATION_PAYOUT_COLUMNS
+    if scheme_type == 'inbuilt' or df.empty:
+        return np.zeros(len(df), dtype=float)
+
+    columns = resolve_payout_columns(additional_suffixes, bonus_schemes_count,
+                                     scheme_type == 'ho-scheme', naming)
+
+    failed = np.zeros(len(df), dtype=bool)
+    for qualify_col, achieved_col in columns['mandatory_checks']:
+        failed |= _mandatory_failures(df, qualify_col, achieved_col)
+
+    total = _sum_columns(df, columns['payouts'], skipna)
+    return np.where(failed, 0.0, total)
@@ -7,6 +7,7 @@ Uses vectorized pandas operations for maximum performance
 import pandas as pd
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
+from calculations.slab_engine import SlabTable, FALLBACK_ZERO
 
 def add_growth_columns_vectorized(tracker_df, structured_data, json_data, strata_growth_df=None):
     """
@@ -253,8 +254,8 @@ def _add_additional_scheme_growth_vectorized(tracker_df, scheme_data, scheme_ind
 
 def _vectorized_slab_lookup(values_series, slabs_df, rate_column):
     """
-    Vectorized slab lookup using pandas operations
-    Much faster than iterating through each row
+    Vectorized slab lookup using the shared slab engine
+    (first slab rate as fallback for unmatched, zero-rate and base = 0 accounts)
     
     Args:
         values_series: pandas Series of values to lookup
@@ -267,17 +268,14 @@ def _vectorized_slab_lookup(values_series, slabs_df, rate_column):
     if slabs_df.empty:
         return pd.Series(0.0, index=values_series.index)
     
-    # Create a result series initialized with zeros
-    result = pd.Series(0.0, index=values_series.index)
+    # Compile slabs once and resolve all values in one binary-search pass
+    slab_table = SlabTable.from_frame(slabs_df, [rate_column])
     
-    # Sort slabs by slab_start to ensure proper precedence
-    slabs_sorted = slabs_df.sort_values('slab_start')
-    
-    print(f"   🔍 Slab lookup: {len(slabs_sorted)} slabs, {len(values_series)} values")
+    print(f"   🔍 Slab lookup: {len(slab_table)} slabs, {len(values_series)} values")
     print(f"   📊 Value range: {values_series.min():.2f} to {values_series.max():.2f}")
     
     # Get first slab's growth rate as fallback
-    first_slab_rate = float(slabs_sorted.iloc[0][rate_column]) if not slabs_sorted.empty and pd.notna(slabs_sorted.iloc[0][rate_column]) else 0.0
+    first_slab_rate = slab_table.first_value(rate_column)
     print(f"   📋 First slab growth rate (fallback): {first_slab_rate}%")
     
     # Count accounts with base = 0 (new accounts with no base period data)
@@ -285,36 +283,10 @@ def _vectorized_slab_lookup(values_series, slabs_df, rate_column):
     if zero_base_count > 0:
         print(f"   🆕 Found {zero_base_count} accounts with base = 0 (new accounts)")
     
-    # Vectorized lookup: for each slab, find values that fall within its range
-    for _, slab in slabs_sorted.iterrows():
-        slab_start = float(slab['slab_start'])
-        slab_end = float(slab['slab_end']) if pd.notna(slab['slab_end']) and slab['slab_end'] != '' else float('inf')
-        rate = float(slab[rate_column]) if pd.notna(slab[rate_column]) else 0.0
-        
-        # Vectorized condition: values >= slab_start AND values <= slab_end
-        mask = (values_series >= slab_start) & (values_series <= slab_end)
-        values_in_slab = values_series[mask]
-        
-        if not values_in_slab.empty:
-            print(f"     📍 Slab {slab_start}-{slab_end}: {len(values_in_slab)} values, rate: {rate}%")
-        
-        result.loc[mask] = rate
-    
-    # ENHANCED FIX: Apply first slab growth rate to accounts with base = 0 AND any other unmatched accounts
-    unmatched_mask = (result == 0.0)
-    zero_base_mask = (values_series == 0.0)
-    
-    # Combine masks: accounts with base = 0 OR unmatched accounts should get first slab rate
-    fallback_mask = unmatched_mask | zero_base_mask
-    fallback_count = fallback_mask.sum()
-    
-    if fallback_count > 0 and first_slab_rate > 0:
-        result.loc[fallback_mask] = first_slab_rate
-        zero_accounts = (fallback_mask & zero_base_mask).sum()
-        unmatched_accounts = (fallback_mask & ~zero_base_mask).sum()
-        print(f"   🔧 Applied first slab rate ({first_slab_rate}%) to {fallback_count} accounts:")
-        print(f"      - {zero_accounts} new accounts with base = 0")
-        print(f"      - {unmatched_accounts} other unmatched accounts")
+    # ENHANCED FIX: accounts with base = 0 AND any other unmatched accounts get the first slab rate
+    rates = slab_table.resolve(values_series.to_numpy(dtype=float, na_value=np.nan),
+                               fallback=FALLBACK_ZERO)[rate_column]
+    result = pd.Series(rates, index=values_series.index)
     
     # Count how many values got rates assigned
     non_zero_count = (result > 0).sum()
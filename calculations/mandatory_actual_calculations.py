@@ -85,7 +85,7 @@ def _filter_scheme_sales(sales_df: pd.DataFrame, scheme_from: datetime,
     """Filter sales data for scheme period and mandatory products"""
     
     # Convert sale_date to datetime if needed
-    if 'sale_date' in sales_df.columns:
+    if 'sale_date' in sales_df.columns and not pd.api.types.is_datetime64_any_dtype(sales_df['sale_date']):
         sales_df['sale_date'] = pd.to_datetime(sales_df['sale_date'])
     
     # Filter by date range
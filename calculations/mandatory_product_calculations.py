@@ -6,6 +6,8 @@ Handles mandatory product calculations for main and additional schemes
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Any
+from calculations.slab_engine import SlabTable, FALLBACK_UNMATCHED
+from calculations.sales_matrix import get_sales_matrix
 
 
 def calculate_mandatory_product_columns(tracker_df: pd.DataFrame, structured_data: Dict, 
@@ -227,30 +229,20 @@ def _calculate_mandatory_base_metrics(tracker_df: pd.DataFrame, sales_df: pd.Dat
     
     print(f"     📅 Base period: {from_date.date()} to {to_date.date()} ({sum_avg_method})")
     
-    # Filter sales data for base period and mandatory materials only
-    if 'sale_date' in sales_df.columns:
-        sales_temp = sales_df.copy()
-        sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date'])
-        base_mandatory_sales = sales_temp[
-            (sales_temp['sale_date'] >= from_date) &
-            (sales_temp['sale_date'] <= to_date) &
-            (sales_temp['material'].isin(mandatory_materials))
-        ].copy()
-    else:
+    if 'sale_date' not in sales_df.columns:
         print("     ⚠️ No sale_date column found")
         return tracker_df
     
-    print(f"     📊 Base period mandatory sales: {len(base_mandatory_sales)} records")
+    # Aggregate by credit_account for mandatory products in base period (shared account x material matrix)
+    base_mandatory_actuals = get_sales_matrix(sales_df).product_actuals(mandatory_materials, from_date, to_date)
     
-    if base_mandatory_sales.empty:
+    print(f"     📊 Base period mandatory sales: {len(base_mandatory_actuals)} accounts")
+    
+    if base_mandatory_actuals.empty:
         print("     ℹ️ No mandatory product sales in base period")
         return tracker_df
     
-    # Aggregate by credit_account for mandatory products in base period
-    base_mandatory_actuals = base_mandatory_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
+    base_mandatory_actuals = base_mandatory_actuals.drop(columns=['material_count'])
     
     # Apply SUM/AVG logic
     if sum_avg_method.lower() == 'average':
@@ -298,15 +290,9 @@ def _calculate_mandatory_scheme_metrics(tracker_df: pd.DataFrame, sales_df: pd.D
     
     print(f"     📅 Scheme period: {scheme_from.date()} to {scheme_to.date()}")
     
-    # Filter sales data for scheme period and mandatory materials only
+    # Mandatory product sums and distinct material counts from the shared account x material matrix
     if 'sale_date' in sales_df.columns:
-        sales_temp = sales_df.copy()
-        sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date'])
-        scheme_mandatory_sales = sales_temp[
-            (sales_temp['sale_date'] >= scheme_from) &
-            (sales_temp['sale_date'] <= scheme_to) &
-            (sales_temp['material'].isin(mandatory_materials))
-        ].copy()
+        scheme_mandatory_actuals = get_sales_matrix(sales_df).product_actuals(mandatory_materials, scheme_from, scheme_to)
     else:
         print("     ⚠️ No sale_date column found")
         # Initialize with zeros
@@ -315,28 +301,23 @@ def _calculate_mandatory_scheme_metrics(tracker_df: pd.DataFrame, sales_df: pd.D
         tracker_df[f'Mandatory_Product_PPI_Achievement{suffix}'] = 0.0
         return tracker_df
     
-    print(f"     📊 Scheme period mandatory sales: {len(scheme_mandatory_sales)} records")
+    print(f"     📊 Scheme period mandatory sales: {len(scheme_mandatory_actuals)} accounts")
     
     # Initialize columns
     tracker_df[f'Mandatory_product_actual_value{suffix}'] = 0.0
     tracker_df[f'Mandatory_product_actual_PPI{suffix}'] = 0.0
     tracker_df[f'Mandatory_Product_PPI_Achievement{suffix}'] = 0.0
     
-    if scheme_mandatory_sales.empty:
+    if scheme_mandatory_actuals.empty:
         print("     ℹ️ No mandatory product sales in scheme period")
         return tracker_df
     
     # P3: Calculate Mandatory_product_actual_value (sum of values)
-    mandatory_actual_values = scheme_mandatory_sales.groupby('credit_account').agg({
-        'value': 'sum'  # Total actual sales value for mandatory products
-    }).reset_index()
-    mandatory_actual_values['credit_account'] = mandatory_actual_values['credit_account'].astype(str)
+    mandatory_actual_values = scheme_mandatory_actuals[['credit_account', 'value']]
     
     # P4: Calculate Mandatory_product_actual_PPI (distinct material count)
-    # Group by credit_account and count distinct material codes
-    mandatory_ppi_counts = scheme_mandatory_sales.groupby('credit_account')['material'].nunique().reset_index()
-    mandatory_ppi_counts.columns = ['credit_account', 'distinct_material_count']
-    mandatory_ppi_counts['credit_account'] = mandatory_ppi_counts['credit_account'].astype(str)
+    mandatory_ppi_counts = scheme_mandatory_actuals[['credit_account', 'material_count']].rename(
+        columns={'material_count': 'distinct_material_count'})
     
     print(f"     📈 P3: Actual values calculated for {len(mandatory_actual_values)} accounts")
     print(f"     📈 P4: Distinct material counts calculated for {len(mandatory_ppi_counts)} accounts")
@@ -494,97 +475,36 @@ def _extract_mandatory_fields_from_slabs(tracker_df: pd.DataFrame, json_data: Di
         
         print(f"     📊 Processing {len(slabs)} slabs for mandatory field extraction")
         
-        # 🔧 NEW: Get first slab values as fallback for accounts below minimum slab range
-        first_slab_min_shades = 0.0
-        first_slab_product_target = 0.0
-        first_slab_target_to_actual = 0.0
-        
-        if slabs:
-            first_slab = slabs[0]  # Get first slab for fallback
-            
-            # Extract first slab values
-            first_slab_min_shades_raw = first_slab.get('mandatoryMinShadesPPI', '')
-            first_slab_product_target_raw = first_slab.get('mandatoryProductTarget', '')
-            first_slab_target_to_actual_raw = first_slab.get('mandatoryProductTargetToActual', '')
-            
-            if first_slab_min_shades_raw and str(first_slab_min_shades_raw).strip():
-                try:
-                    first_slab_min_shades = float(first_slab_min_shades_raw)
-                    print(f"     📋 First slab fallback: Mandatory_Min_Shades_PPI = {first_slab_min_shades}")
-                except (ValueError, TypeError):
-                    print(f"     ⚠️ Could not parse first slab mandatoryMinShadesPPI: {first_slab_min_shades_raw}")
-            
-            if first_slab_product_target_raw and str(first_slab_product_target_raw).strip():
-                try:
-                    first_slab_product_target = float(first_slab_product_target_raw)
-                    print(f"     📋 First slab fallback: Mandatory_Product_Fixed_Target = {first_slab_product_target}")
-                except (ValueError, TypeError):
-                    print(f"     ⚠️ Could not parse first slab mandatoryProductTarget: {first_slab_product_target_raw}")
-            
-            if first_slab_target_to_actual_raw and str(first_slab_target_to_actual_raw).strip():
-                try:
-                    first_slab_target_to_actual = float(first_slab_target_to_actual_raw)
-                    print(f"     📋 First slab fallback: Mandatory_Product_pct_Target_to_Actual_Sales = {first_slab_target_to_actual}")
-                except (ValueError, TypeError):
-                    print(f"     ⚠️ Could not parse first slab mandatoryProductTargetToActual: {first_slab_target_to_actual_raw}")
+        # Compile slabs in JSON order; a slab only sets the fields it actually carries
+        def _slab_field(slab, key):
+            value = slab.get(key, '')
+            return value if value and str(value).strip() else None
         
-        # Get base values for slab matching
-        base_values = tracker_df[base_column].values
+        field_keys = {
+            f'Mandatory_Min_Shades_PPI{suffix}': 'mandatoryMinShadesPPI',
+            f'Mandatory_Product_Fixed_Target{suffix}': 'mandatoryProductTarget',
+            f'Mandatory_Product_pct_Target_to_Actual_Sales{suffix}': 'mandatoryProductTargetToActual',
+        }
+        slab_table = SlabTable(
+            [slab.get('slabStart', 0) for slab in slabs],
+            [slab.get('slabEnd') for slab in slabs],
+            {column: [_slab_field(slab, key) for slab in slabs] for column, key in field_keys.items()},
+            sort=False
+        )
         
-        # 🔧 ENHANCED: Initialize fields with first slab values as default fallback
-        tracker_df[f'Mandatory_Min_Shades_PPI{suffix}'] = first_slab_min_shades
-        tracker_df[f'Mandatory_Product_Fixed_Target{suffix}'] = first_slab_product_target
-        tracker_df[f'Mandatory_Product_pct_Target_to_Actual_Sales{suffix}'] = first_slab_target_to_actual
+        # 🔧 ENHANCED: First slab values are the fallback for accounts outside every slab
+        for column in field_keys:
+            print(f"     📋 First slab fallback: {column} = {slab_table.first_value(column)}")
         
-        print(f"     🔧 Applied first slab fallback to ALL accounts initially")
+        base_values = pd.to_numeric(tracker_df[base_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        resolved = slab_table.resolve(base_values, fallback=FALLBACK_UNMATCHED, skip_missing=True)
+        for column in field_keys:
+            tracker_df[column] = resolved[column]
         
-        # Process each slab
-        for slab in slabs:
-            try:
-                slab_start = float(slab.get('slabStart', 0))
-                slab_end = float(slab.get('slabEnd', float('inf')))
-                
-                # Create mask for values in this slab range
-                mask = (base_values >= slab_start) & (base_values <= slab_end)
-                
-                if mask.sum() > 0:
-                    # Extract mandatory fields from slab
-                    mandatory_min_shades = slab.get('mandatoryMinShadesPPI', '')
-                    mandatory_product_target = slab.get('mandatoryProductTarget', '')
-                    mandatory_target_to_actual = slab.get('mandatoryProductTargetToActual', '')
-                    
-                    print(f"       📍 Slab {slab_start}-{slab_end}: {mask.sum()} accounts")
-                    
-                    # Apply mandatoryMinShadesPPI
-                    if mandatory_min_shades and str(mandatory_min_shades).strip():
-                        try:
-                            min_shades_value = float(mandatory_min_shades)
-                            tracker_df.loc[mask, f'Mandatory_Min_Shades_PPI{suffix}'] = min_shades_value
-                            print(f"         ✅ Set Mandatory_Min_Shades_PPI{suffix} = {min_shades_value}")
-                        except (ValueError, TypeError):
-                            print(f"         ⚠️ Could not parse mandatoryMinShadesPPI: {mandatory_min_shades}")
-                    
-                    # Apply mandatoryProductTarget
-                    if mandatory_product_target and str(mandatory_product_target).strip():
-                        try:
-                            product_target_value = float(mandatory_product_target)
-                            tracker_df.loc[mask, f'Mandatory_Product_Fixed_Target{suffix}'] = product_target_value
-                            print(f"         ✅ Set Mandatory_Product_Fixed_Target{suffix} = {product_target_value}")
-                        except (ValueError, TypeError):
-                            print(f"         ⚠️ Could not parse mandatoryProductTarget: {mandatory_product_target}")
-                    
-                    # Apply mandatoryProductTargetToActual
-                    if mandatory_target_to_actual and str(mandatory_target_to_actual).strip():
-                        try:
-                            target_to_actual_value = float(mandatory_target_to_actual)
-                            tracker_df.loc[mask, f'Mandatory_Product_pct_Target_to_Actual_Sales{suffix}'] = target_to_actual_value
-                            print(f"         ✅ Set Mandatory_Product_pct_Target_to_Actual_Sales{suffix} = {target_to_actual_value}%")
-                        except (ValueError, TypeError):
-                            print(f"         ⚠️ Could not parse mandatoryProductTargetToActual: {mandatory_target_to_actual}")
-                    
-            except Exception as e:
-                print(f"         ⚠️ Error processing slab: {e}")
-                continue
+        slab_index = slab_table.slab_index(base_values)
+        matched_counts = np.bincount(slab_index[slab_index >= 0], minlength=len(slab_table))
+        for i in np.flatnonzero(matched_counts):
+            print(f"       📍 Slab {slab_table.slab_start[i]}-{slab_table.slab_end[i]}: {matched_counts[i]} accounts")
         
         # Summary
         min_shades_non_zero = (tracker_df[f'Mandatory_Min_Shades_PPI{suffix}'] > 0).sum()
@@ -7,6 +7,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List
 
+from sales_frame import typed_sales_frame
+
 
 def fill_scheme_metadata_columns(tracker_df: pd.DataFrame, structured_data: Dict, sales_df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -149,8 +151,12 @@ def _fill_region_column(tracker_df: pd.DataFrame, sales_df: pd.DataFrame) -> pd.
     
     # Create a mapping of credit_account to region using the most frequent region per account
     # This handles cases where an account might appear in multiple regions
-    sales_temp = sales_df.copy()
-    sales_temp['credit_account'] = sales_temp['credit_account'].astype(str)
+    if typed_sales_frame(sales_df) is not None and not sales_df['credit_account'].isna().any():
+        # credit_account is already str
+        sales_temp = sales_df
+    else:
+        sales_temp = sales_df.copy()
+        sales_temp['credit_account'] = sales_temp['credit_account'].astype(str)
     
     # Get the most frequent region for each credit account
     account_region_mapping = (
@@ -6,6 +6,8 @@ Handles vectorized payout calculations for main and additional schemes
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Any
+from calculations.slab_engine import SlabTable, FALLBACK_UNMATCHED
+from calculations.sales_matrix import get_sales_matrix
 
 
 def calculate_payout_columns_vectorized(tracker_df: pd.DataFrame, structured_data: Dict, 
@@ -159,49 +161,12 @@ def _apply_slab_payout_calculations(tracker_df: pd.DataFrame, slabs: pd.DataFram
                 payout_volume_col, payout_value_col, payout_product_payout_col, total_payout_col]:
         tracker_df[col] = 0.0
     
-    # Apply vectorized slab lookup for each slab
-    base_values = tracker_df[base_column].values
-    
-    # Track which accounts have been matched to slabs
-    matched_accounts = pd.Series([False] * len(tracker_df), index=tracker_df.index)
-    
-    # Get first slab values for fallback
-    first_slab = slabs_sorted.iloc[0] if not slabs_sorted.empty else None
-    
-    for _, slab_row in slabs_sorted.iterrows():
-        slab_start = float(slab_row['slab_start'])
-        slab_end = float(slab_row['slab_end'])
-        
-        # Create mask for values in this slab range
-        mask = (base_values >= slab_start) & (base_values <= slab_end)
-        
-        if mask.sum() > 0:
-            print(f"     📍 Slab {slab_start}-{slab_end}: {mask.sum()} accounts")
-            
-            # Apply slab values to matching accounts
-            tracker_df.loc[mask, rebate_per_litre_col] = float(slab_row['rebate_per_litre'])
-            tracker_df.loc[mask, rebate_percent_col] = float(slab_row['rebate_percent'])
-            tracker_df.loc[mask, additional_rebate_growth_col] = float(slab_row['additional_rebate_on_growth'])
-            tracker_df.loc[mask, fixed_rebate_col] = float(slab_row['fixed_rebate'])
-            
-            # Mark these accounts as matched
-            matched_accounts[mask] = True
-    
-    # Apply fallback for unmatched accounts using first slab values
-    if first_slab is not None:
-        unmatched_mask = ~matched_accounts
-        unmatched_count = unmatched_mask.sum()
-        
-        if unmatched_count > 0:
-            print(f"     🔧 Applying first slab fallback for {unmatched_count} unmatched accounts")
-            
-            # Apply first slab values as fallback
-            tracker_df.loc[unmatched_mask, rebate_per_litre_col] = float(first_slab['rebate_per_litre'])
-            tracker_df.loc[unmatched_mask, rebate_percent_col] = float(first_slab['rebate_percent'])
-            tracker_df.loc[unmatched_mask, additional_rebate_growth_col] = float(first_slab['additional_rebate_on_growth'])
-            tracker_df.loc[unmatched_mask, fixed_rebate_col] = float(first_slab['fixed_rebate'])
-            
-            print(f"       📌 Fallback values applied: Rebate/L={first_slab['rebate_per_litre']}, Rebate%={first_slab['rebate_percent']}, Additional={first_slab['additional_rebate_on_growth']}, Fixed={first_slab['fixed_rebate']}")
+    # Resolve slab rebates for all accounts (first slab fallback for unmatched accounts)
+    tracker_df = _assign_slab_rebates(
+        tracker_df, slabs_sorted, base_column,
+        rebate_per_litre_col, rebate_percent_col, additional_rebate_growth_col, fixed_rebate_col,
+        indent="     "
+    )
     
     # Calculate payout product volumes and values
     tracker_df = _calculate_scheme_payout_actuals(tracker_df, structured_data, sales_df, scheme_config, scheme_type, suffix)
@@ -226,6 +191,42 @@ def _apply_slab_payout_calculations(tracker_df: pd.DataFrame, slabs: pd.DataFram
     return tracker_df
 
 
+def _assign_slab_rebates(tracker_df: pd.DataFrame, slabs: pd.DataFrame, base_column: str,
+                         rebate_per_litre_col: str, rebate_percent_col: str,
+                         additional_rebate_growth_col: str, fixed_rebate_col: str,
+                         indent: str = "     ") -> pd.DataFrame:
+    """Set slab rebate columns from the matching slab, falling back to the first slab"""
+    slab_columns = {
+        'rebate_per_litre': rebate_per_litre_col,
+        'rebate_percent': rebate_percent_col,
+        'additional_rebate_on_growth': additional_rebate_growth_col,
+        'fixed_rebate': fixed_rebate_col,
+    }
+    slab_table = SlabTable.from_frame(slabs, list(slab_columns))
+    if slab_table.empty:
+        return tracker_df
+    
+    base_values = pd.to_numeric(tracker_df[base_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    slab_index = slab_table.slab_index(base_values)
+    resolved = slab_table.resolve(base_values, fallback=FALLBACK_UNMATCHED)
+    for attribute, column in slab_columns.items():
+        tracker_df[column] = resolved[attribute]
+    
+    matched_counts = np.bincount(slab_index[slab_index >= 0], minlength=len(slab_table))
+    for i in np.flatnonzero(matched_counts):
+        print(f"{indent}📍 Slab {slab_table.slab_start[i]}-{slab_table.slab_end[i]}: {matched_counts[i]} accounts")
+    
+    unmatched_count = int((slab_index < 0).sum())
+    if unmatched_count > 0:
+        print(f"{indent}🔧 Applying first slab fallback for {unmatched_count} unmatched accounts")
+        print(f"{indent}  📌 Fallback values applied: Rebate/L={slab_table.first_value('rebate_per_litre')}, "
+              f"Rebate%={slab_table.first_value('rebate_percent')}, "
+              f"Additional={slab_table.first_value('additional_rebate_on_growth')}, "
+              f"Fixed={slab_table.first_value('fixed_rebate')}")
+    
+    return tracker_df
+
+
 def _calculate_payout_product_actuals(tracker_df: pd.DataFrame, structured_data: Dict, 
                                     sales_df: pd.DataFrame, scheme_config: Dict, 
                                     scheme_type: str, suffix: str) -> pd.DataFrame:
@@ -273,21 +274,16 @@ def _calculate_payout_product_actuals(tracker_df: pd.DataFrame, structured_data:
     
     # Filter sales data for scheme period and payout products
     if 'sale_date' in sales_df.columns:
-        # Create a copy to avoid modifying original DataFrame  
-        sales_temp = sales_df.copy()
-        sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date'])
-        scheme_sales = sales_temp[
-            (sales_temp['sale_date'] >= scheme_from) &
-            (sales_temp['sale_date'] <= scheme_to) &
-            (sales_temp['material'].isin(payout_materials))
-        ].copy()
+        # Payout product sums from the shared account x material matrix
+        payout_actuals = get_sales_matrix(sales_df).product_actuals(
+            payout_materials, scheme_from, scheme_to).drop(columns=['material_count'])
     else:
         print("   ⚠️ No sale_date column found for scheme period filtering")
-        scheme_sales = pd.DataFrame()  # Empty DataFrame
+        payout_actuals = pd.DataFrame()  # Empty DataFrame
     
-    print(f"   📊 Scheme period payout sales: {len(scheme_sales)} records")
+    print(f"   📊 Scheme period payout sales: {len(payout_actuals)} accounts")
     
-    if scheme_sales.empty:
+    if payout_actuals.empty:
         # No sales for payout products
         tracker_df[f'Payout_Products_Volume{suffix}'] = 0.0
         tracker_df[f'Payout_Products_Value{suffix}'] = 0.0
@@ -295,12 +291,6 @@ def _calculate_payout_product_actuals(tracker_df: pd.DataFrame, structured_data:
         tracker_df[f'payoutproductactualvalue{suffix}'] = 0.0
         return tracker_df
     
-    # Aggregate by credit_account for payout products
-    payout_actuals = scheme_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
     payout_actuals.columns = ['credit_account', 'payout_volume', 'payout_value']
     payout_actuals['credit_account'] = payout_actuals['credit_account'].astype(str)
     
@@ -412,49 +402,12 @@ def _apply_slab_payout_calculations(tracker_df: pd.DataFrame, slabs: pd.DataFram
                 payout_volume_col, payout_value_col, payout_product_payout_col, total_payout_col]:
         tracker_df[col] = 0.0
     
-    # Apply vectorized slab lookup
-    base_values = tracker_df[base_column].values
-    
-    # Track which accounts have been matched to slabs
-    matched_accounts = pd.Series([False] * len(tracker_df), index=tracker_df.index)
-    
-    # Get first slab values for fallback
-    first_slab = slabs_sorted.iloc[0] if not slabs_sorted.empty else None
-    
-    for _, slab_row in slabs_sorted.iterrows():
-        slab_start = float(slab_row['slab_start'])
-        slab_end = float(slab_row['slab_end'])
-        
-        # Create mask for values in this slab range
-        mask = (base_values >= slab_start) & (base_values <= slab_end)
-        
-        if mask.sum() > 0:
-            print(f"       📍 Slab {slab_start}-{slab_end}: {mask.sum()} accounts")
-            
-            # Apply slab values to matching accounts
-            tracker_df.loc[mask, rebate_per_litre_col] = float(slab_row['rebate_per_litre'])
-            tracker_df.loc[mask, rebate_percent_col] = float(slab_row['rebate_percent'])
-            tracker_df.loc[mask, additional_rebate_growth_col] = float(slab_row['additional_rebate_on_growth'])
-            tracker_df.loc[mask, fixed_rebate_col] = float(slab_row['fixed_rebate'])
-            
-            # Mark these accounts as matched
-            matched_accounts[mask] = True
-    
-    # Apply fallback for unmatched accounts using first slab values
-    if first_slab is not None:
-        unmatched_mask = ~matched_accounts
-        unmatched_count = unmatched_mask.sum()
-        
-        if unmatched_count > 0:
-            print(f"       🔧 Applying first slab fallback for {unmatched_count} unmatched accounts")
-            
-            # Apply first slab values as fallback
-            tracker_df.loc[unmatched_mask, rebate_per_litre_col] = float(first_slab['rebate_per_litre'])
-            tracker_df.loc[unmatched_mask, rebate_percent_col] = float(first_slab['rebate_percent'])
-            tracker_df.loc[unmatched_mask, additional_rebate_growth_col] = float(first_slab['additional_rebate_on_growth'])
-            tracker_df.loc[unmatched_mask, fixed_rebate_col] = float(first_slab['fixed_rebate'])
-            
-            print(f"         📌 Fallback values applied: Rebate/L={first_slab['rebate_per_litre']}, Rebate%={first_slab['rebate_percent']}, Additional={first_slab['additional_rebate_on_growth']}, Fixed={first_slab['fixed_rebate']}")
+    # Resolve slab rebates for all accounts (first slab fallback for unmatched accounts)
+    tracker_df = _assign_slab_rebates(
+        tracker_df, slabs_sorted, base_column,
+        rebate_per_litre_col, rebate_percent_col, additional_rebate_growth_col, fixed_rebate_col,
+        indent="       "
+    )
     
     # Calculate payout product actuals
     tracker_df = _calculate_scheme_payout_actuals(
@@ -671,21 +624,16 @@ def _calculate_scheme_payout_actuals(tracker_df: pd.DataFrame, structured_data:
     scheme_to = pd.to_datetime(scheme_config['scheme_to'])
     
     if 'sale_date' in sales_df.columns:
-        # Create a copy to avoid modifying original DataFrame  
-        sales_temp = sales_df.copy()
-        sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date'])
-        scheme_sales = sales_temp[
-            (sales_temp['sale_date'] >= scheme_from) &
-            (sales_temp['sale_date'] <= scheme_to) &
-            (sales_temp['material'].isin(payout_materials))
-        ].copy()
+        # Payout product sums from the shared account x material matrix
+        payout_actuals = get_sales_matrix(sales_df).product_actuals(
+            payout_materials, scheme_from, scheme_to).drop(columns=['material_count'])
     else:
         print("     ⚠️ No sale_date column found for scheme period filtering")
-        scheme_sales = pd.DataFrame()  # Empty DataFrame
+        payout_actuals = pd.DataFrame()  # Empty DataFrame
     
-    print(f"     📊 Scheme period payout sales: {len(scheme_sales)} records")
+    print(f"     📊 Scheme period payout sales: {len(payout_actuals)} accounts")
     
-    if scheme_sales.empty:
+    if payout_actuals.empty:
         # No sales for payout products
         tracker_df[f'Payout_Products_Volume{suffix}'] = 0.0
         tracker_df[f'Payout_Products_Value{suffix}'] = 0.0
@@ -693,12 +641,6 @@ def _calculate_scheme_payout_actuals(tracker_df: pd.DataFrame, structured_data:
         tracker_df[f'payoutproductactualvalue{suffix}'] = 0.0
         return tracker_df
     
-    # Aggregate by credit_account for payout products
-    payout_actuals = scheme_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
     payout_actuals.columns = ['credit_account', 'payout_volume_temp', 'payout_value_temp']
     payout_actuals['credit_account'] = payout_actuals['credit_account'].astype(str)
     
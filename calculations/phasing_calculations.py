@@ -7,6 +7,8 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Any, Tuple
 from datetime import datetime
+from calculations.sales_matrix import get_sales_matrix, frame_windows
+from calculations.product_resolver import scheme_products
 
 
 def calculate_phasing_columns(tracker_df: pd.DataFrame, structured_data: Dict, 
@@ -28,6 +30,16 @@ def calculate_phasing_columns(tracker_df: pd.DataFrame, structured_data: Dict,
     # Get configuration manager to check phasing configuration
     config_manager = structured_data.get('config_manager')
     
+    # Bucket every phasing / payout / bonus window of all schemes in one pass over the sales rows
+    phasing_df = structured_data.get('phasing')
+    if phasing_df is not None and not phasing_df.empty:
+        windows = frame_windows(phasing_df, [
+            ('phasing_from_date', 'phasing_to_date'), ('payout_from_date', 'payout_to_date'),
+            ('bonus_phasing_from_date', 'bonus_phasing_to_date'), ('bonus_payout_from_date', 'bonus_payout_to_date'),
+        ])
+        built = get_sales_matrix(sales_df).prepare_periods(windows)
+        print(f"   🗓️ Prepared {built} phasing sales windows")
+    
     # Add main scheme phasing columns (if enabled)
     if config_manager and config_manager.is_main_feature_enabled('bonusSchemes'):
         print("   🎯 Main scheme phasing: ENABLED - calculating...")
@@ -469,29 +481,16 @@ def _calculate_period_sales(sales_df: pd.DataFrame, date_from: datetime, date_to
                           credit_accounts: pd.Series) -> Dict[str, pd.Series]:
     """Calculate sales volume and value for a specific period"""
     
-    # Filter sales data for the period
-    sales_temp = sales_df.copy()
-    sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date']).dt.tz_localize(None)
-    
-    period_sales = sales_temp[
-        (sales_temp['sale_date'] >= date_from) &
-        (sales_temp['sale_date'] <= date_to)
-    ].copy()
+    # Per-account sums for the period from the shared account x material matrix
+    period_actuals = get_sales_matrix(sales_df).product_actuals(None, date_from, date_to).drop(columns=['material_count'])
     
-    if period_sales.empty:
+    if period_actuals.empty:
         # Return zeros for all accounts
         return {
             'volume': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index),
             'value': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index)
         }
     
-    # Aggregate by credit_account
-    period_actuals = period_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
-    period_actuals['credit_account'] = period_actuals['credit_account'].astype(str)
     credit_accounts_str = credit_accounts.astype(str)
     
     # Create a DataFrame to merge
@@ -516,51 +515,28 @@ def _calculate_payout_product_period_sales(structured_data: Dict, sales_df: pd.D
     
     if suffix:  # Additional scheme
         scheme_num = suffix.replace('_p', '')
-        payout_products = products_df[
-            (products_df['scheme_type'] == 'additional_scheme') & 
-            (products_df['scheme_name'] == f'Additional Scheme {scheme_num}') &
-            (products_df['is_payout_product'] == True)
-        ]
+        payout_materials = scheme_products(products_df, 'is_payout_product', 'additional_scheme',
+                                           f'Additional Scheme {scheme_num}')
     else:  # Main scheme
-        payout_products = products_df[
-            (products_df['scheme_type'] == 'main_scheme') & 
-            (products_df['is_payout_product'] == True)
-        ]
+        payout_materials = scheme_products(products_df, 'is_payout_product', 'main_scheme')
     
-    if payout_products.empty:
+    if not payout_materials:
         # Return zeros for all accounts
         return {
             'volume': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index),
             'value': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index)
         }
     
-    # Get payout product materials
-    payout_materials = set(payout_products['material_code'].tolist())
+    # Per-account sums for the period and payout products from the shared account x material matrix
+    payout_actuals = get_sales_matrix(sales_df).product_actuals(payout_materials, date_from, date_to).drop(columns=['material_count'])
     
-    # Filter sales data for the period and payout products
-    sales_temp = sales_df.copy()
-    sales_temp['sale_date'] = pd.to_datetime(sales_temp['sale_date']).dt.tz_localize(None)
-    
-    period_payout_sales = sales_temp[
-        (sales_temp['sale_date'] >= date_from) &
-        (sales_temp['sale_date'] <= date_to) &
-        (sales_temp['material'].isin(payout_materials))
-    ].copy()
-    
-    if period_payout_sales.empty:
+    if payout_actuals.empty:
         # Return zeros for all accounts
         return {
             'volume': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index),
             'value': pd.Series([0.0] * len(credit_accounts), index=credit_accounts.index)
         }
     
-    # Aggregate by credit_account
-    payout_actuals = period_payout_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
-    payout_actuals['credit_account'] = payout_actuals['credit_account'].astype(str)
     credit_accounts_str = credit_accounts.astype(str)
     
     # Create a DataFrame to merge
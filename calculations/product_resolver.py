@@ -0,0 +1,132 @@
+"""
+Product Resolver
+
+Scheme product selections (productData, payoutProducts, mandatoryProducts)
+resolved once per run instead of once per stage.
+
+Every stage matched a selection the same way: union the grps, skus,
+materials, categories, ... lists and keep the sales rows whose material is
+in that union. The JSON's materials list is the already-expanded selection
+and the other lists are the facets it was picked by, so only values that
+are material codes ever match; the resolver keeps exactly that rule.
+
+What changes is where the work happens:
+- a selection is interned as a frozenset keyed by its list values
+- each sales frame's material column becomes an inverted index once
+  (material code -> material id, row -> material id; taken from the
+  SalesFrame codes when the frame came from one)
+- a selection resolves to a cached bitmap over material ids, and a stage's
+  row mask is that bitmap indexed by the row material ids - a gather over
+  int32 codes instead of an isin over every sales row
+- scheme product rows (structured_data['products']) are grouped once into
+  mandatory / payout material sets per scheme
+"""
+
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from frame_cache import FrameCache
+from sales_frame import typed_sales_frame
+
+PRODUCT_KEYS = ('grps', 'skus', 'materials', 'categories', 'otherGroups',
+                'wandaGroups', 'productNames', 'thinnerGroups')
+
+_selections = {}
+_selections_lock = threading.Lock()
+
+
+def product_selection(product_data: Optional[Dict], keys: Iterable[str] = PRODUCT_KEYS) -> frozenset:
+    """Union of the product lists in product_data (same values the stages used to collect)"""
+    if not product_data:
+        return frozenset()
+    key = tuple((name, tuple(product_data[name])) for name in keys
+                if name in product_data and product_data[name])
+    with _selections_lock:
+        selection = _selections.get(key)
+        if selection is None:
+            selection = frozenset(value for _, values in key for value in values)
+            _selections[key] = selection
+        return selection
+
+
+class MaterialIndex:
+    """Material id per sales row plus cached selection bitmaps over the material ids"""
+
+    def __init__(self, sales_df: pd.DataFrame):
+        self.rows = len(sales_df)
+        typed = typed_sales_frame(sales_df)
+        encoded = typed.codes('material') if typed is not None else None
+        if encoded is None:
+            encoded = pd.factorize(sales_df['material'])
+        codes, labels = encoded
+        self.labels = pd.Index(labels)
+        # Missing materials point at an extra id that no selection contains
+        self.row_ids = np.where(codes < 0, len(labels), codes)
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+
+    def bitmap(self, selection: frozenset) -> np.ndarray:
+        """Boolean vector over material ids (last slot = missing material)"""
+        with self._lock:
+            bitmap = self._bitmaps.get(selection)
+            if bitmap is None:
+                bitmap = np.zeros(len(self.labels) + 1, dtype=bool)
+                bitmap[:-1] = self.labels.isin(list(selection))
+                self._bitmaps[selection] = bitmap
+            return bitmap
+
+    def mask(self, selection: frozenset) -> np.ndarray:
+        """Row mask of sales whose material is in selection"""
+        return self.bitmap(selection)[self.row_ids]
+
+
+_indexes = FrameCache(('material',))
+
+
+def get_material_index(sales_df: pd.DataFrame) -> MaterialIndex:
+    """Shared MaterialIndex for this sales frame (dropped when the frame is collected or its materials change)"""
+    return _indexes.get(sales_df, MaterialIndex)
+
+
+def product_mask(sales_df: pd.DataFrame, selection: Iterable) -> np.ndarray:
+    """sales_df['material'].isin(selection) as a numpy mask, via the frame's material index"""
+    if not isinstance(selection, frozenset):
+        selection = frozenset(selection)
+    return get_material_index(sales_df).mask(selection)
+
+
+_product_sets = FrameCache(('material_code', 'scheme_type', 'scheme_name',
+                            'is_mandatory_product', 'is_payout_product'))
+
+
+def _scheme_product_sets(products_df: pd.DataFrame) -> Dict:
+    """{(scheme_type, scheme_name, flag_column): frozenset(material_code)} for one products frame"""
+    return _product_sets.get(products_df, _build_product_sets)
+
+
+def _build_product_sets(products_df: pd.DataFrame) -> Dict:
+    sets = {}
+    for flag in ('is_mandatory_product', 'is_payout_product'):
+        if flag not in products_df.columns:
+            continue
+        flagged = products_df[products_df[flag] == True]
+        for (scheme_type, scheme_name), group in flagged.groupby(['scheme_type', 'scheme_name'], sort=False):
+            sets[(scheme_type, scheme_name, flag)] = frozenset(group['material_code'].tolist())
+        for scheme_type, group in flagged.groupby('scheme_type', sort=False):
+            sets[(scheme_type, None, flag)] = frozenset(group['material_code'].tolist())
+    return sets
+
+
+def scheme_products(products_df: pd.DataFrame, flag: str, scheme_type: str,
+                    scheme_name: Optional[str] = None) -> frozenset:
+    """
+    Material codes flagged `flag` (is_mandatory_product / is_payout_product) for a scheme.
+
+    scheme_name None matches every scheme of scheme_type (main scheme lookups).
+    """
+    if products_df is None or products_df.empty:
+        return frozenset()
+    return _scheme_product_sets(products_df).get((scheme_type, scheme_name, flag), frozenset())
@@ -0,0 +1,113 @@
+"""
+Reward Slab Resolver
+
+Sorts reward slabs once and assigns every account its slab with
+np.searchsorted, instead of scanning slabs row by row. Shared by
+rewards_calculations (HO-scheme "Rewards") and tracker_runner ("Scheme Reward").
+
+Matching rule (unchanged): the first slab, in slab order, with
+slab_from <= payout <= slab_to wins; slabs with a missing bound never match.
+"""
+
+import pandas as pd
+import numpy as np
+
+
+class RewardSlabResolver:
+    """Sorted, immutable view of one scheme's reward slabs"""
+
+    def __init__(self, slabs_df: pd.DataFrame):
+        if slabs_df is None or slabs_df.empty:
+            slab_from = slab_to = np.empty(0, dtype=float)
+            rewards = np.empty(0, dtype=object)
+        else:
+            slab_from = pd.to_numeric(slabs_df['slab_from'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            slab_to = pd.to_numeric(slabs_df['slab_to'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            rewards = slabs_df['scheme_reward'].to_numpy(dtype=object)
+
+        valid = ~(np.isnan(slab_from) | np.isnan(slab_to))
+        # Original positions break ties so the earlier slab sorts first
+        position = np.flatnonzero(valid)
+        order = position[np.lexsort((position, slab_from[valid]))]
+
+        self.slab_from = slab_from[order]
+        self.slab_to = slab_to[order]
+        self.rewards = rewards[order]
+        self._position = order
+        self._sorted = self._is_searchable()
+
+    def __len__(self):
+        return len(self.rewards)
+
+    @property
+    def empty(self):
+        return len(self.rewards) == 0
+
+    def _is_searchable(self):
+        """
+        searchsorted is exact when slabs don't overlap. Slabs may share a
+        boundary value as long as the lower slab also comes first in slab
+        order, since first-match then picks the lower one.
+        """
+        if len(self.rewards) < 2:
+            return True
+        next_from = self.slab_from[1:]
+        prev_to = self.slab_to[:-1]
+        if np.any(next_from < prev_to) or np.any(self.slab_to < self.slab_from):
+            return False
+        touching = next_from == prev_to
+        return not np.any(touching & (self._position[1:] < self._position[:-1]))
+
+    def slab_index(self, payouts) -> np.ndarray:
+        """Index into the sorted slabs for each payout, -1 where none matches"""
+        values = np.asarray(payouts, dtype=float)
+        result = np.full(values.shape, -1, dtype=np.int64)
+        if self.empty:
+            return result
+
+        if self._sorted:
+            # First slab whose upper bound reaches the payout, then check its lower bound
+            idx = np.searchsorted(self.slab_to, values, side='left')
+            in_range = idx < len(self.slab_to)
+            clipped = np.minimum(idx, len(self.slab_to) - 1)
+            matched = in_range & (self.slab_from[clipped] <= values) & ~np.isnan(values)
+            result[matched] = clipped[matched]
+            return result
+
+        # Overlapping slabs: resolve in slab order with column masks (still no row loop)
+        for i in np.argsort(self._position, kind='stable'):
+            hit = (result == -1) & (self.slab_from[i] <= values) & (values <= self.slab_to[i])
+            result[hit] = i
+        return result
+
+    def resolve(self, payouts, eligible=None, default="") -> np.ndarray:
+        """
+        Reward value per payout (object array); default where no slab
+        matches or the account is not eligible.
+        """
+        idx = self.slab_index(payouts)
+        out = np.full(idx.shape, default, dtype=object)
+        matched = idx >= 0
+        if eligible is not None:
+            matched &= np.asarray(eligible, dtype=bool)
+        out[matched] = self.rewards[idx[matched]]
+        return out
+
+
+def credit_note_rewards(payouts: pd.Series, eligible, as_integer: bool = False) -> pd.Series:
+    """
+    "Credit Note Rs. {payout}" for eligible accounts, "" elsewhere, built
+    column-wise. as_integer truncates to whole rupees like int(payout).
+    """
+    eligible = np.asarray(eligible, dtype=bool)
+    out = pd.Series("", index=payouts.index, dtype=object)
+    if not eligible.any():
+        return out
+
+    values = payouts[eligible]
+    if as_integer:
+        text = pd.to_numeric(values, errors='coerce').astype(np.int64).astype(str)
+    else:
+        text = pd.Series([str(value) for value in values.tolist()], index=values.index)
+    out[eligible] = ("Credit Note Rs. " + text).to_numpy(dtype=object)
+    return out
@@ -13,6 +13,7 @@ Formula Summary:
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Any
+from calculations.reward_resolver import RewardSlabResolver, credit_note_rewards
 
 
 def calculate_rewards(tracker_df: pd.DataFrame, structured_data: Dict[str, Any],
@@ -41,15 +42,10 @@ def calculate_rewards(tracker_df: pd.DataFrame, structured_data: Dict[str, Any],
     else:
         print(f"   📋 Found {len(rewards_df)} reward slabs")
 
-    # Calculate rewards for each row
-    rewards_list = []
-
-    for index, row in tracker_df.iterrows():
-        reward = _calculate_row_reward(row, scheme_type, rewards_df)
-        rewards_list.append(reward)
-
-    # Add the Rewards column
-    tracker_df['Rewards'] = rewards_list
+    # Calculate rewards for all rows at once
+    tracker_df['Rewards'] = _calculate_rewards_column(
+        tracker_df, scheme_type, rewards_df, structured_data.get('reward_resolver')
+    )
 
     # Count non-empty rewards
     non_empty_rewards = (tracker_df['Rewards'] != "").sum()
@@ -93,94 +89,35 @@ def _get_scheme_type(structured_data: Dict[str, Any], scheme_config: Dict = None
         return 'target-based'
 
 
-def _calculate_row_reward(row: pd.Series, scheme_type: str, rewards_df: pd.DataFrame) -> str:
-    """
-    Calculate reward for a single row based on scheme type and final payout
+def build_reward_resolver(rewards_df: pd.DataFrame) -> RewardSlabResolver:
+    """Sorted resolver over the main scheme reward slabs"""
+    if rewards_df is None or rewards_df.empty or 'scheme_type' not in rewards_df.columns:
+        return RewardSlabResolver(pd.DataFrame())
+    return RewardSlabResolver(rewards_df[rewards_df['scheme_type'] == 'main_scheme'])
 
-    Args:
-        row: DataFrame row
-        scheme_type: Type of scheme ('ho-scheme', 'target-based', 'inbuilt')
-        rewards_df: DataFrame containing reward slabs
 
-    Returns:
-        Reward string or empty string
+def _calculate_rewards_column(tracker_df: pd.DataFrame, scheme_type: str,
+                              rewards_df: pd.DataFrame, resolver: RewardSlabResolver = None) -> pd.Series:
     """
-    # Get final payout value
-    final_payout = row.get("Scheme Final Payout", 0)
+    Rewards for every row based on scheme type and final payout
 
-    # Handle None/NaN values
-    if pd.isna(final_payout) or final_payout is None:
-        final_payout = 0.0
+    - Payout missing, 0 or negative: ""
+    - HO-Scheme: scheme_reward of the matching main scheme slab, else ""
+    - Otherwise: "Credit Note Rs. {int(final_payout)}"
+    """
+    if "Scheme Final Payout" in tracker_df.columns:
+        payouts = pd.to_numeric(tracker_df["Scheme Final Payout"], errors='coerce').fillna(0.0).astype(float)
     else:
-        final_payout = float(final_payout)
+        payouts = pd.Series(0.0, index=tracker_df.index)
+    eligible = (payouts > 0).to_numpy()
 
-    # If final payout is 0 or negative, return empty string
-    if final_payout <= 0:
-        return ""
-
-    # For HO-Scheme: Use reward slabs
     if scheme_type == 'ho-scheme':
-        return _calculate_ho_scheme_reward(final_payout, rewards_df)
-
-    # For Non-HO-Scheme: Use credit note format
-    else:
-        return _calculate_non_ho_scheme_reward(final_payout)
-
-
-def _calculate_ho_scheme_reward(final_payout: float, rewards_df: pd.DataFrame) -> str:
-    """
-    Calculate reward for HO-Scheme using reward slabs
-
-    Args:
-        final_payout: The scheme final payout amount
-        rewards_df: DataFrame containing reward slabs
-
-    Returns:
-        Reward string or empty string
-    """
-    # If no reward slabs available, return empty string
-    if rewards_df.empty:
-        return ""
-
-    # Filter for main scheme rewards
-    main_scheme_rewards = rewards_df[rewards_df['scheme_type'] == 'main_scheme']
-
-    if main_scheme_rewards.empty:
-        return ""
-
-    # Find matching slab
-    for _, slab in main_scheme_rewards.iterrows():
-        slab_from = slab.get('slab_from')
-        slab_to = slab.get('slab_to')
-        scheme_reward = slab.get('scheme_reward', '')
-
-        # Skip if slab boundaries are None
-        if pd.isna(slab_from) or pd.isna(slab_to):
-            continue
-
-        # Check if final_payout falls within this slab
-        if float(slab_from) <= final_payout <= float(slab_to):
-            return str(scheme_reward)
-
-    # No matching slab found
-    return ""
+        if resolver is None:
+            resolver = build_reward_resolver(rewards_df)
+        rewards = resolver.resolve(payouts.to_numpy(), eligible=eligible)
+        return pd.Series([str(reward) for reward in rewards], index=tracker_df.index, dtype=object)
 
-
-def _calculate_non_ho_scheme_reward(final_payout: float) -> str:
-    """
-    Calculate reward for Non-HO-Scheme using credit note format
-
-    Args:
-        final_payout: The scheme final payout amount
-
-    Returns:
-        Credit note formatted string
-    """
-    if final_payout > 0:
-        # 🔢 Updated to match rounded up integer format (no decimals)
-        return f"Credit Note Rs. {int(final_payout)}"
-    else:
-        return ""
+    return credit_note_rewards(payouts, eligible, as_integer=True)
 
 
 # Column mapping information for reference
@@ -0,0 +1,276 @@
+"""
+Sales Matrix
+
+Account x material view of a run's sales frame, shared by every
+product-scoped actual (mandatory, payout, bonus-MP, phasing payout and
+additional-scheme products).
+
+The frame is encoded once (account codes, material codes, volume, value)
+with rows sorted by sale date as integer day offsets (nanoseconds when the
+dates carry a time of day). Each date range the modules ask for becomes a
+sparse matrix in coordinate form: one entry per (account, material) pair
+with its summed volume and value. A date range is a contiguous slice of the
+sorted rows (two searchsorted calls), and a scheme's product set is an
+indicator vector over the material columns, so its per-account actuals are
+a sparse mat-vec (np.bincount over the matching entries) instead of a copy +
+isin filter + groupby over the full sales frame.
+
+prepare_periods() builds many windows at once (every phasing, bonus and
+payout window of a scheme): the window bounds cut the sorted rows into
+elementary date buckets, one grouped reduction sums every (bucket, account,
+material), and each window's matrix is the sum of the buckets it covers.
+
+Matching rules are those of the old filter + groupby blocks:
+- sale_date in [date_from, date_to] inclusive (tz dropped, as the phasing
+  and bonus modules did)
+- material.isin(materials) on the raw material values
+- rows without a credit_account are ignored; NaN volume/value sum as 0
+- material_count is the number of distinct matching materials (PPI)
+"""
+
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from frame_cache import FrameCache
+from sales_frame import NO_DAY, typed_sales_frame
+
+
+_DAY_NS = 86_400_000_000_000
+
+
+def _aggregate_pairs(pairs: np.ndarray, volume: np.ndarray, value: np.ndarray):
+    """Sum volume/value per distinct key; returns (keys, volume, value)"""
+    if not len(pairs):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=float), np.empty(0, dtype=float)
+    keys, inverse = np.unique(pairs, return_inverse=True)
+    return (keys,
+            np.bincount(inverse, weights=volume, minlength=len(keys)),
+            np.bincount(inverse, weights=value, minlength=len(keys)))
+
+
+class PeriodMatrix:
+    """Sparse account x material sums for one date range (coordinate form)"""
+
+    def __init__(self, pairs: np.ndarray, volume: np.ndarray, value: np.ndarray, n_materials: int):
+        """pairs = account_code * n_materials + material_code, one per sales row or bucket entry"""
+        keys, self.volume, self.value = _aggregate_pairs(pairs, volume, value)
+        self.accounts = keys // n_materials
+        self.materials = keys % n_materials
+
+    @property
+    def nnz(self) -> int:
+        return len(self.accounts)
+
+
+class SalesMatrix:
+    """Encoded, date-sorted sales frame plus cached per-period matrices"""
+
+    def __init__(self, sales_df: pd.DataFrame):
+        self.rows = len(sales_df)
+
+        # Frames built by SalesFrame.to_calculation_frame() carry their codes and day numbers
+        typed = typed_sales_frame(sales_df)
+        account_codes = material_codes = days = None
+        if typed is not None:
+            account_codes, account_labels = typed.codes('credit_account') or (None, None)
+            material_codes, material_labels = typed.codes('material') or (None, None)
+            days = typed.day_numbers()
+
+        if account_codes is None:
+            accounts = sales_df['credit_account']
+            account_codes, account_labels = pd.factorize(accounts.astype(str))
+            account_codes[accounts.isna().to_numpy()] = -1
+        self.account_labels = np.asarray(account_labels, dtype=object)
+
+        # Unknown (NaN) materials get their own last column: never in a product
+        # set, but counted when a query covers all materials
+        if material_codes is None:
+            material_codes, material_labels = pd.factorize(sales_df['material'])
+        self.material_index = pd.Index(material_labels)
+        self.n_materials = len(material_labels) + 1
+        material_codes = np.where(material_codes < 0, self.n_materials - 1, material_codes)
+
+        if days is not None:
+            # Rows without an account or a date never match any window
+            valid = (account_codes >= 0) & (days != NO_DAY)
+            self.tick = _DAY_NS
+            ticks = days[valid].astype(np.int64)
+        else:
+            dates = pd.to_datetime(sales_df['sale_date'])
+            if getattr(dates.dt, 'tz', None) is not None:
+                dates = dates.dt.tz_localize(None)
+            valid = (account_codes >= 0) & dates.notna().to_numpy()
+            nanoseconds = dates.to_numpy(dtype='datetime64[ns]')[valid].astype(np.int64)
+            self.tick = _DAY_NS if not (nanoseconds % _DAY_NS).any() else 1
+            ticks = nanoseconds // self.tick
+        order = np.argsort(ticks, kind='stable')
+
+        self._ticks = ticks[order]
+        self._pairs = (account_codes[valid].astype(np.int64) * self.n_materials + material_codes[valid])[order]
+        self._volume = pd.to_numeric(sales_df['volume'], errors='coerce').fillna(0.0).to_numpy(dtype=float)[valid][order]
+        self._value = pd.to_numeric(sales_df['value'], errors='coerce').fillna(0.0).to_numpy(dtype=float)[valid][order]
+
+        self._periods = {}
+        self._indicators = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _period_key(date_from, date_to):
+        bounds = []
+        for value in (date_from, date_to):
+            ts = pd.Timestamp(value)
+            bounds.append(ts.tz_localize(None) if ts.tz is not None else ts)
+        return tuple(bounds)
+
+    def _tick_bounds(self, key):
+        """Inclusive [first, last] tick range of a period key (rows with first <= tick <= last)"""
+        start, end = (np.datetime64(bound, 'ns').astype(np.int64) for bound in key)
+        return -(-start // self.tick), end // self.tick
+
+    def _row_slice(self, key):
+        first, last = self._tick_bounds(key)
+        return (np.searchsorted(self._ticks, first, side='left'),
+                np.searchsorted(self._ticks, last, side='right'))
+
+    def period(self, date_from, date_to) -> PeriodMatrix:
+        """Matrix of sales dated date_from..date_to (inclusive), built once per range"""
+        key = self._period_key(date_from, date_to)
+        with self._lock:
+            matrix = self._periods.get(key)
+            if matrix is None:
+                if pd.isna(key[0]) or pd.isna(key[1]):
+                    lo = hi = 0
+                else:
+                    lo, hi = self._row_slice(key)
+                hi = max(lo, hi)
+                matrix = PeriodMatrix(self._pairs[lo:hi], self._volume[lo:hi], self._value[lo:hi], self.n_materials)
+                self._periods[key] = matrix
+            return matrix
+
+    def prepare_periods(self, windows: Iterable) -> int:
+        """
+        Build the matrices of several (date_from, date_to) windows in one pass.
+
+        Window bounds cut the date-sorted rows into elementary buckets; one
+        grouped reduction sums every (bucket, account, material) and each
+        window adds up the buckets it covers. Returns the number of windows built.
+        """
+        with self._lock:
+            keys = set()
+            for date_from, date_to in windows:
+                key = self._period_key(date_from, date_to)
+                if not (pd.isna(key[0]) or pd.isna(key[1])) and key not in self._periods:
+                    keys.add(key)
+            if not keys:
+                return 0
+
+            ranges = {key: self._tick_bounds(key) for key in keys}
+            # Bucket b covers ticks [edges[b], edges[b + 1])
+            edges = np.unique([tick for first, last in ranges.values() for tick in (first, last + 1)])
+            row_edges = np.searchsorted(self._ticks, edges, side='left')
+            lo, hi = row_edges[0], row_edges[-1]
+            buckets = np.repeat(np.arange(len(edges) - 1, dtype=np.int64), np.diff(row_edges))
+
+            n_pairs = len(self.account_labels) * self.n_materials
+            bucket_keys, volume, value = _aggregate_pairs(
+                buckets * n_pairs + self._pairs[lo:hi], self._volume[lo:hi], self._value[lo:hi])
+            entry_buckets = bucket_keys // n_pairs
+            entry_pairs = bucket_keys % n_pairs
+
+            for key, (first, last) in ranges.items():
+                if last < first:
+                    start = end = 0
+                else:
+                    first_bucket = np.searchsorted(edges, first)
+                    last_bucket = np.searchsorted(edges, last + 1) - 1
+                    start = np.searchsorted(entry_buckets, first_bucket, side='left')
+                    end = np.searchsorted(entry_buckets, last_bucket, side='right')
+                self._periods[key] = PeriodMatrix(entry_pairs[start:end], volume[start:end],
+                                                  value[start:end], self.n_materials)
+            return len(ranges)
+
+    def indicator(self, materials: Optional[Iterable]) -> np.ndarray:
+        """Boolean vector over material columns; None selects every material"""
+        if materials is None:
+            return np.ones(self.n_materials, dtype=bool)
+        # Resolver selections are frozensets shared across stages, so their vectors are kept
+        cached = self._indicators.get(materials) if isinstance(materials, frozenset) else None
+        if cached is not None:
+            return cached
+        selected = np.zeros(self.n_materials, dtype=bool)
+        selected[:-1] = self.material_index.isin(list(materials))
+        if isinstance(materials, frozenset):
+            self._indicators[materials] = selected
+        return selected
+
+    def _apply(self, matrix: PeriodMatrix, selected: np.ndarray) -> pd.DataFrame:
+        entries = selected[matrix.materials]
+        accounts = matrix.accounts[entries]
+        n_accounts = len(self.account_labels)
+        counts = np.bincount(accounts, minlength=n_accounts)
+        present = counts > 0
+        return pd.DataFrame({
+            'credit_account': self.account_labels[present],
+            'volume': np.bincount(accounts, weights=matrix.volume[entries], minlength=n_accounts)[present],
+            'value': np.bincount(accounts, weights=matrix.value[entries], minlength=n_accounts)[present],
+            'material_count': counts[present],
+        })
+
+    def product_actuals(self, materials: Optional[Iterable], date_from, date_to) -> pd.DataFrame:
+        """
+        Per-account sums for one product set in a date range.
+
+        Returns credit_account (str), volume, value, material_count for accounts
+        with at least one matching sale, like the old groupby('credit_account').
+        """
+        return self._apply(self.period(date_from, date_to), self.indicator(materials))
+
+    def product_actuals_many(self, product_sets: Dict[str, Optional[Iterable]],
+                             date_from, date_to) -> Dict[str, pd.DataFrame]:
+        """product_actuals for several product sets over the same period matrix"""
+        matrix = self.period(date_from, date_to)
+        return {name: self._apply(matrix, self.indicator(materials))
+                for name, materials in product_sets.items()}
+
+    def map_to_accounts(self, actuals: pd.DataFrame, credit_accounts: pd.Series,
+                        column: str) -> pd.Series:
+        """actuals[column] aligned to credit_accounts (missing accounts -> 0.0)"""
+        lookup = pd.Series(actuals[column].to_numpy(dtype=float), index=actuals['credit_account'])
+        return credit_accounts.astype(str).map(lookup).fillna(0.0).astype(float)
+
+
+def _naive_timestamp(value):
+    # Same parsing as the callers: pd.to_datetime(...).tz_localize(None)
+    try:
+        ts = pd.to_datetime(value)
+    except (ValueError, TypeError):
+        return pd.NaT
+    return ts.tz_localize(None) if getattr(ts, 'tz', None) is not None else ts
+
+
+def frame_windows(frame: pd.DataFrame, column_pairs) -> list:
+    """(date_from, date_to) windows from the given from/to column pairs of a config frame"""
+    windows = []
+    for from_col, to_col in column_pairs:
+        if from_col not in frame.columns or to_col not in frame.columns:
+            continue
+        windows.extend((_naive_timestamp(start), _naive_timestamp(end))
+                       for start, end in zip(frame[from_col], frame[to_col]))
+    return windows
+
+
+_matrices = FrameCache(('credit_account', 'material', 'sale_date', 'volume', 'value'))
+
+
+def get_sales_matrix(sales_df: pd.DataFrame) -> SalesMatrix:
+    """
+    Shared SalesMatrix for this sales frame.
+
+    The pipeline hands the same sales_df object to every calculation stage, so
+    the matrix is built on first use and dropped when the frame is collected
+    (or rebuilt once a column it encodes has been replaced).
+    """
+    return _matrices.get(sales_df, SalesMatrix)
@@ -15,6 +15,7 @@ Formula Summary:
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Any
+from calculations.final_payout_engine import compute_final_payout, CALCULATION_PAYOUT_COLUMNS
 
 
 def calculate_scheme_final_payout(tracker_df: pd.DataFrame, structured_data: Dict[str, Any], 
@@ -44,14 +45,12 @@ def calculate_scheme_final_payout(tracker_df: pd.DataFrame, structured_data: Dic
     bonus_schemes_count = _get_bonus_schemes_count(tracker_df)
     print(f"   🎁 Bonus schemes detected: {bonus_schemes_count}")
     
-    # Calculate final payout for each row
-    final_payouts = []
-    
-    for index, row in tracker_df.iterrows():
-        final_payout = _calculate_row_final_payout(
-            row, scheme_type, additional_schemes_count, bonus_schemes_count
-        )
-        final_payouts.append(final_payout)
+    # Calculate final payout for all rows at once (shared engine with tracker_runner)
+    additional_suffixes = [f"_p{i}" for i in range(1, additional_schemes_count + 1)]
+    final_payouts = compute_final_payout(
+        tracker_df, scheme_type, additional_suffixes, bonus_schemes_count,
+        naming=CALCULATION_PAYOUT_COLUMNS
+    )
     
     # Add the column at the end
     tracker_df['Scheme Final Payout'] = final_payouts
@@ -139,87 +138,6 @@ def _get_bonus_schemes_count(tracker_df: pd.DataFrame) -> int:
     return max(scheme_numbers) if scheme_numbers else 0
 
 
-def _calculate_row_final_payout(row: pd.Series, scheme_type: str, 
-                              additional_schemes_count: int, bonus_schemes_count: int) -> float:
-    """
-    Calculate final payout for a single row based on scheme type and mandatory checks
-    """
-    
-    # STEP 1: Check if scheme type is 'inbuilt'
-    if scheme_type == 'inbuilt':
-        return 0.0
-    
-    # STEP 2: Mandatory Qualification Checks
-    # Check Main Scheme Mandatory Qualification
-    if row.get("Mandatory Qualify") == "Yes":
-        main_achieved = row.get("percentage_achieved")
-        if main_achieved is None or main_achieved < 1.0:
-            return 0.0  # Failed main scheme mandatory qualification
-    
-    # Check Additional Schemes Mandatory Qualification
-    for i in range(1, additional_schemes_count + 1):
-        mandatory_qualify_col = f"Mandatory Qualify_p{i}"
-        percentage_achieved_col = f"percentage_achieved_p{i}"
-        
-        if row.get(mandatory_qualify_col) == "Yes":
-            achieved = row.get(percentage_achieved_col)
-            if achieved is None or achieved < 1.0:
-                return 0.0  # Failed additional scheme mandatory qualification
-    
-    # STEP 3: Calculate Total Payout
-    total_payout = 0.0
-    
-    # Main Scheme Base Payouts (for all non-inbuilt schemes)
-    main_payout_cols = [
-        "Total_Payout",
-        "MP_Final_Payout", 
-        "FINAL_PHASING_PAYOUT"
-    ]
-    
-    for col in main_payout_cols:
-        value = row.get(col, 0)
-        if pd.notna(value):
-            total_payout += float(value)
-    
-    # Additional Schemes Payouts
-    for i in range(1, additional_schemes_count + 1):
-        additional_payout_cols = [
-            f"Total_Payout_p{i}",
-            f"MP_Final_Payout_p{i}",
-            f"FINAL_PHASING_PAYOUT_p{i}"
-        ]
-        
-        for col in additional_payout_cols:
-            value = row.get(col, 0)
-            if pd.notna(value):
-                total_payout += float(value)
-    
-    # For HO-SCHEME: Add Bonus Payouts
-    if scheme_type == 'ho-scheme':
-        for i in range(1, bonus_schemes_count + 1):
-            bonus_payout_cols = [
-                f"Bonus Scheme {i} Bonus Payout",
-                f"Bonus Scheme {i} MP Payout"
-            ]
-            
-            for col in bonus_payout_cols:
-                value = row.get(col, 0)
-                if pd.notna(value):
-                    total_payout += float(value)
-    
-    return total_payout
-
-
-def _safe_float_conversion(value) -> float:
-    """Safely convert value to float, handling NaN and None"""
-    if value is None or pd.isna(value):
-        return 0.0
-    try:
-        return float(value)
-    except (ValueError, TypeError):
-        return 0.0
-
-
 # Column mapping information for reference
 COLUMN_MAPPING = {
     'mandatory_qualify_main': 'Mandatory Qualify',
@@ -0,0 +1,224 @@
+"""
+Slab Engine
+
+Compiles a scheme's slab table into sorted NumPy arrays once and resolves
+every slab attribute for all accounts with a single np.searchsorted pass,
+instead of masking the tracker once per slab.
+
+Matching rules:
+- a value matches a slab when slab_start <= value <= slab_end
+- a missing slab_end is open-ended
+- overlapping slabs resolve by priority: 'last' (later slab wins, the
+  behaviour of the old per-slab overwrite loops) or 'first' (first match wins)
+
+First-slab fallback rules, shared by every module:
+- FALLBACK_UNMATCHED: accounts matching no slab get the first slab's values
+- FALLBACK_BELOW_FIRST: only unmatched accounts below the first slab start
+  get the first slab's values; all other unmatched accounts get 0
+- FALLBACK_ZERO: accounts whose resolved value is 0 (unmatched, or zero in
+  the matched slab) or whose base is 0 get the first slab's value when it is > 0
+- FALLBACK_NONE: unmatched accounts get 0
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional
+
+FALLBACK_NONE = 'none'
+FALLBACK_UNMATCHED = 'unmatched'
+FALLBACK_BELOW_FIRST = 'below_first'
+FALLBACK_ZERO = 'zero'
+
+
+def _to_float_array(values, fill_value=np.nan) -> np.ndarray:
+    """Numeric array from a list/Series of raw slab values ('' and junk -> fill_value)"""
+    array = pd.to_numeric(pd.Series(list(values), dtype=object).replace('', np.nan),
+                          errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    if not np.isnan(fill_value):
+        array = np.where(np.isnan(array), fill_value, array)
+    return array
+
+
+class SlabTable:
+    """One scheme's slabs compiled for vectorized lookup"""
+
+    def __init__(self, slab_start, slab_end, attributes: Dict[str, np.ndarray],
+                 priority: str = 'last', sort: bool = True):
+        """
+        Args:
+            slab_start, slab_end: Slab bounds in slab order
+            attributes: attribute name -> values in slab order (NaN = not set)
+            priority: 'last' or 'first' matching slab wins when slabs overlap
+            sort: Order slabs by slab_start first (stable), as the callers' sort_values did
+        """
+        starts = _to_float_array(slab_start, fill_value=0.0)
+        ends = _to_float_array(slab_end)
+        ends = np.where(np.isnan(ends), np.inf, ends)
+
+        order = np.argsort(starts, kind='stable') if sort else np.arange(len(starts))
+        self.slab_start = starts[order]
+        self.slab_end = ends[order]
+        self.attributes = {name: _to_float_array(values)[order] for name, values in attributes.items()}
+        self.priority = priority
+
+        # Search structures: slabs sorted by start, ties broken by priority rank
+        rank = np.arange(len(order))
+        self._search_order = np.lexsort((rank, self.slab_start))
+        self._search_start = self.slab_start[self._search_order]
+        self._search_end = self.slab_end[self._search_order]
+        self._searchable = self._is_searchable()
+        self._subtables = {}
+
+    @classmethod
+    def from_frame(cls, slabs_df: pd.DataFrame, attributes: List[str], start_column: str = 'slab_start',
+                   end_column: str = 'slab_end', priority: str = 'last', sort: bool = True) -> 'SlabTable':
+        """Compile a slabs DataFrame; attributes missing from the frame resolve to 0"""
+        if slabs_df is None or slabs_df.empty:
+            return cls([], [], {name: [] for name in attributes}, priority=priority, sort=sort)
+        return cls(
+            slabs_df[start_column].tolist(),
+            slabs_df[end_column].tolist() if end_column in slabs_df.columns else [np.nan] * len(slabs_df),
+            {name: slabs_df[name].tolist() if name in slabs_df.columns else [0.0] * len(slabs_df)
+             for name in attributes},
+            priority=priority, sort=sort
+        )
+
+    @classmethod
+    def from_records(cls, slabs: List[Dict], attributes: Dict[str, str], start_key: str = 'slabStart',
+                     end_key: str = 'slabEnd', priority: str = 'last', sort: bool = False) -> 'SlabTable':
+        """Compile slab dicts (e.g. scheme JSON slabs); attributes maps output name -> record key"""
+        return cls(
+            [slab.get(start_key, 0) for slab in slabs],
+            [slab.get(end_key) for slab in slabs],
+            {name: [slab.get(key) for slab in slabs] for name, key in attributes.items()},
+            priority=priority, sort=sort
+        )
+
+    def __len__(self):
+        return len(self.slab_start)
+
+    @property
+    def empty(self):
+        return len(self.slab_start) == 0
+
+    @property
+    def first_slab_start(self) -> float:
+        return float(self.slab_start[0]) if not self.empty else 0.0
+
+    def first_value(self, attribute: str, default: float = 0.0) -> float:
+        """Attribute of the first slab (slab order), default when missing"""
+        if self.empty:
+            return default
+        value = self.attributes[attribute][0]
+        return default if np.isnan(value) else float(value)
+
+    def _is_searchable(self) -> bool:
+        """
+        Binary search is exact when slabs don't overlap. A shared boundary
+        value is fine as long as priority picks the slab searchsorted lands on.
+        """
+        if len(self._search_start) < 2:
+            return True
+        next_start = self._search_start[1:]
+        prev_end = self._search_end[:-1]
+        if np.any(next_start < prev_end) or np.any(self._search_end < self._search_start):
+            return False
+        # At a shared boundary 'last' lands on the upper slab and 'first' on the
+        # lower one, so both need the upper slab to come later in slab order
+        rank_rising = self._search_order[1:] > self._search_order[:-1]
+        touching = next_start == prev_end
+        return not np.any(touching & ~rank_rising)
+
+    def slab_index(self, values) -> np.ndarray:
+        """Index of the matching slab (slab order) per value, -1 where none matches"""
+        values = np.asarray(values, dtype=float)
+        result = np.full(values.shape, -1, dtype=np.int64)
+        if self.empty:
+            return result
+
+        if self._searchable:
+            last = len(self._search_start) - 1
+            if self.priority == 'last':
+                # Last slab starting at or below the value
+                pos = np.searchsorted(self._search_start, values, side='right') - 1
+            else:
+                # First slab ending at or above the value
+                pos = np.searchsorted(self._search_end, values, side='left')
+            valid = (pos >= 0) & (pos <= last)
+            pos = np.clip(pos, 0, last)
+            matched = (valid & (self._search_start[pos] <= values) & (values <= self._search_end[pos]))
+            result[matched] = self._search_order[pos[matched]]
+            return result
+
+        # Overlapping slabs: walk slabs in priority order with column masks
+        slab_order = range(len(self.slab_start))
+        for i in (reversed(slab_order) if self.priority == 'last' else slab_order):
+            hit = (result == -1) & (self.slab_start[i] <= values) & (values <= self.slab_end[i])
+            result[hit] = i
+        return result
+
+    def _subtable(self, attribute: str) -> 'SlabTable':
+        """Slabs that actually set attribute (used with skip_missing)"""
+        if attribute not in self._subtables:
+            keep = ~np.isnan(self.attributes[attribute])
+            self._subtables[attribute] = SlabTable(
+                self.slab_start[keep], self.slab_end[keep],
+                {attribute: self.attributes[attribute][keep]}, priority=self.priority, sort=False
+            )
+        return self._subtables[attribute]
+
+    def resolve(self, values, attributes: Optional[List[str]] = None, fallback: str = FALLBACK_UNMATCHED,
+                skip_missing: bool = False, default: float = 0.0) -> Dict[str, np.ndarray]:
+        """
+        Resolve slab attributes for every value.
+
+        Args:
+            values: Base values (volume/value) per account
+            attributes: Attributes to resolve (all by default)
+            fallback: One of the FALLBACK_* rules
+            skip_missing: A slab with a missing attribute doesn't set it, so the
+                account keeps the next slab by priority (or the fallback)
+            default: Value for accounts with neither a match nor a fallback
+
+        Returns:
+            dict attribute -> float array aligned with values
+        """
+        values = np.asarray(values, dtype=float)
+        attributes = list(self.attributes) if attributes is None else attributes
+        results = {}
+        if self.empty:
+            return {name: np.full(values.shape, default, dtype=float) for name in attributes}
+
+        shared_index = self.slab_index(values)
+        for name in attributes:
+            if skip_missing and np.isnan(self.attributes[name]).any():
+                index = self._subtable(name).slab_index(values)
+                slab_values = self._subtable(name).attributes[name]
+            else:
+                index = shared_index
+                slab_values = np.where(np.isnan(self.attributes[name]), default, self.attributes[name])
+
+            matched = index >= 0
+            resolved = np.full(values.shape, default, dtype=float)
+            if len(slab_values):
+                resolved[matched] = slab_values[index[matched]]
+            results[name] = self._apply_fallback(resolved, matched, values, name, fallback, default)
+        return results
+
+    def _apply_fallback(self, resolved, matched, values, attribute, fallback, default):
+        first = self.first_value(attribute, default)
+        if fallback == FALLBACK_UNMATCHED:
+            resolved[~matched] = first
+        elif fallback == FALLBACK_BELOW_FIRST:
+            resolved[~matched & (values < self.first_slab_start)] = first
+        elif fallback == FALLBACK_ZERO:
+            if first > 0:
+                resolved[(resolved == 0.0) | (values == 0.0)] = first
+        return resolved
+
+    def floor_to_first_slab(self, values) -> np.ndarray:
+        """Raise values below the first slab start up to it"""
+        values = np.asarray(values, dtype=float)
+        if self.empty:
+            return values
+        return np.where(values < self.first_slab_start, self.first_slab_start, values)
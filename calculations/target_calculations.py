@@ -7,6 +7,8 @@ Uses growth rates, strata growth, and slab thresholds with vectorized operations
 import pandas as pd
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
+from calculations.slab_engine import SlabTable
+from calculations.sales_matrix import get_sales_matrix
 
 def calculate_targets_and_actuals_vectorized(tracker_df, structured_data, json_data, sales_df, scheme_config=None):
     """
@@ -41,23 +43,40 @@ def calculate_targets_and_actuals_vectorized(tracker_df, structured_data, json_d
     # Process ALL additional schemes in parallel
     print(f"🎯 Processing {len(additional_schemes)} additional schemes for targets...")
     
+    # Each scheme works on its own copy (pandas frames are not safe for concurrent
+    # column inserts); its columns are merged back serially in scheme order
+    base_df = tracker_df
     with ThreadPoolExecutor(max_workers=4) as executor:
         futures = []
         for i, (scheme_id, scheme_data) in enumerate(additional_schemes.items(), 1):
             future = executor.submit(
                 _calculate_additional_scheme_targets_vectorized,
-                tracker_df, structured_data, scheme_data, i, sales_df, scheme_config
+                base_df.copy(), structured_data, scheme_data, i, sales_df, scheme_config
             )
             futures.append((i, future))
         
         # Collect results in order
         for scheme_index, future in futures:
-            tracker_df = future.result()
+            tracker_df = _merge_scheme_columns(tracker_df, base_df, future.result())
             print(f"   ✅ Additional scheme {scheme_index} targets completed")
     
     print("✅ Target and actual calculations completed!")
     return tracker_df
 
+def _merge_scheme_columns(tracker_df, base_df, scheme_df):
+    """Copy the columns a scheme worker added or changed (relative to base_df) into tracker_df"""
+    changed = [col for col in scheme_df.columns
+               if col not in base_df.columns or not scheme_df[col].equals(base_df[col])]
+    if not changed:
+        return tracker_df
+    for col in changed:
+        if col in tracker_df.columns:
+            tracker_df[col] = scheme_df[col]
+    added = [col for col in changed if col not in tracker_df.columns]
+    if added:
+        tracker_df = pd.concat([tracker_df, scheme_df[added]], axis=1)
+    return tracker_df
+
 def _calculate_main_scheme_targets_vectorized(tracker_df, structured_data, main_scheme, sales_df, scheme_config=None):
     """Calculate main scheme targets and actuals using vectorization"""
     
@@ -385,16 +404,13 @@ def _apply_slab_thresholds_vectorized(tracker_df, slabs_df, total_column, base_t
         tracker_df[final_target_column] = tracker_df.get(base_target_column, 0.0)
         return tracker_df
     
-    # Get first slab minimum
-    first_slab_start = slabs_df.iloc[0]['slab_start']
-    
     # FIXED LOGIC: Check if the calculated target (base_target_column) is less than first slab
     # If calculated target < first slab, then use first slab value
     # Otherwise use the calculated target
-    tracker_df[final_target_column] = np.where(
-        tracker_df[base_target_column] < first_slab_start,
-        first_slab_start,  # Use first slab minimum if calculated target is too low
-        tracker_df[base_target_column]  # Use calculated target if it meets minimum threshold
+    slab_table = SlabTable.from_frame(slabs_df, [])
+    first_slab_start = slab_table.first_slab_start
+    tracker_df[final_target_column] = slab_table.floor_to_first_slab(
+        pd.to_numeric(tracker_df[base_target_column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
     )
     
     print(f"     🔧 Applied first slab minimum check: target >= {first_slab_start}")
@@ -466,31 +482,17 @@ def _calculate_main_scheme_actuals_vectorized(tracker_df, structured_data, sales
         tracker_df['actual_value'] = 0.0
         return tracker_df
     
-    # Filter sales data for scheme period and main scheme materials
-    # Ensure sale_date is datetime
-    if 'sale_date' in sales_df.columns:
-        sales_df['sale_date'] = pd.to_datetime(sales_df['sale_date'])
+    # Product set as an indicator over the shared account x material matrix
+    actuals = get_sales_matrix(sales_df).product_actuals(main_materials, scheme_start, scheme_end).drop(columns=['material_count'])
     
-    scheme_sales = sales_df[
-        (sales_df['material'].isin(main_materials)) &
-        (sales_df['sale_date'] >= scheme_start) &
-        (sales_df['sale_date'] <= scheme_end)
-    ]
+    print(f"   📊 Scheme period sales data: {len(actuals)} accounts")
     
-    print(f"   📊 Scheme period sales data: {len(scheme_sales)} records")
-    
-    if scheme_sales.empty:
+    if actuals.empty:
         print("   ⚠️  No sales data found for main scheme in running period")
         tracker_df['actual_volume'] = 0.0
         tracker_df['actual_value'] = 0.0
         return tracker_df
     
-    # Aggregate actuals by credit account
-    actuals = scheme_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
     print(f"   📊 Aggregated actuals for {len(actuals)} accounts")
     print(f"      Total actual volume: {actuals['volume'].sum():,.2f}")
     print(f"      Total actual value: {actuals['value'].sum():,.2f}")
@@ -592,49 +594,34 @@ def _calculate_additional_scheme_actuals_vectorized(tracker_df, structured_data,
         tracker_df[f'actual_value{prefix}'] = 0.0
         return tracker_df
     
-    # Filter sales data for scheme period and additional scheme materials
-    # Ensure sale_date is datetime
-    if 'sale_date' in sales_df.columns:
-        sales_df['sale_date'] = pd.to_datetime(sales_df['sale_date'])
-    
-    scheme_sales = sales_df[
-        (sales_df['material'].isin(additional_materials)) &
-        (sales_df['sale_date'] >= scheme_start) &
-        (sales_df['sale_date'] <= scheme_end)
-    ]
+    # Product set as an indicator over the shared account x material matrix
+    actuals = get_sales_matrix(sales_df).product_actuals(additional_materials, scheme_start, scheme_end).drop(columns=['material_count'])
     
-    print(f"   📊 Additional scheme {scheme_index} sales data: {len(scheme_sales)} records")
+    print(f"   📊 Additional scheme {scheme_index} sales data: {len(actuals)} accounts")
     
-    if scheme_sales.empty:
+    if actuals.empty:
         print(f"   ⚠️  No sales data found for additional scheme {scheme_index} in running period")
         tracker_df[f'actual_volume{prefix}'] = 0.0
         tracker_df[f'actual_value{prefix}'] = 0.0
         return tracker_df
     
-    # Aggregate actuals by credit account
-    actuals = scheme_sales.groupby('credit_account').agg({
-        'volume': 'sum',
-        'value': 'sum'
-    }).reset_index()
-    
     print(f"   📊 Aggregated actuals for {len(actuals)} accounts")
     print(f"      Total actual volume: {actuals['volume'].sum():,.2f}")
     print(f"      Total actual value: {actuals['value'].sum():,.2f}")
     
     # Merge with tracker_df using vectorized operations
     actuals['credit_account'] = actuals['credit_account'].astype(str)
-    tracker_df['credit_account_str'] = tracker_df['credit_account'].astype(str)
+    # Local key series: additional schemes run in parallel threads on the same tracker_df,
+    # so a shared temporary column could be dropped by another scheme mid-lookup
+    account_keys = tracker_df['credit_account'].astype(str)
     
     # Create lookup dictionaries
     volume_lookup = dict(zip(actuals['credit_account'], actuals['volume']))
     value_lookup = dict(zip(actuals['credit_account'], actuals['value']))
     
     # Vectorized mapping with explicit float conversion
-    tracker_df[f'actual_volume{prefix}'] = tracker_df['credit_account_str'].map(volume_lookup).fillna(0.0).astype(float)
-    tracker_df[f'actual_value{prefix}'] = tracker_df['credit_account_str'].map(value_lookup).fillna(0.0).astype(float)
-    
-    # Clean up temporary column
-    tracker_df.drop('credit_account_str', axis=1, inplace=True)
+    tracker_df[f'actual_volume{prefix}'] = account_keys.map(volume_lookup).fillna(0.0).astype(float)
+    tracker_df[f'actual_value{prefix}'] = account_keys.map(value_lookup).fillna(0.0).astype(float)
     
     print(f"✅ Additional scheme {scheme_index} actuals calculated for {len(actuals)} accounts")
     return tracker_df
@@ -696,7 +683,7 @@ def handle_new_credit_accounts_vectorized(tracker_df, sales_df, structured_data,
     
     # Get all accounts from scheme period sales
     # Ensure sale_date is datetime
-    if 'sale_date' in sales_df.columns:
+    if 'sale_date' in sales_df.columns and not pd.api.types.is_datetime64_any_dtype(sales_df['sale_date']):
         sales_df['sale_date'] = pd.to_datetime(sales_df['sale_date'])
     
     # 🔧 DYNAMIC DATE EXTRACTION: Get scheme period dates dynamically
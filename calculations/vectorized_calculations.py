@@ -16,6 +16,9 @@ import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
+from sales_frame import typed_sales_frame
+from .product_resolver import product_selection, product_mask
+
 def calculate_base_and_scheme_metrics_vectorized(sales_df: pd.DataFrame, scheme_config: Dict[str, Any], 
                                                json_data: Dict[str, Any] = None, structured_data: Dict = None) -> pd.DataFrame:
     """
@@ -132,6 +135,9 @@ def _prepare_sales_data_vectorized(sales_df: pd.DataFrame) -> pd.DataFrame:
     
     print("📋 Preparing data with vectorization...")
     
+    # Frames from SalesFrame already have str accounts and datetime64 dates
+    typed = typed_sales_frame(sales_df) is not None
+    
     # Create copy and ensure required columns
     sales_clean = sales_df.copy()
     
@@ -142,8 +148,10 @@ def _prepare_sales_data_vectorized(sales_df: pd.DataFrame) -> pd.DataFrame:
         sales_clean['so_name'] = sales_clean['area_head_name']
     
     # Vectorized data type conversions
-    sales_clean['credit_account'] = sales_clean['credit_account'].astype(str)
-    sales_clean['sale_date'] = pd.to_datetime(sales_clean['sale_date'])
+    if not typed or sales_clean['credit_account'].isna().any():
+        sales_clean['credit_account'] = sales_clean['credit_account'].astype(str)
+    if not typed:
+        sales_clean['sale_date'] = pd.to_datetime(sales_clean['sale_date'])
     
     # Vectorized null handling
     numeric_cols = ['volume', 'value']
@@ -178,15 +186,11 @@ def _get_all_scheme_configured_accounts(json_data: Dict = None, sales_df: pd.Dat
     
     # Filter by product materials if they exist
     product_data = main_scheme.get('productData', {})
-    product_materials = set()
-    for product_type in ['grps', 'skus', 'materials', 'categories', 'otherGroups', 
-                        'wandaGroups', 'productNames', 'thinnerGroups']:
-        if product_type in product_data:
-            product_materials.update(product_data[product_type])
+    product_materials = product_selection(product_data)
     
     if product_materials and sales_df is not None:
         # Get accounts that have ANY sales (historical or current) with product materials
-        material_mask = sales_df['material'].isin(product_materials)
+        material_mask = product_mask(sales_df, product_materials)
         product_accounts = set(sales_df[material_mask]['credit_account'].astype(str).tolist())
         
         # Keep only configured accounts that have product relevance
@@ -217,14 +221,10 @@ def _get_product_filtered_accounts_vectorized(sales_df: pd.DataFrame, json_data:
     main_scheme = json_data.get('mainScheme', {})
     product_data = main_scheme.get('productData', {})
     
-    product_materials = set()
-    for product_type in ['grps', 'skus', 'materials', 'categories', 'otherGroups', 
-                        'wandaGroups', 'productNames', 'thinnerGroups']:
-        if product_type in product_data:
-            product_materials.update(product_data[product_type])
+    product_materials = product_selection(product_data)
     
     # Vectorized filtering
-    material_mask = sales_df['material'].isin(product_materials)
+    material_mask = product_mask(sales_df, product_materials)
     filtered_accounts = sorted(sales_df[material_mask]['credit_account'].unique().tolist())
     
     print(f"   📋 Product materials: {len(product_materials):,}")
@@ -246,15 +246,11 @@ def _calculate_main_scheme_vectorized(sales_df: pd.DataFrame, base_periods: List
     main_scheme = json_data.get('mainScheme', {}) if json_data else {}
     product_data = main_scheme.get('productData', {})
     
-    product_materials = set()
-    for product_type in ['grps', 'skus', 'materials', 'categories', 'otherGroups', 
-                        'wandaGroups', 'productNames', 'thinnerGroups']:
-        if product_type in product_data:
-            product_materials.update(product_data[product_type])
+    product_materials = product_selection(product_data)
     
     # Filter sales by product materials
     if product_materials:
-        material_mask = sales_df['material'].isin(product_materials)
+        material_mask = product_mask(sales_df, product_materials)
         relevant_sales = sales_df[material_mask].copy()
     else:
         relevant_sales = sales_df.copy()
@@ -539,12 +535,7 @@ def _calculate_additional_scheme_vectorized(sales_df: pd.DataFrame, base_periods
     # Get additional scheme product materials
     # Additional schemes store product data directly under 'productData', not 'productData.mainScheme'
     add_product_data = add_scheme.get('productData', {})
-    add_product_materials = set()
-    
-    for product_type in ['grps', 'skus', 'materials', 'categories', 'otherGroups', 
-                        'wandaGroups', 'productNames', 'thinnerGroups']:
-        if product_type in add_product_data:
-            add_product_materials.update(add_product_data[product_type])
+    add_product_materials = product_selection(add_product_data)
     
     if not add_product_materials:
         print(f"   ⚠️ No products for additional scheme {scheme_num}")
@@ -553,7 +544,7 @@ def _calculate_additional_scheme_vectorized(sales_df: pd.DataFrame, base_periods
     print(f"   📋 Additional scheme {scheme_num} has {len(add_product_materials)} product materials")
     
     # Vectorized filtering by additional scheme products
-    material_mask = sales_df['material'].isin(add_product_materials)
+    material_mask = product_mask(sales_df, add_product_materials)
     scheme_sales = sales_df[material_mask].copy()
     
     print(f"   📊 Sales records for additional scheme {scheme_num} products: {len(scheme_sales)}")
@@ -0,0 +1,498 @@
+"""
+Pluggable data source for everything that goes through DatabaseManager
+
+DATA_SOURCE_MODE selects the backend behind DatabaseManager.getconn():
+
+- live:   plain pooled Postgres connections (default)
+- record: live connections whose query results are also captured as
+          compressed columnar snapshots (.npz + JSON sidecar) in DATA_SOURCE_DIR
+- replay: no database at all; queries are answered from the snapshots with
+          zero, recorded or scaled latency (DATA_SOURCE_REPLAY_LATENCY)
+
+Snapshots are keyed by the whitespace-normalised SQL plus its parameters, so
+JSONFetcher, SalesFetcher, MaterialFetcher, the material cache and the
+tracker runner replay deterministically. The sales snapshot cache is bypassed
+outside live mode so the same queries are issued on record and replay.
+
+    DATA_SOURCE_MODE=record python main.py      # capture an incident
+    DATA_SOURCE_MODE=replay python main.py      # reproduce it offline
+    python data_source.py list                  # inspect captured queries
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+from decimal import Decimal
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from sales_cache import _encode_column, _decode_column
+
+DATA_SOURCE_MODE = os.getenv("DATA_SOURCE_MODE", "live").lower()
+DATA_SOURCE_DIR = os.getenv("DATA_SOURCE_DIR", "data_snapshots")
+# zero | recorded | <factor> (e.g. 0.5 replays at half the recorded latency)
+DATA_SOURCE_REPLAY_LATENCY = os.getenv("DATA_SOURCE_REPLAY_LATENCY", "zero").lower()
+
+SNAPSHOT_FORMAT_VERSION = 1
+WRITE_STATEMENTS = ("insert", "update", "delete", "create", "alter", "drop", "truncate",
+                    "copy", "set", "begin", "commit", "rollback", "grant", "vacuum", "analyze")
+
+
+class ReplayMissError(LookupError):
+    """A query was issued in replay mode that was never recorded"""
+
+
+def normalize_sql(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode()
+    return re.sub(r"\s+", " ", str(sql)).strip()
+
+
+def query_key(sql, params=None):
+    """Stable snapshot key for a statement and its parameters"""
+    payload = json.dumps([normalize_sql(sql), params], default=str, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _is_write(sql):
+    return normalize_sql(sql).split(" ", 1)[0].lower() in WRITE_STATEMENTS
+
+
+# ---------------------------------------------------------------------------
+# Snapshot encoding: one compressed column set per query result
+# ---------------------------------------------------------------------------
+
+def _is_bool(value):
+    return isinstance(value, (bool, np.bool_))
+
+
+def _is_int(value):
+    return isinstance(value, (int, np.integer)) and not _is_bool(value)
+
+
+def _python_type(values):
+    non_null = [v for v in values if v is not None]
+    if not non_null:
+        return 'none'
+    # Integer and boolean columns keep their dtype (numpy scalars included)
+    if all(_is_bool(v) for v in non_null):
+        return 'bool'
+    if all(_is_int(v) for v in non_null):
+        return 'int'
+    types = {type(v) for v in non_null}
+    if len(types) > 1:
+        numbers = [v for v in non_null if isinstance(v, (float, Decimal, np.floating)) or _is_int(v)]
+        if len(numbers) < len(non_null) or not any(isinstance(v, Decimal) for v in numbers):
+            # Mixed columns (numbers and strings, or ints and floats) would be coerced by the columnar encoding
+            return 'json'
+    sample = non_null[0]
+    if isinstance(sample, (dict, list)):
+        return 'json'
+    if isinstance(sample, datetime):
+        return 'datetime'
+    if isinstance(sample, date):
+        return 'date'
+    return type(sample).__name__
+
+
+def _json_value(value):
+    # numpy scalars in pipeline output
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _encode_exact_column(values, pytype):
+    """int64 / bool values for integer and boolean columns (None -> 0, masked by nulls), or None on int64 overflow"""
+    dtype = np.bool_ if pytype == 'bool' else np.int64
+    try:
+        array = np.array([0 if v is None else v for v in values], dtype=dtype)
+    except OverflowError:
+        return None
+    return 'numeric', {'values': array}, {}
+
+
+def _restore_exact_column(series, pytype):
+    """Snapshots written before ints/bools kept their dtype stored them as float64"""
+    filled = series.fillna(0)
+    if pytype == 'bool':
+        return filled.astype(bool)
+    if (filled % 1 == 0).all():
+        return filled.astype(np.int64)
+    return series
+
+
+def encode_rows(columns, rows):
+    """(arrays, columns_meta) for np.savez_compressed"""
+    arrays = {}
+    columns_meta = []
+    for i, name in enumerate(columns):
+        values = [row[i] for row in rows]
+        nulls = np.array([v is None for v in values], dtype=bool)
+        pytype = _python_type(values)
+        stem = f"c{i:03d}"
+        encoded = _encode_exact_column(values, pytype) if pytype in ('int', 'bool') else None
+        if encoded is not None:
+            kind, column_arrays, meta = encoded
+        elif pytype == 'json' or pytype == 'int':
+            # Mixed columns and integers beyond int64 round-trip through JSON
+            pytype = 'json'
+            kind, column_arrays, meta = 'json', {'values': np.array([json.dumps(v, default=_json_value) for v in values], dtype=str)}, {}
+        elif pytype == 'none':
+            kind, column_arrays, meta = 'none', {}, {}
+        else:
+            kind, column_arrays, meta = _encode_column(pd.Series(values, dtype=object))
+        for array_name, array in column_arrays.items():
+            arrays[f"{stem}.{array_name}"] = array
+        arrays[f"{stem}.nulls"] = nulls
+        columns_meta.append({'name': name, 'file': stem, 'kind': kind, 'pytype': pytype,
+                             'arrays': list(column_arrays), 'meta': meta})
+    return arrays, columns_meta
+
+
+def decode_rows(archive, columns_meta, row_count):
+    """Rebuild psycopg2-style row tuples (Decimal comes back as float; int and bool keep their type)"""
+    columns = []
+    for column in columns_meta:
+        stem, kind, pytype = column['file'], column['kind'], column['pytype']
+        nulls = archive[f"{stem}.nulls"]
+        if kind == 'none':
+            values = [None] * row_count
+        elif kind == 'json':
+            values = [json.loads(v) for v in archive[f"{stem}.values"].tolist()]
+        else:
+            arrays = {name: archive[f"{stem}.{name}"] for name in column['arrays']}
+            series = _decode_column(kind, arrays, column['meta'])
+            if kind == 'datetime':
+                values = [None if pd.isna(ts) else ts.date() if pytype == 'date' else ts.to_pydatetime()
+                          for ts in series]
+            else:
+                if pytype in ('int', 'bool') and series.dtype.kind == 'f':
+                    series = _restore_exact_column(series, pytype)
+                values = series.astype(object).tolist()
+        if nulls.any():
+            values = [None if is_null else value for value, is_null in zip(values, nulls.tolist())]
+        columns.append(values)
+    return list(zip(*columns)) if columns else [() for _ in range(row_count)]
+
+
+# ---------------------------------------------------------------------------
+# Snapshot store
+# ---------------------------------------------------------------------------
+
+class SnapshotStore:
+    """Directory of recorded query results"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or DATA_SOURCE_DIR
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return f"{base}.json", f"{base}.npz"
+
+    def save(self, key, sql, params, description, rows, rowcount, elapsed):
+        meta_path, data_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'sql': normalize_sql(sql),
+            'params': json.loads(json.dumps(params, default=str)),
+            'elapsed_seconds': elapsed,
+            'rowcount': rowcount,
+            'recorded_at': time.time(),
+            'has_result': description is not None,
+            'rows': len(rows) if rows is not None else 0,
+            'description': [[d[0], d[1]] for d in description] if description is not None else None,
+        }
+        suffix = f".tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        if description is not None:
+            arrays, meta['columns'] = encode_rows([d[0] for d in description], rows)
+            with open(data_path + suffix, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(data_path + suffix, data_path)
+        with open(meta_path + suffix, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + suffix, meta_path)
+
+    def load(self, key):
+        """(meta, rows) for a recorded query, or None"""
+        meta_path, data_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        rows = None
+        if meta['has_result']:
+            with np.load(data_path, allow_pickle=False) as archive:
+                rows = decode_rows(archive, meta['columns'], meta['rows'])
+        return meta, rows
+
+    def iter_meta(self):
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in sorted(files):
+                if name.endswith(".json"):
+                    with open(os.path.join(root, name), encoding="utf-8") as f:
+                        yield name[:-5], json.load(f)
+
+
+# ---------------------------------------------------------------------------
+# Cursor / connection proxies
+# ---------------------------------------------------------------------------
+
+class _BufferedCursor:
+    """Serves fetch* from a fully materialised result"""
+
+    def __init__(self):
+        self.description = None
+        self.rowcount = -1
+        self._rows = []
+        self._pos = 0
+        self.closed = False
+
+    def _set_result(self, description, rows, rowcount):
+        self.description = description
+        self._rows = rows or []
+        self._pos = 0
+        self.rowcount = rowcount
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        row = self._rows[self._pos]
+        self._pos += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = size or 1
+        rows = self._rows[self._pos:self._pos + size]
+        self._pos += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._rows[self._pos:]
+        self._pos = len(self._rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class RecordingCursor(_BufferedCursor):
+    """Runs statements on a live cursor and snapshots their results"""
+
+    def __init__(self, cursor, store):
+        super().__init__()
+        self._cursor = cursor
+        self._store = store
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        self._cursor.execute(sql, params)
+        description = self._cursor.description
+        rows = self._cursor.fetchall() if description is not None else None
+        elapsed = time.perf_counter() - start
+        self._set_result(description, rows, self._cursor.rowcount)
+        try:
+            self._store.save(query_key(sql, params), sql, params, description, rows, self._cursor.rowcount, elapsed)
+        except Exception as e:
+            print(f"⚠️ Could not record query snapshot: {e}")
+
+    def executemany(self, sql, params_seq):
+        self._cursor.executemany(sql, params_seq)
+        self._set_result(None, None, self._cursor.rowcount)
+
+    def copy_expert(self, sql, file, *args, **kwargs):
+        return self._cursor.copy_expert(sql, file, *args, **kwargs)
+
+    def close(self):
+        super().close()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ReplayCursor(_BufferedCursor):
+    """Answers statements from recorded snapshots"""
+
+    def __init__(self, source):
+        super().__init__()
+        self._source = source
+
+    def execute(self, sql, params=None):
+        snapshot = self._source.store.load(query_key(sql, params))
+        if snapshot is None:
+            if _is_write(sql):
+                # Side effects are discarded during replay
+                self._set_result(None, None, 0)
+                return
+            raise ReplayMissError(f"No recorded snapshot for query: {normalize_sql(sql)[:200]}")
+
+        meta, rows = snapshot
+        self._source.sleep(meta['elapsed_seconds'])
+        description = [tuple(d) + (None, None, None, None, None) for d in meta['description']] if meta['has_result'] else None
+        self._set_result(description, rows, meta['rowcount'])
+
+    def executemany(self, sql, params_seq):
+        self._set_result(None, None, 0)
+
+    def copy_expert(self, sql, file, *args, **kwargs):
+        return None
+
+    def mogrify(self, sql, params=None):
+        return normalize_sql(sql).encode()
+
+
+class RecordingConnection:
+    """Live connection wrapper whose cursors record their results"""
+
+    def __init__(self, conn, store):
+        self._conn = conn
+        self._store = store
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._conn.cursor(*args, **kwargs), self._store)
+
+    def unwrap(self):
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class ReplayConnection:
+    """Stand-in connection for replay mode (no database behind it)"""
+
+    closed = 0
+    autocommit = False
+
+    def __init__(self, source):
+        self._source = source
+
+    def cursor(self, *args, **kwargs):
+        return ReplayCursor(self._source)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Data source
+# ---------------------------------------------------------------------------
+
+class DataSource:
+    """Selects live / record / replay behaviour for DatabaseManager connections"""
+
+    def __init__(self, mode=None, directory=None, replay_latency=None):
+        self.mode = (mode or DATA_SOURCE_MODE).lower()
+        if self.mode not in ('live', 'record', 'replay'):
+            raise ValueError(f"Unknown DATA_SOURCE_MODE '{self.mode}' (live, record, replay)")
+        self.store = SnapshotStore(directory)
+        latency = (replay_latency or DATA_SOURCE_REPLAY_LATENCY).lower()
+        if latency == 'zero':
+            self.latency_factor = 0.0
+        elif latency == 'recorded':
+            self.latency_factor = 1.0
+        else:
+            self.latency_factor = float(latency)
+
+    @property
+    def is_live(self):
+        return self.mode == 'live'
+
+    @property
+    def needs_database(self):
+        return self.mode != 'replay'
+
+    def sleep(self, recorded_seconds):
+        if self.latency_factor and recorded_seconds:
+            time.sleep(recorded_seconds * self.latency_factor)
+
+    def wrap(self, conn):
+        """Connection handed to callers of DatabaseManager.getconn()"""
+        if self.mode == 'record':
+            return RecordingConnection(conn, self.store)
+        return conn
+
+    def replay_connection(self):
+        return ReplayConnection(self)
+
+    @staticmethod
+    def unwrap(conn):
+        """Live connection to return to the pool, or None for replay connections"""
+        if isinstance(conn, ReplayConnection):
+            return None
+        if isinstance(conn, RecordingConnection):
+            return conn.unwrap()
+        return conn
+
+
+_data_source = None
+_data_source_lock = threading.Lock()
+
+
+def get_data_source():
+    """Process-wide data source (DATA_SOURCE_MODE)"""
+    global _data_source
+    with _data_source_lock:
+        if _data_source is None:
+            _data_source = DataSource()
+            if not _data_source.is_live:
+                print(f"🎞️ Data source: {_data_source.mode} ({_data_source.store.directory})")
+        return _data_source
+
+
+def configure_data_source(mode=None, directory=None, replay_latency=None):
+    """Switch the process-wide data source (e.g. replay inside a profiling script)"""
+    global _data_source
+    with _data_source_lock:
+        _data_source = DataSource(mode, directory, replay_latency)
+        return _data_source
+
+
+if __name__ == "__main__":
+    import sys
+    import shutil
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    store = SnapshotStore(sys.argv[2] if len(sys.argv) > 2 else None)
+    if command == "list":
+        total_rows = 0
+        for key, meta in store.iter_meta():
+            total_rows += meta['rows']
+            print(f"{key[:12]}  {meta['rows']:>9} rows  {meta['elapsed_seconds']:>8.3f}s  {meta['sql'][:100]}")
+        print(f"📼 {total_rows} rows recorded in {store.directory}")
+    elif command == "clear":
+        shutil.rmtree(store.directory, ignore_errors=True)
+        print(f"🗑️ Cleared {store.directory}")
+    else:
+        print("Usage: python data_source.py [list|clear] [directory]")
@@ -3,28 +3,50 @@ FastAPI Application for Costing Sheet API
 Uses the SchemeProcessor from astra-main for complete calculation functionality
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 import logging
+import asyncio
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 import sys
 import os
 
 # Import the SchemeProcessor from main.py
 from main import SchemeProcessor
+from process_executor import get_calculation_executor, run_scheme_pipeline
+from result_store import load_costing_result
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the job queue workers so queued jobs resume after a restart or deploy"""
+    try:
+        from job_queue import get_job_queue
+        await asyncio.to_thread(get_job_queue().start)
+    except Exception as e:
+        logger.warning(f"Job queue workers not started: {e}")
+
+    yield
+
+    try:
+        from job_queue import get_job_queue
+        await asyncio.to_thread(get_job_queue().stop, 5)
+    except Exception as e:
+        logger.error(f"Error stopping job queue workers: {e}")
+
 # Create FastAPI app
 app = FastAPI(
     title="Costing Sheet API",
     description="High-performance costing sheet calculations using SchemeProcessor",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -36,9 +58,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Asynchronous job API (POST /jobs, GET /jobs/{job_id})
+try:
+    from app.routers import jobs
+    app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+except Exception as e:
+    logger.warning(f"Could not include jobs router: {e}")
+
 # Pydantic models
 class CostingRequest(BaseModel):
     scheme_id: str
+    debug: bool = False  # include per-stage pipeline metrics in the response
+    refresh: bool = False  # recompute even when a current stored result exists
 
 class CostingResponse(BaseModel):
     success: bool
@@ -48,6 +79,7 @@ class CostingResponse(BaseModel):
     execution_time_seconds: Optional[float] = None
     error_message: Optional[str] = None
     summary: Optional[Dict[str, Any]] = None
+    metrics: Optional[Dict[str, Any]] = None
 
 class ValidationResponse(BaseModel):
     success: bool
@@ -65,7 +97,9 @@ async def root():
             "calculate": "POST /calculate",
             "validate": "GET /validate/{scheme_id}",
             "summary": "GET /summary/{scheme_id}",
-            "health": "GET /health"
+            "results": "GET /results/{scheme_id}",
+            "health": "GET /health",
+            "jobs": "POST /jobs, GET /jobs/{job_id}"
         }
     }
 
@@ -90,44 +124,52 @@ async def calculate_costing_sheet(request: CostingRequest):
     try:
         logger.info(f"Starting costing calculation for scheme_id: {request.scheme_id}")
         
-        # Initialize SchemeProcessor
-        processor = SchemeProcessor()
-        
-        # Process the scheme (this runs all calculations)
-        success = processor.process_scheme(request.scheme_id)
-        
-        if not success:
+        # Serve the stored result while the scheme and sales data are unchanged
+        stored = None if request.refresh else await asyncio.to_thread(load_costing_result, request.scheme_id)
+        if stored is not None:
+            result_data = await asyncio.to_thread(stored.result_data)
+            execution_time = time.time() - start_time
+            logger.info(f"Served stored costing result for scheme_id {request.scheme_id} in {execution_time:.3f}s")
             return CostingResponse(
-                success=False,
-                message="Scheme processing failed",
+                success=True,
+                message="Costing result served from store",
                 scheme_id=request.scheme_id,
-                error_message="SchemeProcessor returned failure status"
+                data=result_data,
+                execution_time_seconds=execution_time,
+                summary={
+                    "execution_time_seconds": execution_time,
+                    "total_records": result_data['summary']['total_records'],
+                    "total_columns": result_data['summary']['total_columns'],
+                    "sales_records": stored.meta.get('sales_records'),
+                    "material_records": stored.meta.get('material_records'),
+                    "calculation_summary": stored.meta.get('calculation_summary'),
+                    "stored_result": stored.describe()
+                }
             )
         
-        # Get calculation results as JSON
-        result_data = processor.get_calculation_results_json(request.scheme_id)
+        # Run the SchemeProcessor pipeline in a worker process (thread when
+        # CALC_PROCESS_WORKERS=0); only the JSON-ready payload comes back
+        pipeline = await get_calculation_executor().run(run_scheme_pipeline, request.scheme_id)
         
-        if not result_data:
+        if not pipeline['success']:
             return CostingResponse(
                 success=False,
-                message="No calculation results available",
+                message=pipeline['message'],
                 scheme_id=request.scheme_id,
-                error_message="get_calculation_results_json returned None"
+                error_message=pipeline['error_message'],
+                metrics=pipeline.get('pipeline_metrics') if request.debug else None
             )
         
+        result_data = pipeline['result_data']
         execution_time = time.time() - start_time
         
-        # Get additional summary data
-        stored_data = processor.get_stored_data()
-        calc_summary = processor.get_calculation_summary()
-        
         summary = {
             "execution_time_seconds": execution_time,
             "total_records": result_data['summary']['total_records'],
             "total_columns": result_data['summary']['total_columns'],
-            "sales_records": len(stored_data.get('combined_sales_data', [])),
-            "material_records": len(stored_data.get('material_master_data', [])),
-            "calculation_summary": calc_summary
+            "sales_records": pipeline['sales_records'],
+            "material_records": pipeline['material_records'],
+            "calculation_summary": pipeline['calculation_summary']
         }
         
         logger.info(f"Costing calculation completed successfully in {execution_time:.2f}s")
@@ -138,7 +180,8 @@ async def calculate_costing_sheet(request: CostingRequest):
             scheme_id=request.scheme_id,
             data=result_data,
             execution_time_seconds=execution_time,
-            summary=summary
+            summary=summary,
+            metrics=pipeline.get('pipeline_metrics') if request.debug else None
         )
         
     except Exception as e:
@@ -173,11 +216,13 @@ async def validate_scheme(scheme_id: str):
             )
         
         # For now, return basic validation
+        stored = await asyncio.to_thread(load_costing_result, scheme_id)
         validation_details = {
             "scheme_id": scheme_id,
             "is_numeric": scheme_id.isdigit(),
             "length": len(scheme_id),
-            "validation_timestamp": datetime.now().isoformat()
+            "validation_timestamp": datetime.now().isoformat(),
+            "stored_result": stored.describe() if stored is not None else None
         }
         
         return ValidationResponse(
@@ -207,6 +252,16 @@ async def get_scheme_summary(scheme_id: str):
     try:
         logger.info(f"Getting summary for scheme: {scheme_id}")
         
+        # Totals computed from the stored result columns when one is current
+        stored = await asyncio.to_thread(load_costing_result, scheme_id)
+        if stored is not None:
+            return CostingResponse(
+                success=True,
+                message="Summary computed from stored result",
+                scheme_id=scheme_id,
+                data=await asyncio.to_thread(stored.summary)
+            )
+        
         summary_data = {
             "scheme_id": scheme_id,
             "summary_timestamp": datetime.now().isoformat(),
@@ -250,6 +305,28 @@ async def get_scheme_summary(scheme_id: str):
             error_message=error_msg
         )
 
+# Re-download a stored result
+@app.get("/results/{scheme_id}", response_model=CostingResponse)
+async def get_stored_results(scheme_id: str, columns: Optional[str] = Query(None, description="comma separated column subset")):
+    """
+    Return the stored costing result for the scheme's current version (no recalculation)
+    """
+    start_time = time.time()
+    stored = await asyncio.to_thread(load_costing_result, scheme_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No current stored result for scheme {scheme_id}; run POST /calculate")
+    
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    result_data = await asyncio.to_thread(stored.result_data, selected)
+    return CostingResponse(
+        success=True,
+        message="Stored costing result retrieved",
+        scheme_id=scheme_id,
+        data=result_data,
+        execution_time_seconds=time.time() - start_time,
+        summary={"stored_result": stored.describe()}
+    )
+
 # Test endpoint
 @app.get("/test")
 async def test_api():
@@ -0,0 +1,92 @@
+"""
+Per-DataFrame caches for derived structures
+
+The calculation stages pass the same frame objects around, so structures
+derived from a frame (sales matrix, material index, typed SalesFrame,
+scheme product sets) are kept per frame object: keyed by id(), dropped by a
+weakref callback when the frame is collected, and only reused while the
+frame still looks the same.
+
+"The same" means the same row count and, for each watched column, the same
+backing data. Reassigning a watched column (sales_df['sale_date'] = ...)
+replaces its data and invalidates the entry. The entry also holds the
+watched columns, so under pandas copy-on-write an in-place edit
+(df.loc[i, col] = x) copies the data and invalidates it too. Without
+copy-on-write (pandas < 3 by default) in-place edits of a watched column are
+not detected; call forget(frame) after editing a cached frame in place.
+"""
+
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+
+def _same_data(current, held):
+    """True when two column objects share their backing data"""
+    if current.dtype != held.dtype:
+        return False
+    if isinstance(current.dtype, pd.DatetimeTZDtype):
+        return current.array.asi8.__array_interface__['data'][0] == held.array.asi8.__array_interface__['data'][0]
+    if isinstance(current.dtype, np.dtype):
+        return (current.to_numpy(copy=False).__array_interface__['data'][0]
+                == held.to_numpy(copy=False).__array_interface__['data'][0])
+    # Extension columns (string, categorical, nullable) hand out the same array object until replaced
+    return current.array is held.array
+
+
+class FrameCache:
+    """One derived value per live DataFrame, invalidated when its watched columns change"""
+
+    def __init__(self, columns=()):
+        self.columns = tuple(columns)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self, frame):
+        # Holding the column objects keeps copy-on-write from editing their buffers in place
+        return {name: frame[name] for name in self.columns if name in frame.columns}
+
+    def _matches(self, entry, frame):
+        ref, _, rows, columns = entry
+        if ref() is not frame or rows != len(frame):
+            return False
+        present = [name for name in self.columns if name in frame.columns]
+        if present != list(columns):
+            return False
+        return all(_same_data(frame[name], column) for name, column in columns.items())
+
+    def lookup(self, frame):
+        """Cached value for frame, or None (never stored, collected, or changed since)"""
+        if frame is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(id(frame))
+        if entry is None or not self._matches(entry, frame):
+            return None
+        return entry[1]
+
+    def put(self, frame, value):
+        key = id(frame)
+        entry = (weakref.ref(frame, lambda _, key=key: self._entries.pop(key, None)),
+                 value, len(frame), self._snapshot(frame))
+        with self._lock:
+            self._entries[key] = entry
+        return value
+
+    def get(self, frame, build):
+        """Cached value for frame, building it with build(frame) on a miss (first stored value wins)"""
+        value = self.lookup(frame)
+        if value is not None:
+            return value
+        value = build(frame)
+        with self._lock:
+            entry = self._entries.get(id(frame))
+        if entry is not None and self._matches(entry, frame):
+            return entry[1]
+        return self.put(frame, value)
+
+    def forget(self, frame):
+        with self._lock:
+            self._entries.pop(id(frame), None)
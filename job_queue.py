@@ -0,0 +1,331 @@
+"""
+Persistent job queue for long costing and tracker runs
+
+Jobs live in the calculation_jobs table, so queued work survives restarts
+and deploys. A bounded pool of worker threads claims jobs with
+FOR UPDATE SKIP LOCKED (safe with several API processes or standalone
+workers), heartbeats while running, and stores the JSON result or error on
+the job row. Jobs whose worker stopped heartbeating are re-queued until
+JOB_MAX_ATTEMPTS is reached.
+
+Both API apps start the workers in their lifespan (and stop them on
+shutdown), so jobs queued before a restart resume when the new process
+boots. Run `python job_queue.py` for a dedicated worker process (the fly.toml
+`worker` process group); set JOB_WORKERS=0 on API instances that should only
+enqueue.
+"""
+
+import os
+import time
+import uuid
+import socket
+import threading
+import traceback
+
+from app.database_psycopg2 import database_manager
+from tracker_json import encode_json
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+JOBS_TABLE = "calculation_jobs"
+
+JOBS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {JOBS_TABLE} (
+    job_id text PRIMARY KEY,
+    job_type text NOT NULL,
+    scheme_id text NOT NULL,
+    params jsonb NOT NULL DEFAULT '{{}}'::jsonb,
+    status text NOT NULL DEFAULT 'queued',
+    attempts integer NOT NULL DEFAULT 0,
+    worker_id text,
+    result jsonb,
+    error text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    started_at timestamptz,
+    heartbeat_at timestamptz,
+    finished_at timestamptz
+);
+CREATE INDEX IF NOT EXISTS idx_{JOBS_TABLE}_claim ON {JOBS_TABLE} (status, created_at);
+"""
+
+JOB_STATUS_COLUMNS = ("job_id", "job_type", "scheme_id", "params", "status", "attempts", "worker_id",
+                      "error", "created_at", "started_at", "heartbeat_at", "finished_at")
+
+
+# ---------------------------------------------------------------------------
+# Job handlers: job_type -> callable(scheme_id, params) returning a JSON-ready dict
+# ---------------------------------------------------------------------------
+
+def _run_costing_job(scheme_id, params):
+    """CostingSheetCalculator pipeline (app/routers/costing /calculate)"""
+    from process_executor import get_calculation_executor, run_costing_sheet
+
+    outcome = get_calculation_executor().call(run_costing_sheet, scheme_id)
+    validation = outcome['validation']
+    if not validation['is_valid']:
+        raise ValueError(f"Scheme validation failed: {', '.join(validation['errors'])}")
+
+    result = outcome['result']
+    if result.get('status') != 'success':
+        raise RuntimeError(result.get('error_message', 'Unknown error occurred'))
+    return result
+
+
+def _run_scheme_processor_job(scheme_id, params):
+    """SchemeProcessor pipeline (fastapi_app /calculate)"""
+    from process_executor import get_calculation_executor, run_scheme_pipeline
+    from result_store import load_costing_result
+
+    stored = None if params.get('refresh') or params.get('debug') else load_costing_result(scheme_id)
+    if stored is not None:
+        return stored.result_data()
+
+    pipeline = get_calculation_executor().call(run_scheme_pipeline, scheme_id)
+    if not pipeline['success']:
+        raise RuntimeError(pipeline['error_message'])
+    if params.get('debug'):
+        return dict(pipeline['result_data'], pipeline_metrics=pipeline.get('pipeline_metrics'))
+    return pipeline['result_data']
+
+
+def _run_tracker_job(scheme_id, params):
+    """Tracker run (app/routers/tracker /run-background)"""
+    import asyncio
+    from app.services.tracker_service import TrackerService
+
+    tracker_service = TrackerService()
+    result = asyncio.run(tracker_service._execute_tracker(scheme_id))
+    if not result.get('success'):
+        asyncio.run(tracker_service._mark_tracker_as_error(scheme_id, result.get('message', '')))
+        raise RuntimeError(result.get('message', 'Tracker run failed'))
+    return result
+
+
+JOB_HANDLERS = {
+    'costing': _run_costing_job,
+    'scheme_processor': _run_scheme_processor_job,
+    'tracker': _run_tracker_job,
+}
+
+
+def register_job_handler(job_type, handler):
+    """Register (or replace) the callable that runs jobs of job_type"""
+    JOB_HANDLERS[job_type] = handler
+
+
+# ---------------------------------------------------------------------------
+# Queue
+# ---------------------------------------------------------------------------
+
+class JobQueue:
+    """Postgres-backed job queue with a bounded in-process worker pool"""
+
+    def __init__(self, workers=None, db_manager=None):
+        self.workers = JOB_WORKERS if workers is None else workers
+        self.db_manager = db_manager or database_manager
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._threads = []
+        self._running_jobs = {}
+        self._running_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._table_ready = False
+        self._start_lock = threading.Lock()
+
+    def ensure_table(self):
+        """Create calculation_jobs once per process"""
+        if self._table_ready:
+            return
+        with self.db_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(JOBS_DDL)
+        self._table_ready = True
+
+    # -- API side --------------------------------------------------------
+
+    def submit(self, job_type, scheme_id, params=None):
+        """Persist a queued job and wake a worker; returns the job row"""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job_type '{job_type}'. Available: {', '.join(sorted(JOB_HANDLERS))}")
+
+        self.ensure_table()
+        job_id = uuid.uuid4().hex
+        with self.db_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    INSERT INTO {JOBS_TABLE} (job_id, job_type, scheme_id, params)
+                    VALUES (%s, %s, %s, %s::jsonb)
+                """, (job_id, job_type, str(scheme_id), encode_json(params or {})))
+
+        print(f"📥 Job {job_id} queued ({job_type}, scheme {scheme_id})")
+        self.start()
+        self._wake.set()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id, include_result=False):
+        """Job row as a dict (result only when include_result), or None"""
+        self.ensure_table()
+        columns = JOB_STATUS_COLUMNS + (("result",) if include_result else ())
+        with self.db_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {', '.join(columns)} FROM {JOBS_TABLE} WHERE job_id = %s", (job_id,))
+                row = cur.fetchone()
+        if row is None:
+            return None
+
+        job = dict(zip(columns, row))
+        for key in ("created_at", "started_at", "heartbeat_at", "finished_at"):
+            if job[key] is not None:
+                job[key] = job[key].isoformat()
+        return job
+
+    # -- Worker side -----------------------------------------------------
+
+    def start(self):
+        """Start the worker and heartbeat threads once (no-op when JOB_WORKERS=0)"""
+        if self.workers <= 0 or self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            self.ensure_table()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, args=(f"{self.worker_prefix}:{i}",),
+                                          name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            heartbeat.start()
+            self._threads.append(heartbeat)
+            print(f"🧵 Job queue started with {self.workers} workers")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def _claim(self, worker_id):
+        """Atomically take the oldest queued (or stale running) job"""
+        with self.db_manager.connection() as conn:
+            with conn.cursor() as cur:
+                # Jobs whose worker died past the retry budget are failed, not retried
+                cur.execute(f"""
+                    UPDATE {JOBS_TABLE}
+                    SET status = 'failed', finished_at = now(),
+                        error = coalesce(error, 'Worker stopped responding')
+                    WHERE status = 'running'
+                      AND heartbeat_at < now() - make_interval(secs => %s)
+                      AND attempts >= %s
+                """, (JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS))
+                cur.execute(f"""
+                    UPDATE {JOBS_TABLE} j
+                    SET status = 'running', attempts = j.attempts + 1, worker_id = %s,
+                        started_at = now(), heartbeat_at = now(), error = NULL
+                    WHERE j.job_id = (
+                        SELECT job_id FROM {JOBS_TABLE}
+                        WHERE status = 'queued'
+                           OR (status = 'running'
+                               AND heartbeat_at < now() - make_interval(secs => %s)
+                               AND attempts < %s)
+                        ORDER BY created_at
+                        FOR UPDATE SKIP LOCKED
+                        LIMIT 1
+                    )
+                    RETURNING j.job_id, j.job_type, j.scheme_id, j.params, j.attempts
+                """, (worker_id, JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS))
+                return cur.fetchone()
+
+    def _finish(self, job_id, worker_id, result=None, error=None):
+        with self.db_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE {JOBS_TABLE}
+                    SET status = %s, result = %s::jsonb, error = %s, finished_at = now()
+                    WHERE job_id = %s AND worker_id = %s
+                """, ('failed' if error else 'completed',
+                      None if result is None else encode_json(result), error, job_id, worker_id))
+
+    def _run_job(self, worker_id, job):
+        job_id, job_type, scheme_id, params, attempts = job
+        print(f"⚙️ Job {job_id} started ({job_type}, scheme {scheme_id}, attempt {attempts})")
+        with self._running_lock:
+            self._running_jobs[job_id] = worker_id
+
+        start_time = time.time()
+        try:
+            result = JOB_HANDLERS[job_type](scheme_id, params or {})
+            self._finish(job_id, worker_id, result=result)
+            print(f"✅ Job {job_id} completed in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                self._finish(job_id, worker_id, error=str(e))
+            except Exception as finish_error:
+                print(f"❌ Could not record failure of job {job_id}: {finish_error}")
+            print(f"❌ Job {job_id} failed after {time.time() - start_time:.2f}s: {e}")
+        finally:
+            with self._running_lock:
+                self._running_jobs.pop(job_id, None)
+
+    def _worker_loop(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                job = self._claim(worker_id)
+            except Exception as e:
+                print(f"⚠️ Job claim failed on {worker_id}: {e}")
+                job = None
+
+            if job is None:
+                self._wake.wait(JOB_POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self._run_job(worker_id, job)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(JOB_HEARTBEAT_INTERVAL):
+            with self._running_lock:
+                running = list(self._running_jobs.items())
+            if not running:
+                continue
+            try:
+                with self.db_manager.connection() as conn:
+                    with conn.cursor() as cur:
+                        for job_id, worker_id in running:
+                            cur.execute(f"""
+                                UPDATE {JOBS_TABLE} SET heartbeat_at = now()
+                                WHERE job_id = %s AND worker_id = %s AND status = 'running'
+                            """, (job_id, worker_id))
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Process-wide job queue (workers start in the API lifespan, on first submit, or via start())"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
+
+
+if __name__ == "__main__":
+    # Dedicated worker process: python job_queue.py
+    queue = JobQueue(workers=max(JOB_WORKERS, 1))
+    queue.start()
+    print("👷 Job worker running. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        queue.stop(timeout=5)
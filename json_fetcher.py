@@ -1,17 +1,22 @@
+import copy
 from datetime import datetime
-import psycopg2
-from supabaseconfig import SUPABASE_CONFIG
+from app.database_psycopg2 import database_manager
+from scheme_cache import get_parsed_scheme_cache
 
 class JSONFetcher:
     def __init__(self):
         self.scheme_json = None
         self.scheme_config = None
+        self.scheme_id = None
+        self.content_hash = None
+        self.scheme_cache = get_parsed_scheme_cache()
     
     def fetch_and_store_json(self, scheme_id):
         """Fetch JSON once and store in memory"""
-        query = "SELECT scheme_json FROM schemes_data WHERE scheme_id::TEXT = %s"
+        # md5 of scheme_json keys the parsed-scheme cache, so edits invalidate it
+        query = "SELECT scheme_json, md5(scheme_json::text) FROM schemes_data WHERE scheme_id::TEXT = %s"
         
-        with psycopg2.connect(**SUPABASE_CONFIG) as conn:
+        with database_manager.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(query, (scheme_id,))
                 result = cur.fetchone()
@@ -19,11 +24,23 @@ class JSONFetcher:
                 if not result:
                     raise ValueError(f"Scheme {scheme_id} not found")
                 
-                self.scheme_json = result[0]
-                self.scheme_config = self._parse_config(scheme_id)
-                
-                print(f"SUCCESS: JSON fetched and stored for scheme {scheme_id}")
-                return self.scheme_config
+                return self.store_json(scheme_id, result[0], result[1])
+    
+    def store_json(self, scheme_id, scheme_json, content_hash):
+        """Store an already-fetched scheme_json and parse its config (cached by content hash)"""
+        self.scheme_json = scheme_json
+        self.scheme_id = scheme_id
+        self.content_hash = content_hash
+        
+        cached_config = self.get_cached('scheme_config')
+        if cached_config is not None:
+            self.scheme_config = copy.deepcopy(cached_config)
+        else:
+            self.scheme_config = self._parse_config(scheme_id)
+            self.store_cached(scheme_config=copy.deepcopy(self.scheme_config))
+        
+        print(f"SUCCESS: JSON fetched and stored for scheme {scheme_id}")
+        return self.scheme_config
     
     def _parse_config(self, scheme_id):
         """Parse JSON WITHOUT any +1 day adjustment"""
@@ -74,6 +91,17 @@ class JSONFetcher:
             'has_double_base_period': len(base_periods) == 2
         }
     
+    def get_cached(self, field):
+        """Parsed artifact cached for the currently stored scheme_json, or None"""
+        if self.scheme_cache is None or self.content_hash is None:
+            return None
+        return self.scheme_cache.get(self.scheme_id, self.content_hash, field)
+
+    def store_cached(self, **fields):
+        """Cache parsed artifacts for the currently stored scheme_json"""
+        if self.scheme_cache is not None and self.content_hash is not None:
+            self.scheme_cache.update(self.scheme_id, self.content_hash, **fields)
+
     def get_stored_config(self):
         return self.scheme_config
     
@@ -6,6 +6,8 @@ from sales_fetcher import SalesFetcher
 from materialfetcher import MaterialFetcher
 from schemeapplicablefetcher import SchemeApplicableFetcher
 from store import SchemeDataExtractor, process_scheme_json
+from scheme_cache import copy_structured_data
+from pipeline_metrics import PipelineProfiler
 from calculations import calculate_base_and_scheme_metrics, calculate_growth_metrics_vectorized, calculate_all_targets_and_actuals
 
 class SchemeProcessor:
@@ -21,14 +23,17 @@ class SchemeProcessor:
         self.data_extractor = None  # For structured data storage
         self.structured_data = None  # Pandas DataFrames
         self.calculation_results = None  # Calculation results storage
+        self._profiler = PipelineProfiler(None, enabled=False)
+        self.pipeline_metrics = None  # Per-stage timings of the last process_scheme run
 
     def process_scheme(self, scheme_id):
         print(f"\nProcessing Scheme: {scheme_id}")
         print("=" * 50)
         
+        profiler = self._profiler = PipelineProfiler(scheme_id)
         try:
             # Step 1: Fetch scheme config
-            raw_config = self.json_fetcher.fetch_and_store_json(scheme_id)
+            raw_config = profiler.run('fetch_scheme_config', self.json_fetcher.fetch_and_store_json, scheme_id)
             if isinstance(raw_config, list) and len(raw_config) >= 1:
                 self.scheme_config = raw_config[0]
             else:
@@ -36,7 +41,7 @@ class SchemeProcessor:
 
             # Step 2: Extract filters
             self.scheme_applicable_fetcher = SchemeApplicableFetcher(self.json_fetcher.get_stored_json())
-            self.applicable_data = self.scheme_applicable_fetcher.fetch_scheme_applicable()
+            self.applicable_data = profiler.run('fetch_scheme_applicable', self.scheme_applicable_fetcher.fetch_scheme_applicable)
 
             filters = self.scheme_applicable_fetcher.get_all_filters_for_sql()
 
@@ -44,7 +49,7 @@ class SchemeProcessor:
             self._display_periods_safe()
 
             # Step 4: Fetch sales data for each period separately
-            self.sales_data = self.sales_fetcher.fetch_all_sales_with_filters(self.scheme_config, filters)
+            self.sales_data = profiler.run('fetch_sales', self.sales_fetcher.fetch_all_sales_with_filters, self.scheme_config, filters)
             
             print(f"\n📊 Data Fetching Summary:")
             print(f"   ✓ Base period 1 data: {len(self.sales_fetcher.get_base_period1_data() or [])} records")
@@ -54,12 +59,12 @@ class SchemeProcessor:
             print(f"   ✓ Total combined records: {len(self.sales_data)} records")
 
             # Step 5: Fetch material master and store in memory
-            self.materials_data = self.material_fetcher.fetch_all_material_master()
+            self.materials_data = profiler.run('fetch_material_master', self.material_fetcher.fetch_all_material_master)
             print(f"✓ Material master stored in memory")
 
             # Step 6: Extract and structure JSON data for efficient calculations
             print(f"\n📋 Extracting structured data from JSON...")
-            self._extract_structured_data()
+            profiler.run('extract_structured_data', self._extract_structured_data)
 
             # Step 7: Skip file saving (calculations happen in memory)
             print(f"\n💾 Skipping intermediate file saves (calculations in memory)...")
@@ -84,6 +89,7 @@ class SchemeProcessor:
             print(f"\n📊 Preparing calculation results for API response...")
             # Results are now available in self.calculation_results for API access
 
+            self.pipeline_metrics = profiler.finish(success=True)
             print(f"\nSUCCESS: All data processed and calculations completed!")
             return True  # Indicate successful processing
 
@@ -94,6 +100,7 @@ class SchemeProcessor:
             import traceback
             print(f"🔍 FULL TRACEBACK:")
             traceback.print_exc()
+            self.pipeline_metrics = profiler.finish(success=False)
             return False  # Indicate processing failed
 
     def _display_periods_safe(self):
@@ -131,8 +138,21 @@ class SchemeProcessor:
                 # Initialize the data extractor
                 self.data_extractor = SchemeDataExtractor()
                 
-                # Extract all structured data and keep in memory
-                self.structured_data = self.data_extractor.extract_all_data(raw_json)
+                # Reuse DataFrames parsed from this exact scheme_json by an earlier request
+                cached_structured = self.json_fetcher.get_cached('structured_data')
+                if cached_structured is not None:
+                    print(f"   ♻️ Structured data served from parsed-scheme cache")
+                    self.structured_data = copy_structured_data(cached_structured)
+                    self.data_extractor.products_df = self.structured_data['products']
+                    self.data_extractor.slabs_df = self.structured_data['slabs']
+                    self.data_extractor.phasing_df = self.structured_data['phasing']
+                    self.data_extractor.bonus_df = self.structured_data['bonus']
+                    self.data_extractor.rewards_df = self.structured_data['rewards']
+                    self.data_extractor.scheme_info_df = self.structured_data['scheme_info']
+                else:
+                    # Extract all structured data and keep in memory
+                    self.structured_data = self.data_extractor.extract_all_data(raw_json)
+                    self.json_fetcher.store_cached(structured_data=copy_structured_data(self.structured_data))
                 
                 # Print extraction summary (data stored in memory)
                 print(f"   ✓ Products table: {len(self.structured_data['products'])} records (in memory)")
@@ -146,12 +166,23 @@ class SchemeProcessor:
                 # 🔧 Initialize configuration manager for conditional calculations
                 print(f"\n🔧 Parsing scheme configuration flags...")
                 from calculations.configuration_manager import SchemeConfigurationManager
-                self.config_manager = SchemeConfigurationManager(raw_json)
+                self.config_manager = self.json_fetcher.get_cached('config_manager')
+                if self.config_manager is None:
+                    self.config_manager = SchemeConfigurationManager(raw_json)
+                    self.json_fetcher.store_cached(config_manager=self.config_manager)
                 self.config_manager.print_configuration_summary()
                 
                 # Store configuration in structured data for easy access
                 self.structured_data['config_manager'] = self.config_manager
                 
+                # Sorted reward slabs, reused while scheme_json is unchanged
+                from calculations.rewards_calculations import build_reward_resolver
+                reward_resolver = self.json_fetcher.get_cached('reward_resolver')
+                if reward_resolver is None:
+                    reward_resolver = build_reward_resolver(self.structured_data['rewards'])
+                    self.json_fetcher.store_cached(reward_resolver=reward_resolver)
+                self.structured_data['reward_resolver'] = reward_resolver
+                
             else:
                 print("   ⚠️ No JSON data available for structuring")
                 
@@ -178,9 +209,9 @@ class SchemeProcessor:
                 return
             print(f"🔍 DEBUG: Scheme config exists")
             
-            # Convert sales data to DataFrame
+            # Convert sales data to DataFrame (reuses the fetcher's frame when available)
             import pandas as pd
-            sales_df = pd.DataFrame(self.sales_data)
+            sales_df = self._profiler.run('build_sales_frame', self.sales_fetcher.get_combined_sales_frame)
             
             # Get raw JSON data for metadata
             raw_json = self.json_fetcher.get_stored_json()
@@ -190,7 +221,7 @@ class SchemeProcessor:
             from calculations.vectorized_calculations import calculate_base_and_scheme_metrics_vectorized
             print(f"🔧 DEBUG: Import successful, function: {calculate_base_and_scheme_metrics_vectorized}")
             print(f"🔧 DEBUG: About to call function with sales_df shape: {sales_df.shape}")
-            self.calculation_results = calculate_base_and_scheme_metrics_vectorized(sales_df, self.scheme_config, raw_json, self.structured_data)
+            self.calculation_results = self._profiler.run('base_metrics', calculate_base_and_scheme_metrics_vectorized, sales_df, self.scheme_config, raw_json, self.structured_data)
             print(f"🔧 DEBUG: Function returned, result shape: {self.calculation_results.shape if self.calculation_results is not None else 'None'}")
             
             print(f"   ✅ Base calculations completed: {len(self.calculation_results)} accounts processed")
@@ -199,9 +230,9 @@ class SchemeProcessor:
             print("   🚀 Adding growth calculations...")
             
             # Fetch strata growth data using MCP
-            strata_growth_df = self._fetch_strata_growth_data()
+            strata_growth_df = self._profiler.run('fetch_strata_growth', self._fetch_strata_growth_data)
             
-            self.calculation_results = calculate_growth_metrics_vectorized(
+            self.calculation_results = self._profiler.run('growth', calculate_growth_metrics_vectorized,
                 self.calculation_results,
                 self.structured_data,
                 raw_json,
@@ -213,7 +244,7 @@ class SchemeProcessor:
             # Add target and actual calculations
             print("   🎯 Adding target and actual calculations...")
             
-            self.calculation_results = calculate_all_targets_and_actuals(
+            self.calculation_results = self._profiler.run('targets_and_actuals', calculate_all_targets_and_actuals,
                 self.calculation_results,
                 self.structured_data,
                 raw_json,
@@ -226,7 +257,7 @@ class SchemeProcessor:
             # Add Enhanced Costing Tracker Fields (MANDATORY FIX/ADD TASK)
             print("   🧮 Adding enhanced costing tracker fields...")
             from calculations.enhanced_costing_tracker_fields import calculate_enhanced_costing_tracker_fields
-            self.calculation_results = calculate_enhanced_costing_tracker_fields(
+            self.calculation_results = self._profiler.run('enhanced_tracker_fields', calculate_enhanced_costing_tracker_fields,
                 self.calculation_results,
                 self.structured_data,
                 sales_df,
@@ -237,7 +268,7 @@ class SchemeProcessor:
             # Fill scheme metadata columns
             print("   📋 Filling scheme metadata columns...")
             from calculations.metadata_filler import fill_scheme_metadata_columns
-            self.calculation_results = fill_scheme_metadata_columns(
+            self.calculation_results = self._profiler.run('scheme_metadata', fill_scheme_metadata_columns,
                 self.calculation_results, 
                 self.structured_data, 
                 sales_df
@@ -247,7 +278,7 @@ class SchemeProcessor:
             # Apply comprehensive tracker fixes (NEW - addresses user's 3 tasks)
             print("   🔧 Applying comprehensive tracker fixes...")
             from calculations.comprehensive_tracker_fixes import apply_comprehensive_tracker_fixes
-            self.calculation_results = apply_comprehensive_tracker_fixes(
+            self.calculation_results = self._profiler.run('comprehensive_fixes', apply_comprehensive_tracker_fixes,
                 self.calculation_results,
                 self.structured_data,
                 raw_json,
@@ -258,7 +289,7 @@ class SchemeProcessor:
             # Add Scheme Final Payout calculation
             print("   💰 Calculating Scheme Final Payout...")
             from calculations.scheme_final_payout_calculations import calculate_scheme_final_payout
-            self.calculation_results = calculate_scheme_final_payout(
+            self.calculation_results = self._profiler.run('scheme_final_payout', calculate_scheme_final_payout,
                 self.calculation_results,
                 self.structured_data,
                 self.scheme_config
@@ -268,7 +299,7 @@ class SchemeProcessor:
             # Add NEW CONDITIONAL PAYOUT calculations (USER'S REQUESTED FORMULAS)
             print("   🧠 Adding conditional payout calculations based on configuration...")
             from calculations.conditional_payout_calculations import calculate_conditional_payout_columns
-            self.calculation_results = calculate_conditional_payout_columns(
+            self.calculation_results = self._profiler.run('conditional_payouts', calculate_conditional_payout_columns,
                 self.calculation_results,
                 self.structured_data,
                 sales_df,
@@ -280,7 +311,7 @@ class SchemeProcessor:
             print("   📊 Adding estimated calculations based on qualification rates...")
             from calculations.estimated_calculations import calculate_estimated_columns
             scheme_type = self.scheme_config.get('calculation_mode', 'volume')
-            self.calculation_results = calculate_estimated_columns(
+            self.calculation_results = self._profiler.run('estimated_columns', calculate_estimated_columns,
                 self.calculation_results,
                 self.structured_data,
                 scheme_type,
@@ -291,7 +322,7 @@ class SchemeProcessor:
             # Add Rewards calculation
             print("   🏆 Calculating Rewards...")
             from calculations.rewards_calculations import calculate_rewards
-            self.calculation_results = calculate_rewards(
+            self.calculation_results = self._profiler.run('rewards', calculate_rewards,
                 self.calculation_results,
                 self.structured_data,
                 self.scheme_config
@@ -301,7 +332,7 @@ class SchemeProcessor:
             # Convert decimal fields to percentage format
             print("   🔢 Converting decimal fields to percentage format...")
             from calculations.percentage_conversions import convert_decimal_fields_to_percentage
-            self.calculation_results = convert_decimal_fields_to_percentage(
+            self.calculation_results = self._profiler.run('percentage_conversion', convert_decimal_fields_to_percentage,
                 self.calculation_results
             )
             print(f"   ✅ Percentage conversions completed!")
@@ -309,13 +340,14 @@ class SchemeProcessor:
             # 🔧 GLOBAL FIX: Ensure all accounts have correct mandatory product growth targets
             print("   🔧 Applying global mandatory product growth target fix...")
             from calculations.mandatory_product_global_fix import apply_global_mandatory_product_fix
-            self.calculation_results = apply_global_mandatory_product_fix(self.calculation_results)
+            self.calculation_results = self._profiler.run('mandatory_product_global_fix', apply_global_mandatory_product_fix, self.calculation_results)
             
             # Final column reordering after all calculations
             print("   📋 Final column reordering...")
             from calculations.comprehensive_tracker_fixes import get_comprehensive_column_order
-            ordered_columns = get_comprehensive_column_order(self.calculation_results, raw_json)
-            self.calculation_results = self.calculation_results[ordered_columns]
+            with self._profiler.stage('column_reordering') as stage:
+                ordered_columns = get_comprehensive_column_order(self.calculation_results, raw_json)
+                self.calculation_results = stage.record(self.calculation_results[ordered_columns])
             print(f"   ✅ Final column ordering completed!")
             
         except Exception as e:
@@ -604,6 +636,10 @@ class SchemeProcessor:
         
         return filtered_df
 
+    def get_pipeline_metrics(self):
+        """Per-stage wall/CPU/memory/shape metrics of the last process_scheme run"""
+        return self.pipeline_metrics
+
     def get_calculation_results(self):
         """Get calculation results DataFrame"""
         if self.calculation_results is None:
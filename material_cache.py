@@ -0,0 +1,165 @@
+"""
+Versioned in-memory material_master cache
+
+material_master is small and changes rarely, so it is loaded once per process
+into a DataFrame indexed by material (string key, categorical attribute
+columns); the legacy list of dicts is derived from it on request. A cheap
+version probe (row count plus MAX(updated_at), or the sum of row xmin
+transaction ids when the table has no updated_at column) decides when to
+reload. Callers attach category / grp / wanda_group / thinner_group to sales
+frames with an index lookup instead of a SQL JOIN.
+"""
+
+import os
+import time
+import threading
+
+import pandas as pd
+
+from app.database_psycopg2 import database_manager
+
+MATERIAL_CACHE_ENABLED = os.getenv("MATERIAL_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+# Minimum seconds between version probes; within this window the cached frame is served as-is
+MATERIAL_CACHE_PROBE_INTERVAL = float(os.getenv("MATERIAL_CACHE_PROBE_INTERVAL", "60"))
+
+MATERIAL_ATTRIBUTE_COLUMNS = ['category', 'grp', 'wanda_group', 'thinner_group']
+
+# Row count plus the sum of row versions: any committed insert, update or delete
+# moves it, and it only reads xmin (no row serialisation)
+MATERIAL_MASTER_VERSION_SQL = (
+    "SELECT COUNT(*), COALESCE(SUM(xmin::text::bigint), 0)::text FROM material_master"
+)
+
+
+class MaterialMasterCache:
+    """Process-level material_master frame with change detection"""
+
+    def __init__(self, probe_interval=None):
+        self.probe_interval = MATERIAL_CACHE_PROBE_INTERVAL if probe_interval is None else probe_interval
+        self._lock = threading.Lock()
+        self._frame = None
+        # Rows dropped from the material-indexed frame (repeated materials), kept for get_records()
+        self._duplicates = None
+        self._version = None
+        self._probed_at = 0.0
+        self._has_updated_at = None
+
+    def _version_query(self, cur):
+        if self._has_updated_at is None:
+            cur.execute("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'material_master' AND column_name = 'updated_at'
+                LIMIT 1
+            """)
+            self._has_updated_at = cur.fetchone() is not None
+        if self._has_updated_at:
+            return "SELECT COUNT(*), MAX(updated_at)::text FROM material_master"
+        return MATERIAL_MASTER_VERSION_SQL
+
+    def _probe_version(self):
+        with database_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(self._version_query(cur))
+                return tuple(cur.fetchone())
+
+    def _load(self):
+        with database_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT * FROM material_master")
+                rows = cur.fetchall()
+                columns = [desc[0] for desc in cur.description]
+
+        frame = pd.DataFrame.from_records(rows, columns=columns)
+        for col in frame.columns:
+            if col != 'material' and (frame[col].dtype == object or pd.api.types.is_string_dtype(frame[col].dtype)):
+                frame[col] = frame[col].astype('category')
+        duplicates = None
+        if 'material' in frame.columns:
+            frame.index = pd.Index(frame['material'].astype(str), name='material_key')
+            # Keep the first row per material, same as a JOIN against a unique key would
+            repeated = frame.index.duplicated(keep='first')
+            if repeated.any():
+                duplicates = frame[repeated]
+                frame = frame[~repeated]
+        return frame, duplicates
+
+    def _refresh(self, force=False):
+        now = time.time()
+        if not force and self._frame is not None and now - self._probed_at < self.probe_interval:
+            return
+
+        version = self._probe_version()
+        self._probed_at = now
+        if force or self._frame is None or version != self._version:
+            reason = "initial load" if self._frame is None else "version changed"
+            start_time = time.time()
+            self._frame, self._duplicates = self._load()
+            self._version = version
+            print(f"📦 Material master cache loaded ({reason}): {len(self._frame)} materials in {time.time() - start_time:.2f}s")
+
+    def get_frame(self, force_refresh=False):
+        """material_master as a DataFrame indexed by material (as str); do not mutate"""
+        with self._lock:
+            self._refresh(force_refresh)
+            return self._frame
+
+    def get_records(self, force_refresh=False):
+        """material_master as the legacy list of dicts (built from the cached frame)"""
+        return self.get_snapshot(force_refresh)[1]
+
+    def get_snapshot(self, force_refresh=False):
+        """(frame, records) from the same load, so a reload cannot split the pair"""
+        with self._lock:
+            self._refresh(force_refresh)
+            frame, duplicates = self._frame, self._duplicates
+        return frame, _frame_records(frame, duplicates)
+
+    def attach_attributes(self, df, material_column='material', columns=None, drop_unmatched=False):
+        """
+        Add material attributes (category, grp, wanda_group, thinner_group by default)
+        to df via an index lookup on material. drop_unmatched mimics an inner JOIN.
+        """
+        frame = self.get_frame()
+        columns = [c for c in (columns or MATERIAL_ATTRIBUTE_COLUMNS) if c in frame.columns]
+        if df.empty:
+            return df.assign(**{col: pd.Series(dtype=frame[col].dtype) for col in columns})
+
+        keys = df[material_column].astype(str).to_numpy()
+        result = df.copy()
+        for col in columns:
+            # Hash lookup on the unique material index; missing materials become NaN
+            result[col] = frame[col].reindex(keys).array
+        if drop_unmatched:
+            result = result[frame.index.get_indexer(keys) >= 0]
+        return result
+
+    def invalidate(self):
+        """Force a reload on next access"""
+        with self._lock:
+            self._frame = None
+            self._duplicates = None
+            self._version = None
+            self._probed_at = 0.0
+
+
+def _frame_records(frame, duplicates=None):
+    """Rows of the cached frame as dicts of plain values (missing values as None)"""
+    if duplicates is not None:
+        frame = pd.concat([frame, duplicates])
+    values = frame.reset_index(drop=True).astype(object)
+    return values.where(values.notna(), None).to_dict('records')
+
+
+_material_cache = None
+_material_cache_lock = threading.Lock()
+
+
+def get_material_master_cache():
+    """Process-wide cache instance, or None when disabled"""
+    global _material_cache
+    if not MATERIAL_CACHE_ENABLED:
+        return None
+    with _material_cache_lock:
+        if _material_cache is None:
+            _material_cache = MaterialMasterCache()
+        return _material_cache
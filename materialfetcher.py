@@ -1,11 +1,13 @@
-import psycopg2
 import pandas as pd
 import os
-from supabaseconfig import SUPABASE_CONFIG
+from app.database_psycopg2 import database_manager
+from material_cache import get_material_master_cache
 
 class MaterialFetcher:
     def __init__(self):
         self.materials_data = None
+        self.materials_df = None
+        self.material_cache = get_material_master_cache()
         # Create output directory for CSV files
         self.output_dir = os.path.join(os.getcwd())
         if not os.path.exists(self.output_dir):
@@ -16,9 +18,18 @@ class MaterialFetcher:
         
         print("🔍 Fetching material master data...")
         
+        # Served from the process-level cache; reloaded only when material_master changes
+        if self.material_cache is not None:
+            try:
+                self.materials_df, self.materials_data = self.material_cache.get_snapshot()
+                print(f"✅ Material master from cache: {len(self.materials_data)} records")
+                return self.materials_data
+            except Exception as e:
+                print(f"⚠️ Material master cache failed, querying directly: {e}")
+        
         query = "SELECT * FROM material_master"
         
-        with psycopg2.connect(**SUPABASE_CONFIG) as conn:
+        with database_manager.connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(query)
                 rows = cur.fetchall()
@@ -63,6 +74,13 @@ class MaterialFetcher:
     def get_stored_materials(self):
         return self.materials_data
 
+    def get_materials_frame(self):
+        """Material master as a DataFrame indexed by material (as str)"""
+        if self.materials_df is None and self.materials_data:
+            self.materials_df = pd.DataFrame(self.materials_data)
+            self.materials_df.index = pd.Index(self.materials_df['material'].astype(str), name='material_key')
+        return self.materials_df
+
     def get_materials_summary(self):
         if not self.materials_data:
             return "No material data loaded"
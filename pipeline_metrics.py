@@ -0,0 +1,325 @@
+"""
+Per-stage instrumentation for the calculation pipeline
+
+PipelineProfiler records, for every named stage of a scheme run, wall time,
+CPU time, resident memory (current, and the stage's own peak sampled every
+PIPELINE_RSS_SAMPLE_MS), an optional tracemalloc delta and the shape of the
+DataFrame the stage produced. The process-lifetime RSS high-water mark is
+reported once per run, in the summary. The finished profile is returned by
+SchemeProcessor.get_pipeline_metrics(), included in API responses when
+debug is requested, and pushed to the configured sinks (none by default):
+
+- print:    one line per stage on stdout
+- jsonl:    append the profile to PIPELINE_METRICS_FILE
+- postgres: one row per stage in pipeline_stage_metrics
+
+CPU time is process-wide (stages use thread pools internally), so it is
+only exact when one scheme runs per process (see CALC_PROCESS_WORKERS).
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PIPELINE_METRICS_ENABLED = os.getenv("PIPELINE_METRICS_ENABLED", "true").lower() in ("true", "1", "yes")
+PIPELINE_METRICS_SINK = os.getenv("PIPELINE_METRICS_SINK", "none")
+PIPELINE_METRICS_FILE = os.getenv("PIPELINE_METRICS_FILE", "pipeline_metrics.jsonl")
+PIPELINE_TRACEMALLOC = os.getenv("PIPELINE_TRACEMALLOC", "false").lower() in ("true", "1", "yes")
+PIPELINE_RSS_SAMPLE_MS = int(os.getenv("PIPELINE_RSS_SAMPLE_MS", "50"))
+
+METRICS_TABLE = "pipeline_stage_metrics"
+
+METRICS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+    id bigserial PRIMARY KEY,
+    run_id text NOT NULL,
+    scheme_id text NOT NULL,
+    stage text NOT NULL,
+    stage_order integer NOT NULL,
+    wall_seconds double precision,
+    cpu_seconds double precision,
+    rss_mb double precision,
+    rss_delta_mb double precision,
+    peak_rss_mb double precision,
+    tracemalloc_delta_mb double precision,
+    tracemalloc_peak_mb double precision,
+    rows integer,
+    columns integer,
+    error text,
+    recorded_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+_MB = 1024 * 1024
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (None when unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / _MB
+    except Exception:
+        return None
+
+
+def peak_rss_mb():
+    """High-water RSS of this process since it started, in MB (None when unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / _MB if sys.platform == "darwin" else peak / 1024
+
+
+class _RssSampler:
+    """Highest RSS seen while one stage runs, polled on a background thread"""
+
+    def __init__(self, interval_ms=PIPELINE_RSS_SAMPLE_MS):
+        self.interval = interval_ms / 1000
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.peak = current_rss_mb()
+        if self.interval > 0 and self.peak is not None:
+            self._thread = threading.Thread(target=self._sample, name="pipeline-rss-sampler", daemon=True)
+            self._thread.start()
+        return self.peak
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._observe(current_rss_mb())
+
+    def _observe(self, rss):
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self):
+        """Stop sampling; returns (current RSS, stage peak RSS)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        rss = current_rss_mb()
+        self._observe(rss)
+        return rss, self.peak
+
+
+def _frame_shape(value):
+    if isinstance(value, pd.DataFrame):
+        return value.shape
+    if isinstance(value, tuple) and value and isinstance(value[0], pd.DataFrame):
+        return value[0].shape
+    return None
+
+
+def _round(value, digits=4):
+    return None if value is None else round(value, digits)
+
+
+class StageTimer:
+    """Handle yielded by PipelineProfiler.stage(); call record(df) to attach a shape"""
+
+    def __init__(self, name):
+        self.name = name
+        self.shape = None
+
+    def record(self, value):
+        shape = _frame_shape(value)
+        if shape is not None:
+            self.shape = shape
+        return value
+
+
+class PipelineProfiler:
+    """Collects per-stage metrics for one scheme run"""
+
+    def __init__(self, scheme_id, enabled=None, trace_memory=None):
+        self.scheme_id = str(scheme_id)
+        self.enabled = PIPELINE_METRICS_ENABLED if enabled is None else enabled
+        self.trace_memory = PIPELINE_TRACEMALLOC if trace_memory is None else trace_memory
+        self.run_id = f"{self.scheme_id}-{int(time.time() * 1000)}"
+        self.stages = []
+        self._started_tracemalloc = False
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._started_at = datetime.now(timezone.utc)
+        self._finished = None
+
+        if self.enabled and self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one stage"""
+        timer = StageTimer(name)
+        if not self.enabled:
+            yield timer
+            return
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        sampler = _RssSampler()
+        rss_before = sampler.start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        error = None
+        try:
+            yield timer
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_after, stage_peak = sampler.stop()
+            entry = {
+                'stage': name,
+                'wall_seconds': _round(wall),
+                'cpu_seconds': _round(cpu),
+                'rss_mb': _round(rss_after, 1),
+                'rss_delta_mb': _round(rss_after - rss_before, 1) if rss_after is not None and rss_before is not None else None,
+                'peak_rss_mb': _round(stage_peak, 1),
+                'tracemalloc_delta_mb': None,
+                'tracemalloc_peak_mb': None,
+                'rows': timer.shape[0] if timer.shape else None,
+                'columns': timer.shape[1] if timer.shape else None,
+                'error': error,
+            }
+            if tracing:
+                traced_after, traced_peak = tracemalloc.get_traced_memory()
+                entry['tracemalloc_delta_mb'] = _round((traced_after - traced_before) / _MB, 1)
+                entry['tracemalloc_peak_mb'] = _round((traced_peak - traced_before) / _MB, 1)
+            self.stages.append(entry)
+
+    def run(self, name, fn, *args, **kwargs):
+        """Call fn as stage `name`, recording the shape of the DataFrame it returns"""
+        with self.stage(name) as timer:
+            return timer.record(fn(*args, **kwargs))
+
+    def finish(self, success=True, emit=True):
+        """Close the run and push it to the configured sinks; returns the profile"""
+        if self._finished is not None:
+            return self._finished
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        self._finished = self.summary(success)
+        if self.enabled and emit:
+            emit_pipeline_metrics(self._finished)
+        return self._finished
+
+    def summary(self, success=None):
+        slowest = max(self.stages, key=lambda s: s['wall_seconds'] or 0, default=None)
+        stage_peaks = [s['peak_rss_mb'] for s in self.stages if s['peak_rss_mb'] is not None]
+        return {
+            'run_id': self.run_id,
+            'scheme_id': self.scheme_id,
+            'success': success,
+            'started_at': self._started_at.isoformat(),
+            'total_wall_seconds': _round(time.perf_counter() - self._start_wall),
+            'total_cpu_seconds': _round(time.process_time() - self._start_cpu),
+            'peak_rss_mb': _round(max(stage_peaks), 1) if stage_peaks else None,
+            'process_peak_rss_mb': _round(peak_rss_mb(), 1),
+            'slowest_stage': slowest['stage'] if slowest else None,
+            'stages': list(self.stages),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Sinks
+# ---------------------------------------------------------------------------
+
+def _print_sink(profile):
+    print(f"⏱️ Pipeline metrics for scheme {profile['scheme_id']}: "
+          f"{profile['total_wall_seconds']}s wall, {profile['total_cpu_seconds']}s CPU, "
+          f"peak RSS {profile['peak_rss_mb']} MB (process {profile['process_peak_rss_mb']} MB)")
+    for entry in profile['stages']:
+        shape = f"{entry['rows']}x{entry['columns']}" if entry['rows'] is not None else "-"
+        print(f"   {entry['stage']:<32} {entry['wall_seconds']:>9.3f}s wall "
+              f"{entry['cpu_seconds']:>9.3f}s cpu  rss {entry['rss_mb']} MB "
+              f"(Δ {entry['rss_delta_mb']}, peak {entry['peak_rss_mb']})  shape {shape}")
+
+
+_jsonl_lock = threading.Lock()
+
+
+def _jsonl_sink(profile):
+    line = json.dumps(profile, default=str)
+    with _jsonl_lock:
+        with open(PIPELINE_METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+_metrics_table_ready = False
+
+
+def _postgres_sink(profile):
+    global _metrics_table_ready
+    from app.database_psycopg2 import database_manager
+
+    columns = ('wall_seconds', 'cpu_seconds', 'rss_mb', 'rss_delta_mb', 'peak_rss_mb',
+               'tracemalloc_delta_mb', 'tracemalloc_peak_mb', 'rows', 'columns', 'error')
+    rows = [
+        (profile['run_id'], profile['scheme_id'], entry['stage'], order) + tuple(entry[c] for c in columns)
+        for order, entry in enumerate(profile['stages'])
+    ]
+    with database_manager.connection() as conn:
+        with conn.cursor() as cur:
+            if not _metrics_table_ready:
+                cur.execute(METRICS_DDL)
+                _metrics_table_ready = True
+            cur.executemany(f"""
+                INSERT INTO {METRICS_TABLE} (run_id, scheme_id, stage, stage_order, {', '.join(columns)})
+                VALUES ({', '.join(['%s'] * (4 + len(columns)))})
+            """, rows)
+
+
+METRICS_SINKS = {
+    'print': _print_sink,
+    'jsonl': _jsonl_sink,
+    'postgres': _postgres_sink,
+}
+
+
+def register_metrics_sink(name, sink):
+    """Register (or replace) a sink callable(profile); enable it via PIPELINE_METRICS_SINK"""
+    METRICS_SINKS[name] = sink
+
+
+def emit_pipeline_metrics(profile, sinks=None):
+    """Push a finished profile to every configured sink; sink failures are only logged"""
+    names = sinks if sinks is not None else [s.strip() for s in PIPELINE_METRICS_SINK.split(",")]
+    for name in names:
+        if not name or name == "none":
+            continue
+        sink = METRICS_SINKS.get(name)
+        if sink is None:
+            print(f"⚠️ Unknown pipeline metrics sink '{name}'")
+            continue
+        try:
+            sink(profile)
+        except Exception as e:
+            print(f"⚠️ Pipeline metrics sink '{name}' failed: {e}")
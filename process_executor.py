@@ -0,0 +1,242 @@
+"""
+Process-pool execution for CPU-bound calculation pipelines
+
+SchemeProcessor and CostingSheetCalculator are pandas/NumPy heavy with a lot
+of Python glue, so running them on threads serialises on the GIL and blocks
+the event loop. CalculationExecutor runs them in a pool of worker processes:
+
+- workers are warmed once (calculation imports, material master cache)
+- the worker builds the final JSON-ready payload, so only that payload
+  crosses the process boundary, never the intermediate DataFrames
+- CALC_PROCESS_MEMORY_LIMIT_MB caps each worker's address space and
+  CALC_PROCESS_MAX_TASKS_PER_CHILD recycles workers to bound leaks
+- CALC_PROCESS_WORKERS=0 keeps the old in-process (thread) behaviour
+"""
+
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CALC_PROCESS_WORKERS = int(os.getenv("CALC_PROCESS_WORKERS", "0"))
+CALC_PROCESS_START_METHOD = os.getenv("CALC_PROCESS_START_METHOD", "spawn")
+CALC_PROCESS_MAX_TASKS_PER_CHILD = int(os.getenv("CALC_PROCESS_MAX_TASKS_PER_CHILD", "20"))
+CALC_PROCESS_MEMORY_LIMIT_MB = int(os.getenv("CALC_PROCESS_MEMORY_LIMIT_MB", "0"))
+CALC_PROCESS_WARM_MATERIALS = os.getenv("CALC_PROCESS_WARM_MATERIALS", "true").lower() in ("true", "1", "yes")
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+_worker_memory_limit_mb = 0
+
+
+def _init_worker(memory_limit_mb, warm_materials):
+    """Pool initializer: apply the memory cap and pre-load heavy modules"""
+    global _worker_memory_limit_mb
+    _worker_memory_limit_mb = memory_limit_mb
+    if memory_limit_mb > 0 and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Could not apply worker memory limit: {e}")
+
+    try:
+        import main  # noqa: F401  (pulls in calculations, fetchers, pandas)
+        import costing_sheet  # noqa: F401
+    except Exception as e:
+        print(f"⚠️ Worker warm-up import failed: {e}")
+
+    if warm_materials:
+        try:
+            from material_cache import get_material_master_cache
+            cache = get_material_master_cache()
+            if cache is not None:
+                cache.get_frame()
+        except Exception as e:
+            print(f"⚠️ Worker material cache warm-up failed: {e}")
+
+    print(f"🔥 Calculation worker {os.getpid()} ready")
+
+
+def _ping():
+    return os.getpid()
+
+
+def _run_task(fn, args):
+    """Run fn in the worker, turning an address-space overrun into a clear error"""
+    try:
+        return fn(*args)
+    except MemoryError:
+        raise MemoryError(f"Calculation exceeded the worker memory limit "
+                          f"({_worker_memory_limit_mb} MB)")
+
+
+def run_scheme_pipeline(scheme_id):
+    """SchemeProcessor run reduced to the picklable pieces the API returns"""
+    from main import SchemeProcessor
+    from result_store import get_costing_result_store
+
+    # Probe the data version before fetching so a concurrent sales load marks this result stale
+    store = get_costing_result_store()
+    version = None
+    if store is not None:
+        try:
+            version = store.current_version(scheme_id, refresh=True)
+        except Exception as e:
+            print(f"⚠️ Costing result store version probe failed: {e}")
+
+    processor = SchemeProcessor()
+    if not processor.process_scheme(scheme_id):
+        return {'success': False, 'message': "Scheme processing failed",
+                'error_message': "SchemeProcessor returned failure status",
+                'pipeline_metrics': processor.get_pipeline_metrics()}
+
+    result_data = processor.get_calculation_results_json(scheme_id)
+    if not result_data:
+        return {'success': False, 'message': "No calculation results available",
+                'error_message': "get_calculation_results_json returned None",
+                'pipeline_metrics': processor.get_pipeline_metrics()}
+
+    stored_data = processor.get_stored_data()
+    sales_records = len(stored_data.get('combined_sales_data') or [])
+    material_records = len(stored_data.get('material_master_data') or [])
+    calculation_summary = processor.get_calculation_summary()
+    if version is not None and version['content_hash'] == processor.json_fetcher.content_hash:
+        try:
+            store.save(scheme_id, version, result_data, sales_records=sales_records,
+                       material_records=material_records, calculation_summary=calculation_summary)
+        except Exception as e:
+            print(f"⚠️ Could not store costing result for scheme {scheme_id}: {e}")
+
+    return {
+        'success': True,
+        'result_data': result_data,
+        'sales_records': sales_records,
+        'material_records': material_records,
+        'calculation_summary': calculation_summary,
+        'pipeline_metrics': processor.get_pipeline_metrics(),
+    }
+
+
+def run_costing_sheet(scheme_id):
+    """Validate and calculate a costing sheet; result is None when validation fails"""
+    from costing_sheet import CostingSheetCalculator
+
+    calculator = CostingSheetCalculator()
+    validation = calculator.validate_scheme_requirements(scheme_id)
+    if not validation['is_valid']:
+        return {'validation': validation, 'result': None}
+    return {'validation': validation, 'result': calculator.calculate_costing_sheet(scheme_id)}
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+class CalculationExecutor:
+    """Bounded process pool for calculation pipelines (threads when disabled)"""
+
+    def __init__(self, workers=None):
+        self.workers = CALC_PROCESS_WORKERS if workers is None else workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(CALC_PROCESS_START_METHOD)
+                kwargs = {}
+                # max_tasks_per_child is not supported with the fork start method
+                if CALC_PROCESS_MAX_TASKS_PER_CHILD > 0 and CALC_PROCESS_START_METHOD != "fork":
+                    kwargs['max_tasks_per_child'] = CALC_PROCESS_MAX_TASKS_PER_CHILD
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(CALC_PROCESS_MEMORY_LIMIT_MB, CALC_PROCESS_WARM_MATERIALS),
+                    **kwargs
+                )
+                print(f"⚙️ Calculation process pool created ({self.workers} workers, {CALC_PROCESS_START_METHOD})")
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Drop a broken pool so the next call starts fresh workers"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, args):
+        pool = self._get_pool()
+        try:
+            return pool, pool.submit(_run_task, fn, args)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            pool = self._get_pool()
+            return pool, pool.submit(_run_task, fn, args)
+
+    def call(self, fn, *args):
+        """Run fn(*args) in a worker process and block for the result"""
+        if not self.enabled:
+            return fn(*args)
+        pool, future = self._submit(fn, args)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise RuntimeError("Calculation worker process died (memory limit or crash)")
+
+    async def run(self, fn, *args):
+        """Awaitable call(): keeps the event loop free while the worker computes"""
+        if not self.enabled:
+            return await asyncio.to_thread(fn, *args)
+        pool, future = self._submit(fn, args)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise RuntimeError("Calculation worker process died (memory limit or crash)")
+
+    def warm_up(self):
+        """Start every worker now instead of on the first request"""
+        if not self.enabled:
+            return []
+        pool = self._get_pool()
+        futures = [pool.submit(_ping) for _ in range(self.workers)]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_calculation_executor = None
+_calculation_executor_lock = threading.Lock()
+
+
+def get_calculation_executor():
+    """Process-wide calculation executor"""
+    global _calculation_executor
+    with _calculation_executor_lock:
+        if _calculation_executor is None:
+            _calculation_executor = CalculationExecutor()
+        return _calculation_executor
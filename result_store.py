@@ -0,0 +1,314 @@
+"""
+Persistent costing-result store for the SchemeProcessor API
+
+Every successful run_scheme_pipeline() writes its output table (the exact
+headers/rows returned by get_calculation_results_json) as a versioned
+columnar artifact: one directory of .npy column files plus a JSON sidecar,
+laid out like the sales snapshot cache and memory-mapped on read.
+
+Artifacts are keyed by scheme_id, the md5 of scheme_json and a data
+watermark (highest sales_data id plus the material_master row count and
+row-version sum, all read transactionally), so editing the scheme, loading
+sales or changing materials makes the stored result stale. The
+summary, validate and re-download endpoints read from the store; summaries
+only touch the numeric columns they aggregate.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.database_psycopg2 import database_manager
+from data_source import encode_rows, decode_rows
+from sales_query_builder import SALES_DATA_WATERMARK_SQL
+
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "true").lower() in ("true", "1", "yes")
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", os.path.join(tempfile.gettempdir(), "costing_result_store"))
+# Bump to invalidate every stored result after a calculation change
+RESULT_STORE_VERSION = os.getenv("RESULT_STORE_VERSION", "1")
+# Seconds a probed scheme hash / data watermark is trusted before asking Postgres again
+RESULT_STORE_PROBE_INTERVAL = float(os.getenv("RESULT_STORE_PROBE_INTERVAL", "30"))
+# Stored versions kept per scheme (older ones are pruned on save)
+RESULT_STORE_KEEP = int(os.getenv("RESULT_STORE_KEEP", "3"))
+
+META_FILE = "_meta.json"
+STORE_FORMAT_VERSION = 1
+
+# One round trip: scheme content hash plus a watermark read in the same snapshot
+# as the data (not the asynchronous pg_stat counters): MAX(id) of sales_data and
+# COUNT(*) / SUM(xmin) of material_master, which moves on any committed write
+VERSION_SQL = f"""
+    SELECT
+        (SELECT md5(scheme_json::text) FROM schemes_data WHERE scheme_id::TEXT = %s),
+        ({SALES_DATA_WATERMARK_SQL})
+        || ':' || (SELECT COUNT(*) || ':' || COALESCE(SUM(xmin::text::bigint), 0) FROM material_master)
+"""
+
+
+def _json_default(value):
+    # numpy scalars in calculation summaries
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class StoredCostingResult:
+    """Read view of one stored artifact; columns are memory-mapped on demand"""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def headers(self):
+        return [column['name'] for column in self.meta['columns']]
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    def _archive(self, columns_meta):
+        return {
+            f"{column['file']}.{name}": np.load(os.path.join(self.path, f"{column['file']}.{name}.npy"),
+                                                mmap_mode='r', allow_pickle=False)
+            for column in columns_meta
+            for name in column['arrays'] + ['nulls']
+        }
+
+    def _select(self, columns=None):
+        if not columns:
+            return self.meta['columns']
+        wanted = set(columns)
+        return [column for column in self.meta['columns'] if column['name'] in wanted]
+
+    def read(self, columns=None):
+        """(headers, rows) for all columns or the named subset, in stored order"""
+        selected = self._select(columns)
+        rows = decode_rows(self._archive(selected), selected, self.rows)
+        return [column['name'] for column in selected], [list(row) for row in rows]
+
+    def result_data(self, columns=None):
+        """Same shape as SchemeProcessor.get_calculation_results_json()"""
+        headers, data = self.read(columns)
+        return {
+            'scheme_id': self.meta['scheme_id'],
+            'headers': headers,
+            'data': data,
+            'summary': {
+                'total_records': len(data),
+                'total_columns': len(headers),
+                'calculation_timestamp': self.meta['calculation_timestamp'],
+            },
+        }
+
+    def _numeric_values(self, column, archive):
+        """float64 values of a numeric column (or of a category column of formatted numbers), else None"""
+        stem = column['file']
+        if column['kind'] == 'numeric' and column['pytype'] != 'bool':
+            values = np.asarray(archive[f"{stem}.values"], dtype='float64')
+        elif column['kind'] == 'category':
+            # Output columns are mostly formatted decimals; convert the (few) categories, not the rows
+            labels = pd.Series(archive[f"{stem}.categories"])
+            if not len(labels) or labels.str.match(r'^0\d').any():
+                # Zero-padded codes (credit_account, material) are identifiers, not amounts
+                return None
+            categories = pd.to_numeric(labels.str.replace(',', ''), errors='coerce')
+            if categories.isna().any():
+                return None
+            codes = np.asarray(archive[f"{stem}.codes"])
+            values = np.where(codes >= 0, categories.to_numpy(dtype='float64')[np.maximum(codes, 0)], np.nan)
+        else:
+            return None
+        return values[~np.asarray(archive[f"{stem}.nulls"]) & ~np.isnan(values)]
+
+    def column_totals(self):
+        """sum / min / max / mean per numeric column, read from the stored arrays"""
+        totals = {}
+        numeric = [c for c in self.meta['columns'] if c['kind'] in ('numeric', 'category')]
+        archive = self._archive(numeric)
+        for column in numeric:
+            values = self._numeric_values(column, archive)
+            if values is None or not len(values):
+                continue
+            totals[column['name']] = {
+                'sum': float(values.sum()),
+                'min': float(values.min()),
+                'max': float(values.max()),
+                'mean': float(values.mean()),
+                'count': int(len(values)),
+            }
+        return totals
+
+    def describe(self):
+        """Version and size information, without touching column data"""
+        return {
+            'scheme_id': self.meta['scheme_id'],
+            'content_hash': self.meta['content_hash'],
+            'watermark': self.meta['watermark'],
+            'store_version': self.meta['store_version'],
+            'stored_at': self.meta['stored_at'],
+            'calculation_timestamp': self.meta['calculation_timestamp'],
+            'total_records': self.rows,
+            'total_columns': len(self.meta['columns']),
+        }
+
+    def summary(self):
+        return dict(
+            self.describe(),
+            sales_records=self.meta.get('sales_records'),
+            material_records=self.meta.get('material_records'),
+            calculation_summary=self.meta.get('calculation_summary'),
+            column_totals=self.meta.get('column_totals') or self.column_totals(),
+        )
+
+
+class CostingResultStore:
+    """Directory of stored costing results, one subdirectory per scheme"""
+
+    def __init__(self, directory=None, probe_interval=None, keep=None):
+        self.directory = directory or RESULT_STORE_DIR
+        self.probe_interval = RESULT_STORE_PROBE_INTERVAL if probe_interval is None else probe_interval
+        self.keep = RESULT_STORE_KEEP if keep is None else keep
+        self._lock = threading.Lock()
+        self._versions = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def current_version(self, scheme_id, refresh=False):
+        """{'content_hash', 'watermark'} for the scheme as it is now, or None if it does not exist"""
+        key = str(scheme_id)
+        now = time.time()
+        with self._lock:
+            cached = self._versions.get(key)
+            if not refresh and cached is not None and now - cached[1] < self.probe_interval:
+                return cached[0]
+
+        with database_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(VERSION_SQL, (key,))
+                content_hash, watermark = cur.fetchone()
+        version = {'content_hash': content_hash, 'watermark': watermark} if content_hash else None
+        with self._lock:
+            self._versions[key] = (version, now)
+        return version
+
+    def _scheme_dir(self, scheme_id):
+        return os.path.join(self.directory, hashlib.sha1(str(scheme_id).encode()).hexdigest()[:16])
+
+    def _artifact_path(self, scheme_id, version):
+        watermark = hashlib.sha1(str(version['watermark']).encode()).hexdigest()[:12]
+        return os.path.join(self._scheme_dir(scheme_id), f"v{RESULT_STORE_VERSION}-{version['content_hash']}-{watermark}")
+
+    def load(self, scheme_id, version=None):
+        """Stored result for the scheme's current version, or None when missing/stale"""
+        version = version or self.current_version(scheme_id)
+        if version is None:
+            return None
+        path = self._artifact_path(scheme_id, version)
+        try:
+            with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('format_version') != STORE_FORMAT_VERSION:
+            return None
+        return StoredCostingResult(path, meta)
+
+    def save(self, scheme_id, version, result_data, **extra):
+        """Write result_data (headers/data) for version atomically; extra goes to the sidecar"""
+        path = self._artifact_path(scheme_id, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp_path)
+
+        try:
+            rows = result_data['data']
+            arrays, columns_meta = encode_rows(result_data['headers'], rows)
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), values, allow_pickle=False)
+
+            meta = dict(
+                extra,
+                format_version=STORE_FORMAT_VERSION,
+                store_version=RESULT_STORE_VERSION,
+                scheme_id=str(scheme_id),
+                content_hash=version['content_hash'],
+                watermark=version['watermark'],
+                stored_at=time.time(),
+                calculation_timestamp=result_data.get('summary', {}).get('calculation_timestamp'),
+                rows=len(rows),
+                columns=columns_meta,
+            )
+            # Precompute the totals from the written columns so summary reads are a sidecar load
+            meta['column_totals'] = StoredCostingResult(tmp_path, meta).column_totals()
+            with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, default=_json_default)
+
+            with self._lock:
+                if os.path.exists(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp_path, path)
+                self._prune(scheme_id, keep_path=path)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        return path
+
+    def _prune(self, scheme_id, keep_path):
+        scheme_dir = self._scheme_dir(scheme_id)
+        entries = [
+            os.path.join(scheme_dir, name) for name in os.listdir(scheme_dir)
+            if '.tmp-' not in name and os.path.join(scheme_dir, name) != keep_path
+        ]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for stale in entries[max(self.keep - 1, 0):]:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    def invalidate(self, scheme_id=None):
+        """Drop stored results for one scheme (or all)"""
+        with self._lock:
+            if scheme_id is None:
+                self._versions.clear()
+                shutil.rmtree(self.directory, ignore_errors=True)
+                os.makedirs(self.directory, exist_ok=True)
+            else:
+                self._versions.pop(str(scheme_id), None)
+                shutil.rmtree(self._scheme_dir(scheme_id), ignore_errors=True)
+
+
+_result_store = None
+_result_store_lock = threading.Lock()
+
+
+def get_costing_result_store():
+    """Process-wide store instance, or None when disabled/unusable"""
+    global _result_store
+    if not RESULT_STORE_ENABLED:
+        return None
+    with _result_store_lock:
+        if _result_store is None:
+            try:
+                _result_store = CostingResultStore()
+            except OSError as e:
+                print(f"⚠️ Costing result store disabled: {e}")
+                return None
+        return _result_store
+
+
+def load_costing_result(scheme_id):
+    """Current stored result for scheme_id, or None (store disabled, missing, stale or unreachable)"""
+    store = get_costing_result_store()
+    if store is None:
+        return None
+    try:
+        return store.load(scheme_id)
+    except Exception as e:
+        print(f"⚠️ Costing result store lookup failed for scheme {scheme_id}: {e}")
+        return None
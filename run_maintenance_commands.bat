@@ -13,6 +13,31 @@ set DB_USER=your_username
 echo Starting database maintenance...
 echo.
 
+REM Step 0: Materialized sale_date column (see sales_query_builder.py)
+REM Idempotent: adds the column and sync trigger, backfills NULL sale_date in id batches, then builds the indexes
+echo === STEP 0: SALE_DATE COLUMN AND INDEX ===
+echo Running: Migrating sales_data.sale_date with batched backfill
+python sales_query_builder.py migrate
+if %errorlevel% neq 0 (
+    echo ERROR: Failed at Migrating sales_data.sale_date with batched backfill
+    pause
+    exit /b 1
+)
+
+echo.
+
+REM Step 0b: Monthly sales rollup (see sales_rollup.py); folds in sales_data rows added since the last refresh
+echo === STEP 0b: MONTHLY SALES ROLLUP ===
+echo Running: Refreshing sales_monthly_rollup
+python sales_rollup.py refresh
+if %errorlevel% neq 0 (
+    echo ERROR: Failed at Refreshing sales_monthly_rollup
+    pause
+    exit /b 1
+)
+
+echo.
+
 REM Step 1: Update statistics
 echo === STEP 1: UPDATING STATISTICS ===
 echo Running: Analyzing sales_data table
@@ -38,6 +38,29 @@ run_sql() {
     echo ""
 }
 
+# Step 0: Materialized sale_date column (see sales_query_builder.py)
+# Idempotent: adds the column and sync trigger, backfills NULL sale_date in id batches, then builds the indexes
+echo -e "${GREEN}=== STEP 0: SALE_DATE COLUMN AND INDEX ===${NC}"
+echo -e "${YELLOW}Running: Migrating sales_data.sale_date with batched backfill${NC}"
+if python sales_query_builder.py migrate; then
+    echo -e "${GREEN}✓ Completed: Migrating sales_data.sale_date with batched backfill${NC}"
+else
+    echo -e "${RED}✗ Failed: Migrating sales_data.sale_date with batched backfill${NC}"
+    exit 1
+fi
+echo ""
+
+# Step 0b: Monthly sales rollup (see sales_rollup.py); folds in sales_data rows added since the last refresh
+echo -e "${GREEN}=== STEP 0b: MONTHLY SALES ROLLUP ===${NC}"
+echo -e "${YELLOW}Running: Refreshing sales_monthly_rollup${NC}"
+if python sales_rollup.py refresh; then
+    echo -e "${GREEN}✓ Completed: Refreshing sales_monthly_rollup${NC}"
+else
+    echo -e "${RED}✗ Failed: Refreshing sales_monthly_rollup${NC}"
+    exit 1
+fi
+echo ""
+
 # Step 1: Update statistics
 echo -e "${GREEN}=== STEP 1: UPDATING STATISTICS ===${NC}"
 run_sql "ANALYZE sales_data;" "Analyzing sales_data table"
@@ -0,0 +1,406 @@
+"""
+Columnar sales snapshot cache for SalesFetcher
+
+Aggregated daily sales are stored on local disk as one NumPy-backed partition
+per (applicable filters, year, month). Each partition is a directory of .npy
+column files that are memory-mapped on read, so schemes that share base years
+are served without touching Postgres. Only months that are missing or stale
+are fetched from the database.
+
+Besides the TTLs, each partition records the sales_data watermark (highest
+committed id) it was stored under and a fingerprint (source rows, volume and
+value sums). After any load into sales_data, a cached month is only served
+again once one grouped count/sum probe confirms its fingerprint, so
+backfills and corrections to closed months are picked up on the next run
+after a load.
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Cache settings (overridable through the environment)
+SALES_CACHE_ENABLED = os.getenv("SALES_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+SALES_CACHE_DIR = os.getenv("SALES_CACHE_DIR", os.path.join(tempfile.gettempdir(), "sales_snapshot_cache"))
+# Months ending within this many days of today are still receiving sales rows
+SALES_CACHE_OPEN_DAYS = int(os.getenv("SALES_CACHE_OPEN_DAYS", "45"))
+SALES_CACHE_OPEN_MONTH_TTL = int(os.getenv("SALES_CACHE_OPEN_MONTH_TTL", "900"))
+SALES_CACHE_CLOSED_MONTH_TTL = int(os.getenv("SALES_CACHE_CLOSED_MONTH_TTL", str(7 * 24 * 3600)))
+
+META_FILE = "_meta.json"
+CACHE_FORMAT_VERSION = 1
+
+
+def _to_date(value):
+    """Normalize 'YYYY-MM-DD' strings, datetimes and dates to a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+def _month_start(year, month):
+    return date(year, month, 1)
+
+
+def _month_end(year, month):
+    if month == 12:
+        return date(year, 12, 31)
+    return date.fromordinal(date(year, month + 1, 1).toordinal() - 1)
+
+
+def iter_months(start_date, end_date):
+    """Yield (year, month) tuples covering start_date..end_date inclusive"""
+    start = _to_date(start_date)
+    end = _to_date(end_date)
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def filters_cache_key(filters):
+    """Stable hash of the applicable filters that shape the sales query.
+
+    credit_accounts are not part of the key because SalesFetcher deliberately
+    does not push that filter into SQL.
+    """
+    normalized = {}
+    for key, values in sorted((filters or {}).items()):
+        if key == 'credit_accounts' or not values:
+            continue
+        normalized[key] = sorted(str(v) for v in values)
+    key_str = json.dumps(normalized, sort_keys=True)
+    return hashlib.md5(key_str.encode()).hexdigest()
+
+
+def frame_fingerprint(df):
+    """[source rows, volume sum, value sum] of an aggregated sales frame (record_count = source rows)"""
+    def total(column):
+        if column not in df.columns:
+            return 0.0
+        return float(pd.to_numeric(df[column], errors='coerce').fillna(0).sum())
+    rows = int(total('record_count')) if 'record_count' in df.columns else len(df)
+    return [rows, total('volume'), total('value')]
+
+
+def _same_fingerprint(stored, current):
+    """Compare a stored fingerprint with a probed (rows, volume, value); a month without rows is (0, 0, 0)"""
+    if stored is None:
+        return False
+    current = current or (0, 0.0, 0.0)
+    return (int(stored[0]) == int(current[0])
+            and all(math.isclose(float(a), float(b or 0), rel_tol=1e-9, abs_tol=1e-6)
+                    for a, b in zip(stored[1:], current[1:])))
+
+
+def _encode_column(series):
+    """Convert a column to a (kind, arrays, meta) triple that can be stored as .npy"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        tz = str(series.dt.tz) if getattr(series.dt, 'tz', None) is not None else None
+        values = series.dt.tz_convert('UTC').dt.tz_localize(None) if tz else series
+        return 'datetime', {'values': values.to_numpy(dtype='datetime64[ns]')}, {'tz': tz}
+
+    if pd.api.types.is_bool_dtype(series):
+        return 'numeric', {'values': series.to_numpy()}, {}
+
+    if pd.api.types.is_numeric_dtype(series):
+        return 'numeric', {'values': series.to_numpy()}, {}
+
+    non_null = series.dropna()
+    sample = non_null.iloc[0] if len(non_null) else None
+
+    if isinstance(sample, (date, datetime, pd.Timestamp)):
+        converted = pd.to_datetime(series, errors='coerce', utc=isinstance(sample, datetime) and sample.tzinfo is not None)
+        return _encode_column(converted)
+
+    if sample is not None and not isinstance(sample, str):
+        # Decimal / int objects coming straight from psycopg2
+        converted = pd.to_numeric(series, errors='coerce')
+        if converted.notna().sum() == len(non_null):
+            return 'numeric', {'values': converted.to_numpy(dtype='float64')}, {}
+
+    categorical = pd.Categorical(series.where(series.isna(), series.astype(str)))
+    categories = np.asarray(categorical.categories, dtype=str)
+    return 'category', {'codes': categorical.codes.astype('int32'), 'categories': categories}, {}
+
+
+def _decode_column(kind, arrays, meta):
+    if kind == 'datetime':
+        values = pd.Series(np.asarray(arrays['values']))
+        if meta.get('tz'):
+            values = values.dt.tz_localize('UTC').dt.tz_convert(meta['tz'])
+        return values
+    if kind == 'category':
+        categories = pd.Index(np.asarray(arrays['categories']), dtype=object)
+        return pd.Series(pd.Categorical.from_codes(np.asarray(arrays['codes']), categories=categories))
+    return pd.Series(np.asarray(arrays['values']))
+
+
+def normalize_frame(df):
+    """Apply the cache's column encoding in memory so fresh and cached frames share dtypes"""
+    data = {}
+    for name in df.columns:
+        kind, arrays, meta = _encode_column(df[name].reset_index(drop=True))
+        data[name] = _decode_column(kind, arrays, meta)
+    return pd.DataFrame(data, columns=list(df.columns))
+
+
+class SalesSnapshotCache:
+    """Month-partitioned, memory-mapped cache of aggregated sales rows"""
+
+    def __init__(self, cache_dir=None, open_days=None, open_month_ttl=None, closed_month_ttl=None):
+        self.cache_dir = cache_dir or SALES_CACHE_DIR
+        self.open_days = SALES_CACHE_OPEN_DAYS if open_days is None else open_days
+        self.open_month_ttl = SALES_CACHE_OPEN_MONTH_TTL if open_month_ttl is None else open_month_ttl
+        self.closed_month_ttl = SALES_CACHE_CLOSED_MONTH_TTL if closed_month_ttl is None else closed_month_ttl
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _partition_path(self, filter_key, year, month):
+        return os.path.join(self.cache_dir, filter_key, f"year={year:04d}", f"month={month:02d}")
+
+    def _is_fresh(self, meta, year, month):
+        if meta.get('format_version') != CACHE_FORMAT_VERSION:
+            return False
+        age = time.time() - meta.get('fetched_at', 0)
+        days_since_month_end = (date.today() - _month_end(year, month)).days
+        ttl = self.open_month_ttl if days_since_month_end <= self.open_days else self.closed_month_ttl
+        return age < ttl
+
+    def _read_meta(self, path):
+        try:
+            with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    def load_partition(self, filter_key, year, month):
+        """Return the cached month as a DataFrame, or None if missing/stale"""
+        path = self._partition_path(filter_key, year, month)
+        meta = self._read_meta(path)
+        if meta is None or not self._is_fresh(meta, year, month):
+            return None
+        return self._read_partition(path, meta)
+
+    def _read_partition(self, path, meta):
+        data = {}
+        for column in meta['columns']:
+            arrays = {
+                name: np.load(os.path.join(path, f"{column['file']}.{name}.npy"), mmap_mode='r')
+                for name in column['arrays']
+            }
+            data[column['name']] = _decode_column(column['kind'], arrays, column['meta'])
+        return pd.DataFrame(data, columns=[c['name'] for c in meta['columns']])
+
+    def _restamp_partition(self, filter_key, year, month, meta, watermark):
+        """Record that a cached month was verified against sales_data at watermark"""
+        path = self._partition_path(filter_key, year, month)
+        tmp_meta = os.path.join(path, f"{META_FILE}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        try:
+            with open(tmp_meta, 'w', encoding='utf-8') as meta_file:
+                json.dump(dict(meta, watermark=watermark), meta_file)
+            os.replace(tmp_meta, os.path.join(path, META_FILE))
+        except OSError:
+            if os.path.exists(tmp_meta):
+                os.remove(tmp_meta)
+
+    def store_partition(self, filter_key, year, month, df, watermark=None):
+        """Write one month atomically (temp dir + rename)"""
+        path = self._partition_path(filter_key, year, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp_path)
+
+        try:
+            columns_meta = []
+            for i, name in enumerate(df.columns):
+                kind, arrays, meta = _encode_column(df[name].reset_index(drop=True))
+                file_stem = f"c{i:03d}"
+                for array_name, values in arrays.items():
+                    np.save(os.path.join(tmp_path, f"{file_stem}.{array_name}.npy"), values, allow_pickle=False)
+                columns_meta.append({
+                    'name': name,
+                    'file': file_stem,
+                    'kind': kind,
+                    'arrays': list(arrays.keys()),
+                    'meta': meta
+                })
+
+            with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as meta_file:
+                json.dump({
+                    'format_version': CACHE_FORMAT_VERSION,
+                    'year': year,
+                    'month': month,
+                    'rows': len(df),
+                    'fetched_at': time.time(),
+                    'watermark': watermark,
+                    'fingerprint': frame_fingerprint(df),
+                    'columns': columns_meta
+                }, meta_file)
+
+            with self._lock:
+                if os.path.exists(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def get_period(self, start_date, end_date, filters, fetch_ranges, watermark=None, probe_months=None):
+        """Return aggregated sales for start_date..end_date as a DataFrame"""
+        return self.get_ranges([(start_date, end_date)], filters, fetch_ranges, watermark, probe_months)
+
+    def get_ranges(self, ranges, filters, fetch_ranges, watermark=None, probe_months=None):
+        """
+        Return aggregated sales for the union of date ranges as one DataFrame.
+
+        fetch_ranges([(from_date, to_date), ...]) must return the aggregated
+        sales frame for those ranges (including a 'sale_date' column). It is
+        called at most once, with the contiguous runs of months that are
+        missing or stale. Each sales row appears once even if ranges overlap.
+
+        watermark is the highest sales_data id (see sales_data_watermark). A
+        cached month stored under another watermark is only served after
+        probe_months([(from_date, to_date), ...]) -> {(year, month): (rows,
+        volume, value)} confirms its fingerprint; without a probe it is refetched.
+        """
+        bounds = [(_to_date(start), _to_date(end)) for start, end in ranges]
+        filter_key = filters_cache_key(filters)
+
+        months = sorted({ym for start, end in bounds for ym in iter_months(start, end)})
+
+        frames = []
+        missing = []
+        unverified = []
+        hits = 0
+        for year, month in months:
+            path = self._partition_path(filter_key, year, month)
+            meta = self._read_meta(path)
+            if meta is None or not self._is_fresh(meta, year, month):
+                missing.append((year, month))
+            elif watermark is not None and meta.get('watermark') != watermark:
+                # rows were loaded into sales_data since this month was cached
+                unverified.append((year, month, meta))
+            else:
+                frames.append(self._read_partition(path, meta))
+                hits += 1
+
+        verified = 0
+        if unverified:
+            current = {}
+            if probe_months is not None:
+                try:
+                    current = probe_months([(_month_start(y, m).isoformat(), _month_end(y, m).isoformat())
+                                            for y, m, _ in unverified])
+                except Exception as e:
+                    print(f"   ⚠️ Sales cache validation probe failed, refetching {len(unverified)} month(s): {e}")
+                    current = None
+            for year, month, meta in unverified:
+                if current is not None and _same_fingerprint(meta.get('fingerprint'), current.get((year, month))):
+                    self._restamp_partition(filter_key, year, month, meta, watermark)
+                    frames.append(self._read_partition(self._partition_path(filter_key, year, month), meta))
+                    hits += 1
+                    verified += 1
+                else:
+                    missing.append((year, month))
+
+        missing_runs = []
+        for year, month in sorted(missing):
+            if missing_runs and missing_runs[-1][-1] == self._previous_month(year, month):
+                missing_runs[-1].append((year, month))
+            else:
+                missing_runs.append([(year, month)])
+
+        if missing_runs:
+            run_bounds = [(_month_start(*run[0]).isoformat(), _month_end(*run[-1]).isoformat()) for run in missing_runs]
+            fetched = fetch_ranges(run_bounds)
+            fetched_dates = pd.to_datetime(fetched['sale_date']) if 'sale_date' in fetched.columns else None
+
+            for run in missing_runs:
+                for year, month in run:
+                    if fetched_dates is not None and len(fetched):
+                        month_mask = (fetched_dates.dt.year == year) & (fetched_dates.dt.month == month)
+                        month_df = fetched[month_mask.to_numpy()].reset_index(drop=True)
+                    else:
+                        month_df = fetched.iloc[0:0]
+                    month_df = normalize_frame(month_df)
+                    try:
+                        self.store_partition(filter_key, year, month, month_df, watermark)
+                    except Exception as e:
+                        print(f"   ⚠️ Could not store sales cache partition {year}-{month:02d}: {e}")
+                    frames.append(month_df)
+
+        fetched_months = sum(len(run) for run in missing_runs)
+        verified_note = f" ({verified} re-verified after sales_data writes)" if verified else ""
+        print(f"   🗂️ Sales cache: {hits} month(s) from cache{verified_note}, {fetched_months} month(s) fetched")
+
+        frames = [f for f in frames if len(f.columns)]
+        if not frames:
+            return pd.DataFrame()
+
+        category_cols = {c for f in frames for c in f.columns if isinstance(f[c].dtype, pd.CategoricalDtype)}
+        period_df = pd.concat(frames, ignore_index=True)
+        for col in category_cols:
+            if not isinstance(period_df[col].dtype, pd.CategoricalDtype):
+                period_df[col] = period_df[col].astype('category')
+
+        if period_df.empty or 'sale_date' not in period_df.columns:
+            return period_df
+
+        sale_dates = pd.to_datetime(period_df['sale_date'])
+        in_range = np.zeros(len(period_df), dtype=bool)
+        for start, end in bounds:
+            in_range |= ((sale_dates >= pd.Timestamp(start)) & (sale_dates <= pd.Timestamp(end))).to_numpy()
+        period_df = period_df[in_range]
+
+        sort_cols = [c for c in ('credit_account', 'sale_date') if c in period_df.columns]
+        if sort_cols:
+            period_df = period_df.sort_values(sort_cols, kind='stable')
+        return period_df.reset_index(drop=True)
+
+    @staticmethod
+    def _previous_month(year, month):
+        return (year - 1, 12) if month == 1 else (year, month - 1)
+
+    def clear(self):
+        """Drop every cached partition"""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+
+_sales_cache = None
+_sales_cache_lock = threading.Lock()
+
+
+def get_sales_snapshot_cache():
+    """Process-wide cache instance, or None when disabled/unusable"""
+    global _sales_cache
+    if not SALES_CACHE_ENABLED:
+        return None
+    from data_source import get_data_source
+    if not get_data_source().is_live:
+        # Record/replay must see the same queries, not cache hits
+        return None
+    with _sales_cache_lock:
+        if _sales_cache is None:
+            try:
+                _sales_cache = SalesSnapshotCache()
+            except OSError as e:
+                print(f"⚠️ Sales snapshot cache disabled: {e}")
+                return None
+        return _sales_cache
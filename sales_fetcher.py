@@ -1,7 +1,17 @@
-import psycopg2
+import os
 import csv
 import pandas as pd
-from supabaseconfig import SUPABASE_CONFIG
+from app.database_psycopg2 import database_manager
+from sales_cache import get_sales_snapshot_cache, normalize_frame
+from sales_frame import SalesFrame
+from sales_rollup import get_sales_rollup, split_rollup_ranges
+from sales_query_builder import (
+    applicable_filter_clauses, date_between_clause, date_ranges_clause,
+    get_sale_date_mode, in_filter_clause, sale_date_expr, sales_data_watermark
+)
+
+# 'single_pass' fetches all periods with one query, 'per_period' issues one query per period
+SALES_FETCH_MODE = os.getenv("SALES_FETCH_MODE", "single_pass").lower()
 
 class SalesFetcher:
     def __init__(self):
@@ -9,6 +19,9 @@ class SalesFetcher:
         self.base_period1_data = None
         self.base_period2_data = None
         self.scheme_period_data = None
+        self.period_frames = None
+        self.snapshot_cache = get_sales_snapshot_cache()
+        self.sales_rollup = get_sales_rollup()
 
     def fetch_sales_for_period(self, start_date, end_date, filters, calc_mode, period_name):
         """
@@ -17,40 +30,33 @@ class SalesFetcher:
         print(f"🔍 Fetching {period_name} sales data with filters")
         print(f"🔧 Debug: start_date={start_date}, end_date={end_date}, type={type(start_date)}")
         
-        # Build WHERE clauses for filters
-        where_clauses = []
-        params = []
-        
-        def add_in_filter(field, values):
-            if values:
-                placeholders = ','.join(['%s'] * len(values))
-                clause = f"{field} IN ({placeholders})"
-                return clause, values
-            return None
-        
-        filter_fields = {
-            'state_name': filters.get('states', []),
-            'region_name': filters.get('regions', []),
-            'credit_account': [str(ca) for ca in filters.get('credit_accounts', [])],
-            'customer_name': filters.get('customer_names', []),
-            'dealer_type': filters.get('dealer_types', []),
-            'rack_dealers': filters.get('rack_dealers', []),
-            'distributor': filters.get('distributors', []),
-            'fixed_dealers': filters.get('fixed_dealers', []),
-            'area_head_name': filters.get('area_heads', []),
-            'division': filters.get('divisions', [])
-        }
+        where_clauses, params = self._build_filter_clauses(filters)
         
-        # Apply filters, but handle credit_account filtering specially
-        credit_accounts_filter = filter_fields.pop('credit_account', [])
+        # Serve whole months from the local columnar snapshot cache when possible
+        if self.snapshot_cache is not None:
+            try:
+                period_df = self.snapshot_cache.get_period(
+                    start_date,
+                    end_date,
+                    filters,
+                    lambda ranges: self._fetch_ranges_frame(ranges, where_clauses, params),
+                    watermark=sales_data_watermark(),
+                    probe_months=lambda ranges: self._probe_months(ranges, where_clauses, params)
+                )
+                if not period_df.empty:
+                    print(f"      📊 {period_name} records fetched: {len(period_df)} (snapshot cache)")
+                    return period_df.to_dict('records')
+                print(f"   ℹ️ Snapshot cache returned no rows for {period_name}, using live query")
+            except Exception as e:
+                print(f"   ⚠️ Sales snapshot cache failed for {period_name}: {e}")
         
-        # Apply all other filters first
-        for field, values in filter_fields.items():
-            clause_result = add_in_filter(field, values)
-            if clause_result:
-                clause, vals = clause_result
-                where_clauses.append(clause)
-                params.extend(vals)
+        return self._fetch_sales_for_period_live(start_date, end_date, filters, calc_mode, period_name, where_clauses, params)
+
+    def _build_filter_clauses(self, filters):
+        """Build the WHERE clauses and params for the applicable filters"""
+        # Build WHERE clauses for filters (credit_account handled specially below)
+        where_clauses, params = applicable_filter_clauses(filters)
+        credit_accounts_filter = [str(ca) for ca in filters.get('credit_accounts', [])]
         
         # MODIFIED LOGIC: Don't apply credit account filter to allow all accounts with sales data
         # The goal is to include ALL accounts that have sales data and match other filters (state, region, etc.)
@@ -62,18 +68,14 @@ class SalesFetcher:
         else:
             print(f"   ℹ️ No credit account filter specified - including all accounts")
         
-        calc_column = 'value' if calc_mode == 'value' else 'volume'
-        
-        print(f"   📊 {period_name}: {start_date} to {end_date}")
-        
-        # Build SQL query (include ALL data, even negative values)
-        date_clause = "TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD') BETWEEN %s AND %s"
-        # Remove ALL filtering of negative values - fetch everything
-        all_where_clauses = [date_clause] + where_clauses
-        where_sql = " AND ".join(all_where_clauses)
-        
-        # Aggregated query to summarize by credit_account and date
-        query = f"""
+        return where_clauses, params
+
+    def _build_aggregated_query(self, where_sql):
+        """Aggregated query to summarize by credit_account and date"""
+        sale_date_sql = sale_date_expr()
+        # The materialized column is not functionally dependent on the group keys for Postgres
+        group_by_sale_date = ", sale_date" if get_sale_date_mode() == 'column' else ""
+        return f"""
         SELECT 
             MIN(id) as id,
             division, distributor, location, year, month, day,
@@ -91,25 +93,71 @@ class SalesFetcher:
             SUM(value) as value,
             MIN(created_at) as created_at,
             MIN(area_head_code) as area_head_code,
-            TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD') as sale_date,
+            {sale_date_sql} as sale_date,
             COUNT(*) as record_count
         FROM sales_data
         WHERE {where_sql}
-        GROUP BY division, distributor, location, year, month, day, credit_account, material
-        ORDER BY credit_account, TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD')
+        GROUP BY division, distributor, location, year, month, day, credit_account, material{group_by_sale_date}
+        ORDER BY credit_account, {sale_date_sql}
         """
+
+    def _fetch_ranges_frame(self, ranges, where_clauses, params):
+        """Run the aggregated query once for one or more date ranges and return a DataFrame"""
+        ranges_clause, range_params = date_ranges_clause(ranges)
+        query = self._build_aggregated_query(" AND ".join([ranges_clause] + where_clauses))
+        
+        with database_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, range_params + params)
+                rows = cur.fetchall()
+                columns = [desc[0] for desc in cur.description]
+        
+        return pd.DataFrame.from_records(rows, columns=columns)
+
+    def _probe_months(self, ranges, where_clauses, params):
+        """{(year, month): (rows, volume, value)} of sales_data for the ranges (sales cache validation)"""
+        ranges_clause, range_params = date_ranges_clause(ranges)
+        query = f"""
+        SELECT DATE_TRUNC('month', {sale_date_expr()})::date AS month_start,
+               COUNT(*), SUM(volume), SUM(value)
+        FROM sales_data
+        WHERE {" AND ".join([ranges_clause] + where_clauses)}
+        GROUP BY 1
+        """
+        
+        with database_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, range_params + params)
+                rows = cur.fetchall()
+        
+        return {(month_start.year, month_start.month): (count, float(volume or 0), float(value or 0))
+                for month_start, count, volume, value in rows if month_start is not None}
+
+    def _fetch_sales_for_period_live(self, start_date, end_date, filters, calc_mode, period_name, where_clauses, params):
+        """Fetch a period directly from Postgres (no snapshot cache)"""
+        calc_column = 'value' if calc_mode == 'value' else 'volume'
+        
+        print(f"   📊 {period_name}: {start_date} to {end_date}")
+        
+        # Build SQL query (include ALL data, even negative values)
+        date_clause = date_between_clause()
+        # Remove ALL filtering of negative values - fetch everything
+        all_where_clauses = [date_clause] + where_clauses
+        where_sql = " AND ".join(all_where_clauses)
+        
+        query = self._build_aggregated_query(where_sql)
         
         params_for_query = [start_date, end_date] + params
         
         print(f"🔧 Debug Filter count: {len(where_clauses)} additional filters")
         
-        with psycopg2.connect(**SUPABASE_CONFIG) as conn:
+        with database_manager.connection() as conn:
             with conn.cursor() as cur:
                 # First test without filters to see if date range works
                 test_query = f"""
                 SELECT COUNT(*) 
                 FROM sales_data 
-                WHERE TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD') BETWEEN %s AND %s
+                WHERE {date_clause}
                 """
                 cur.execute(test_query, [start_date, end_date])
                 test_count = cur.fetchone()[0]
@@ -156,31 +204,7 @@ class SalesFetcher:
                         minimal_where = date_clause
                     
                     # Aggregated minimal query
-                    minimal_query = f"""
-                    SELECT 
-                        MIN(id) as id,
-                        division, distributor, location, year, month, day,
-                        credit_account,
-                        MIN(customer_name) as customer_name,
-                        MIN(region_name) as region_name,
-                        MIN(state_name) as state_name,
-                        MIN(area_head_name) as area_head_name,
-                        MIN(so_name) as so_name,
-                        MIN(dealer_type) as dealer_type,
-                        MIN(fixed_dealers) as fixed_dealers,
-                        MIN(rack_dealers) as rack_dealers,
-                        material,
-                        SUM(volume) as volume,
-                        SUM(value) as value,
-                        MIN(created_at) as created_at,
-                        MIN(area_head_code) as area_head_code,
-                        TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD') as sale_date,
-                        COUNT(*) as record_count
-                    FROM sales_data
-                    WHERE {minimal_where}
-                    GROUP BY division, distributor, location, year, month, day, credit_account, material
-                    ORDER BY credit_account, TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD')
-                    """
+                    minimal_query = self._build_aggregated_query(minimal_where)
                     
                     minimal_query_params = [start_date, end_date] + minimal_params
                     
@@ -204,6 +228,130 @@ class SalesFetcher:
         print(f"💾 {filename}: {len(data)} records saved")
 
     def fetch_all_sales_with_filters(self, scheme_config, filters):
+        """
+        Fetch sales data for base period(s) and scheme period, then combine them.
+        
+        In 'single_pass' mode (default) one query covers the union of all periods
+        and rows are split into period frames with pandas. 'per_period' mode keeps
+        the original one-query-per-period behaviour.
+        """
+        if SALES_FETCH_MODE == 'single_pass':
+            try:
+                return self._fetch_all_sales_single_pass(scheme_config, filters)
+            except Exception as e:
+                print(f"⚠️ Single-pass sales fetch failed, falling back to per-period fetch: {e}")
+        
+        return self._fetch_all_sales_per_period(scheme_config, filters)
+
+    def _get_period_definitions(self, scheme_config):
+        """List of (period_key, display_name, from_date, to_date) in fetch order"""
+        base_periods = scheme_config['base_periods']
+        
+        periods = [('base_period_1', "Base Period 1", base_periods[0]['from_date'], base_periods[0]['to_date'])]
+        if isinstance(base_periods, list) and len(base_periods) > 1:
+            periods.append(('base_period_2', "Base Period 2", base_periods[1]['from_date'], base_periods[1]['to_date']))
+        periods.append(('scheme_period', "Scheme Period", scheme_config['scheme_from'], scheme_config['scheme_to']))
+        
+        return periods
+
+    def _split_periods(self, union_df, periods):
+        """Split a union-of-periods frame into one labelled frame per period (vectorized)"""
+        frames = {}
+        if union_df.empty or 'sale_date' not in union_df.columns:
+            for period_key, _, _, _ in periods:
+                frames[period_key] = pd.DataFrame()
+            return frames
+        
+        sale_dates = pd.to_datetime(union_df['sale_date'])
+        for period_key, _, from_date, to_date in periods:
+            mask = (sale_dates >= pd.Timestamp(from_date)) & (sale_dates <= pd.Timestamp(to_date))
+            frames[period_key] = union_df[mask.to_numpy()].assign(period_label=period_key).reset_index(drop=True)
+        
+        return frames
+
+    def _fetch_all_sales_single_pass(self, scheme_config, filters):
+        """Fetch all periods with one query (or one cache lookup) and split them in pandas"""
+        calc_mode = scheme_config['calculation_mode']
+        periods = self._get_period_definitions(scheme_config)
+        
+        print(f"🔍 Fetching sales data for {len(periods)} periods in a single pass")
+        for _, period_name, from_date, to_date in periods:
+            print(f"   📊 {period_name}: {from_date} to {to_date}")
+        
+        where_clauses, params = self._build_filter_clauses(filters)
+        ranges = [(from_date, to_date) for _, _, from_date, to_date in periods]
+        fetch_ranges = lambda date_ranges: self._fetch_ranges_frame(date_ranges, where_clauses, params)
+        
+        # Whole base-period months come from the monthly rollup when it is fresh
+        rollup_df = None
+        rollup_ranges, daily_ranges = self._route_base_months(periods)
+        if rollup_ranges:
+            try:
+                rollup_df = self._fetch_rollup_frame(rollup_ranges, filters)
+                ranges = daily_ranges
+                print(f"      🧮 Monthly rollup: {len(rollup_df)} records for {len(rollup_ranges)} whole-month range(s), "
+                      f"{len(daily_ranges)} daily range(s)")
+            except Exception as e:
+                print(f"   ⚠️ Monthly sales rollup read failed, using daily sales: {e}")
+        
+        if self.snapshot_cache is not None:
+            union_df = self.snapshot_cache.get_ranges(
+                ranges, filters, fetch_ranges, watermark=sales_data_watermark(),
+                probe_months=lambda date_ranges: self._probe_months(date_ranges, where_clauses, params)
+            )
+        else:
+            union_df = normalize_frame(fetch_ranges(ranges))
+        
+        if rollup_df is not None and not rollup_df.empty:
+            union_df = pd.concat([frame for frame in (union_df, rollup_df) if not frame.empty], ignore_index=True)
+            union_df = union_df.sort_values(['credit_account', 'sale_date'], kind='stable').reset_index(drop=True)
+        
+        print(f"      📊 Union of periods: {len(union_df)} records fetched")
+        
+        period_frames = self._split_periods(union_df, periods)
+        
+        for period_key, period_name, from_date, to_date in periods:
+            if period_frames[period_key].empty:
+                # Keep the original minimal-filter fallback for periods with no rows
+                print(f"⚠️ {period_name} has no rows in single-pass fetch, using per-period fallback")
+                records = self._fetch_sales_for_period_live(from_date, to_date, filters, calc_mode, period_name, where_clauses, params)
+                period_frames[period_key] = normalize_frame(pd.DataFrame.from_records(records)).assign(period_label=period_key) if records else pd.DataFrame()
+            print(f"✓ {period_name}: {len(period_frames[period_key])} records stored in memory")
+        
+        # One compact frame for the run; period accessors are row subsets of it
+        non_empty = [frame for frame in period_frames.values() if not frame.empty]
+        self._store_sales_frame(SalesFrame.from_frame(pd.concat(non_empty, ignore_index=True) if non_empty else None))
+        
+        print(f"✅ Combined sales data: {len(self.sales_data)} records stored in memory "
+              f"({self.sales_data.nbytes / 1024 / 1024:.1f} MB compact)")
+        
+        return self.sales_data
+
+    def _route_base_months(self, periods):
+        """(rollup_ranges, daily_ranges) for the periods, or ([], ranges) when the rollup is unusable"""
+        base_ranges = [(from_date, to_date) for key, _, from_date, to_date in periods if key != 'scheme_period']
+        daily_ranges = [(from_date, to_date) for key, _, from_date, to_date in periods if key == 'scheme_period']
+        if self.sales_rollup is None:
+            return [], base_ranges + daily_ranges
+        stale_months = self.sales_rollup.stale_months(base_ranges)
+        if stale_months is None:
+            return [], base_ranges + daily_ranges
+        return split_rollup_ranges(base_ranges, daily_ranges, stale_months)
+
+    def _fetch_rollup_frame(self, ranges, filters):
+        """Monthly rollup rows (sale_date = month start) for whole-month ranges"""
+        columns, rows = self.sales_rollup.fetch_ranges(ranges, filters)
+        return normalize_frame(pd.DataFrame.from_records(rows, columns=columns))
+
+    def _store_sales_frame(self, sales_frame):
+        """Keep the run's SalesFrame as sales_data and split the per-period views from it"""
+        self.sales_data = sales_frame
+        self.period_frames = {key: sales_frame.period(key) for key in ('base_period_1', 'base_period_2', 'scheme_period')}
+        self.base_period1_data = self.period_frames['base_period_1']
+        self.base_period2_data = self.period_frames['base_period_2'] or None
+        self.scheme_period_data = self.period_frames['scheme_period']
+
+    def _fetch_all_sales_per_period(self, scheme_config, filters):
         """
         Fetch sales data for base period(s) and scheme period SEPARATELY,
         then combine them later.
@@ -249,19 +397,25 @@ class SalesFetcher:
         )
         print(f"✓ Scheme period fetched and stored in memory")
         
-        # Combine all fetched data
+        # Tag rows with their period so both fetch modes produce the same shape
+        for period_key, period_data in (('base_period_1', self.base_period1_data),
+                                        ('base_period_2', self.base_period2_data),
+                                        ('scheme_period', self.scheme_period_data)):
+            for row in period_data or []:
+                row['period_label'] = period_key
+        
+        # Combine all fetched data into the run's compact frame
         combined_sales = []
         combined_sales.extend(self.base_period1_data)
         if self.base_period2_data:
             combined_sales.extend(self.base_period2_data)
         combined_sales.extend(self.scheme_period_data)
+        self._store_sales_frame(SalesFrame.from_records(combined_sales))
         
-        # Store combined data in memory
-        self.sales_data = combined_sales
-        
-        print(f"✅ Combined sales data: {len(combined_sales)} records stored in memory")
+        print(f"✅ Combined sales data: {len(self.sales_data)} records stored in memory "
+              f"({self.sales_data.nbytes / 1024 / 1024:.1f} MB compact)")
 
-        return combined_sales
+        return self.sales_data
     
     def save_combined_sales_only(self, scheme_id):
         """Save only the combined sales data to file when specifically requested"""
@@ -279,21 +433,28 @@ class SalesFetcher:
             print("⚠️ No data to save")
             return
         
+        df = data.to_frame() if isinstance(data, SalesFrame) else pd.DataFrame(data)
         try:
-            df = pd.DataFrame(data)
             df.to_csv(filename, index=False)
             print(f"📄 CSV saved with {len(df.columns)} columns")
         except Exception as e:
             with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                if data:
-                    fieldnames = data[0].keys()
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(data)
+                writer = csv.DictWriter(csvfile, fieldnames=list(df.columns))
+                writer.writeheader()
+                writer.writerows(df.to_dict('records'))
             print(f"⚠️ Used CSV fallback: {str(e)}")
 
     def get_stored_sales_data(self):
         return self.sales_data
+    
+    def get_combined_sales_frame(self):
+        """Combined sales as a typed DataFrame for the calculation stages"""
+        if isinstance(self.sales_data, SalesFrame):
+            return self.sales_data.to_calculation_frame()
+        return pd.DataFrame(self.sales_data or [])
+    
+    def get_period_frames(self):
+        return self.period_frames
         
     def get_base_period1_data(self):
         return self.base_period1_data
@@ -308,22 +469,25 @@ class SalesFetcher:
         if not self.sales_data:
             return "No sales data loaded"
         
-        total_records = len(self.sales_data)
-        unique_accounts = len(set(row['credit_account'] for row in self.sales_data))
-        total_volume = sum(row['volume'] for row in self.sales_data if row['volume'])
-        total_value = sum(row['value'] for row in self.sales_data if row['value'])
-        dates = [row['sale_date'] for row in self.sales_data if row.get('sale_date')]
-        date_range = f"{min(dates)} to {max(dates)}" if dates else "No dates"
+        df = self.get_combined_sales_frame()
+        total_records = len(df)
+        unique_accounts = df['credit_account'].nunique()
+        volume = pd.to_numeric(df['volume'], errors='coerce')
+        value = pd.to_numeric(df['value'], errors='coerce')
+        total_volume = float(volume.sum())
+        total_value = float(value.sum())
+        dates = df['sale_date'].dropna() if 'sale_date' in df.columns else pd.Series(dtype=object)
+        date_range = f"{dates.min()} to {dates.max()}" if len(dates) else "No dates"
         
         # Aggregation statistics
-        total_original_records = sum(row.get('record_count', 1) for row in self.sales_data)
+        total_original_records = int(df['record_count'].fillna(1).sum()) if 'record_count' in df.columns else total_records
         aggregation_ratio = total_original_records / total_records if total_records > 0 else 0
         
         # Data quality checks
-        negative_volume_count = sum(1 for row in self.sales_data if row.get('volume') is not None and row.get('volume') < 0)
-        negative_value_count = sum(1 for row in self.sales_data if row.get('value') is not None and row.get('value') < 0)
-        zero_volume_count = sum(1 for row in self.sales_data if row.get('volume') is not None and row.get('volume') == 0)
-        zero_value_count = sum(1 for row in self.sales_data if row.get('value') is not None and row.get('value') == 0)
+        negative_volume_count = int((volume < 0).sum())
+        negative_value_count = int((value < 0).sum())
+        zero_volume_count = int((volume == 0).sum())
+        zero_value_count = int((value == 0).sum())
         
         return {
             'total_records': total_records,
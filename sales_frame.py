@@ -0,0 +1,200 @@
+"""
+Compact sales frame for the calculation pipeline
+
+SalesFetcher builds one SalesFrame per run instead of keeping every period
+as a list of row dicts. String dimensions (credit_account, material and the
+geography/hierarchy fields) are categorical codes over shared labels,
+volume/value are float64 and sale_date is an int32 day number, so a sales
+row costs a few dozen bytes instead of a Python dict.
+
+Calculation modules still receive a DataFrame: to_calculation_frame() builds
+it with the canonical dtypes they expect (credit_account as str,
+sale_date as datetime64[ns], float64 measures). Frames built that way are
+registered, so prepare steps and the sales matrix can skip re-casting
+credit_account / re-parsing sale_date and reuse the codes directly.
+"""
+
+import numpy as np
+import pandas as pd
+
+from frame_cache import FrameCache
+from sales_cache import normalize_frame
+
+MEASURE_COLUMNS = ('volume', 'value')
+DATE_COLUMN = 'sale_date'
+# Compared as strings by every calculation module
+ACCOUNT_COLUMN = 'credit_account'
+# int32 day number used for missing sale dates
+NO_DAY = np.iinfo(np.int32).min
+
+_DAY_NS = 86_400_000_000_000
+
+
+def _compact_columns(frame):
+    """Categorical string dimensions, float64 measures, datetime64 dates (normalize_frame encoding)"""
+    loose = [name for name in frame.columns
+             if not isinstance(frame[name].dtype, pd.CategoricalDtype)
+             and (frame[name].dtype == object or pd.api.types.is_string_dtype(frame[name].dtype))]
+    if loose:
+        normalized = normalize_frame(frame[loose])
+        normalized.index = frame.index
+        frame = frame.assign(**{name: normalized[name] for name in loose})
+
+    for name in MEASURE_COLUMNS:
+        if name in frame.columns and frame[name].dtype != np.float64:
+            frame[name] = pd.to_numeric(frame[name], errors='coerce').astype(np.float64)
+
+    if ACCOUNT_COLUMN in frame.columns and not isinstance(frame[ACCOUNT_COLUMN].dtype, pd.CategoricalDtype):
+        accounts = frame[ACCOUNT_COLUMN]
+        frame[ACCOUNT_COLUMN] = pd.Categorical(accounts.where(accounts.isna(), accounts.astype(str)))
+    return frame
+
+
+def _day_numbers(dates):
+    """int32 days since 1970-01-01 (NO_DAY for NaT), or None when dates carry a time of day / timezone"""
+    if getattr(dates.dt, 'tz', None) is not None:
+        return None
+    nanoseconds = dates.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    missing = dates.isna().to_numpy()
+    if (nanoseconds[~missing] % _DAY_NS).any():
+        return None
+    days = (nanoseconds // _DAY_NS).astype(np.int32)
+    days[missing] = NO_DAY
+    return days
+
+
+class SalesFrame:
+    """Compact, typed sales rows for one run"""
+
+    def __init__(self, frame: pd.DataFrame, days=None):
+        # frame: compacted columns; sale_date lives in `days` when it is date-only
+        self._frame = frame.reset_index(drop=True)
+        self._days = days
+        self._columns = list(frame.columns) if days is None else None
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'SalesFrame':
+        if frame is None or frame.empty:
+            return cls(pd.DataFrame())
+        columns = list(frame.columns)
+        frame = _compact_columns(frame.copy())
+        days = None
+        if DATE_COLUMN in frame.columns:
+            if not pd.api.types.is_datetime64_any_dtype(frame[DATE_COLUMN]):
+                frame[DATE_COLUMN] = pd.to_datetime(frame[DATE_COLUMN], errors='coerce')
+            days = _day_numbers(frame[DATE_COLUMN])
+            if days is not None:
+                frame = frame.drop(columns=[DATE_COLUMN])
+        sales = cls(frame, days)
+        sales._columns = columns
+        return sales
+
+    @classmethod
+    def from_records(cls, records) -> 'SalesFrame':
+        return cls.from_frame(pd.DataFrame.from_records(records) if records else pd.DataFrame())
+
+    @classmethod
+    def concat(cls, frames) -> 'SalesFrame':
+        """One SalesFrame from several (period frames of the same fetch)"""
+        parts = [frame.to_frame(categorical=True) for frame in frames if len(frame)]
+        if not parts:
+            return cls(pd.DataFrame())
+        return cls.from_frame(pd.concat(parts, ignore_index=True))
+
+    def __len__(self):
+        return len(self._frame) if self._columns else 0
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        """Row dicts, materialized in chunks (for code that still walks records)"""
+        frame = self.to_frame()
+        for start in range(0, len(frame), 10_000):
+            yield from frame.iloc[start:start + 10_000].to_dict('records')
+
+    @property
+    def columns(self):
+        return list(self._columns or [])
+
+    @property
+    def nbytes(self) -> int:
+        size = int(self._frame.memory_usage(index=False, deep=False).sum())
+        for name in self._frame.columns:
+            if isinstance(self._frame[name].dtype, pd.CategoricalDtype):
+                size += int(self._frame[name].cat.categories.memory_usage(deep=True))
+        return size + (self._days.nbytes if self._days is not None else 0)
+
+    def codes(self, column):
+        """(int32 codes, labels) of a categorical column; code -1 is missing"""
+        values = self._frame[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            return None
+        return values.cat.codes.to_numpy(dtype=np.int32), np.asarray(values.cat.categories, dtype=object)
+
+    def day_numbers(self):
+        """int32 day numbers of sale_date (NO_DAY when missing), or None if dates are not date-only"""
+        return self._days
+
+    def sale_dates(self) -> pd.Series:
+        if self._days is None:
+            return self._frame[DATE_COLUMN]
+        days = self._days.astype(np.int64)
+        values = (days * _DAY_NS).astype('datetime64[ns]')
+        values[self._days == NO_DAY] = np.datetime64('NaT')
+        return pd.Series(values, name=DATE_COLUMN)
+
+    def subset(self, mask) -> 'SalesFrame':
+        mask = np.asarray(mask, dtype=bool)
+        sales = SalesFrame(self._frame[mask], None if self._days is None else self._days[mask])
+        sales._columns = self._columns
+        return sales
+
+    def period(self, label) -> 'SalesFrame':
+        """Rows tagged with period_label == label"""
+        if 'period_label' not in self._frame.columns:
+            return SalesFrame(pd.DataFrame())
+        return self.subset((self._frame['period_label'] == label).to_numpy())
+
+    def to_frame(self, categorical=False) -> pd.DataFrame:
+        """DataFrame in the original column order; categorical=False gives plain object labels"""
+        if not self:
+            return pd.DataFrame()
+        data = {}
+        for name in self._columns:
+            if name == DATE_COLUMN and self._days is not None:
+                data[name] = self.sale_dates()
+            elif not categorical and isinstance(self._frame[name].dtype, pd.CategoricalDtype):
+                # Object values point at the shared category labels (no per-row strings)
+                data[name] = self._frame[name].astype(object)
+            else:
+                data[name] = self._frame[name]
+        return pd.DataFrame(data, columns=self._columns)
+
+    def to_calculation_frame(self) -> pd.DataFrame:
+        """
+        Fresh DataFrame for the calculation stages.
+
+        Modules fill/assign plain strings, so dimensions are object columns; the
+        frame is registered so typed_sales_frame() can find this SalesFrame.
+        """
+        frame = self.to_frame(categorical=False)
+        if len(frame):
+            _register(frame, self)
+        return frame
+
+    def records(self):
+        return list(self)
+
+
+# Columns whose SalesFrame codes the calculation stages reuse
+_typed_frames = FrameCache((ACCOUNT_COLUMN, 'material', DATE_COLUMN))
+
+
+def _register(frame, sales):
+    _typed_frames.put(frame, sales)
+
+
+def typed_sales_frame(frame):
+    """The SalesFrame a calculation frame was built from, or None (other frames, or rows/coded columns changed)"""
+    return _typed_frames.lookup(frame)
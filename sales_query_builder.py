@@ -0,0 +1,295 @@
+"""
+Shared query builder for sales_data filtering
+
+All sales fetchers build their date and filter predicates here so that
+date-range pushdown targets the materialized, indexed sale_date column
+instead of TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD'),
+which defeats every index and forces a full scan.
+
+Run `python sales_query_builder.py migrate` once to add, backfill and index
+sale_date (plus the trigger that keeps it in sync). Until the backfill is
+complete and the index exists the builder keeps emitting the legacy
+expression, so queries stay valid and no unbackfilled rows are skipped.
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+
+import psycopg2
+from supabaseconfig import SUPABASE_CONFIG
+from app.database_psycopg2 import database_manager
+
+# 'auto' probes information_schema once per process, 'column' / 'expression' force a mode
+SALES_DATE_MODE = os.getenv("SALES_DATE_MODE", "auto").lower()
+
+SALE_DATE_COLUMN = "sale_date"
+SALE_DATE_INDEX = "idx_sales_data_sale_date"
+
+# Matches TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD') with an optional table alias
+LEGACY_SALE_DATE_PATTERN = re.compile(
+    r"TO_DATE\(\s*(?:(\w+)\.)?year\s*\|\|\s*'-'\s*\|\|\s*(?:\w+\.)?month\s*\|\|\s*'-'\s*\|\|\s*"
+    r"(?:\w+\.)?day\s*,\s*'YYYY-Mon-DD'\s*\)"
+)
+
+# Applicable filter key -> sales_data column
+APPLICABLE_FILTER_COLUMNS = {
+    'states': 'state_name',
+    'regions': 'region_name',
+    'customer_names': 'customer_name',
+    'dealer_types': 'dealer_type',
+    'rack_dealers': 'rack_dealers',
+    'distributors': 'distributor',
+    'fixed_dealers': 'fixed_dealers',
+    'area_heads': 'area_head_name',
+    'divisions': 'division'
+}
+
+_sale_date_mode = None
+_sale_date_mode_lock = threading.Lock()
+
+
+def _probe_sale_date_column(execute=None):
+    """
+    Return True when sales_data.sale_date is ready to filter on.
+
+    The migration adds the column before its batched backfill and creates
+    SALE_DATE_INDEX last, so the column only counts once that index is valid
+    and no row with year/month/day is still waiting for a backfilled date
+    (checked through the same index). Lookups are limited to the current schema.
+    """
+    index_query = """
+    SELECT 1
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relname = %s AND t.relname = 'sales_data' AND n.nspname = current_schema() AND i.indisvalid
+    LIMIT 1
+    """
+    # Only valid SQL once the column exists, so it runs after the index check
+    backfill_query = f"""
+    SELECT 1
+    FROM sales_data
+    WHERE {SALE_DATE_COLUMN} IS NULL
+      AND year IS NOT NULL AND month IS NOT NULL AND day IS NOT NULL
+    LIMIT 1
+    """
+    if execute is not None:
+        return bool(execute(index_query, [SALE_DATE_INDEX])) and not execute(backfill_query, [])
+
+    with database_manager.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(index_query, [SALE_DATE_INDEX])
+            if cur.fetchone() is None:
+                return False
+            cur.execute(backfill_query)
+            return cur.fetchone() is None
+
+
+def get_sale_date_mode(execute=None):
+    """
+    'column' when queries can use the materialized sale_date column,
+    otherwise 'expression'. The probe result is cached for the process.
+
+    execute(query, params) -> rows can be passed to reuse an existing
+    connection (e.g. DatabaseManager.execute_query).
+    """
+    global _sale_date_mode
+    if SALES_DATE_MODE in ('column', 'expression'):
+        return SALES_DATE_MODE
+
+    with _sale_date_mode_lock:
+        if _sale_date_mode is None:
+            try:
+                _sale_date_mode = 'column' if _probe_sale_date_column(execute) else 'expression'
+            except Exception as e:
+                print(f"⚠️ Could not probe sales_data.{SALE_DATE_COLUMN}, using TO_DATE expression: {e}")
+                _sale_date_mode = 'expression'
+            print(f"🗓️ Sales date filtering mode: {_sale_date_mode}")
+        return _sale_date_mode
+
+
+def reset_sale_date_mode():
+    """Forget the cached probe (e.g. right after running the migration)"""
+    global _sale_date_mode
+    with _sale_date_mode_lock:
+        _sale_date_mode = None
+
+
+# Highest committed sales_data id: a primary-key lookup, moved by every load
+SALES_DATA_WATERMARK_SQL = "SELECT COALESCE(MAX(id), 0)::text FROM sales_data"
+
+
+def sales_data_watermark():
+    """
+    Highest committed sales_data id as text, or None when it cannot be read.
+
+    It is read inside the query's snapshot, so it never runs ahead of the
+    rows a fetch can see (unlike the asynchronous pg_stat counters, which
+    also count aborted writes and stay behind on replicas). In-place
+    corrections without new rows do not move it; they surface at the next
+    load or when the cached month's TTL expires.
+    """
+    try:
+        with database_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(SALES_DATA_WATERMARK_SQL)
+                return cur.fetchone()[0]
+    except Exception as e:
+        print(f"⚠️ Could not read the sales_data watermark: {e}")
+        return None
+
+
+def _prefix(alias):
+    return f"{alias}." if alias else ""
+
+
+def sale_date_expr(alias=None, execute=None):
+    """SQL expression for the sale date of a sales_data row"""
+    p = _prefix(alias)
+    if get_sale_date_mode(execute) == 'column':
+        return f"{p}{SALE_DATE_COLUMN}"
+    return f"TO_DATE({p}year || '-' || {p}month || '-' || {p}day, 'YYYY-Mon-DD')"
+
+
+def date_between_clause(alias=None, execute=None):
+    """'<sale date> BETWEEN %s AND %s' (two params: from_date, to_date)"""
+    return f"{sale_date_expr(alias, execute)} BETWEEN %s AND %s"
+
+
+def date_ranges_clause(ranges, alias=None, execute=None):
+    """
+    Predicate matching any of several date ranges plus its params.
+    Each range becomes its own BETWEEN so the planner can use index range scans.
+    """
+    between = date_between_clause(alias, execute)
+    clause = "(" + " OR ".join([between] * len(ranges)) + ")"
+    params = [d for date_range in ranges for d in date_range]
+    return clause, params
+
+
+def in_filter_clause(column, values, alias=None, cast_text=False):
+    """'<column> IN (%s, ...)' and its params, or (None, []) when values are empty"""
+    if not values:
+        return None, []
+    column_sql = f"{_prefix(alias)}{column}" + ("::text" if cast_text else "")
+    placeholders = ','.join(['%s'] * len(values))
+    return f"{column_sql} IN ({placeholders})", list(values)
+
+
+def applicable_filter_clauses(filters, alias=None, fields=None, text_columns=()):
+    """
+    WHERE clauses and params for scheme applicable filters.
+    credit_accounts are intentionally not pushed down (see SalesFetcher).
+    """
+    clauses = []
+    params = []
+    for key, column in APPLICABLE_FILTER_COLUMNS.items():
+        if fields is not None and key not in fields:
+            continue
+        clause, values = in_filter_clause(column, (filters or {}).get(key, []), alias,
+                                          cast_text=column in text_columns)
+        if clause:
+            clauses.append(clause)
+            params.extend(values)
+    return clauses, params
+
+
+def apply_sale_date_column(sql, execute=None):
+    """
+    Rewrite legacy TO_DATE(year || '-' || month || '-' || day, ...) predicates in
+    a SQL template (tracker queries) to the indexed sale_date column.
+    Returns the SQL unchanged while the column does not exist.
+    """
+    if get_sale_date_mode(execute) != 'column':
+        return sql
+    return LEGACY_SALE_DATE_PATTERN.sub(
+        lambda m: f"{m.group(1)}.{SALE_DATE_COLUMN}" if m.group(1) else SALE_DATE_COLUMN,
+        sql
+    )
+
+
+# =============================================================================
+# Migration / maintenance
+# =============================================================================
+
+SALE_DATE_SYNC_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION sales_data_set_sale_date() RETURNS trigger AS $$
+BEGIN
+  NEW.{SALE_DATE_COLUMN} := TO_DATE(NEW.year || '-' || NEW.month || '-' || NEW.day, 'YYYY-Mon-DD');
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+SALE_DATE_SYNC_TRIGGER = f"""
+DROP TRIGGER IF EXISTS trg_sales_data_sale_date ON sales_data;
+CREATE TRIGGER trg_sales_data_sale_date
+  BEFORE INSERT OR UPDATE OF year, month, day ON sales_data
+  FOR EACH ROW EXECUTE FUNCTION sales_data_set_sale_date();
+"""
+
+
+def migrate_sale_date_column(batch_size=50000, conn_params=None):
+    """
+    Create, backfill and index sales_data.sale_date.
+
+    Safe to re-run: the column, trigger and index are created idempotently and
+    the backfill only touches rows where sale_date IS NULL, in id windows of
+    batch_size with a commit per batch so the table is never locked for long.
+    """
+    conn = psycopg2.connect(**(conn_params or SUPABASE_CONFIG))
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("SET statement_timeout = 0")
+
+        print(f"🔧 Adding sales_data.{SALE_DATE_COLUMN} column (if missing)...")
+        cur.execute(f"ALTER TABLE sales_data ADD COLUMN IF NOT EXISTS {SALE_DATE_COLUMN} date")
+
+        print("🔧 Installing sync trigger for new/updated rows...")
+        cur.execute(SALE_DATE_SYNC_FUNCTION)
+        cur.execute(SALE_DATE_SYNC_TRIGGER)
+
+        cur.execute("SELECT MIN(id), MAX(id) FROM sales_data")
+        min_id, max_id = cur.fetchone()
+        if min_id is not None:
+            print(f"🔧 Backfilling {SALE_DATE_COLUMN} for ids {min_id}..{max_id} in batches of {batch_size}...")
+            updated_total = 0
+            start_time = time.time()
+            for window_start in range(min_id, max_id + 1, batch_size):
+                window_end = window_start + batch_size - 1
+                cur.execute(f"""
+                    UPDATE sales_data
+                    SET {SALE_DATE_COLUMN} = TO_DATE(year || '-' || month || '-' || day, 'YYYY-Mon-DD')
+                    WHERE id BETWEEN %s AND %s AND {SALE_DATE_COLUMN} IS NULL
+                """, [window_start, window_end])
+                updated_total += cur.rowcount
+            print(f"   ✅ Backfilled {updated_total} rows in {time.time() - start_time:.1f}s")
+
+        print(f"🔧 Creating index {SALE_DATE_INDEX} (concurrently)...")
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {SALE_DATE_INDEX} ON sales_data ({SALE_DATE_COLUMN})")
+        cur.execute(f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS {SALE_DATE_INDEX}_account
+            ON sales_data ({SALE_DATE_COLUMN}, credit_account)
+        """)
+
+        print("🔧 Analyzing sales_data...")
+        cur.execute("ANALYZE sales_data")
+        cur.close()
+        print(f"✅ sales_data.{SALE_DATE_COLUMN} is ready for index range scans")
+    finally:
+        conn.close()
+
+    reset_sale_date_mode()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        batch = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+        migrate_sale_date_column(batch_size=batch)
+    else:
+        print("Usage: python sales_query_builder.py migrate [batch_size]")
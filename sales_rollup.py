@@ -0,0 +1,418 @@
+"""
+Monthly sales rollup for base-period reads
+
+Base periods are summed (or averaged over months_count) per account and
+material, so reading them as daily rows from sales_data moves ~30x more rows
+than the calculation needs. sales_monthly_rollup keeps one row per month and
+(credit_account, material) plus the applicable-filter columns, so the same
+filters can be pushed down and re-aggregated exactly like the daily query.
+
+The rollup is maintained incrementally: a refresh compares each month's
+sales_data fingerprint (row count, volume sum, value sum) with the rollup's
+and recomputes the months that differ plus the last
+SALES_ROLLUP_LOOKBACK_MONTHS months (delete + re-insert per month, one
+transaction). Fingerprints see late-committing inserts, deletes and
+volume/value updates; edits that only move rows between accounts or
+materials inside an older month need a rebuild. Every verified month is then
+stamped in sales_rollup_months with the MAX(id) of sales_data read before
+the comparison.
+
+    python sales_rollup.py refresh     # incremental (run_maintenance_commands.sh)
+    python sales_rollup.py rebuild     # full rebuild, e.g. after bulk updates/deletes
+
+SalesFetcher routes whole base-period months that are stamped, have no
+sales_data rows above their id watermark (an index range scan over the rows
+loaded since the last refresh) and are untouched by the scheme period to the
+rollup; partial-month edges and the scheme period (phasing/bonus windows
+need days) still come from daily data. Changes the id watermark cannot see
+(updates, late commits of lower ids) reach the rollup at the next refresh.
+Until the table exists (or when SALES_ROLLUP_ENABLED=false) nothing changes.
+"""
+
+import os
+import sys
+import time
+import threading
+from datetime import date, timedelta
+
+import psycopg2
+from supabaseconfig import SUPABASE_CONFIG
+from app.database_psycopg2 import database_manager
+from sales_cache import _month_end, _month_start, _same_fingerprint, _to_date, iter_months
+from sales_query_builder import applicable_filter_clauses, sale_date_expr
+
+SALES_ROLLUP_ENABLED = os.getenv("SALES_ROLLUP_ENABLED", "true").lower() in ("true", "1", "yes")
+# Seconds a month's rollup freshness check is trusted before asking Postgres again
+SALES_ROLLUP_PROBE_INTERVAL = float(os.getenv("SALES_ROLLUP_PROBE_INTERVAL", "60"))
+# Most recent months recomputed on every refresh, changed or not
+SALES_ROLLUP_LOOKBACK_MONTHS = int(os.getenv("SALES_ROLLUP_LOOKBACK_MONTHS", "2"))
+
+ROLLUP_TABLE = "sales_monthly_rollup"
+ROLLUP_STATE_TABLE = "sales_rollup_state"
+ROLLUP_MONTHS_TABLE = "sales_rollup_months"
+ROLLUP_NAME = "monthly"
+
+# Grouping keys: the daily query's keys minus day, plus every applicable-filter
+# column so pushed-down filters select the same source rows
+ROLLUP_GROUP_COLUMNS = [
+    'division', 'distributor', 'location', 'credit_account', 'material',
+    'customer_name', 'region_name', 'state_name', 'area_head_name',
+    'dealer_type', 'fixed_dealers', 'rack_dealers'
+]
+
+
+def _rollup_select(where_sql):
+    """Monthly aggregate of sales_data rows matching where_sql (column order of the rollup table)"""
+    sale_date_sql = sale_date_expr()
+    group_sql = ", ".join(ROLLUP_GROUP_COLUMNS)
+    return f"""
+    SELECT
+        DATE_TRUNC('month', {sale_date_sql})::date AS month_start,
+        MIN(year) AS year,
+        MIN(month) AS month,
+        {group_sql},
+        MIN(so_name) AS so_name,
+        MIN(area_head_code) AS area_head_code,
+        SUM(volume) AS volume,
+        SUM(value) AS value,
+        COUNT(*) AS record_count,
+        MIN(id) AS min_id,
+        MIN(created_at) AS created_at
+    FROM sales_data
+    WHERE {where_sql}
+    GROUP BY DATE_TRUNC('month', {sale_date_sql})::date, {group_sql}
+    """
+
+
+def _ddl_statements():
+    return [
+        # Column types follow sales_data (CREATE TABLE AS ... WITH NO DATA)
+        f"CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} AS {_rollup_select('FALSE')} WITH NO DATA",
+        f"CREATE INDEX IF NOT EXISTS idx_{ROLLUP_TABLE}_month_account ON {ROLLUP_TABLE} (month_start, credit_account)",
+        f"""
+        CREATE TABLE IF NOT EXISTS {ROLLUP_STATE_TABLE} (
+            rollup_name text PRIMARY KEY,
+            last_id bigint NOT NULL DEFAULT 0,
+            refreshed_at timestamptz
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS {ROLLUP_MONTHS_TABLE} (
+            month_start date PRIMARY KEY,
+            max_id bigint NOT NULL,
+            refreshed_at timestamptz NOT NULL
+        )
+        """,
+    ]
+
+
+def _month_bounds(month_start):
+    month_start = _to_date(month_start)
+    return month_start, _month_end(month_start.year, month_start.month)
+
+
+def _changed_months(cur):
+    """
+    Months whose rollup fingerprint no longer matches sales_data (refresh only).
+
+    Compares COUNT(*) / SUM(volume) / SUM(value) per month of sales_data with
+    the rollup's SUM(record_count) / SUM(volume) / SUM(value); this scans the
+    whole table, so it belongs to the maintenance refresh, not the read path.
+    """
+    sale_date_sql = sale_date_expr()
+    cur.execute(f"""
+        WITH source AS (
+            SELECT DATE_TRUNC('month', {sale_date_sql})::date AS month_start,
+                   COUNT(*) AS record_count, SUM(volume) AS volume, SUM(value) AS value
+            FROM sales_data
+            GROUP BY 1
+        ), rolled AS (
+            SELECT month_start, SUM(record_count) AS record_count, SUM(volume) AS volume, SUM(value) AS value
+            FROM {ROLLUP_TABLE}
+            GROUP BY 1
+        )
+        SELECT COALESCE(source.month_start, rolled.month_start),
+               source.record_count, source.volume, source.value,
+               rolled.record_count, rolled.volume, rolled.value
+        FROM source FULL OUTER JOIN rolled ON rolled.month_start = source.month_start
+    """)
+    changed = set()
+    for month_start, *fingerprints in cur.fetchall():
+        if month_start is None:
+            continue
+        current = fingerprints[:3] if fingerprints[0] is not None else None
+        stored = fingerprints[3:] if fingerprints[3] is not None else None
+        if stored is None and current is None:
+            continue
+        if not _same_fingerprint(stored or [0, 0.0, 0.0], current):
+            changed.add(_to_date(month_start))
+    return changed
+
+
+def _lookback_months(today=None):
+    """First days of the last SALES_ROLLUP_LOOKBACK_MONTHS months (current month included)"""
+    month_start = (today or date.today()).replace(day=1)
+    months = []
+    for _ in range(max(SALES_ROLLUP_LOOKBACK_MONTHS, 0)):
+        months.append(month_start)
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    return months
+
+
+def refresh_monthly_rollup(full=False, conn_params=None):
+    """
+    Fold new sales_data rows into the rollup.
+
+    Months whose fingerprint differs from sales_data (plus the lookback
+    months) are recomputed; full=True recomputes every month. Every month is
+    then stamped with the sales_data MAX(id) read before the comparison.
+    """
+    conn = psycopg2.connect(**(conn_params or SUPABASE_CONFIG))
+    try:
+        cur = conn.cursor()
+        cur.execute("SET statement_timeout = 0")
+        for statement in _ddl_statements():
+            cur.execute(statement)
+        cur.execute(f"INSERT INTO {ROLLUP_STATE_TABLE} (rollup_name) VALUES (%s) ON CONFLICT DO NOTHING", [ROLLUP_NAME])
+        conn.commit()
+
+        # Row lock serializes concurrent refreshes
+        cur.execute(f"SELECT last_id FROM {ROLLUP_STATE_TABLE} WHERE rollup_name = %s FOR UPDATE", [ROLLUP_NAME])
+        # Read before the comparison: rows above it may be missing from the rollup
+        cur.execute("SELECT MAX(id) FROM sales_data")
+        high_id = cur.fetchone()[0] or 0
+
+        sale_date_sql = sale_date_expr()
+        if full:
+            cur.execute(f"SELECT DISTINCT DATE_TRUNC('month', {sale_date_sql})::date FROM sales_data")
+            months = sorted(row[0] for row in cur.fetchall() if row[0] is not None)
+        else:
+            months = sorted(_changed_months(cur) | set(_lookback_months()))
+
+        start_time = time.time()
+        print(f"🔧 Refreshing {ROLLUP_TABLE}: {len(months)} month(s) "
+              f"({'full rebuild' if full else f'changed + last {SALES_ROLLUP_LOOKBACK_MONTHS} months'})")
+        if full:
+            cur.execute(f"DELETE FROM {ROLLUP_TABLE}")
+            cur.execute(f"DELETE FROM {ROLLUP_MONTHS_TABLE}")
+        inserted = 0
+        for month_start in months:
+            first_day, last_day = _month_bounds(month_start)
+            if not full:
+                cur.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE month_start = %s", [first_day])
+            cur.execute(f"INSERT INTO {ROLLUP_TABLE} {_rollup_select(f'{sale_date_sql} BETWEEN %s AND %s')}",
+                        [first_day, last_day])
+            inserted += cur.rowcount
+
+        # Recomputed months get a row; every other month was just verified by the comparison
+        if months:
+            cur.execute(f"""
+                INSERT INTO {ROLLUP_MONTHS_TABLE} (month_start, max_id, refreshed_at)
+                SELECT month_start, %s, NOW() FROM unnest(%s::date[]) AS m(month_start)
+                ON CONFLICT (month_start) DO NOTHING
+            """, [high_id, [_to_date(month) for month in months]])
+        cur.execute(f"UPDATE {ROLLUP_MONTHS_TABLE} SET max_id = %s, refreshed_at = NOW()", [high_id])
+        cur.execute(f"UPDATE {ROLLUP_STATE_TABLE} SET last_id = %s, refreshed_at = NOW() WHERE rollup_name = %s",
+                    [high_id, ROLLUP_NAME])
+        conn.commit()
+        if months:
+            cur.execute(f"ANALYZE {ROLLUP_TABLE}")
+            conn.commit()
+        cur.close()
+        print(f"✅ {ROLLUP_TABLE}: {inserted} rollup rows written in {time.time() - start_time:.1f}s")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    reset_sales_rollup()
+
+
+def _first_of_next_month(day):
+    return _month_end(day.year, day.month) + timedelta(days=1)
+
+
+def _merge_days(days):
+    """Sorted day ordinals -> [(from_date, to_date)] of consecutive runs"""
+    runs = []
+    for ordinal in days:
+        if runs and runs[-1][1] == ordinal - 1:
+            runs[-1][1] = ordinal
+        else:
+            runs.append([ordinal, ordinal])
+    return [(date.fromordinal(start), date.fromordinal(end)) for start, end in runs]
+
+
+def split_rollup_ranges(base_ranges, daily_ranges, stale_months=()):
+    """
+    Route base-period ranges between the monthly rollup and daily sales.
+
+    A month is served from the rollup when every base range touching it covers
+    it whole, no daily range (scheme period) touches it and it is not stale.
+    Returns (rollup_ranges, daily_ranges): merged month runs for the rollup and
+    the original daily ranges plus the partial-month base edges.
+    """
+    base = [(_to_date(start), _to_date(end)) for start, end in base_ranges]
+    daily = [(_to_date(start), _to_date(end)) for start, end in daily_ranges]
+    stale = {_to_date(month) for month in stale_months}
+
+    rollup_months = []
+    for year, month in sorted({ym for start, end in base for ym in iter_months(start, end)}):
+        first_day, last_day = _month_start(year, month), _month_end(year, month)
+        touching = [(start, end) for start, end in base if start <= last_day and end >= first_day]
+        if (first_day not in stale
+                and all(start <= first_day and end >= last_day for start, end in touching)
+                and not any(start <= last_day and end >= first_day for start, end in daily)):
+            rollup_months.append(first_day)
+
+    rollup_days = set()
+    for first_day in rollup_months:
+        rollup_days.update(range(first_day.toordinal(), _first_of_next_month(first_day).toordinal()))
+    edge_days = sorted({ordinal for start, end in base
+                        for ordinal in range(start.toordinal(), end.toordinal() + 1)
+                        if ordinal not in rollup_days})
+
+    rollup_ranges = _merge_days(sorted(rollup_days))
+    edges = _merge_days(edge_days)
+    return ([(start.isoformat(), end.isoformat()) for start, end in rollup_ranges],
+            [(start.isoformat(), end.isoformat()) for start, end in daily + edges])
+
+
+class SalesRollup:
+    """Read side of the monthly rollup: freshness probe plus the aggregated rollup query"""
+
+    def __init__(self, probe_interval=None):
+        self.probe_interval = SALES_ROLLUP_PROBE_INTERVAL if probe_interval is None else probe_interval
+        self._lock = threading.Lock()
+        # month start -> (stale, checked at)
+        self._checked = {}
+
+    def stale_months(self, ranges):
+        """
+        Months of the (from_date, to_date) ranges the rollup cannot serve, or
+        None when the rollup has never been built (or cannot be read).
+
+        A month is stale when the last refresh did not stamp it or sales_data
+        has rows for it above its id watermark. Each month's verdict is
+        trusted for probe_interval seconds.
+        """
+        months = {_month_start(year, month) for start, end in ranges
+                  for year, month in iter_months(_to_date(start), _to_date(end))}
+        now = time.time()
+        with self._lock:
+            checked = {month: self._checked.get(month) for month in months}
+        unchecked = sorted(month for month, entry in checked.items()
+                           if entry is None or now - entry[1] >= self.probe_interval)
+
+        if unchecked:
+            try:
+                with database_manager.connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(f"""
+                            SELECT 1 FROM {ROLLUP_STATE_TABLE}
+                            WHERE rollup_name = %s AND refreshed_at IS NOT NULL
+                        """, [ROLLUP_NAME])
+                        if cur.fetchone() is None:
+                            return None
+                        # id > max_id is a primary-key range over rows loaded since the refresh
+                        cur.execute(f"""
+                            SELECT r.month_start
+                            FROM unnest(%s::date[]) AS r(month_start)
+                            LEFT JOIN {ROLLUP_MONTHS_TABLE} m ON m.month_start = r.month_start
+                            WHERE m.month_start IS NULL OR EXISTS (
+                                SELECT 1 FROM sales_data s
+                                WHERE s.id > m.max_id
+                                  AND DATE_TRUNC('month', {sale_date_expr('s')})::date = r.month_start
+                            )
+                        """, [unchecked])
+                        stale = {_to_date(row[0]) for row in cur.fetchall()}
+            except Exception as e:
+                print(f"⚠️ Monthly sales rollup unavailable, using daily sales: {e}")
+                return None
+            with self._lock:
+                for month in unchecked:
+                    checked[month] = self._checked[month] = (month in stale, now)
+
+        return frozenset(month for month, entry in checked.items() if entry[0])
+
+    def build_query(self, where_sql):
+        """Rollup rows re-aggregated to the daily query's grouping (one row per month)"""
+        return f"""
+        SELECT
+            MIN(min_id) as id,
+            division, distributor, location,
+            MIN(year) as year, MIN(month) as month, NULL as day,
+            credit_account,
+            MIN(customer_name) as customer_name,
+            MIN(region_name) as region_name,
+            MIN(state_name) as state_name,
+            MIN(area_head_name) as area_head_name,
+            MIN(so_name) as so_name,
+            MIN(dealer_type) as dealer_type,
+            MIN(fixed_dealers) as fixed_dealers,
+            MIN(rack_dealers) as rack_dealers,
+            material,
+            SUM(volume) as volume,
+            SUM(value) as value,
+            MIN(created_at) as created_at,
+            MIN(area_head_code) as area_head_code,
+            month_start as sale_date,
+            SUM(record_count) as record_count
+        FROM {ROLLUP_TABLE}
+        WHERE {where_sql}
+        GROUP BY division, distributor, location, credit_account, material, month_start
+        ORDER BY credit_account, month_start
+        """
+
+    def fetch_ranges(self, ranges, filters):
+        """(columns, rows) of the rollup for whole-month ranges and the applicable filters"""
+        range_sql = "(" + " OR ".join(["month_start BETWEEN %s AND %s"] * len(ranges)) + ")"
+        range_params = [d for date_range in ranges for d in date_range]
+        where_clauses, params = applicable_filter_clauses(filters)
+        query = self.build_query(" AND ".join([range_sql] + where_clauses))
+
+        with database_manager.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, range_params + params)
+                rows = cur.fetchall()
+                columns = [desc[0] for desc in cur.description]
+        return columns, rows
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+_sales_rollup = None
+_sales_rollup_lock = threading.Lock()
+
+
+def get_sales_rollup():
+    """Process-wide rollup reader, or None when disabled or not on the live data source"""
+    global _sales_rollup
+    if not SALES_ROLLUP_ENABLED:
+        return None
+    from data_source import get_data_source
+    if not get_data_source().is_live:
+        # Record/replay snapshots hold the daily queries
+        return None
+    with _sales_rollup_lock:
+        if _sales_rollup is None:
+            _sales_rollup = SalesRollup()
+        return _sales_rollup
+
+
+def reset_sales_rollup():
+    """Forget the cached freshness probe (e.g. right after a refresh)"""
+    with _sales_rollup_lock:
+        if _sales_rollup is not None:
+            _sales_rollup.reset()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command in ("refresh", "rebuild"):
+        refresh_monthly_rollup(full=command == "rebuild")
+    else:
+        print("Usage: python sales_rollup.py refresh|rebuild")
@@ -0,0 +1,80 @@
+"""
+Parsed-scheme cache shared across requests
+
+Keyed by scheme_id plus an md5 of scheme_json (computed by Postgres next to
+the fetch), so any edit to the scheme invalidates its entry. An entry holds
+the parsed scheme config, the SchemeDataExtractor DataFrames and the
+SchemeConfigurationManager, letting hot schemes skip JSON walking and
+DataFrame construction on validate / calculate / summary calls.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+SCHEME_CACHE_ENABLED = os.getenv("SCHEME_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+SCHEME_CACHE_SIZE = int(os.getenv("SCHEME_CACHE_SIZE", "64"))
+
+
+def copy_structured_data(structured_data):
+    """Copy DataFrames so callers can't mutate the cached ones"""
+    return {
+        key: value.copy() if isinstance(value, pd.DataFrame) else value
+        for key, value in structured_data.items()
+    }
+
+
+class ParsedSchemeCache:
+    """Bounded LRU of parsed scheme artifacts, one entry per scheme_id"""
+
+    def __init__(self, max_size=None):
+        self.max_size = SCHEME_CACHE_SIZE if max_size is None else max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, scheme_id, content_hash, field):
+        """Cached value of field for this exact scheme_json, or None"""
+        key = str(scheme_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['content_hash'] != content_hash or field not in entry:
+                return None
+            self._entries.move_to_end(key)
+            return entry[field]
+
+    def update(self, scheme_id, content_hash, **fields):
+        """Store fields for scheme_id; a different content_hash replaces the entry"""
+        key = str(scheme_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['content_hash'] != content_hash:
+                entry = {'content_hash': content_hash}
+                self._entries[key] = entry
+            entry.update(fields)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, scheme_id=None):
+        with self._lock:
+            if scheme_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(scheme_id), None)
+
+
+_scheme_cache = None
+_scheme_cache_lock = threading.Lock()
+
+
+def get_parsed_scheme_cache():
+    """Process-wide cache instance, or None when disabled"""
+    global _scheme_cache
+    if not SCHEME_CACHE_ENABLED or SCHEME_CACHE_SIZE <= 0:
+        return None
+    with _scheme_cache_lock:
+        if _scheme_cache is None:
+            _scheme_cache = ParsedSchemeCache()
+        return _scheme_cache
@@ -0,0 +1,96 @@
+"""
+Offline checks for the additional-scheme base metrics in
+calculations.base_calculations against the per-account loop they replaced
+
+    python -m pytest -q test_additional_scheme_metrics.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculations.base_calculations import (
+    _calculate_additional_scheme_metrics, _calculate_additional_scheme_metrics_both
+)
+
+BASE_PERIODS = [
+    {'from_date': '2024-01-01', 'to_date': '2024-03-31', 'sum_avg_method': 'sum'},
+    {'from_date': '2024-04-01', 'to_date': '2024-06-30', 'sum_avg_method': 'average'},
+]
+
+
+def _old_single_period(account_sales, base_period, metric_col):
+    """base_calculations._calculate_single_period_for_account"""
+    if base_period is None or account_sales.empty:
+        return 0.0
+    from_date = pd.to_datetime(base_period['from_date'])
+    to_date = pd.to_datetime(base_period['to_date'])
+    period_data = account_sales[(account_sales['sale_date'] >= from_date) & (account_sales['sale_date'] <= to_date)]
+    if period_data.empty:
+        return 0.0
+    base_metric = period_data[metric_col].sum()
+    if base_period.get('sum_avg_method', 'sum').lower() == 'average':
+        num_months = ((to_date.year - from_date.year) * 12 + to_date.month - from_date.month) + 1
+        return base_metric / num_months if num_months > 0 else base_metric
+    return base_metric
+
+
+def _old_metrics(result_df, sales_df, base_periods, product_materials, metric_col):
+    """Per-account loop: Base 1, Base 2 (Base 1 again with a single period) and their max"""
+    filtered_sales = sales_df[sales_df['material'].isin(product_materials)]
+    rows = []
+    for credit_account in result_df['credit_account'].astype(str):
+        account_sales = filtered_sales[filtered_sales['credit_account'].astype(str) == credit_account]
+        base1 = _old_single_period(account_sales, base_periods[0] if base_periods else None, metric_col)
+        base2 = _old_single_period(account_sales, base_periods[1], metric_col) if len(base_periods) >= 2 else base1
+        rows.append((float(base1), float(base2), float(max(base1, base2))))
+    return np.array(rows, dtype=float).reshape(-1, 3)
+
+
+def _case(seed=9, rows=3000):
+    rng = np.random.default_rng(seed)
+    sales_df = pd.DataFrame({
+        'credit_account': rng.integers(1, 60, rows).astype(str),
+        'material': rng.choice(['M1', 'M2', 'M3', 'M4'], rows),
+        'sale_date': pd.Timestamp('2023-12-15') + pd.to_timedelta(rng.integers(0, 220, rows), unit='D'),
+        'volume': rng.uniform(0, 100, rows).round(2),
+        'value': rng.uniform(0, 5000, rows).round(2),
+    })
+    # Accounts 70/71 have no sales at all
+    result_df = pd.DataFrame({'credit_account': [str(i) for i in range(1, 72)]})
+    return result_df, sales_df
+
+
+@pytest.mark.parametrize('base_periods', [BASE_PERIODS, BASE_PERIODS[:1], BASE_PERIODS[::-1]],
+                         ids=['two-periods', 'one-period', 'average-first'])
+def test_both_metrics_match_the_per_account_loop(base_periods):
+    result_df, sales_df = _case()
+    products = {'M1', 'M3'}
+
+    result = _calculate_additional_scheme_metrics_both(result_df.copy(), sales_df, base_periods, products, '_p1')
+
+    for metric_col, metric_name in [('volume', 'Volume'), ('value', 'Value')]:
+        columns = [f'Base 1 {metric_name} Final_p1', f'Base 2 {metric_name} Final_p1', f'total_{metric_col}_p1']
+        np.testing.assert_allclose(result[columns].to_numpy(dtype=float),
+                                   _old_metrics(result_df, sales_df, base_periods, products, metric_col))
+
+
+@pytest.mark.parametrize('is_volume_based', [True, False])
+def test_single_metric_matches_the_per_account_loop(is_volume_based):
+    result_df, sales_df = _case(seed=4)
+    metric_col, metric_name = ('volume', 'Volume') if is_volume_based else ('value', 'Value')
+
+    result = _calculate_additional_scheme_metrics(result_df.copy(), sales_df, BASE_PERIODS, {'M2'},
+                                                  metric_name, '_p2', is_volume_based)
+
+    columns = [f'Base 1 {metric_name} Final_p2', f'Base 2 {metric_name} Final_p2', f'total_{metric_col}_p2']
+    np.testing.assert_allclose(result[columns].to_numpy(dtype=float),
+                               _old_metrics(result_df, sales_df, BASE_PERIODS, {'M2'}, metric_col))
+
+
+def test_no_matching_products_gives_zeros():
+    result_df, sales_df = _case()
+
+    result = _calculate_additional_scheme_metrics_both(result_df.copy(), sales_df, BASE_PERIODS, {'X9'}, '_p1')
+
+    assert (result.filter(like='_p1').to_numpy(dtype=float) == 0).all()
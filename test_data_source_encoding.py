@@ -0,0 +1,53 @@
+"""
+Offline checks for the record/replay snapshot encoding (data_source.encode_rows / decode_rows)
+
+    python -m pytest -q test_data_source_encoding.py
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+
+from data_source import decode_rows, encode_rows
+
+
+def _round_trip(columns, rows):
+    arrays, columns_meta = encode_rows(columns, rows)
+    return decode_rows(arrays, columns_meta, len(rows))
+
+
+def test_int_and_bool_columns_keep_their_type():
+    rows = [(5, True, 2 ** 40, np.int64(3), np.bool_(False)),
+            (None, False, -3, np.int64(4), None)]
+    decoded = _round_trip(['i', 'b', 'big', 'np_int', 'np_bool'], rows)
+
+    assert decoded == [(5, True, 2 ** 40, 3, False), (None, False, -3, 4, None)]
+    assert [type(v) for v in decoded[0]] == [int, bool, int, int, bool]
+
+
+def test_ints_beyond_int64_and_mixed_numbers_are_exact():
+    decoded = _round_trip(['huge', 'mixed'], [(2 ** 70, 1), (1, 2.5)])
+
+    assert decoded == [(2 ** 70, 1), (1, 2.5)]
+    assert type(decoded[0][1]) is int and type(decoded[1][1]) is float
+
+
+def test_strings_dates_and_decimals():
+    rows = [('a', date(2024, 1, 31), datetime(2024, 1, 31, 10, 30), Decimal('1.25')),
+            (None, None, None, Decimal('2'))]
+    decoded = _round_trip(['s', 'd', 'dt', 'dec'], rows)
+
+    assert decoded[0][:3] == ('a', date(2024, 1, 31), datetime(2024, 1, 31, 10, 30))
+    assert decoded[1][:3] == (None, None, None)
+    # Decimal is the one documented lossy type
+    assert [row[3] for row in decoded] == [1.25, 2.0]
+
+
+def test_legacy_float_encoded_ints_are_restored():
+    arrays = {'c000.values': np.array([5.0, 0.0]), 'c000.nulls': np.array([False, True]),
+              'c001.values': np.array([1.0, 0.0]), 'c001.nulls': np.array([False, False])}
+    columns_meta = [{'name': 'i', 'file': 'c000', 'kind': 'numeric', 'pytype': 'int', 'arrays': ['values'], 'meta': {}},
+                    {'name': 'b', 'file': 'c001', 'kind': 'numeric', 'pytype': 'bool', 'arrays': ['values'], 'meta': {}}]
+
+    assert decode_rows(arrays, columns_meta, 2) == [(5, True), (None, False)]
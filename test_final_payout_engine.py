@@ -0,0 +1,146 @@
+"""
+Offline checks for calculations.final_payout_engine.compute_final_payout
+against the row-wise Scheme Final Payout loops it replaced
+(scheme_final_payout_calculations and tracker_runner)
+
+    python -m pytest -q test_final_payout_engine.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculations.final_payout_engine import (
+    compute_final_payout, CALCULATION_PAYOUT_COLUMNS, TRACKER_PAYOUT_COLUMNS
+)
+
+
+def _old_calculation_payout(row, scheme_type, additional_schemes_count, bonus_schemes_count):
+    """scheme_final_payout_calculations._calculate_row_final_payout"""
+    if scheme_type == 'inbuilt':
+        return 0.0
+    checks = [("Mandatory Qualify", "percentage_achieved")] + [
+        (f"Mandatory Qualify_p{i}", f"percentage_achieved_p{i}") for i in range(1, additional_schemes_count + 1)]
+    for qualify_col, achieved_col in checks:
+        if row.get(qualify_col) == "Yes":
+            achieved = row.get(achieved_col)
+            if achieved is None or achieved < 1.0:
+                return 0.0
+
+    columns = ["Total_Payout", "MP_Final_Payout", "FINAL_PHASING_PAYOUT"]
+    for i in range(1, additional_schemes_count + 1):
+        columns += [f"Total_Payout_p{i}", f"MP_Final_Payout_p{i}", f"FINAL_PHASING_PAYOUT_p{i}"]
+    if scheme_type == 'ho-scheme':
+        for i in range(1, bonus_schemes_count + 1):
+            columns += [f"Bonus Scheme {i} Bonus Payout", f"Bonus Scheme {i} MP Payout"]
+
+    total_payout = 0.0
+    for col in columns:
+        value = row.get(col, 0)
+        if pd.notna(value):
+            total_payout += float(value)
+    return total_payout
+
+
+def _old_tracker_payout(row, main_scheme_type, additional_schemes_count, bonus_schemes_count):
+    """tracker_runner.calculate_scheme_final_payout: plain sums, so NaN propagates"""
+    if main_scheme_type == 'inbuilt':
+        return 0
+    checks = [("Mandatory Qualify", "% Achieved")] + [
+        (f"Mandatory Qualify_p{i}", f"% Achieved_p{i}") for i in range(1, additional_schemes_count + 1)]
+    for qualify_col, achieved_col in checks:
+        if row.get(qualify_col) == "Yes":
+            achieved = row.get(achieved_col)
+            if achieved is None or achieved < 1.0:
+                return 0
+
+    total = 0
+    if main_scheme_type == 'ho-scheme':
+        for i in range(1, bonus_schemes_count + 1):
+            for col in (f"Bonus Scheme {i} Bonus Payout", f"Bonus Scheme {i} MP Payout"):
+                if col in row:
+                    total += row[col]
+    columns = ["Total Payout", "MP Final Payout", "FINAL PHASING PAYOUT"]
+    for i in range(1, additional_schemes_count + 1):
+        columns += [f"Total Payout_p{i}", f"MP Final Payout_p{i}", f"FINAL PHASING PAYOUT_p{i}"]
+    for col in columns:
+        if col in row:
+            total += row[col]
+    return total
+
+
+def _tracker(naming, rows=300, seed=5, additional=2, bonus=2):
+    """Random tracker with payouts, NaNs, mandatory flags and achievements around 100%"""
+    rng = np.random.default_rng(seed)
+    suffixes = [''] + [f'_p{i}' for i in range(1, additional + 1)]
+    data = {}
+    for suffix in suffixes:
+        for col in naming['payouts']:
+            values = rng.uniform(0, 5000, rows).round(2)
+            values[rng.random(rows) < 0.1] = np.nan
+            data[f'{col}{suffix}'] = values
+        data[f'Mandatory Qualify{suffix}'] = rng.choice(['Yes', 'No', None], rows)
+        achieved = rng.uniform(0.5, 1.5, rows)
+        achieved[rng.random(rows) < 0.1] = np.nan
+        achieved[rng.random(rows) < 0.05] = 1.0
+        data[f"{naming['achieved']}{suffix}"] = achieved
+    for i in range(1, bonus + 1):
+        data[f'Bonus Scheme {i} Bonus Payout'] = rng.uniform(0, 1000, rows).round(2)
+        data[f'Bonus Scheme {i} MP Payout'] = rng.uniform(0, 1000, rows).round(2)
+    return pd.DataFrame(data)
+
+
+@pytest.mark.parametrize('scheme_type', ['inbuilt', 'target-based', 'ho-scheme'])
+def test_calculation_naming_matches_the_old_row_loop(scheme_type):
+    df = _tracker(CALCULATION_PAYOUT_COLUMNS)
+
+    result = compute_final_payout(df, scheme_type, ['_p1', '_p2'], 2)
+
+    expected = [_old_calculation_payout(row, scheme_type, 2, 2) for _, row in df.iterrows()]
+    np.testing.assert_allclose(result, expected)
+
+
+@pytest.mark.parametrize('scheme_type', ['inbuilt', 'target-based', 'ho-scheme'])
+def test_tracker_naming_keeps_nan_propagation(scheme_type):
+    df = _tracker(TRACKER_PAYOUT_COLUMNS)
+
+    result = compute_final_payout(df, scheme_type, ['_p1', '_p2'], 2,
+                                  naming=TRACKER_PAYOUT_COLUMNS, skipna=False)
+
+    expected = [_old_tracker_payout(row, scheme_type, 2, 2) for _, row in df.iterrows()]
+    np.testing.assert_allclose(result, np.asarray(expected, dtype=float))
+    if scheme_type != 'inbuilt':
+        assert np.isnan(result).any()
+
+
+def test_mandatory_qualification_boundaries():
+    df = pd.DataFrame({
+        'Total_Payout': [100.0, 100.0, 100.0, 100.0, 100.0],
+        'Mandatory Qualify': ['Yes', 'Yes', 'Yes', 'No', 'Yes'],
+        'percentage_achieved': pd.Series([1.0, 0.999, None, 0.2, 1.2], dtype=object),
+        'Total_Payout_p1': [1.0, 1.0, 1.0, 1.0, 1.0],
+        'Mandatory Qualify_p1': ['No', 'No', 'No', 'No', 'Yes'],
+    })
+
+    # Exactly 100% qualifies; a missing achievement (or achievement column) fails
+    result = compute_final_payout(df, 'target-based', ['_p1'], 0)
+
+    assert result.tolist() == [101.0, 0.0, 0.0, 101.0, 0.0]
+
+
+def test_bonus_payouts_only_count_for_ho_schemes():
+    df = pd.DataFrame({
+        'Total_Payout': [100.0],
+        'Bonus Scheme 1 Bonus Payout': [10.0],
+        'Bonus Scheme 1 MP Payout': [5.0],
+        'Bonus Scheme 2 Bonus Payout': [1000.0],
+    })
+
+    assert compute_final_payout(df, 'ho-scheme', [], 1).tolist() == [115.0]
+    assert compute_final_payout(df, 'ho-scheme', [], 2).tolist() == [1115.0]
+    assert compute_final_payout(df, 'target-based', [], 2).tolist() == [100.0]
+
+
+def test_missing_columns_and_empty_frames():
+    assert compute_final_payout(pd.DataFrame({'x': [1, 2]}), 'target-based', ['_p1'], 1).tolist() == [0.0, 0.0]
+    assert len(compute_final_payout(pd.DataFrame(), 'ho-scheme', [], 1)) == 0
@@ -0,0 +1,50 @@
+"""
+Offline round trip of a real pipeline output through the costing result store
+
+    python -m pytest -q test_result_store_roundtrip.py
+"""
+
+import io
+import math
+import contextlib
+import warnings
+
+import pytest
+
+from benchmarks.generators import generate_case
+from benchmarks.offline import OfflineSchemeProcessor
+from result_store import CostingResultStore
+
+
+@pytest.fixture(scope="module")
+def result_data():
+    scheme_json, sales_df, material_df = generate_case('typical', 10000, seed=3)
+    processor = OfflineSchemeProcessor(scheme_json, sales_df, material_df)
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assert processor.process_scheme('ROUNDTRIP')
+        return processor.get_calculation_results_json('ROUNDTRIP')
+
+
+def _same(expected, actual):
+    if isinstance(expected, float) and math.isnan(expected):
+        return isinstance(actual, float) and math.isnan(actual)
+    return type(expected) is type(actual) and expected == actual
+
+
+def test_stored_result_matches_fresh_run(result_data, tmp_path):
+    store = CostingResultStore(directory=str(tmp_path))
+    version = {'content_hash': 'hash', 'watermark': '1'}
+    store.save('ROUNDTRIP', version, result_data)
+
+    stored = store.load('ROUNDTRIP', version).result_data()
+
+    assert stored['headers'] == result_data['headers']
+    assert len(stored['data']) == len(result_data['data'])
+    mismatched = {
+        header
+        for expected_row, actual_row in zip(result_data['data'], stored['data'])
+        for header, expected, actual in zip(result_data['headers'], expected_row, actual_row)
+        if not _same(expected, actual)
+    }
+    assert not mismatched, sorted(mismatched)
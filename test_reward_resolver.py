@@ -0,0 +1,127 @@
+"""
+Offline checks for calculations.reward_resolver against the row-by-row reward
+slab scans it replaced (rewards_calculations and tracker_runner)
+
+    python -m pytest -q test_reward_resolver.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculations.reward_resolver import RewardSlabResolver, credit_note_rewards
+from calculations.rewards_calculations import _calculate_rewards_column
+
+SLABS = pd.DataFrame({
+    'slab_from': [1000.0, 0.0, 5000.0],        # out of order on purpose
+    'slab_to': [5000.0, 1000.0, 20000.0],      # touching boundaries
+    'scheme_reward': ['Watch', 'Bag', 'Phone'],
+})
+
+GAPPED = pd.DataFrame({
+    'slab_from': [100.0, 1000.0, 5000.0],
+    'slab_to': [999.0, 4000.0, 20000.0],
+    'scheme_reward': ['Bag', 'Watch', 'Phone'],
+})
+
+OVERLAPPING = pd.DataFrame({
+    'slab_from': [0.0, 1000.0, 1500.0, np.nan, 300.0],
+    'slab_to': [5000.0, 2000.0, 8000.0, 9000.0, None],
+    'scheme_reward': ['Bag', 'Watch', 'Phone', 'Never', 'Never'],
+})
+
+
+def _old_scheme_reward(final_payout, reward_slabs_df):
+    """tracker_runner.calculate_scheme_reward: first slab in slab order whose bounds are set and hold the payout"""
+    if pd.isna(final_payout) or final_payout == 0 or reward_slabs_df.empty:
+        return ""
+    for _, slab in reward_slabs_df.iterrows():
+        slab_from = slab['slab_from']
+        slab_to = slab['slab_to']
+        if pd.notna(slab_from) and pd.notna(slab_to):
+            if slab_from <= final_payout <= slab_to:
+                return slab['scheme_reward']
+    return ""
+
+
+def _payouts(slabs_df):
+    bounds = pd.concat([slabs_df['slab_from'], slabs_df['slab_to']]).dropna().to_numpy(dtype=float)
+    edges = np.concatenate([bounds, bounds - 0.5, bounds + 0.5])
+    rng = np.random.default_rng(11)
+    return np.concatenate([[np.nan, 0.0, -50.0, 1e9], edges, rng.uniform(-100, 25000, 500)])
+
+
+@pytest.mark.parametrize('slabs_df', [SLABS, GAPPED, OVERLAPPING], ids=['touching', 'gapped', 'overlapping'])
+def test_resolve_matches_the_old_row_scan(slabs_df):
+    payouts = _payouts(slabs_df)
+    eligible = ~np.isnan(payouts) & (payouts != 0)
+
+    resolved = RewardSlabResolver(slabs_df).resolve(payouts, eligible=eligible)
+
+    assert resolved.tolist() == [_old_scheme_reward(payout, slabs_df) for payout in payouts]
+
+
+def test_below_first_boundary_and_above_last():
+    resolver = RewardSlabResolver(GAPPED)
+    payouts = [50.0, 100.0, 999.0, 999.5, 1000.0, 20000.0, 20000.5]
+
+    assert resolver.slab_index(payouts).tolist() == [-1, 0, 0, -1, 1, 2, -1]
+    assert resolver.resolve(payouts).tolist() == ['', 'Bag', 'Bag', '', 'Watch', 'Phone', '']
+
+
+def test_shared_boundary_goes_to_the_earlier_slab():
+    resolver = RewardSlabResolver(SLABS)
+
+    # 1000 ends 'Bag' and starts 'Watch'; 'Watch' comes first in slab order
+    assert resolver.resolve([1000.0, 5000.0]).tolist() == ['Watch', 'Watch']
+
+
+def test_slabs_with_a_missing_bound_never_match():
+    resolver = RewardSlabResolver(OVERLAPPING)
+
+    assert len(resolver) == 3
+    assert resolver.resolve([8500.0, 200.0]).tolist() == ['', 'Bag']
+
+
+def test_empty_slabs_resolve_to_default():
+    for resolver in (RewardSlabResolver(pd.DataFrame()), RewardSlabResolver(None)):
+        assert resolver.empty
+        assert resolver.slab_index([0.0, 500.0]).tolist() == [-1, -1]
+        assert resolver.resolve([0.0, 500.0]).tolist() == ['', '']
+        assert resolver.resolve([500.0], default=None).tolist() == [None]
+
+
+def test_ineligible_payouts_get_the_default():
+    resolver = RewardSlabResolver(GAPPED)
+
+    assert resolver.resolve([500.0, 500.0], eligible=[True, False]).tolist() == ['Bag', '']
+
+
+def test_credit_note_rewards_match_the_old_formats():
+    payouts = pd.Series([1234.56, 0.0, np.nan, -20.5, 99.99], index=[10, 11, 12, 13, 14])
+    eligible = (payouts.notna() & (payouts != 0)).to_numpy()
+
+    tracker = credit_note_rewards(payouts, eligible)
+    rewards = credit_note_rewards(payouts.fillna(0.0), (payouts.fillna(0.0) > 0).to_numpy(), as_integer=True)
+
+    expected_tracker = [f"Credit Note Rs. {p}" if pd.notna(p) and p != 0 else "" for p in payouts]
+    expected_rewards = [f"Credit Note Rs. {int(p)}" if p > 0 else "" for p in payouts.fillna(0.0)]
+    assert tracker.index.equals(payouts.index)
+    assert tracker.tolist() == expected_tracker
+    assert rewards.tolist() == expected_rewards
+    assert credit_note_rewards(payouts, np.zeros(len(payouts), dtype=bool)).tolist() == [''] * 5
+
+
+def test_rewards_column_uses_main_scheme_slabs_for_ho_schemes():
+    rewards_df = pd.concat([
+        SLABS.assign(scheme_type='main_scheme'),
+        GAPPED.assign(scheme_type='additional_scheme', scheme_reward='Other'),
+    ])
+    tracker_df = pd.DataFrame({'Scheme Final Payout': [500.0, 1000.0, 0.0, None, 25000.0, 7000.0]})
+
+    ho = _calculate_rewards_column(tracker_df, 'ho-scheme', rewards_df)
+    target = _calculate_rewards_column(tracker_df, 'target-based', rewards_df)
+
+    assert ho.tolist() == ['Bag', 'Watch', '', '', '', 'Phone']
+    assert target.tolist() == ['Credit Note Rs. 500', 'Credit Note Rs. 1000', '', '', 'Credit Note Rs. 25000',
+                               'Credit Note Rs. 7000']
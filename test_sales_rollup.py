@@ -0,0 +1,171 @@
+"""
+Offline checks for the monthly rollup routing (sales_rollup.split_rollup_ranges,
+the refresh fingerprint comparison, the read-side id watermark check and
+SalesFetcher reading through a rollup)
+
+    python -m pytest -q test_sales_rollup.py
+"""
+
+import contextlib
+import io
+import warnings
+from datetime import date
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from benchmarks.generators import generate_case
+from benchmarks.offline import OfflineSchemeProcessor
+import sales_rollup
+from sales_rollup import SalesRollup, _changed_months, split_rollup_ranges
+
+
+def test_whole_base_months_go_to_the_rollup_and_edges_stay_daily():
+    rollup, daily = split_rollup_ranges([('2024-01-15', '2024-04-10')], [('2025-01-01', '2025-03-31')])
+
+    assert rollup == [('2024-02-01', '2024-03-31')]
+    assert daily == [('2025-01-01', '2025-03-31'), ('2024-01-15', '2024-01-31'), ('2024-04-01', '2024-04-10')]
+
+
+def test_overlapping_base_periods_keep_partially_covered_months_daily():
+    # February is whole in the first base period but only half of it in the second
+    rollup, daily = split_rollup_ranges([('2024-01-01', '2024-03-31'), ('2024-02-15', '2024-05-31')], [])
+
+    assert rollup == [('2024-01-01', '2024-01-31'), ('2024-03-01', '2024-05-31')]
+    assert daily == [('2024-02-01', '2024-02-29')]
+
+
+def test_months_touched_by_the_scheme_period_stay_daily():
+    rollup, daily = split_rollup_ranges([('2024-01-01', '2024-03-31')], [('2024-03-20', '2024-06-30')])
+
+    assert rollup == [('2024-01-01', '2024-02-29')]
+    assert daily == [('2024-03-20', '2024-06-30'), ('2024-03-01', '2024-03-31')]
+
+
+def test_stale_months_stay_daily():
+    rollup, daily = split_rollup_ranges([('2024-01-01', '2024-03-31')], [], stale_months=[date(2024, 2, 1)])
+
+    assert rollup == [('2024-01-01', '2024-01-31'), ('2024-03-01', '2024-03-31')]
+    assert daily == [('2024-02-01', '2024-02-29')]
+
+
+class _Cursor:
+    """Returns queued result sets in order and records every (query, params)"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        self.result = self.results.pop(0) if self.results else []
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _DatabaseManager:
+    def __init__(self, cursor):
+        self.cursor_ = cursor
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return self.cursor_
+
+
+def test_changed_months_compare_counts_and_sums():
+    cursor = _Cursor([
+        (date(2024, 1, 1), 10, 5.0, 100.0, 10, 5.0, 100.0 + 1e-9),  # same (float noise)
+        (date(2024, 2, 1), 11, 5.0, 100.0, 10, 5.0, 100.0),         # late-committed insert
+        (date(2024, 3, 1), 10, 7.0, 100.0, 10, 5.0, 100.0),         # updated volume
+        (date(2024, 4, 1), None, None, None, 3, 1.0, 1.0),          # rows deleted
+        (date(2024, 5, 1), 2, 1.0, 1.0, None, None, None),          # not rolled up yet
+        (None, 4, 1.0, 1.0, None, None, None),                      # rows without a sale date
+    ])
+
+    changed = _changed_months(cursor)
+
+    assert changed == {date(2024, 2, 1), date(2024, 3, 1), date(2024, 4, 1), date(2024, 5, 1)}
+
+
+def test_stale_months_checks_id_watermarks_once_per_probe_interval(monkeypatch):
+    cursor = _Cursor([(1,)], [(date(2024, 2, 1),)])
+    monkeypatch.setattr(sales_rollup, 'database_manager', _DatabaseManager(cursor))
+    rollup = SalesRollup(probe_interval=60)
+
+    assert rollup.stale_months([('2024-01-10', '2024-03-05')]) == {date(2024, 2, 1)}
+    months_param = cursor.executed[1][1][0]
+    assert months_param == [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)]
+    # The read path never aggregates sales_data
+    assert all('SUM(' not in query and 'COUNT(' not in query for query, _ in cursor.executed)
+
+    # Cached verdicts: no new queries inside the probe interval
+    assert rollup.stale_months([('2024-02-01', '2024-02-29')]) == {date(2024, 2, 1)}
+    assert len(cursor.executed) == 2
+
+
+def test_stale_months_is_none_until_the_rollup_is_built(monkeypatch):
+    monkeypatch.setattr(sales_rollup, 'database_manager', _DatabaseManager(_Cursor([])))
+
+    assert SalesRollup().stale_months([('2024-01-01', '2024-01-31')]) is None
+
+
+class _FrameRollup:
+    """SalesRollup stand-in aggregating a sales frame the way sales_monthly_rollup does"""
+
+    def __init__(self, sales_df, stale=()):
+        self.sales = sales_df.assign(
+            month_start=pd.to_datetime(sales_df['sale_date']).dt.to_period('M').dt.to_timestamp())
+        self.stale = frozenset(stale)
+        self.requested = []
+
+    def stale_months(self, ranges):
+        return self.stale
+
+    def fetch_ranges(self, ranges, filters):
+        self.requested.extend(ranges)
+        mask = pd.Series(False, index=self.sales.index)
+        for start, end in ranges:
+            mask |= self.sales['month_start'].between(pd.Timestamp(start), pd.Timestamp(end))
+        selected = self.sales[mask]
+        keys = [c for c in ('division', 'distributor', 'location', 'credit_account', 'material', 'month_start')
+                if c in selected.columns]
+        grouped = selected.groupby(keys, dropna=False, sort=True)
+        rolled = grouped.agg(volume=('volume', 'sum'), value=('value', 'sum')).reset_index()
+        for column in selected.columns:
+            if column not in keys and column not in ('volume', 'value', 'sale_date'):
+                rolled[column] = grouped[column].min().to_numpy()
+        rolled = rolled.rename(columns={'month_start': 'sale_date'})
+        return list(rolled.columns), list(rolled.itertuples(index=False, name=None))
+
+
+def _run(rollup_factory):
+    warnings.simplefilter('ignore')
+    scheme_json, sales, materials = generate_case('typical', 10_000, seed=3)
+    processor = OfflineSchemeProcessor(scheme_json, sales, materials)
+    if rollup_factory is not None:
+        processor.sales_fetcher.sales_rollup = rollup_factory(sales)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert processor.process_scheme('B')
+    results = processor.calculation_results
+    return results.sort_values('credit_account').reset_index(drop=True), processor.sales_fetcher.sales_rollup
+
+
+def test_rollup_routing_matches_daily_results():
+    daily, _ = _run(None)
+    rolled, rollup = _run(_FrameRollup)
+
+    assert rollup.requested
+    assert_frame_equal(daily, rolled[daily.columns], check_exact=False)
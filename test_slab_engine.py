@@ -0,0 +1,170 @@
+"""
+Offline checks for calculations.slab_engine.SlabTable against the per-slab
+mask loops it replaced (growth/payout/conditional payout/costing service)
+
+    python -m pytest -q test_slab_engine.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculations.slab_engine import (
+    SlabTable, FALLBACK_BELOW_FIRST, FALLBACK_NONE, FALLBACK_UNMATCHED, FALLBACK_ZERO
+)
+
+SLABS = pd.DataFrame({
+    'slab_start': [0.0, 1000.0, 5000.0],
+    'slab_end': [1000.0, 5000.0, 10000.0],   # touching boundaries
+    'rate': [0.05, 0.10, 0.15],
+})
+
+GAPPED = pd.DataFrame({
+    'slab_start': [100.0, 1000.0, 5000.0],
+    'slab_end': [999.0, 4000.0, 10000.0],
+    'rate': [0.05, 0.10, 0.15],
+})
+
+
+def _old_last_wins(slabs_df, values, column):
+    """Old loop: one mask per slab in slab_start order, later slabs overwrite"""
+    slabs_df = slabs_df.sort_values('slab_start')
+    result = np.zeros(len(values))
+    matched = np.zeros(len(values), dtype=bool)
+    for _, slab in slabs_df.iterrows():
+        end = float('inf') if pd.isna(slab['slab_end']) else float(slab['slab_end'])
+        mask = (values >= float(slab['slab_start'])) & (values <= end)
+        result[mask] = float(slab[column])
+        matched |= mask
+    return result, matched
+
+
+def _old_growth(slabs_df, values, column):
+    """growth_calculations: last slab wins, then zero/unmatched accounts take a positive first-slab rate"""
+    result, _ = _old_last_wins(slabs_df, values, column)
+    first_rate = float(slabs_df.sort_values('slab_start').iloc[0][column])
+    if first_rate > 0:
+        result[(result == 0) | (values == 0)] = first_rate
+    return result
+
+
+def _old_payout(slabs_df, values, column):
+    """payout_calculations: last slab wins, unmatched accounts take the first slab"""
+    result, matched = _old_last_wins(slabs_df, values, column)
+    result[~matched] = float(slabs_df.sort_values('slab_start').iloc[0][column])
+    return result
+
+
+def _old_conditional(slabs_df, values, column):
+    """conditional_payout_calculations: only unmatched accounts below the first slab take it"""
+    result, matched = _old_last_wins(slabs_df, values, column)
+    first = slabs_df.sort_values('slab_start').iloc[0]
+    result[~matched & (values < float(first['slab_start']))] = float(first[column])
+    return result
+
+
+def _old_first_match(slabs, values, column):
+    """optimized_costing_service: per-row scan, first matching slab else first slab"""
+    result = []
+    for value in values:
+        slab = next((s for s in slabs if s['slab_start'] <= value <= s['slab_end']), slabs[0])
+        result.append(slab[column])
+    return np.array(result, dtype=float)
+
+
+def _values(slabs_df):
+    starts, ends = slabs_df['slab_start'].to_numpy(), slabs_df['slab_end'].to_numpy()
+    edges = np.concatenate([starts, ends, starts - 0.5, ends + 0.5])
+    rng = np.random.default_rng(7)
+    return np.concatenate([[-10.0, 0.0, 1e9], edges, rng.uniform(-100, 12000, 500)])
+
+
+@pytest.mark.parametrize('slabs_df', [SLABS, GAPPED], ids=['touching', 'gapped'])
+@pytest.mark.parametrize('fallback, reference', [
+    (FALLBACK_ZERO, _old_growth),
+    (FALLBACK_UNMATCHED, _old_payout),
+    (FALLBACK_BELOW_FIRST, _old_conditional),
+])
+def test_resolve_matches_the_old_mask_loops(slabs_df, fallback, reference):
+    values = _values(slabs_df)
+    table = SlabTable.from_frame(slabs_df.sample(frac=1, random_state=1), ['rate'])
+
+    resolved = table.resolve(values, fallback=fallback)['rate']
+
+    np.testing.assert_array_equal(resolved, reference(slabs_df, values, 'rate'))
+
+
+def test_below_first_boundary_and_above_last():
+    table = SlabTable.from_frame(GAPPED, ['rate'])
+    values = [50.0, 100.0, 999.0, 999.5, 1000.0, 10000.0, 10000.5]
+
+    assert table.slab_index(values).tolist() == [-1, 0, 0, -1, 1, 2, -1]
+    assert table.resolve(values, fallback=FALLBACK_NONE)['rate'].tolist() == [0, 0.05, 0.05, 0, 0.10, 0.15, 0]
+    assert table.resolve(values, fallback=FALLBACK_BELOW_FIRST)['rate'].tolist() == [
+        0.05, 0.05, 0.05, 0, 0.10, 0.15, 0]
+    assert table.resolve(values, fallback=FALLBACK_UNMATCHED)['rate'].tolist() == [
+        0.05, 0.05, 0.05, 0.05, 0.10, 0.15, 0.05]
+
+
+def test_shared_boundary_goes_to_the_later_slab():
+    table = SlabTable.from_frame(SLABS, ['rate'])
+
+    assert table.resolve([1000.0, 5000.0])['rate'].tolist() == [0.10, 0.15]
+
+
+def test_missing_slab_end_is_open_ended():
+    slabs_df = SLABS.assign(slab_end=[1000.0, 5000.0, np.nan])
+    table = SlabTable.from_frame(slabs_df, ['rate'])
+    values = np.array([5000.0, 1e12])
+
+    assert table.resolve(values, fallback=FALLBACK_NONE)['rate'].tolist() == [0.15, 0.15]
+    np.testing.assert_array_equal(table.resolve(values, fallback=FALLBACK_ZERO)['rate'],
+                                  _old_growth(slabs_df, values, 'rate'))
+
+
+def test_overlapping_slabs_resolve_by_priority():
+    slabs = [
+        {'slab_start': 0.0, 'slab_end': 5000.0, 'rate': 0.05},
+        {'slab_start': 1000.0, 'slab_end': 2000.0, 'rate': 0.10},
+        {'slab_start': 1500.0, 'slab_end': 8000.0, 'rate': 0.15},
+    ]
+    slabs_df = pd.DataFrame(slabs)
+    values = _values(slabs_df)
+
+    last = SlabTable.from_frame(slabs_df, ['rate'])
+    first = SlabTable.from_frame(slabs_df, ['rate'], priority='first', sort=False)
+
+    np.testing.assert_array_equal(last.resolve(values)['rate'], _old_payout(slabs_df, values, 'rate'))
+    np.testing.assert_array_equal(first.resolve(values)['rate'], _old_first_match(slabs, values, 'rate'))
+
+
+def test_first_priority_matches_the_costing_row_loop():
+    slabs = GAPPED.to_dict('records')
+    values = _values(GAPPED)
+    table = SlabTable.from_frame(GAPPED, ['rate'], priority='first', sort=False)
+
+    np.testing.assert_array_equal(table.resolve(values)['rate'], _old_first_match(slabs, values, 'rate'))
+
+
+def test_skip_missing_keeps_the_next_slab_that_sets_the_attribute():
+    slabs = [
+        {'slabStart': '0', 'slabEnd': '1000', 'target': '10'},
+        {'slabStart': '500', 'slabEnd': '2000', 'target': ''},
+    ]
+    table = SlabTable.from_records(slabs, {'target': 'target'})
+
+    assert table.resolve([700.0, 1500.0, 3000.0], skip_missing=True)['target'].tolist() == [10.0, 10.0, 10.0]
+    assert table.resolve([700.0], skip_missing=True, fallback=FALLBACK_NONE)['target'].tolist() == [10.0]
+
+
+@pytest.mark.parametrize('fallback', [FALLBACK_NONE, FALLBACK_UNMATCHED, FALLBACK_BELOW_FIRST, FALLBACK_ZERO])
+def test_empty_slab_table_resolves_to_default(fallback):
+    table = SlabTable.from_frame(pd.DataFrame(), ['rate'])
+    values = [-1.0, 0.0, 500.0]
+
+    assert table.empty
+    assert table.slab_index(values).tolist() == [-1, -1, -1]
+    assert table.resolve(values, fallback=fallback)['rate'].tolist() == [0.0, 0.0, 0.0]
+    assert table.resolve(values, fallback=fallback, default=-1.0)['rate'].tolist() == [-1.0, -1.0, -1.0]
+    assert table.first_value('rate') == 0.0
+    assert table.floor_to_first_slab(values).tolist() == values
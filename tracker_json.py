@@ -0,0 +1,133 @@
+"""
+Streaming JSON serializer for tracker output
+
+Replaces the per-row iterrows() + OrderedDict + json.dumps(indent=4) pattern.
+Columns are converted to native Python values once (NaN -> null,
++/-inf -> "Infinity"/"-Infinity", same as before), records are encoded in
+chunks and the output is compact unless an indent is requested. orjson is
+used when installed.
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 'auto' uses orjson when available, 'json' forces the standard library
+TRACKER_JSON_BACKEND = os.getenv("TRACKER_JSON_BACKEND", "auto").lower()
+# Pretty-printing is opt-in; compact output keeps JSONB payloads small
+TRACKER_JSON_INDENT = int(os.getenv("TRACKER_JSON_INDENT", "0")) or None
+TRACKER_JSON_CHUNK_ROWS = int(os.getenv("TRACKER_JSON_CHUNK_ROWS", "5000"))
+
+
+def _json_default(value):
+    """Fallback for numpy scalars, Decimals, timestamps, etc."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _column_values(series):
+    """Column as a list of JSON-ready Python values"""
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+        if not series.hasnans:
+            return series.to_numpy().tolist()
+
+    if pd.api.types.is_float_dtype(series.dtype):
+        array = series.to_numpy(dtype=float, na_value=np.nan)
+        values = array.tolist()
+        for i in np.flatnonzero(np.isnan(array)):
+            values[i] = None
+        for i in np.flatnonzero(np.isposinf(array)):
+            values[i] = "Infinity"
+        for i in np.flatnonzero(np.isneginf(array)):
+            values[i] = "-Infinity"
+        return values
+
+    values = series.astype(object).tolist()
+    null_mask = series.isna().to_numpy()
+    for i in np.flatnonzero(null_mask):
+        values[i] = None
+    for i, value in enumerate(values):
+        if isinstance(value, float) and value in (float('inf'), float('-inf')):
+            values[i] = "Infinity" if value > 0 else "-Infinity"
+        elif isinstance(value, np.generic):
+            values[i] = value.item()
+    return values
+
+
+def _use_orjson(indent):
+    return orjson is not None and TRACKER_JSON_BACKEND != "json" and not indent
+
+
+def _encode_records(records, indent):
+    if _use_orjson(indent):
+        return orjson.dumps(records, default=_json_default).decode("utf-8")
+    if indent:
+        return json.dumps(records, indent=indent, ensure_ascii=False, default=_json_default)
+    return json.dumps(records, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+def encode_json(value, indent=None):
+    """Encode one JSON-ready value with the configured backend"""
+    return _encode_records(value, indent)
+
+
+def iter_tracker_records(df, chunk_rows=None):
+    """Yield df's records as lists of JSON-ready dicts, chunk_rows at a time"""
+    chunk_rows = chunk_rows or TRACKER_JSON_CHUNK_ROWS
+    columns = [str(col) for col in df.columns]
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        column_values = [_column_values(chunk.iloc[:, i]) for i in range(len(columns))]
+        yield [dict(zip(columns, row)) for row in zip(*column_values)]
+
+
+def iter_tracker_json(df, indent=None, chunk_rows=None):
+    """
+    Yield the JSON array of df's records (column order preserved) in chunks.
+    indent=None gives compact output; an int reproduces json.dumps(..., indent=n).
+    """
+    indent = TRACKER_JSON_INDENT if indent is None else indent
+
+    if df.empty:
+        yield "[]"
+        return
+
+    item_separator = ",\n" if indent else ","
+    pad = " " * indent if indent else ""
+    yield "[\n" if indent else "["
+
+    for chunk_index, records in enumerate(iter_tracker_records(df, chunk_rows)):
+        if indent:
+            # Indent each record one level, matching a single json.dumps(list, indent=n)
+            body = item_separator.join(
+                "\n".join(pad + line for line in _encode_records(record, indent).split("\n"))
+                for record in records
+            )
+        else:
+            body = _encode_records(records, indent)[1:-1]
+
+        yield (item_separator if chunk_index else "") + body
+
+    yield "\n]" if indent else "]"
+
+
+def tracker_to_json(df, indent=None, chunk_rows=None):
+    """Tracker frame as one JSON string"""
+    return "".join(iter_tracker_json(df, indent=indent, chunk_rows=chunk_rows))
+
+
+def write_tracker_json(df, fp, indent=None, chunk_rows=None):
+    """Stream tracker JSON into a text file-like object; returns characters written"""
+    written = 0
+    for part in iter_tracker_json(df, indent=indent, chunk_rows=chunk_rows):
+        fp.write(part)
+        written += len(part)
+    return written
@@ -1,10 +1,13 @@
 import psycopg2
+import numpy as np
 import pandas as pd
 import threading
 import itertools
 import sys
 import time
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 # Import the queries from the separate file
 from tracker_queries import (
@@ -13,6 +16,15 @@ from tracker_queries import (
     TRACKER_ADDITIONAL_SCHEME_VALUE,
     TRACKER_ADDITIONAL_SCHEME_VOLUME
 )
+from sales_query_builder import apply_sale_date_column
+from tracker_json import tracker_to_json
+from tracker_store import save_tracker_run, store_blob
+from calculations.final_payout_engine import compute_final_payout, TRACKER_PAYOUT_COLUMNS
+from calculations.reward_resolver import RewardSlabResolver, credit_note_rewards
+from app.database_psycopg2 import database_manager
+
+# Max tracker templates executed at once (each on its own pooled connection)
+TRACKER_QUERY_CONCURRENCY = int(os.getenv("TRACKER_QUERY_CONCURRENCY", "4"))
 
 # Database connection parameters
 db_params = {
@@ -387,7 +399,8 @@ def build_queries_from_templates(scheme_id, scheme_config_df):
             # Replace both placeholders
             query = template.replace('{scheme_id}', scheme_id).replace('{additional_scheme_index}', str(scheme_index))
         
-        queries.append(query)
+        # Use the indexed sale_date column instead of TO_DATE(...) once migrated
+        queries.append(apply_sale_date_column(query))
         scheme_names.append(scheme_number)
     
     return queries, scheme_names
@@ -432,46 +445,48 @@ def fetch_reward_slabs(conn, scheme_id):
         print(f"❌ Error fetching reward slabs: {e}")
         return pd.DataFrame()
 
-def calculate_scheme_reward(final_payout, reward_slabs_df):
+# scheme_id -> (slab rows, RewardSlabResolver) for the process lifetime
+_reward_resolvers = {}
+_reward_resolvers_lock = threading.Lock()
+
+def get_reward_resolver(conn, scheme_id):
     """
-    Calculate scheme reward based on final payout and reward slabs.
+    Sorted reward slabs for a ho-scheme, reused while the fetched slab rows
+    are unchanged (no extra round trip to validate the cached entry).
     
-    Args:
-        final_payout: The scheme final payout amount
-        reward_slabs_df: DataFrame with reward slab data
-        
     Returns:
-        The scheme reward string or empty string if no match
+        RewardSlabResolver (empty if the scheme has no reward slabs)
     """
-    if pd.isna(final_payout) or final_payout == 0 or reward_slabs_df.empty:
-        return ""
+    slabs_df = fetch_reward_slabs(conn, scheme_id)
+    slab_rows = slabs_df.to_csv(index=False)
+    with _reward_resolvers_lock:
+        entry = _reward_resolvers.get(str(scheme_id))
+    if entry is not None and entry[0] == slab_rows:
+        print(f"♻️ Reward slabs reused from an earlier run ({len(entry[1])} slabs)")
+        return entry[1]
     
-    # Find the matching slab
-    for _, slab in reward_slabs_df.iterrows():
-        slab_from = slab['slab_from']
-        slab_to = slab['slab_to']
-        
-        # Check if final_payout falls within this slab range
-        if pd.notna(slab_from) and pd.notna(slab_to):
-            if slab_from <= final_payout <= slab_to:
-                return slab['scheme_reward']
-    
-    return ""
+    resolver = RewardSlabResolver(slabs_df)
+    with _reward_resolvers_lock:
+        _reward_resolvers[str(scheme_id)] = (slab_rows, resolver)
+    return resolver
 
-def insert_tracker_data_to_db(scheme_id, json_data, from_date, to_date, conn):
+def insert_tracker_data_to_db(scheme_id, json_data, from_date, to_date, conn, tracker_df=None):
     """
     Insert or update tracker data in the scheme_tracker_runs table.
     
+    Tracker rows (TRACKER_STORAGE_MODE 'rows'/'both') and the run row are written
+    in one transaction by tracker_store.save_tracker_run, falling back to the
+    tracker_data blob if the row store fails.
+    
     Args:
         scheme_id: The scheme ID
-        json_data: JSON string of the tracker data
+        json_data: JSON string of the tracker data (None when only rows are stored)
         from_date: Scheme period from date
         to_date: Scheme period to date
         conn: Database connection
+        tracker_df: Tracker frame, written to scheme_tracker_rows when TRACKER_STORAGE_MODE is 'rows'/'both'
     """
-    try:
-        cur = conn.cursor()
-        
+    def write_run(cur, json_data):
         # Check if record exists for this scheme_id
         check_query = """
         SELECT scheme_id FROM scheme_tracker_runs 
@@ -502,13 +517,8 @@ def insert_tracker_data_to_db(scheme_id, json_data, from_date, to_date, conn):
             """
             cur.execute(insert_query, (scheme_id, json_data, from_date, to_date))
             print(f"\n✅ Inserted tracker data in database for scheme_id: {scheme_id}")
-        
-        conn.commit()
-        cur.close()
-        
-    except Exception as db_error:
-        print(f"❌ Error saving tracker data to database: {db_error}")
-        conn.rollback()
+    
+    save_tracker_run(scheme_id, json_data, tracker_df, conn, write_run)
 
 def clean_dataframe_for_excel(df):
     """Clean the dataframe to prevent Excel corruption issues"""
@@ -533,93 +543,88 @@ def clean_dataframe_for_excel(df):
     
     return df
 
-def calculate_scheme_final_payout(row, main_scheme_type, additional_scheme_config_rows, bonus_schemes_count):
+def _run_tracker_query(query):
+    """Run one tracker template on its own pooled connection"""
+    start_time = time.time()
+    with database_manager.connection() as query_conn:
+        df = pd.read_sql_query(query, query_conn)
+    return df, time.time() - start_time
+
+def run_tracker_queries_concurrently(function_queries, max_workers=None):
     """
-    Calculate the Scheme Final Payout for a credit account based on complex conditions.
-    
-    Args:
-        row: A row from the dataframe representing a credit account
-        main_scheme_type: The scheme type of the main scheme
-        additional_scheme_config_rows: List of tuples (original_index, scheme_row, query_index) for additional schemes
-        bonus_schemes_count: Number of bonus schemes enabled
-        
-    Returns:
-        The calculated Scheme Final Payout value
+    Execute the main and additional scheme templates concurrently.
+    Returns the result frames in the same order as function_queries.
     """
-    total = 0
+    if not function_queries:
+        return []
+    max_workers = max(1, min(max_workers or TRACKER_QUERY_CONCURRENCY, len(function_queries)))
     
-    # If main scheme type is 'inbuilt', return 0
-    if main_scheme_type == 'inbuilt':
-        return 0
+    for idx, query in enumerate(function_queries):
+        print(f"\nExecuting Query {idx+1}:")
+        print(query[:200] + "..." if len(query) > 200 else query)
     
-    # Check mandatory schemes and their % achieved for all scheme types
-    # Note: % values are in decimal format (0.85 = 85%), so we compare against 1.0 (100%)
-    # For main scheme
-    if row.get("Mandatory Qualify") == "Yes":
-        achieved = row.get("% Achieved")
-        if achieved is None or achieved < 1.0:
-            return 0
+    results = [None] * len(function_queries)
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_run_tracker_query, query): idx for idx, query in enumerate(function_queries)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx], elapsed = future.result()
+            print(f"\n⏱️ Query {idx+1} finished in {elapsed:.2f}s")
+    print(f"⏱️ {len(function_queries)} tracker queries completed in {time.time() - start_time:.2f}s "
+          f"(concurrency {max_workers})")
+    return results
+
+def align_tracker_tables(tables, all_credit_accounts=None):
+    """
+    Outer-align per-scheme frames on credit_account with a single concat and
+    order rows by how many non-null values they carry (most complete first).
     
-    # For each additional scheme
-    for original_idx, scheme_row, query_index in additional_scheme_config_rows:
-        suffix = f"_p{query_index + 1}"
-        mandatory_qualify_col = f"Mandatory Qualify{suffix}"
-        if row.get(mandatory_qualify_col) == "Yes":
-            achieved_col = f"% Achieved{suffix}"
-            achieved = row.get(achieved_col)
-            if achieved is None or achieved < 1.0:
-                return 0
+    Presence is summed per table before the concat, so no helper column is
+    materialized over the full wide frame.
+    """
+    tables = [df for df in tables if 'credit_account' in df.columns]
+    if not tables:
+        return pd.DataFrame({'credit_account': list(all_credit_accounts or [])})
     
-    # If we passed all mandatory checks, calculate the total payout
+    indexed = [df.set_index('credit_account') for df in tables]
+    if not all(df.index.is_unique for df in indexed):
+        # Duplicate accounts need merge's many-to-many semantics
+        print("⚠️ Duplicate credit accounts in tracker results, falling back to sequential merge")
+        merged_df = pd.DataFrame({'credit_account': list(all_credit_accounts or [])})
+        for df in tables:
+            merged_df = pd.merge(merged_df, df, on='credit_account', how='outer')
+        presence = merged_df.notna().sum(axis=1).to_numpy()
+        return merged_df.iloc[np.argsort(-presence, kind='stable')].reset_index(drop=True)
     
-    # For ho-scheme, add bonus payouts from main scheme
-    if main_scheme_type == 'ho-scheme':
-        # Add bonus payouts for each enabled bonus scheme (1 to bonus_schemes_count)
-        for i in range(1, bonus_schemes_count+1):
-            bonus_payout_col = f"Bonus Scheme {i} Bonus Payout"
-            bonus_mp_payout_col = f"Bonus Scheme {i} MP Payout"
-            if bonus_payout_col in row:
-                total += row[bonus_payout_col]
-            if bonus_mp_payout_col in row:
-                total += row[bonus_mp_payout_col]
+    merged_df = pd.concat(indexed, axis=1, join='outer', sort=False)
+    if all_credit_accounts:
+        missing = pd.Index(list(all_credit_accounts)).difference(merged_df.index)
+        if len(missing):
+            merged_df = merged_df.reindex(merged_df.index.append(missing))
     
-    # For non-inbuilt schemes (including ho-scheme and others) we add base payouts
-    if main_scheme_type != 'inbuilt':
-        # Add base payouts from main scheme
-        base_payout_cols = ["Total Payout", "MP Final Payout", "FINAL PHASING PAYOUT"]
-        for col in base_payout_cols:
-            if col in row:
-                total += row[col]
-        
-        # Add payouts from each additional scheme
-        for original_idx, scheme_row, query_index in additional_scheme_config_rows:
-            suffix = f"_p{query_index + 1}"
-            additional_payout_cols = [f"Total Payout{suffix}", f"MP Final Payout{suffix}", f"FINAL PHASING PAYOUT{suffix}"]
-            for col in additional_payout_cols:
-                if col in row:
-                    total += row[col]
+    # credit_account itself always counts as present
+    presence = pd.Series(1, index=merged_df.index)
+    for df in indexed:
+        presence = presence.add(df.notna().sum(axis=1), fill_value=0)
+    order = np.argsort(-presence.reindex(merged_df.index).to_numpy(), kind='stable')
     
-    return total
+    merged_df = merged_df.iloc[order]
+    merged_df.index.name = 'credit_account'
+    return merged_df.reset_index()
 
 def run_multiple_queries_and_combine(function_queries, scheme_names, scheme_config_df):
+    conn = None
     try:
-        conn = psycopg2.connect(**db_params)
         stop_event = threading.Event()
         t = threading.Thread(target=loading_animation, args=(stop_event,))
         t.start()
         aligned_tables = []
         all_credit_accounts = set()
         
-        for idx, query in enumerate(function_queries):
-            cur = conn.cursor()
-            cur.execute("SET statement_timeout = 0;")
-            conn.commit()
-            cur.close()
-            
-            print(f"\nExecuting Query {idx+1}:")
-            print(query[:200] + "..." if len(query) > 200 else query)
-            
-            df = pd.read_sql_query(query, conn)
+        query_results = run_tracker_queries_concurrently(function_queries)
+        
+        for idx, df in enumerate(query_results):
             scheme_name = scheme_names[idx]
             
             if df.empty:
@@ -641,16 +646,11 @@ def run_multiple_queries_and_combine(function_queries, scheme_names, scheme_conf
             
             aligned_tables.append(df)
         
-        # Create merged dataframe with all credit accounts
-        merged_df = pd.DataFrame({'credit_account': list(all_credit_accounts)})
-        
-        # Merge all tables
-        for df in aligned_tables:
-            merged_df = pd.merge(merged_df, df, on='credit_account', how='outer')
+        # Connection for reward slabs and the tracker insert
+        conn = database_manager.getconn()
         
-        # Sort by presence (number of non-null values)
-        merged_df['presence_count'] = merged_df.notna().sum(axis=1)
-        merged_df = merged_df.sort_values(by='presence_count', ascending=False).drop(columns='presence_count')
+        # Align all tables on credit_account and sort by presence (number of non-null values)
+        merged_df = align_tracker_tables(aligned_tables, all_credit_accounts)
         
         # Only fill specific columns with 0, not the entire dataframe
         # This preserves actual values while handling missing values appropriately
@@ -957,20 +957,27 @@ def run_multiple_queries_and_combine(function_queries, scheme_names, scheme_conf
                 additional_scheme_config_rows.append((idx, row, i))
         
         # Add Scheme Final Payout column at the end
-        merged_df["Scheme Final Payout"] = merged_df.apply(
-            lambda row: calculate_scheme_final_payout(row, main_scheme_type, additional_scheme_config_rows, bonus_schemes_count),
-            axis=1
+        # Column-wise engine shared with the calculation pipeline; NaN payouts propagate as before
+        merged_df["Scheme Final Payout"] = compute_final_payout(
+            merged_df,
+            main_scheme_type,
+            [f"_p{query_index + 1}" for _, _, query_index in additional_scheme_config_rows],
+            bonus_schemes_count,
+            naming=TRACKER_PAYOUT_COLUMNS,
+            skipna=False
         )
         
         # Add Scheme Reward column based on scheme type
         if main_scheme_type == 'ho-scheme':
             # For ho-scheme, fetch reward slabs and calculate scheme reward
             print(f"\n🔍 Fetching reward slabs for ho-scheme (scheme_id: {scheme_id})")
-            reward_slabs_df = fetch_reward_slabs(conn, scheme_id)
+            reward_resolver = get_reward_resolver(conn, scheme_id)
             
-            if not reward_slabs_df.empty:
-                merged_df["Scheme Reward"] = merged_df["Scheme Final Payout"].apply(
-                    lambda payout: calculate_scheme_reward(payout, reward_slabs_df)
+            if not reward_resolver.empty:
+                final_payout = merged_df["Scheme Final Payout"]
+                merged_df["Scheme Reward"] = reward_resolver.resolve(
+                    final_payout.to_numpy(dtype=float, na_value=np.nan),
+                    eligible=(final_payout.notna() & (final_payout != 0)).to_numpy()
                 )
                 print(f"✅ Added Scheme Reward column based on reward slabs")
             else:
@@ -979,8 +986,9 @@ def run_multiple_queries_and_combine(function_queries, scheme_names, scheme_conf
                 print(f"⚠️ No reward slabs found, setting Scheme Reward to empty")
         else:
             # For non-ho-scheme, use "Credit Note Rs. " + Scheme Final Payout
-            merged_df["Scheme Reward"] = merged_df["Scheme Final Payout"].apply(
-                lambda payout: f"Credit Note Rs. {payout}" if pd.notna(payout) and payout != 0 else ""
+            final_payout = merged_df["Scheme Final Payout"]
+            merged_df["Scheme Reward"] = credit_note_rewards(
+                final_payout, (final_payout.notna() & (final_payout != 0)).to_numpy()
             )
             print(f"✅ Added Scheme Reward column with 'Credit Note Rs.' prefix for non-ho-scheme")
         
@@ -1008,31 +1016,12 @@ def run_multiple_queries_and_combine(function_queries, scheme_names, scheme_conf
             # merged_df.to_excel(excel_filename, index=False, engine='xlsxwriter')
             # print(f"\n✅ Tracker results saved to Excel: {excel_filename}")
             
-            # Create ordered JSON manually to preserve column order
-            import collections
-            
             # Get column names in exact order from dataframe
             column_order = list(merged_df.columns)
             
-            # Create ordered records manually
-            ordered_records = []
-            for _, row in merged_df.iterrows():
-                ordered_record = collections.OrderedDict()
-                for col in column_order:
-                    value = row[col]
-                    # Handle NaN and infinity values
-                    if pd.isna(value):
-                        ordered_record[col] = None
-                    elif value == float('inf'):
-                        ordered_record[col] = "Infinity"
-                    elif value == float('-inf'):
-                        ordered_record[col] = "-Infinity"
-                    else:
-                        ordered_record[col] = value
-                ordered_records.append(ordered_record)
-            
-            # Convert to JSON string with preserved order
-            json_data = json.dumps(ordered_records, indent=4, ensure_ascii=False)
+            # Column-wise serialization (NaN -> null, inf -> "Infinity"), compact unless TRACKER_JSON_INDENT is set
+            # Skipped when the tracker is only kept in the scheme_tracker_rows row store
+            json_data = tracker_to_json(merged_df) if store_blob() else None
             
             # # Save JSON file
             # with open(json_filename, 'w', encoding='utf-8') as json_file:
@@ -1047,25 +1036,24 @@ def run_multiple_queries_and_combine(function_queries, scheme_names, scheme_conf
             # Get scheme period dates from main scheme configuration
             scheme_period_from = main_scheme_row['scheme_period_from'].values[0] if not main_scheme_row.empty else None
             scheme_period_to = main_scheme_row['scheme_period_to'].values[0] if not main_scheme_row.empty else None
-            insert_tracker_data_to_db(scheme_id, json_data, scheme_period_from, scheme_period_to, conn)
+            insert_tracker_data_to_db(scheme_id, json_data, scheme_period_from, scheme_period_to, conn, tracker_df=merged_df)
             
         except Exception as save_error:
             print(f"❌ Error during processing: {save_error}")
             print("Displaying first 5 rows in terminal:")
             print(merged_df.head())
-        
-        conn.close()
     except Exception as e:
         stop_event.set()
         t.join()
         print(f"\n❌ Error during query execution: {e}")
+    finally:
+        database_manager.putconn(conn)
 
 if __name__ == "__main__":
     scheme_id = input("Enter Scheme ID: ").strip()
     try:
-        conn = psycopg2.connect(**db_params)
-        scheme_config_df = fetch_scheme_config(conn, scheme_id)
-        conn.close()
+        with database_manager.connection() as conn:
+            scheme_config_df = fetch_scheme_config(conn, scheme_id)
         
         if scheme_config_df.empty:
             print("No scheme data returned for this scheme_id.")
@@ -0,0 +1,208 @@
+"""
+Row-store persistence for tracker output
+
+Alongside (or instead of) the single scheme_tracker_runs.tracker_data JSONB
+blob, tracker rows can be stored one per credit account in
+scheme_tracker_rows. Writes go through COPY into a temp table followed by an
+upsert that only rewrites rows whose content changed, plus a delete of
+accounts that dropped out. Reads are paginated by row order or filtered by
+account, so neither side has to parse or rewrite the whole tracker.
+
+TRACKER_STORAGE_MODE: 'blob' (default, legacy), 'rows', or 'both'.
+"""
+
+import io
+import os
+import csv
+import hashlib
+
+from tracker_json import iter_tracker_records, encode_json, tracker_to_json
+
+TRACKER_STORAGE_MODE = os.getenv("TRACKER_STORAGE_MODE", "blob").lower()
+TRACKER_ROWS_TABLE = "scheme_tracker_rows"
+
+TRACKER_ROWS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {TRACKER_ROWS_TABLE} (
+    scheme_id bigint NOT NULL,
+    credit_account text NOT NULL,
+    row_order integer NOT NULL,
+    row_data jsonb NOT NULL,
+    row_hash text NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (scheme_id, credit_account)
+);
+CREATE INDEX IF NOT EXISTS idx_{TRACKER_ROWS_TABLE}_order ON {TRACKER_ROWS_TABLE} (scheme_id, row_order);
+"""
+
+_table_ready = False
+
+
+def store_blob():
+    """Whether scheme_tracker_runs.tracker_data should still be written"""
+    return TRACKER_STORAGE_MODE in ("blob", "both")
+
+
+def store_rows():
+    """Whether scheme_tracker_rows should be written"""
+    return TRACKER_STORAGE_MODE in ("rows", "both")
+
+
+def ensure_tracker_rows_table(conn):
+    """Create scheme_tracker_rows once per process"""
+    global _table_ready
+    if _table_ready:
+        return
+    with conn.cursor() as cur:
+        cur.execute(TRACKER_ROWS_DDL)
+    conn.commit()
+    _table_ready = True
+
+
+def _iter_copy_rows(scheme_id, tracker_df):
+    """(scheme_id, credit_account, row_order, row_data, row_hash) per tracker row"""
+    row_order = 0
+    for records in iter_tracker_records(tracker_df):
+        for record in records:
+            account = record.get('credit_account')
+            if account is None:
+                account = f"__row_{row_order}"
+            row_json = encode_json(record)
+            yield (scheme_id, str(account), row_order,
+                   row_json, hashlib.md5(row_json.encode("utf-8")).hexdigest())
+            row_order += 1
+
+
+def write_tracker_rows(scheme_id, tracker_df, conn, batch_rows=20000, commit=True):
+    """
+    COPY tracker_df into scheme_tracker_rows for scheme_id.
+
+    Unchanged rows are left alone, changed rows are updated, new accounts are
+    inserted and accounts missing from tracker_df are deleted. The caller's
+    transaction is committed on success unless commit=False (the caller then
+    commits it together with its own writes). Returns the number of rows written.
+    """
+    ensure_tracker_rows_table(conn)
+    scheme_id = int(scheme_id)
+
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TEMP TABLE tmp_tracker_rows
+            (LIKE {TRACKER_ROWS_TABLE} INCLUDING DEFAULTS) ON COMMIT DROP
+        """)
+
+        copy_sql = ("COPY tmp_tracker_rows (scheme_id, credit_account, row_order, row_data, row_hash) "
+                    "FROM STDIN WITH (FORMAT csv)")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        total_rows = 0
+        for row in _iter_copy_rows(scheme_id, tracker_df):
+            writer.writerow(row)
+            total_rows += 1
+            if total_rows % batch_rows == 0:
+                buffer.seek(0)
+                cur.copy_expert(copy_sql, buffer)
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            buffer.seek(0)
+            cur.copy_expert(copy_sql, buffer)
+
+        cur.execute(f"""
+            INSERT INTO {TRACKER_ROWS_TABLE} (scheme_id, credit_account, row_order, row_data, row_hash)
+            SELECT DISTINCT ON (credit_account) scheme_id, credit_account, row_order, row_data, row_hash
+            FROM tmp_tracker_rows
+            ORDER BY credit_account, row_order
+            ON CONFLICT (scheme_id, credit_account) DO UPDATE
+            SET row_order = EXCLUDED.row_order,
+                row_data = EXCLUDED.row_data,
+                row_hash = EXCLUDED.row_hash,
+                updated_at = now()
+            WHERE {TRACKER_ROWS_TABLE}.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+               OR {TRACKER_ROWS_TABLE}.row_order IS DISTINCT FROM EXCLUDED.row_order
+        """)
+        changed_rows = cur.rowcount
+
+        cur.execute(f"""
+            DELETE FROM {TRACKER_ROWS_TABLE} r
+            WHERE r.scheme_id = %s
+              AND NOT EXISTS (SELECT 1 FROM tmp_tracker_rows t WHERE t.credit_account = r.credit_account)
+        """, (scheme_id,))
+        deleted_rows = cur.rowcount
+
+    if commit:
+        conn.commit()
+    print(f"✅ Tracker rows stored for scheme {scheme_id}: {total_rows} rows, "
+          f"{changed_rows} inserted/updated, {deleted_rows} removed")
+    return total_rows
+
+
+def save_tracker_run(scheme_id, json_data, tracker_df, conn, write_run):
+    """
+    Store a tracker run: scheme_tracker_rows (TRACKER_STORAGE_MODE 'rows'/'both')
+    and the scheme_tracker_runs row in one transaction.
+
+    write_run(cur, json_data) upserts the scheme_tracker_runs row; json_data is
+    None when only rows are stored. If the row store fails, the run falls back
+    to the tracker_data blob; if that also fails the error is raised and nothing
+    is marked completed.
+    """
+    write_rows = tracker_df is not None and store_rows()
+    try:
+        _write_run(scheme_id, json_data, tracker_df if write_rows else None, conn, write_run)
+        return
+    except Exception as db_error:
+        conn.rollback()
+        if not write_rows:
+            print(f"❌ Error saving tracker data to database: {db_error}")
+            raise
+        print(f"❌ Error saving tracker rows to database: {db_error}")
+
+    # Row store failed: keep the run's output as the tracker_data blob instead
+    print("⚠️ Falling back to the tracker_data blob for this run")
+    if json_data is None:
+        json_data = tracker_to_json(tracker_df)
+    try:
+        _write_run(scheme_id, json_data, None, conn, write_run)
+    except Exception as db_error:
+        print(f"❌ Error saving tracker data to database: {db_error}")
+        conn.rollback()
+        raise
+
+
+def _write_run(scheme_id, json_data, tracker_df, conn, write_run):
+    """Tracker rows (when tracker_df is given) and the run row, committed once"""
+    if tracker_df is not None:
+        write_tracker_rows(scheme_id, tracker_df, conn, commit=False)
+    cur = conn.cursor()
+    write_run(cur, json_data)
+    conn.commit()
+    cur.close()
+
+
+def fetch_tracker_rows(scheme_id, conn, limit=1000, after_row=-1, credit_accounts=None):
+    """
+    Page through stored tracker rows in tracker order.
+
+    Returns (rows, next_after_row); pass next_after_row back in to get the
+    next page (None once exhausted). credit_accounts restricts to those accounts.
+    """
+    params = [int(scheme_id), after_row]
+    account_filter = ""
+    if credit_accounts:
+        account_filter = "AND credit_account = ANY(%s)"
+        params.append([str(account) for account in credit_accounts])
+    params.append(limit)
+
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT row_order, row_data
+            FROM {TRACKER_ROWS_TABLE}
+            WHERE scheme_id = %s AND row_order > %s {account_filter}
+            ORDER BY row_order
+            LIMIT %s
+        """, params)
+        result = cur.fetchall()
+
+    rows = [row_data for _, row_data in result]
+    next_after_row = result[-1][0] if len(result) == limit else None
+    return rows, next_after_row